@@ -0,0 +1,163 @@
+"""
+Regression check of the benchmarks of the Python-side overhead.
+
+Compares the results of the benchmarks, as written by `pytest-benchmark`, with
+the stored baseline. A benchmark regresses if its median time exceeds that of
+the baseline by more than the threshold, in which case the check fails. The
+benchmarks replace the model by a fake one, so the check runs offline.
+
+Usage:
+
+    pytest benchmarks/ --benchmark-json=results.json
+    python benchmarks/compare.py results.json --threshold 0.25
+
+Timings depend on the machine, so the baseline should be recorded on the
+machine (or the class of CI runner) running the check, with `--update`. The
+machine the baseline was recorded on is reported alongside the comparison.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from pydantic import BaseModel
+
+BASELINE = Path(__file__).parent / "baseline.json"
+
+
+class Baseline(BaseModel):
+    """
+    The median time of each benchmark, in seconds.
+    """
+
+    machine: str
+    benchmarks: dict[str, float]
+
+
+class Comparison(BaseModel):
+    """
+    The time of a benchmark, compared with the baseline.
+    """
+
+    name: str
+    baseline: float | None
+    current: float | None
+
+    @property
+    def change(self) -> float | None:
+        """
+        The relative change of the time, positive if slower.
+        """
+        if self.baseline is None or self.current is None:
+            return None
+        return self.current / self.baseline - 1
+
+
+def load_results(path: Path) -> Baseline:
+    """
+    Load the results of a run of `pytest-benchmark`.
+    """
+    data = json.loads(path.read_text())
+    info = data.get("machine_info", {})
+    machine = " ".join(
+        str(part)
+        for part in [
+            info.get("cpu", {}).get("brand_raw", info.get("processor", "")),
+            info.get("python_implementation", ""),
+            info.get("python_version", ""),
+        ]
+        if part
+    )
+    return Baseline(
+        machine=machine,
+        benchmarks={
+            benchmark["name"]: benchmark["stats"]["median"]
+            for benchmark in data["benchmarks"]
+        },
+    )
+
+
+def compare(baseline: Baseline, results: Baseline) -> list[Comparison]:
+    """
+    Compare every benchmark of the results or the baseline.
+    """
+    names = sorted(baseline.benchmarks.keys() | results.benchmarks.keys())
+    return [
+        Comparison(
+            name=name,
+            baseline=baseline.benchmarks.get(name),
+            current=results.benchmarks.get(name),
+        )
+        for name in names
+    ]
+
+
+def summarize(comparisons: list[Comparison], threshold: float) -> str:
+    """
+    Summarize the comparisons as a table.
+    """
+    width = max(len(comparison.name) for comparison in comparisons)
+    lines = [f"{'benchmark':<{width}} {'baseline':>11} {'current':>11} {'change':>8}"]
+    for comparison in comparisons:
+        baseline = (
+            "-" if comparison.baseline is None else f"{comparison.baseline * 1e6:.1f}us"
+        )
+        current = (
+            "-" if comparison.current is None else f"{comparison.current * 1e6:.1f}us"
+        )
+        change = comparison.change
+        status = ""
+        if change is None:
+            status = "  new" if comparison.baseline is None else "  missing"
+        elif change > threshold:
+            status = "  REGRESSED"
+        lines.append(
+            f"{comparison.name:<{width}} {baseline:>11} {current:>11} "
+            f"{'' if change is None else f'{change:+.0%}':>8}{status}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """
+    Run the regression check.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "results", type=Path, help="The JSON results of pytest-benchmark."
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="The largest slowdown allowed, as a fraction of the baseline.",
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="Store the results as the baseline."
+    )
+    args = parser.parse_args()
+
+    results = load_results(args.results)
+    if args.update:
+        args.baseline.write_text(results.model_dump_json(indent=2) + "\n")
+        sys.stdout.write(f"Stored {len(results.benchmarks)} benchmarks.\n")
+        return
+
+    baseline = Baseline.model_validate_json(args.baseline.read_text())
+    comparisons = compare(baseline, results)
+    sys.stdout.write(f"baseline: {baseline.machine}\ncurrent:  {results.machine}\n")
+    sys.stdout.write(summarize(comparisons, args.threshold) + "\n")
+    regressed = [
+        comparison.name
+        for comparison in comparisons
+        if (change := comparison.change) is not None and change > args.threshold
+    ]
+    if regressed:
+        sys.stdout.write(f"{len(regressed)} benchmarks regressed.\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Fixtures of the benchmarks of the Python-side overhead.
+
+The models are replaced by fake chat models, always giving the same answer, so
+the benchmarks measure everything but the model: building the components,
+rendering the prompts, validating and dumping the models, and parsing the
+answers. Each benchmark of a snippet runs for snippets of 10 to 10,000 lines.
+"""
+
+import itertools
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.reviewer import (
+    Recommendation,
+    Recommendations,
+    Reviewer,
+    ReviewerLLMInput,
+)
+from pypacter_api.base import get_detector, get_reviewer, router
+
+SIZES = [10, 100, 1_000, 10_000]
+"""
+The number of lines of the snippets.
+"""
+
+DETECTION = LanguageDetectionOutput(
+    language="python",
+    confidence=0.95,
+    message="Language successfully detected.",
+    result="detection successful",
+)
+
+FUNCTION = '''def function_{i}(values: list[int], factor: int = {i}) -> list[int]:
+    """Scale the values by a factor, skipping the negative ones."""
+    result = []
+    for value in values:
+        if value < 0:
+            continue
+        result.append(value * factor)
+    return result
+
+
+'''
+
+
+def fake_model(answer: str) -> GenericFakeChatModel:
+    """
+    A chat model always giving the same answer.
+    """
+    return GenericFakeChatModel(messages=itertools.repeat(AIMessage(content=answer)))
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: f"{size}-lines")
+def lines(request: pytest.FixtureRequest) -> int:
+    """
+    The number of lines of the snippet.
+    """
+    return request.param
+
+
+@pytest.fixture
+def code(lines: int) -> str:
+    """
+    A snippet of Python code of the given number of lines.
+    """
+    functions = (FUNCTION.format(i=i) for i in itertools.count())
+    text = "".join(itertools.islice(functions, lines // 10 + 1))
+    return "\n".join(text.splitlines()[:lines])
+
+
+@pytest.fixture
+def review(lines: int) -> Recommendations:
+    """
+    A review of the snippet, with a recommendation for every ten lines.
+    """
+    return Recommendations(
+        recommendations=[
+            Recommendation(
+                line=line,
+                severity="warning",
+                message=f"The factor of function_{line // 10} should be validated.",
+            )
+            for line in range(1, lines + 1, 10)
+        ],
+        review_result="Success",
+    )
+
+
+@pytest.fixture
+def llm_input(code: str) -> ReviewerLLMInput:
+    """
+    The input of the review chain for the snippet.
+    """
+    return ReviewerLLMInput(
+        code=code,
+        language=DETECTION.language,
+        confidence=DETECTION.confidence,
+        summary=DETECTION.result + DETECTION.message,
+    )
+
+
+@pytest.fixture
+def model() -> GenericFakeChatModel:
+    """
+    A chat model always answering with the detection of Python.
+    """
+    return fake_model(DETECTION.model_dump_json())
+
+
+@pytest.fixture
+def detector(model: GenericFakeChatModel) -> LanguageDetector:
+    """
+    A language detector, answering with a fake model.
+    """
+    return LanguageDetector(model)
+
+
+@pytest.fixture
+def offline(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Let the default model be built without an API key; it is never called.
+    """
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-benchmark")
+
+
+@pytest.fixture
+def reviewer(detector: LanguageDetector, review: Recommendations) -> Reviewer:
+    """
+    A code reviewer, answering with a fake model.
+    """
+    return Reviewer(
+        model=fake_model(review.model_dump_json()), language_detector=detector
+    )
+
+
+@pytest.fixture
+def client(detector: LanguageDetector, reviewer: Reviewer) -> TestClient:
+    """
+    A client of the API, serving the fake detector and reviewer.
+    """
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_detector] = lambda: detector
+    app.dependency_overrides[get_reviewer] = lambda: reviewer
+    return TestClient(app)
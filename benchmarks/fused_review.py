@@ -0,0 +1,211 @@
+"""
+Benchmark of the fused detect-and-review mode.
+
+Reviews files with the two-stage reviewer (language detection, then review) and
+in fused mode (a single call identifying the language and reviewing the code),
+and compares their latency, token usage and results. Both modes call the real
+model, so `OPENAI_API_KEY` must be set.
+
+Usage:
+
+    python benchmarks/fused_review.py src/pypacter/**/*.py --repeat 3
+
+The results agree on the language if the fused review identifies the same
+language as the language detector, and the agreement of the recommendations is
+the Jaccard index of their `(line, severity)` pairs.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from pypacter.cache import ResultCache
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.models import default_model, model_id, temperature
+from pypacter.reviewer import FusedRecommendations, Recommendations, Reviewer
+
+
+class TokenCounter(BaseCallbackHandler):
+    """
+    Counts the calls to a model and the tokens they use.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create a new counter.
+        """
+        self.calls = 0
+        self.tokens = 0
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:  # noqa: ANN401, ARG002
+        """
+        Count a completed call.
+        """
+        self.calls += 1
+        for generations in response.generations:
+            for generation in generations:
+                if isinstance(generation, ChatGeneration):
+                    usage = getattr(generation.message, "usage_metadata", None)
+                    if usage:
+                        self.tokens += usage["total_tokens"]
+
+
+class Run(BaseModel):
+    """
+    The review of a file in one mode.
+    """
+
+    seconds: float
+    calls: int
+    tokens: int
+    language: str
+    review: Recommendations
+
+
+class Comparison(BaseModel):
+    """
+    The reviews of a file in both modes.
+    """
+
+    path: str
+    two_stage: Run
+    fused: Run
+    same_language: bool
+    agreement: float
+
+
+def _model(counter: TokenCounter, name: str) -> ChatOpenAI:
+    return ChatOpenAI(temperature=temperature(), model=name, callbacks=[counter])
+
+
+async def review_two_stage(code: str, model: str) -> Run:
+    """
+    Review code by detecting its language, then reviewing it.
+    """
+    counter = TokenCounter()
+    detector = LanguageDetector(
+        _model(counter, model), cache=ResultCache(LanguageDetectionOutput)
+    )
+    reviewer = Reviewer(_model(counter, model), language_detector=detector)
+    start = time.perf_counter()
+    review = await reviewer.ainvoke({"code": code})
+    seconds = time.perf_counter() - start
+    # Answered from the cache of the detector, so no further call is made.
+    detection = await detector.ainvoke({"code": code})
+    return Run(
+        seconds=seconds,
+        calls=counter.calls,
+        tokens=counter.tokens,
+        language=detection.language.lower(),
+        review=review,
+    )
+
+
+async def review_fused(code: str, model: str) -> Run:
+    """
+    Review code in fused mode.
+    """
+    counter = TokenCounter()
+    reviewer = Reviewer(_model(counter, model), fused=True)
+    start = time.perf_counter()
+    review = await reviewer.ainvoke({"code": code})
+    seconds = time.perf_counter() - start
+    language = review.language if isinstance(review, FusedRecommendations) else ""
+    return Run(
+        seconds=seconds,
+        calls=counter.calls,
+        tokens=counter.tokens,
+        language=language.lower(),
+        review=review,
+    )
+
+
+def agreement(a: Recommendations, b: Recommendations) -> float:
+    """
+    The Jaccard index of the `(line, severity)` pairs of two reviews.
+    """
+    x = {(r.line, r.severity) for r in a.recommendations}
+    y = {(r.line, r.severity) for r in b.recommendations}
+    return len(x & y) / len(x | y) if x or y else 1.0
+
+
+async def compare(path: Path, model: str) -> Comparison:
+    """
+    Review a file in both modes.
+    """
+    code = path.read_text()
+    two_stage = await review_two_stage(code, model)
+    fused = await review_fused(code, model)
+    return Comparison(
+        path=str(path),
+        two_stage=two_stage,
+        fused=fused,
+        same_language=two_stage.language == fused.language,
+        agreement=agreement(two_stage.review, fused.review),
+    )
+
+
+def summarize(results: list[Comparison]) -> str:
+    """
+    Summarize the comparisons as a table.
+    """
+    lines = [f"{'mode':<10} {'p50 (s)':>8} {'mean (s)':>9} {'calls':>6} {'tokens':>8}"]
+    for mode in ("two_stage", "fused"):
+        runs: list[Run] = [getattr(result, mode) for result in results]
+        seconds = [run.seconds for run in runs]
+        lines.append(
+            f"{mode:<10} {statistics.median(seconds):>8.2f} "
+            f"{statistics.fmean(seconds):>9.2f} "
+            f"{sum(run.calls for run in runs):>6} "
+            f"{sum(run.tokens for run in runs):>8}"
+        )
+    same = sum(result.same_language for result in results) / len(results)
+    overlap = statistics.fmean(result.agreement for result in results)
+    lines.append(
+        f"language agreement: {same:.0%}, recommendation agreement: {overlap:.2f}"
+    )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """
+    Run the benchmark.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("paths", nargs="+", type=Path, help="The files to review.")
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="The number of reviews of each file."
+    )
+    parser.add_argument("--model", default=model_id(default_model()))
+    parser.add_argument(
+        "--json", type=Path, help="Write the individual results to this file."
+    )
+    args = parser.parse_args()
+
+    async def run() -> list[Comparison]:
+        return [
+            await compare(path, args.model)
+            for path in args.paths
+            for _ in range(args.repeat)
+        ]
+
+    results = asyncio.run(run())
+    if args.json:
+        args.json.write_text(
+            json.dumps([result.model_dump() for result in results], indent=2)
+        )
+    sys.stdout.write(summarize(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
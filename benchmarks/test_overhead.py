@@ -0,0 +1,124 @@
+"""
+Benchmarks of the Python-side overhead of detection and review.
+
+Run with the `pytest-benchmark` plugin (the `devel-bench` extra):
+
+    pytest benchmarks/ --benchmark-json=results.json
+    python benchmarks/compare.py results.json
+
+See [`compare`](compare.py) for the regression check against the stored
+baseline.
+"""
+
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from pypacter.language_detector import LanguageDetector
+from pypacter.reviewer import Recommendations, Reviewer, ReviewerLLMInput, ReviewInput
+from pypacter_api.state import AppState
+
+
+def test_build_reviewer(
+    benchmark: BenchmarkFixture, model: GenericFakeChatModel
+) -> None:
+    """
+    Build a language detector and a code reviewer.
+    """
+
+    def build() -> Reviewer:
+        detector = LanguageDetector(model)
+        return Reviewer(model=model, language_detector=detector)
+
+    benchmark(build)
+
+
+@pytest.mark.usefixtures("offline")
+def test_build_state(benchmark: BenchmarkFixture) -> None:
+    """
+    Build the shared state of the API from the environment, as done at startup.
+    """
+
+    def build() -> Reviewer:
+        return AppState().get_reviewer()
+
+    benchmark(build)
+
+
+def test_render_prompt(
+    benchmark: BenchmarkFixture, reviewer: Reviewer, llm_input: ReviewerLLMInput
+) -> None:
+    """
+    Render the review prompt: the instructions and the code template.
+    """
+    variables = llm_input.model_dump()
+
+    messages = benchmark(reviewer.prompt_template.format_messages, **variables)
+
+    assert llm_input.code in str(messages[-1].content)
+
+
+def test_dump_input(benchmark: BenchmarkFixture, llm_input: ReviewerLLMInput) -> None:
+    """
+    Dump the input of the review chain.
+    """
+    benchmark(llm_input.model_dump)
+
+
+def test_parse_review(
+    benchmark: BenchmarkFixture, reviewer: Reviewer, review: Recommendations
+) -> None:
+    """
+    Parse the answer of the model with the output parser.
+    """
+    text = review.model_dump_json()
+
+    output = benchmark(reviewer.parser.parse, text)
+
+    assert output == review
+
+
+def test_validate_request(benchmark: BenchmarkFixture, code: str) -> None:
+    """
+    Validate the body of a review request.
+    """
+    body = json.dumps({"code": code})
+
+    benchmark(ReviewInput.model_validate_json, body)
+
+
+def test_detect(
+    benchmark: BenchmarkFixture, detector: LanguageDetector, code: str
+) -> None:
+    """
+    Detect the language of a snippet, end to end but for the model.
+    """
+    output = benchmark(detector.invoke, {"code": code})
+
+    assert output.language == "python"
+
+
+def test_review(benchmark: BenchmarkFixture, reviewer: Reviewer, code: str) -> None:
+    """
+    Review a snippet, end to end but for the model.
+    """
+    output = benchmark(reviewer.invoke, {"code": code})
+
+    assert output.review_result == "Success"
+
+
+def test_code_review_endpoint(
+    benchmark: BenchmarkFixture, client: TestClient, code: str
+) -> None:
+    """
+    Serve a review request, including its validation and the serialization.
+    """
+    body = json.dumps({"code": code})
+    headers = {"Content-Type": "application/json"}
+
+    response = benchmark(client.post, "/code-review", content=body, headers=headers)
+
+    assert response.json()["review_result"] == "Success"
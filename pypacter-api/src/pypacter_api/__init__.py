@@ -79,11 +79,13 @@ def local() -> None:
     import uvicorn
 
     import pypacter_api.base
+    import pypacter_api.state
 
     local_app = FastAPI(
         title="PyPacter (local)",
         description="Development version of PyPacter API.",
         version=__version__,
+        lifespan=pypacter_api.state.lifespan,
     )
 
     # CORS Configuration
@@ -0,0 +1,386 @@
+"""
+Admission control.
+
+Every review or detection ends in calls to the model, which is both slow and
+rate-limited. Without a bound on the work accepted, a bulk sweep can queue
+thousands of reviews and starve the interactive users behind it. The
+[`AdmissionController`][AdmissionController] bounds the requests processed at
+once, and queues the others in two priority lanes:
+
+-   `interactive`: requests from users waiting on the result, such as an IDE.
+    These are always served first.
+-   `bulk`: batch endpoints and background sweeps. These may only hold some of
+    the slots, so that interactive requests never wait behind a full house of
+    bulk work.
+
+Each lane's queue is bounded, and a request waits for at most a set time.
+Requests which cannot be queued (or which waited too long) are rejected
+immediately with a `503`, and clients sending requests faster than their token
+bucket allows are rejected with a `429`. Both responses carry a `Retry-After`
+header.
+"""
+
+import asyncio
+import contextlib
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from typing import Literal, get_args
+
+from pydantic import BaseModel, Field
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionRejected",
+    "AdmissionStats",
+    "Lane",
+    "LaneStats",
+    "TokenBucket",
+]
+
+Lane = Literal["interactive", "bulk"]
+"""
+The priority lane of a request, in order of priority.
+"""
+
+LANES: tuple[Lane, ...] = get_args(Lane)
+
+
+class AdmissionRejected(Exception):  # noqa: N818
+    """
+    A request was not admitted.
+    """
+
+    def __init__(self, status_code: int, message: str, retry_after: float) -> None:
+        """
+        Create a new rejection.
+
+        Args:
+            status_code:
+                The HTTP status of the response: `429` if the client exceeded
+                its rate limit, or `503` if the server is too busy.
+            message:
+                The reason for the rejection.
+            retry_after:
+                The number of seconds after which the request may be retried.
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """
+        The headers of the response, telling the client when to retry.
+        """
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class TokenBucket:
+    """
+    A token bucket, limiting the rate of requests of a client.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        """
+        Create a new, full bucket.
+
+        Args:
+            rate:
+                The number of tokens added per second.
+            burst:
+                The capacity of the bucket.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take a token from the bucket.
+
+        Returns:
+            `0` if a token was taken, otherwise the number of seconds until one
+            is available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LaneStats(BaseModel):
+    """
+    Gauges and counters of a priority lane.
+    """
+
+    running: int = 0
+    queued: int = 0
+    """
+    The current depth of the queue.
+    """
+    admitted: int = 0
+    rejected: int = 0
+    """
+    Requests rejected as the queue was full.
+    """
+    timed_out: int = 0
+    """
+    Requests rejected as they waited too long in the queue.
+    """
+    wait_seconds: float = 0.0
+    """
+    The total time admitted requests spent in the queue.
+    """
+    max_wait_seconds: float = 0.0
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        """
+        The mean time admitted requests spent in the queue.
+        """
+        return self.wait_seconds / self.admitted if self.admitted else 0.0
+
+
+class AdmissionStats(BaseModel):
+    """
+    Gauges and counters of the admission controller.
+    """
+
+    max_concurrent: int
+    rate_limited: int = 0
+    """
+    Requests rejected as their client exceeded its rate limit.
+    """
+    lanes: dict[Lane, LaneStats] = Field(
+        default_factory=lambda: {lane: LaneStats() for lane in LANES}
+    )
+
+
+class AdmissionController:
+    """
+    Bounds the requests processed at once, queueing the others by priority.
+
+    The controller belongs to the event loop serving the requests.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        max_concurrent: int = 32,
+        max_bulk_concurrent: int | None = None,
+        max_queue: int = 64,
+        max_bulk_queue: int = 256,
+        queue_timeout: float = 30.0,
+        rate: float = 0.0,
+        burst: int = 10,
+        max_clients: int = 10_000,
+    ) -> None:
+        """
+        Create a new controller.
+
+        Args:
+            max_concurrent:
+                The maximum number of requests processed at once.
+            max_bulk_concurrent:
+                The maximum number of bulk requests processed at once.
+                Defaults to three quarters of `max_concurrent`.
+            max_queue:
+                The maximum number of interactive requests waiting.
+            max_bulk_queue:
+                The maximum number of bulk requests waiting.
+            queue_timeout:
+                The maximum time, in seconds, a request waits to be processed.
+            rate:
+                The number of requests per second allowed to each client, on
+                average. Set to `0` to not limit clients.
+            burst:
+                The number of requests a client may send at once.
+            max_clients:
+                The number of clients whose token buckets are remembered; the
+                least recently seen clients are forgotten first.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_bulk_concurrent = (
+            max(1, max_concurrent * 3 // 4)
+            if max_bulk_concurrent is None
+            else max_bulk_concurrent
+        )
+        self.max_queue: dict[Lane, int] = {
+            "interactive": max_queue,
+            "bulk": max_bulk_queue,
+        }
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._running: dict[Lane, int] = dict.fromkeys(LANES, 0)
+        self._waiting: dict[Lane, deque[asyncio.Future[None]]] = {
+            lane: deque() for lane in LANES
+        }
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._stats = AdmissionStats(max_concurrent=max_concurrent)
+        self._service_seconds = 1.0
+        """
+        A moving average of the time requests hold a slot, used to tell
+        rejected clients when to retry.
+        """
+
+    @property
+    def stats(self) -> AdmissionStats:
+        """
+        A snapshot of the gauges and counters.
+        """
+        stats = self._stats.model_copy(deep=True)
+        for lane in LANES:
+            stats.lanes[lane].running = self._running[lane]
+            stats.lanes[lane].queued = sum(
+                not future.done() for future in self._waiting[lane]
+            )
+        return stats
+
+    def _can_run(self, lane: Lane) -> bool:
+        """
+        Whether a request of a lane could be processed now.
+        """
+        if sum(self._running.values()) >= self.max_concurrent:
+            return False
+        return lane == "interactive" or self._running[lane] < self.max_bulk_concurrent
+
+    def _next(self, lane: Lane) -> asyncio.Future[None] | None:
+        """
+        The first request still waiting in a lane, if any.
+        """
+        waiting = self._waiting[lane]
+        while waiting and waiting[0].done():
+            waiting.popleft()
+        return waiting[0] if waiting else None
+
+    def _retry_after(self, lane: Lane) -> float:
+        """
+        An estimate of the time until a request of a lane could be processed.
+        """
+        queued = len(self._waiting["interactive"])
+        if lane == "bulk":
+            queued += len(self._waiting["bulk"])
+        return self._service_seconds * (queued + 1) / self.max_concurrent
+
+    def _check_rate(self, client: str) -> None:
+        """
+        Take a token from the bucket of a client.
+
+        Raises:
+            AdmissionRejected: If the bucket is empty.
+        """
+        if self.rate <= 0:
+            return
+        bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+        self._buckets[client] = bucket
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        wait = bucket.take()
+        if wait:
+            self._stats.rate_limited += 1
+            msg = "Too many requests."
+            raise AdmissionRejected(429, msg, wait)
+
+    async def acquire(self, lane: Lane, client: str) -> None:
+        """
+        Wait for a request to be admitted.
+
+        Args:
+            lane:
+                The priority lane of the request.
+            client:
+                Identifies the client, for its rate limit.
+
+        Raises:
+            AdmissionRejected: If the client exceeded its rate limit, the queue
+                of the lane is full, or the request waited too long.
+        """
+        self._check_rate(client)
+        stats = self._stats.lanes[lane]
+        ahead = LANES[: LANES.index(lane) + 1]
+        if self._can_run(lane) and all(self._next(other) is None for other in ahead):
+            self._running[lane] += 1
+            stats.admitted += 1
+            return
+
+        if len(self._waiting[lane]) >= self.max_queue[lane]:
+            stats.rejected += 1
+            msg = "The server is too busy."
+            raise AdmissionRejected(503, msg, self._retry_after(lane))
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiting[lane].append(future)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except TimeoutError:
+            # The slot may have been handed over just as the wait timed out.
+            if future.done() and not future.cancelled():
+                self.release(lane)
+            stats.timed_out += 1
+            msg = "The server is too busy."
+            raise AdmissionRejected(503, msg, self._retry_after(lane)) from None
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation.
+            if future.done() and not future.cancelled():
+                self.release(lane)
+            raise
+        finally:
+            with contextlib.suppress(ValueError):
+                self._waiting[lane].remove(future)
+        wait = time.monotonic() - start
+        stats.admitted += 1
+        stats.wait_seconds += wait
+        stats.max_wait_seconds = max(stats.max_wait_seconds, wait)
+
+    def release(self, lane: Lane) -> None:
+        """
+        Release the slot of a request, handing it over to the next request.
+
+        Args:
+            lane:
+                The priority lane of the request.
+        """
+        self._running[lane] -= 1
+        for next_lane in LANES:
+            while self._can_run(next_lane):
+                future = self._next(next_lane)
+                if future is None:
+                    break
+                self._waiting[next_lane].popleft()
+                self._running[next_lane] += 1
+                future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, lane: Lane, client: str) -> AsyncIterator[None]:
+        """
+        Hold a slot while processing a request.
+
+        Args:
+            lane:
+                The priority lane of the request.
+            client:
+                Identifies the client, for its rate limit.
+
+        Yields:
+            Once the request is admitted.
+
+        Raises:
+            AdmissionRejected: If the request is not admitted.
+        """
+        await self.acquire(lane, client)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            self._service_seconds += 0.1 * (seconds - self._service_seconds)
+            self.release(lane)
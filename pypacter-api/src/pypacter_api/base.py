@@ -5,21 +5,70 @@ The routes in this module serve a very basic purpose, such as health checks and
 version information.
 """
 
-from typing import Annotated
-
-from fastapi import APIRouter, Depends
+import logging
+import os
+import time
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Annotated, Any, Generic, TypeVar
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from langchain_core.runnables import Runnable, RunnableConfig
 from pydantic import BaseModel
 
+from pypacter.connections import shared_pool
 from pypacter.language_detector import (
     LanguageDetectionInput,
     LanguageDetectionOutput,
     LanguageDetector,
 )
-from pypacter.reviewer import Recommendations, Reviewer
+from pypacter.metrics import Metrics, Stats
+from pypacter.reviewer import (
+    FusedRecommendations,
+    Recommendation,
+    Recommendations,
+    Reviewer,
+    ReviewInput,
+)
+from pypacter.reviewer.diffing import DiffReviewInput
+from pypacter.singleflight import SingleFlight
 from pypacter_api import get_version
+from pypacter_api.admission import AdmissionRejected, AdmissionStats, Lane
+from pypacter_api.state import STATE
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+OutputT = TypeVar("OutputT", bound=BaseModel)
+
+MaxConcurrency = Annotated[
+    int | None,
+    Query(
+        ge=1,
+        description="The maximum number of snippets processed concurrently. "
+        "Defaults to `PYPACTER_BATCH_CONCURRENCY`, or 8 if unset.",
+    ),
+]
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+Stream = Annotated[
+    bool,
+    Query(
+        description="Stream the results as newline-delimited JSON, in the order "
+        "they complete, each with the index of its snippet.",
+    ),
+]
+
 
 class HealthResponse(BaseModel):
     """
@@ -37,6 +86,26 @@ class VersionResponse(BaseModel):
     version: str
 
 
+class BatchItem(BaseModel, Generic[OutputT]):
+    """
+    A single result of a streamed batch.
+    """
+
+    index: int
+    result: OutputT
+
+
+class ReviewStreamSummary(BaseModel):
+    """
+    The final event of a streamed code review.
+    """
+
+    review_result: str
+    recommendations: int
+    time_to_first_recommendation: float | None
+    duration: float
+
+
 @router.get("/health", tags=["health"])
 async def health() -> HealthResponse:
     """
@@ -59,35 +128,223 @@ async def version() -> VersionResponse:
     return VersionResponse(version=get_version())
 
 
+@router.get("/ready", tags=["health"])
+async def ready(response: Response) -> HealthResponse:
+    """
+    Readiness check.
+
+    The API is only ready to take traffic once the shared language detector
+    and code reviewer have been built during startup.
+
+    Returns:
+        A JSON response indicating whether the API is ready. If it is not, the
+        response has a 503 status code.
+    """
+    if not STATE.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return HealthResponse(status="starting")
+    return HealthResponse(status="ready")
+
+
+@router.get("/admission", tags=["health"])
+async def admission() -> AdmissionStats:
+    """
+    Report the state of admission control.
+
+    Returns:
+        The number of requests running and queued in each priority lane, how
+        long they waited and how many were rejected.
+
+    Raises:
+        HTTPException: If admission control is disabled.
+    """
+    controller = STATE.get_admission()
+    if controller is None:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, "Admission control is disabled.")
+    return controller.stats
+
+
+def admit(lane: Lane) -> Callable[..., AsyncIterator[None]]:
+    """
+    Build a dependency holding a slot of the admission controller.
+
+    The slot is held until the response has been sent, including streamed
+    responses.
+
+    Args:
+        lane:
+            The default priority lane of the endpoint. Clients may choose
+            another with the `X-Priority` header.
+
+    Returns:
+        The dependency.
+    """
+
+    async def dependency(
+        request: Request,
+        x_priority: Annotated[
+            Lane | None,
+            Header(description=f"The priority lane of the request (default: {lane})."),
+        ] = None,
+        x_client_id: Annotated[
+            str | None,
+            Header(description="Identifies the client for rate limiting."),
+        ] = None,
+    ) -> AsyncIterator[None]:
+        controller = STATE.get_admission()
+        if controller is None:
+            yield
+            return
+        client = x_client_id or (request.client.host if request.client else "")
+        try:
+            async with controller.slot(x_priority or lane, client):
+                yield
+        except AdmissionRejected as rejection:
+            raise HTTPException(
+                rejection.status_code, rejection.message, rejection.headers
+            ) from None
+
+    return dependency
+
+
 def get_detector() -> LanguageDetector:
     """
-    Provides an instance of the LanguageDetector.
+    Provides the shared instance of the LanguageDetector.
 
     This function is used to inject the LanguageDetector dependency into the
-    endpoint handlers.
+    endpoint handlers. The instance is built once at startup and reused across
+    requests; override this dependency to substitute it in tests.
 
     Returns:
-        An instance of LanguageDetector.
+        The shared instance of LanguageDetector.
     """
-    return LanguageDetector()
+    return STATE.get_detector()
 
 
 def get_reviewer() -> Reviewer:
     """
-    Provides an instance of the Reviewer.
+    Provides the shared instance of the Reviewer.
+
+    This function is used to inject the Reviewer dependency into the endpoint
+    handlers. The instance is built once at startup and reused across requests;
+    override this dependency to substitute it in tests.
+
+    Returns:
+        The shared instance of Reviewer.
+    """
+    return STATE.get_reviewer()
+
+
+def _coalescing_stats(in_flight: SingleFlight[Any]) -> dict[str, Any]:
+    """
+    The coalescing counters, with the number of waiters of each call in flight.
+    """
+    return {
+        **in_flight.stats.model_dump(),
+        "calls": {
+            key: {"waiters": count} for key, count in in_flight.waiters().items()
+        },
+    }
+
+
+def _component_stats(
+    detector: LanguageDetector, reviewer: Reviewer
+) -> list[tuple[str, Stats, dict[str, str]]]:
+    """
+    Snapshots of the stats of the components, exported with the metrics.
 
-    This function is used to inject the Reviewer dependency into the
-    endpoint handlers.
+    Components which are not configured are skipped.
+    """
+    admission = STATE.get_admission()
+    batcher = detector.batcher
+    batches = None if batcher is None else batcher.stats
+    stats: list[tuple[str, Stats, dict[str, str]]] = [
+        ("detector", {"tiers": detector.tier_stats}, {}),
+        (
+            "batcher",
+            None
+            if batches is None
+            else {
+                **batches.model_dump(),
+                "tokens_per_snippet": batches.tokens_per_snippet,
+                "mean_queue_seconds": batches.mean_queue_seconds,
+            },
+            {},
+        ),
+        ("pool", shared_pool().stats, {}),
+        ("admission", None if admission is None else admission.stats, {}),
+        ("limiter", None if detector.limiter is None else detector.limiter.stats, {}),
+        (
+            "breaker",
+            None if detector.breaker is None else detector.breaker.stats,
+            {"component": "detector"},
+        ),
+        (
+            "breaker",
+            None if reviewer.breaker is None else reviewer.breaker.stats,
+            {"component": "reviewer"},
+        ),
+        ("routing", detector.routing_stats, {"component": "detector"}),
+        ("routing", reviewer.routing_stats, {"component": "reviewer"}),
+        ("hedge", detector.hedge_stats, {"component": "detector"}),
+        ("hedge", reviewer.hedge_stats, {"component": "reviewer"}),
+        (
+            "single_flight",
+            _coalescing_stats(detector.in_flight),
+            {"component": "detector"},
+        ),
+        (
+            "single_flight",
+            _coalescing_stats(reviewer.in_flight),
+            {"component": "reviewer"},
+        ),
+    ]
+    for name, cache in [
+        ("detector", detector.cache),
+        ("reviewer", reviewer.cache),
+        ("fused", reviewer.fused_cache),
+    ]:
+        stats.append(("cache", None if cache is None else cache.stats, {"cache": name}))
+    return stats
+
+
+@router.get(
+    "/metrics",
+    tags=["health"],
+    response_class=Response,
+    responses={200: {"content": {PROMETHEUS_CONTENT_TYPE: {}}}},
+)
+async def metrics(
+    detector: Annotated[LanguageDetector, Depends(get_detector)],
+    reviewer: Annotated[Reviewer, Depends(get_reviewer)],
+) -> Response:
+    """
+    Export the metrics in the Prometheus text format.
+
+    Besides the time spent in each stage of the pipeline, the tokens and the
+    failures, the stats of the connection pool, admission control,
+    micro-batching, limiter, circuit breaker, routing, hedging, coalescing and
+    caches are exported, for those which are configured. The number of
+    callers waiting on each call in flight is exported per call.
+
+    Args:
+        detector (LanguageDetector): Dependency-injected language detector.
+        reviewer (Reviewer): Dependency-injected code reviewer.
 
     Returns:
-        An instance of Reviewer.
+        Response: The metrics, for Prometheus to scrape.
     """
-    return Reviewer()
+    recorded = detector.metrics or Metrics()
+    return Response(
+        recorded.render(_component_stats(detector, reviewer)),
+        media_type=PROMETHEUS_CONTENT_TYPE,
+    )
 
 
 @router.post(
     "/detect-language",
     tags=["language detection"],
+    dependencies=[Depends(admit("interactive"))],
 )
 async def detect_language(
     snippet: LanguageDetectionInput,
@@ -103,22 +360,234 @@ async def detect_language(
     Returns:
         LanguageDetectionOutput: Detected programming language with confidence.
     """
-    return detector.invoke(snippet)
+    return await detector.ainvoke(snippet)
 
 
-@router.post("/code-review", tags=["Code Review"])
+@router.post(
+    "/code-review",
+    tags=["Code Review"],
+    dependencies=[Depends(admit("interactive"))],
+)
 async def code_review(
-    snippet: LanguageDetectionInput,
+    snippet: ReviewInput,
     reviewer: Annotated[Reviewer, Depends(get_reviewer)],
-) -> Recommendations:
+) -> Recommendations | FusedRecommendations:
     """
     Generate a code review for a given code snippet.
 
     Args:
-        snippet (LanguageDetectionInput): The code snippet input from the user.
+        snippet (ReviewInput): The code snippet input from the user.
+        reviewer (Reviewer): Dependency-injected code reviewer.
+
+    Returns:
+        Recommendations: Generated code review output. Reviews in fused mode
+            also include the language identified by the review.
+    """
+    return await reviewer.ainvoke(snippet)
+
+
+@router.post(
+    "/code-review/diff",
+    tags=["Code Review"],
+    dependencies=[Depends(admit("interactive"))],
+)
+async def code_review_diff(
+    change: DiffReviewInput,
+    reviewer: Annotated[Reviewer, Depends(get_reviewer)],
+    context: Annotated[int, Query(ge=0, le=200)] = 10,
+) -> Recommendations:
+    """
+    Generate a code review for a change to a code snippet.
+
+    If the base code has been reviewed before, only the changed lines (and up
+    to `context` lines around them) are sent to the model, and the rest of the
+    review is carried over from the review of the base.
+
+    Args:
+        change (DiffReviewInput): The base code, and either the new code or a
+            unified diff against the base.
+        reviewer (Reviewer): Dependency-injected code reviewer.
+        context (int): The number of unchanged lines reviewed around each
+            change.
+
+    Returns:
+        Recommendations: The code review output for the new code in full.
+    """
+    return await reviewer.areview_diff(change, context=context)
+
+
+def _sse(event: str, data: BaseModel) -> str:
+    """
+    Format a server-sent event.
+    """
+    return f"event: {event}\ndata: {data.model_dump_json()}\n\n"
+
+
+@router.post(
+    "/code-review/stream",
+    tags=["Code Review"],
+    dependencies=[Depends(admit("interactive"))],
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def code_review_stream(
+    snippet: ReviewInput,
+    reviewer: Annotated[Reviewer, Depends(get_reviewer)],
+) -> StreamingResponse:
+    """
+    Stream a code review for a given code snippet as server-sent events.
+
+    Each recommendation is sent as a `recommendation` event as soon as the
+    model has finished generating it. A final `summary` event reports the
+    `review_result`, the number of recommendations, and the time (in seconds)
+    until the first recommendation and until the end of the review.
+
+    Args:
+        snippet (ReviewInput): The code snippet input from the user.
+        reviewer (Reviewer): Dependency-injected code reviewer.
+
+    Returns:
+        StreamingResponse: The `text/event-stream` of the review.
+    """
+    start = time.perf_counter()
+
+    async def events() -> AsyncIterator[str]:
+        first: float | None = None
+        async for item in reviewer.astream_recommendations(snippet):
+            if isinstance(item, Recommendation):
+                if first is None:
+                    first = time.perf_counter() - start
+                yield _sse("recommendation", item)
+                continue
+            summary = ReviewStreamSummary(
+                review_result=item.review_result,
+                recommendations=len(item.recommendations),
+                time_to_first_recommendation=first,
+                duration=time.perf_counter() - start,
+            )
+            logger.info(
+                "Streamed review: %d recommendations, first after %s s, done in %.3f s",
+                summary.recommendations,
+                "-" if first is None else f"{first:.3f}",
+                summary.duration,
+            )
+            yield _sse("summary", summary)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _batch_config(size: int, max_concurrency: int | None) -> RunnableConfig:
+    """
+    Validate a batch and build the config it is processed with.
+
+    The size of a batch is limited by `PYPACTER_BATCH_MAX_SIZE` (defaults to
+    1000), and the default concurrency is set by `PYPACTER_BATCH_CONCURRENCY`
+    (defaults to 8).
+
+    Args:
+        size:
+            The number of snippets in the batch.
+        max_concurrency:
+            The requested concurrency, if any.
+
+    Returns:
+        The config for `abatch`/`abatch_as_completed`.
+
+    Raises:
+        HTTPException: If the batch is too large.
+    """
+    max_size = int(os.getenv("PYPACTER_BATCH_MAX_SIZE", "1000"))
+    if size > max_size:
+        raise HTTPException(
+            status.HTTP_413_CONTENT_TOO_LARGE,
+            f"A batch may contain at most {max_size} snippets.",
+        )
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("PYPACTER_BATCH_CONCURRENCY", "8"))
+    return RunnableConfig(max_concurrency=max_concurrency)
+
+
+def _stream_batch(
+    runnable: Runnable[LanguageDetectionInput, OutputT],
+    snippets: Sequence[LanguageDetectionInput],
+    config: RunnableConfig,
+) -> StreamingResponse:
+    """
+    Stream the results of a batch as newline-delimited JSON.
+
+    Each line is a [`BatchItem`][BatchItem], written as soon as its snippet
+    has been processed, so a slow snippet does not hold up the others.
+    """
+
+    async def lines() -> AsyncIterator[str]:
+        async for index, result in runnable.abatch_as_completed(snippets, config):
+            yield BatchItem[OutputT](index=index, result=result).model_dump_json()
+            yield "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post(
+    "/detect-language/batch",
+    tags=["language detection"],
+    dependencies=[Depends(admit("bulk"))],
+    response_model=list[LanguageDetectionOutput],
+)
+async def detect_language_batch(
+    snippets: list[LanguageDetectionInput],
+    detector: Annotated[LanguageDetector, Depends(get_detector)],
+    *,
+    max_concurrency: MaxConcurrency = None,
+    stream: Stream = False,
+) -> list[LanguageDetectionOutput] | Response:
+    """
+    Detect the programming language of several code snippets.
+
+    Args:
+        snippets (list[LanguageDetectionInput]): The code snippets.
+        detector (LanguageDetector): Dependency-injected language detector.
+        max_concurrency (int | None): The maximum number of snippets processed
+            concurrently.
+        stream (bool): Whether to stream the results as they complete.
+
+    Returns:
+        The detected languages, in the order of the snippets; or if streaming,
+        newline-delimited `BatchItem`s in the order they complete.
+    """
+    config = _batch_config(len(snippets), max_concurrency)
+    if stream:
+        return _stream_batch(detector, snippets, config)
+    return await detector.abatch(snippets, config)
+
+
+@router.post(
+    "/code-review/batch",
+    tags=["Code Review"],
+    dependencies=[Depends(admit("bulk"))],
+    response_model=list[Recommendations | FusedRecommendations],
+)
+async def code_review_batch(
+    snippets: list[ReviewInput],
+    reviewer: Annotated[Reviewer, Depends(get_reviewer)],
+    *,
+    max_concurrency: MaxConcurrency = None,
+    stream: Stream = False,
+) -> list[Recommendations | FusedRecommendations] | Response:
+    """
+    Generate code reviews for several code snippets.
+
+    Args:
+        snippets (list[ReviewInput]): The code snippets.
         reviewer (Reviewer): Dependency-injected code reviewer.
+        max_concurrency (int | None): The maximum number of snippets processed
+            concurrently.
+        stream (bool): Whether to stream the results as they complete.
 
     Returns:
-        Recommendations: Generated code review output.
+        The code reviews, in the order of the snippets; or if streaming,
+        newline-delimited `BatchItem`s in the order they complete.
     """
-    return reviewer.invoke(snippet)
+    config = _batch_config(len(snippets), max_concurrency)
+    if stream:
+        return _stream_batch(reviewer, snippets, config)
+    return await reviewer.abatch(snippets, config)
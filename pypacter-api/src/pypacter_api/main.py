@@ -10,6 +10,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from pypacter_api.__version__ import __version__
 from pypacter_api.base import router as api_router
+from pypacter_api.state import lifespan
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,6 +23,7 @@ app = FastAPI(
     openapi_url="/openapi.json",  # Endpoint for OpenAPI documentation
     docs_url="/docs",  # Swagger UI for interactive API docs
     redoc_url="/redoc",  # ReDoc UI for an alternative view of docs
+    lifespan=lifespan,  # Build shared detector/reviewer once at startup
 )
 
 # CORS middleware configuration for development/production environments
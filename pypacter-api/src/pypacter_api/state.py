@@ -0,0 +1,561 @@
+"""
+Shared application state.
+
+The language detector and code reviewer are comparatively expensive to build:
+each one creates a `PydanticOutputParser`, renders its format instructions and
+composes a prompt | model | parser chain. This module holds a single, long-lived
+instance of each, built once when the application starts and reused by every
+request.
+
+The optional stages of the pipeline (caching, the local fast path, sampling,
+circuit breaking, admission control, etc.) are configured from the
+environment, and are all off unless enabled.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import time
+import typing
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel
+
+from pypacter.breaker import CircuitBreaker
+from pypacter.cache import ResultCache
+from pypacter.hedging import HedgePolicy
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.language_detector.batching import MicroBatcher
+from pypacter.language_detector.heuristics import HeuristicDetector
+from pypacter.language_detector.sampling import CodeSampler
+from pypacter.limiter import AdaptiveLimiter
+from pypacter.metrics import Metrics, default_tracer
+from pypacter.models import close_models, get_model
+from pypacter.reviewer import FusedRecommendations, Recommendations, Reviewer
+from pypacter_api.admission import AdmissionController
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from fastapi import FastAPI
+
+    from pypacter.language_detector.local import CandidateFilter, LocalDetector
+
+__all__ = [
+    "STATE",
+    "AppState",
+    "lifespan",
+]
+
+logger = logging.getLogger(__name__)
+
+ModelT = typing.TypeVar("ModelT", bound=BaseModel)
+
+
+def _flag(name: str) -> bool:
+    """
+    Read a boolean flag from the environment.
+
+    Args:
+        name:
+            The name of the environment variable.
+
+    Returns:
+        Whether the variable is set to `1`, `true` or `yes`.
+    """
+    return os.getenv(name, "").lower() in {"1", "true", "yes"}
+
+
+def _cache(model_type: type[ModelT]) -> ResultCache[ModelT] | None:
+    """
+    Create a result cache from the environment.
+
+    The caches are configured through the following environment variables:
+
+    -   `PYPACTER_CACHE_SIZE`: the number of entries held in memory (e.g.
+        `1024`). Defaults to `0`, which disables caching.
+    -   `PYPACTER_CACHE_TTL`: the lifetime of an entry in seconds. Set to `0`
+        for entries to never expire. Defaults to one day.
+    -   `PYPACTER_CACHE_PATH`: the SQLite file of the on-disk tier, shared by
+        all workers on the host and persisted across restarts. The on-disk
+        tier is disabled if unset.
+    -   `PYPACTER_CACHE_DISK_SIZE`: the number of entries held on disk per
+        cache. Defaults to 100,000; set to `0` for no limit.
+
+    Args:
+        model_type:
+            The type of the cached values.
+
+    Returns:
+        The cache, or `None` if caching is disabled.
+    """
+    size = int(os.getenv("PYPACTER_CACHE_SIZE", "0"))
+    if size <= 0:
+        return None
+    ttl = float(os.getenv("PYPACTER_CACHE_TTL", str(24 * 60 * 60)))
+    disk_size = int(os.getenv("PYPACTER_CACHE_DISK_SIZE", "100000"))
+    return ResultCache(
+        model_type,
+        maxsize=size,
+        ttl=ttl or None,
+        path=os.getenv("PYPACTER_CACHE_PATH") or None,
+        max_disk_entries=disk_size or None,
+    )
+
+
+def _hedge() -> HedgePolicy | None:
+    """
+    Create the hedging policy from the environment.
+
+    The same policy applies to the language detector and the code reviewer,
+    each of which tracks the latencies of its own calls. It is configured
+    through the following environment variables:
+
+    -   `PYPACTER_HEDGE_PERCENTILE`: the percentile of the recent latencies
+        (e.g. `0.95`) after which a call to the model is hedged. Hedging is
+        disabled if unset.
+    -   `PYPACTER_HEDGE_MAX_RATIO`: the largest share of the calls which may
+        be hedged. Defaults to 0.1.
+
+    Returns:
+        The policy, or `None` if hedging is disabled.
+    """
+    percentile = os.getenv("PYPACTER_HEDGE_PERCENTILE")
+    if not percentile:
+        return None
+    return HedgePolicy(
+        percentile=float(percentile),
+        max_ratio=float(os.getenv("PYPACTER_HEDGE_MAX_RATIO", "0.1")),
+    )
+
+
+def _limiter() -> AdaptiveLimiter | None:
+    """
+    Create the adaptive limiter of the calls to the models from the environment.
+
+    A single limiter is shared by the language detector and the code reviewer.
+    It is configured through the following environment variables:
+
+    -   `PYPACTER_LLM_CONCURRENCY`: the number of calls in flight to start
+        with. The limit then adapts to the latency and the overload errors of
+        the provider. The calls are not limited if unset.
+    -   `PYPACTER_LLM_MIN_CONCURRENCY`: the lowest the limit is cut to.
+        Defaults to 1.
+    -   `PYPACTER_LLM_MAX_CONCURRENCY`: the highest the limit is raised to.
+        Defaults to 64.
+    -   `PYPACTER_LLM_MAX_WAIT`: how long a call may wait for a permit, in
+        seconds. Calls wait for as long as needed if unset.
+
+    Returns:
+        The limiter, or `None` if calls are not limited.
+    """
+    concurrency = os.getenv("PYPACTER_LLM_CONCURRENCY")
+    if not concurrency:
+        return None
+    max_wait = os.getenv("PYPACTER_LLM_MAX_WAIT")
+    return AdaptiveLimiter(
+        initial_limit=float(concurrency),
+        min_limit=float(os.getenv("PYPACTER_LLM_MIN_CONCURRENCY", "1")),
+        max_limit=float(os.getenv("PYPACTER_LLM_MAX_CONCURRENCY", "64")),
+        max_wait=float(max_wait) if max_wait else None,
+    )
+
+
+def _breaker() -> CircuitBreaker | None:
+    """
+    Create the circuit breaker around the calls to the models from the environment.
+
+    The language detector and the code reviewer each have their own breaker,
+    so failing reviews do not degrade detection. While the breaker of the
+    detector is open, detections are answered by the local detectors (and
+    marked as degraded); while the breaker of the reviewer is open, reviews
+    fail immediately. The breakers are configured through the following
+    environment variables:
+
+    -   `PYPACTER_BREAKER_FAILURES`: the number of consecutive failures after
+        which the breaker opens (e.g. `5`). Defaults to `0`, which disables
+        the breaker.
+    -   `PYPACTER_BREAKER_LATENCY`: the time, in seconds, above which a
+        successful call counts as a failure. Only failed calls count if unset.
+    -   `PYPACTER_BREAKER_RESET`: how long, in seconds, the breaker stays open
+        before trial calls are let through. Defaults to 30.
+
+    Returns:
+        The breaker, or `None` if it is disabled.
+    """
+    failures = int(os.getenv("PYPACTER_BREAKER_FAILURES", "0"))
+    if failures <= 0:
+        return None
+    latency = os.getenv("PYPACTER_BREAKER_LATENCY")
+    return CircuitBreaker(
+        failure_threshold=failures,
+        latency_threshold=float(latency) if latency else None,
+        reset_timeout=float(os.getenv("PYPACTER_BREAKER_RESET", "30")),
+    )
+
+
+def _metrics() -> Metrics:
+    """
+    Create the metrics of the pipeline from the environment.
+
+    The metrics are shared by the language detector and the code reviewer, and
+    exported by the `/metrics` endpoint. Each stage is also recorded as an
+    OpenTelemetry span if OpenTelemetry is installed (the `otel` extra of
+    `pypacter`), unless `PYPACTER_TRACING` is set to `false`.
+
+    Returns:
+        The metrics.
+    """
+    tracing = os.getenv("PYPACTER_TRACING", "true").lower() not in {"0", "false", "no"}
+    return Metrics(tracer=default_tracer() if tracing else None)
+
+
+def _detector() -> LanguageDetector:
+    """
+    Create the language detector from the environment.
+
+    Besides the cache, hedging, limiting, circuit breaking and tracing, the
+    local tiers, micro-batching, sampling and routing are configured through
+    the following environment variables:
+
+    -   `PYPACTER_HEURISTICS`: set to `true` to add the heuristic detector as
+        the first fast-path tier, answering clear-cut snippets without calling
+        the LLM. Defaults to `false`.
+    -   `PYPACTER_FAST_PATH_THRESHOLD`: the confidence a local guess needs to
+        be returned without calling the LLM. Defaults to 0.9.
+    -   `PYPACTER_PYGMENTS`: how the Pygments detector is used, if at all.
+        One of `off` (the default), `fast-path` or `prefilter`. Requires the
+        `pygments` extra of `pypacter`.
+    -   `PYPACTER_PYGMENTS_LANGUAGES`: comma-separated allow-list of the
+        languages considered by the Pygments detector. Defaults to all
+        supported languages.
+    -   `PYPACTER_NGRAM_MODEL`: the directory of a trained n-gram classifier,
+        added as a fast-path tier after the heuristics. Requires the `ngram`
+        extra of `pypacter`.
+    -   `PYPACTER_MICRO_BATCH_SIZE`: the maximum number of concurrent
+        detections packed into a single prompt. Defaults to 1, which disables
+        micro-batching. Batches are sent to the default model, so
+        micro-batching is not used with `PYPACTER_FAST_MODEL`.
+    -   `PYPACTER_MICRO_BATCH_WAIT_MS`: how long a detection waits for others
+        to join its batch, in milliseconds. Defaults to 10.
+    -   `PYPACTER_DETECTION_TOKEN_BUDGET`: the number of tokens of code sent
+        for detection; longer code is reduced to a representative sample.
+        Defaults to `0`, which always sends the full code; `1024` is a
+        reasonable budget.
+    -   `PYPACTER_FAST_MODEL`: the name of a pre-configured model (e.g.
+        `GPT_4O_MINI`, see [`MODELS`][pypacter.models.MODELS]) tried before the
+        default model. Routing is disabled if unset.
+    -   `PYPACTER_ESCALATION_THRESHOLD`: the confidence below which a detection
+        by the fast model is escalated to the default model. Defaults to 0.8.
+
+    Returns:
+        The language detector.
+
+    Raises:
+        ValueError: If `PYPACTER_PYGMENTS` is not recognised, or
+            `PYPACTER_PYGMENTS_LANGUAGES` lists an unsupported language.
+    """
+    fast_path: list[LocalDetector] = []
+    if _flag("PYPACTER_HEURISTICS"):
+        fast_path.append(HeuristicDetector())
+    prefilter: CandidateFilter | None = None
+
+    ngram_model = os.getenv("PYPACTER_NGRAM_MODEL")
+    if ngram_model:
+        from pypacter.language_detector.ngram import NgramClassifier
+
+        fast_path.append(NgramClassifier.load(ngram_model))
+
+    mode = os.getenv("PYPACTER_PYGMENTS", "off")
+    if mode != "off":
+        # Pygments is optional, so only import it when enabled. Creating the
+        # detector builds the lexer index, keeping it off the request path.
+        from pypacter.language_detector.lexers import PygmentsDetector
+
+        languages = [
+            language.strip()
+            for language in os.getenv("PYPACTER_PYGMENTS_LANGUAGES", "").split(",")
+            if language.strip()
+        ]
+        pygments = PygmentsDetector(languages or None)
+        if mode == "fast-path":
+            fast_path.append(pygments)
+        elif mode == "prefilter":
+            prefilter = pygments
+        else:
+            msg = f"Unknown PYPACTER_PYGMENTS mode: {mode!r}"
+            raise ValueError(msg)
+
+    budget = int(os.getenv("PYPACTER_DETECTION_TOKEN_BUDGET", "0"))
+    fast_model = os.getenv("PYPACTER_FAST_MODEL")
+
+    detector = LanguageDetector(
+        cache=_cache(LanguageDetectionOutput),
+        fast_path=fast_path,
+        fast_path_threshold=float(os.getenv("PYPACTER_FAST_PATH_THRESHOLD", "0.9")),
+        prefilter=prefilter,
+        sampler=CodeSampler(budget) if budget > 0 else None,
+        fast_model=get_model(fast_model) if fast_model else None,
+        escalation_threshold=float(os.getenv("PYPACTER_ESCALATION_THRESHOLD", "0.8")),
+        hedge=_hedge(),
+        limiter=_limiter(),
+        breaker=_breaker(),
+        metrics=_metrics(),
+    )
+
+    batch_size = int(os.getenv("PYPACTER_MICRO_BATCH_SIZE", "1"))
+    if batch_size > 1 and detector.router is not None:
+        logger.warning("Micro-batching is not used with PYPACTER_FAST_MODEL")
+    elif batch_size > 1:
+        # Batched prompts go through the limiter, hedging and breaker of the
+        # detector, as its single calls do.
+        detector.batcher = MicroBatcher(
+            detector.llm,
+            max_batch_size=batch_size,
+            max_wait=float(os.getenv("PYPACTER_MICRO_BATCH_WAIT_MS", "10")) / 1000,
+        )
+    return detector
+
+
+def _reviewer(detector: LanguageDetector) -> Reviewer:
+    """
+    Create the code reviewer from the environment.
+
+    Besides the cache and hedging, chunked review of large files, fused mode
+    and routing are configured through the following environment variables:
+
+    -   `PYPACTER_CHUNK_LINES`: the number of lines above which code is
+        reviewed in chunks. Chunking is disabled if unset.
+    -   `PYPACTER_CHUNK_OVERLAP`: the number of lines of context shared by
+        neighbouring chunks. Defaults to 5.
+    -   `PYPACTER_CHUNK_CONCURRENCY`: the number of chunks of a file reviewed
+        at once. Defaults to 4.
+    -   `PYPACTER_FUSED_REVIEW`: set to `true` to identify the language as part
+        of the review by default, in a single call to the model, instead of
+        detecting it beforehand. Requests may override it.
+    -   `PYPACTER_FAST_MODEL`: the name of a pre-configured model reviewing
+        small snippets in place of the default model. Routing is disabled if
+        unset.
+    -   `PYPACTER_FAST_REVIEW_TOKENS`: the largest prompt, in estimated tokens,
+        reviewed by the fast model. Defaults to 1500; set to `0` to review
+        everything with the default model.
+
+    The reviewer shares the limiter and the metrics of the detector, if any,
+    but has its own circuit breaker.
+
+    Args:
+        detector:
+            The shared language detector.
+
+    Returns:
+        The code reviewer.
+    """
+    chunk_lines = os.getenv("PYPACTER_CHUNK_LINES")
+    fast_model = os.getenv("PYPACTER_FAST_MODEL")
+    fast_tokens = int(os.getenv("PYPACTER_FAST_REVIEW_TOKENS", "1500"))
+    return Reviewer(
+        language_detector=detector,
+        cache=_cache(Recommendations),
+        max_chunk_lines=int(chunk_lines) if chunk_lines else None,
+        chunk_overlap=int(os.getenv("PYPACTER_CHUNK_OVERLAP", "5")),
+        max_chunk_concurrency=int(os.getenv("PYPACTER_CHUNK_CONCURRENCY", "4")),
+        fused=_flag("PYPACTER_FUSED_REVIEW"),
+        fused_cache=_cache(FusedRecommendations),
+        fast_model=get_model(fast_model) if fast_model and fast_tokens > 0 else None,
+        fast_max_tokens=fast_tokens,
+        hedge=_hedge(),
+        limiter=detector.limiter,
+        breaker=_breaker(),
+        metrics=detector.metrics,
+    )
+
+
+def _admission() -> AdmissionController | None:
+    """
+    Create the admission controller from the environment.
+
+    Admission control is configured through the following environment
+    variables:
+
+    -   `PYPACTER_MAX_CONCURRENT`: the number of requests processed at once
+        (e.g. `32`). Defaults to `0`, which disables admission control.
+    -   `PYPACTER_BULK_MAX_CONCURRENT`: the number of bulk requests processed
+        at once. Defaults to three quarters of `PYPACTER_MAX_CONCURRENT`.
+    -   `PYPACTER_QUEUE_SIZE`: the number of interactive requests which may
+        wait. Defaults to 64.
+    -   `PYPACTER_BULK_QUEUE_SIZE`: the number of bulk requests which may
+        wait. Defaults to 256.
+    -   `PYPACTER_QUEUE_TIMEOUT`: how long a request may wait, in seconds.
+        Defaults to 30.
+    -   `PYPACTER_RATE_LIMIT`: the number of requests per second allowed to
+        each client. Defaults to `0`, which does not limit clients.
+    -   `PYPACTER_RATE_BURST`: the number of requests a client may send at
+        once. Defaults to 10.
+
+    Returns:
+        The admission controller, or `None` if admission control is disabled.
+    """
+    max_concurrent = int(os.getenv("PYPACTER_MAX_CONCURRENT", "0"))
+    if max_concurrent <= 0:
+        return None
+    bulk = os.getenv("PYPACTER_BULK_MAX_CONCURRENT")
+    return AdmissionController(
+        max_concurrent=max_concurrent,
+        max_bulk_concurrent=int(bulk) if bulk else None,
+        max_queue=int(os.getenv("PYPACTER_QUEUE_SIZE", "64")),
+        max_bulk_queue=int(os.getenv("PYPACTER_BULK_QUEUE_SIZE", "256")),
+        queue_timeout=float(os.getenv("PYPACTER_QUEUE_TIMEOUT", "30")),
+        rate=float(os.getenv("PYPACTER_RATE_LIMIT", "0")),
+        burst=int(os.getenv("PYPACTER_RATE_BURST", "10")),
+    )
+
+
+class AppState:
+    """
+    Container for the components shared across requests.
+
+    The components are created by [`startup`][AppState.startup] (normally from
+    the application [`lifespan`][lifespan]). Tests may replace them by
+    assigning to the attributes directly, or by overriding the
+    `get_detector`/`get_reviewer` dependencies of the API.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create an empty state; nothing is built until startup.
+        """
+        self.detector: LanguageDetector | None = None
+        self.reviewer: Reviewer | None = None
+        self.admission: AdmissionController | None = None
+        self._admission_built = False
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the shared components have been built and warmed.
+        """
+        return self.detector is not None and self.reviewer is not None
+
+    def startup(self) -> None:
+        """
+        Build and warm the shared components.
+
+        The reviewer reuses the detector, so only a single detector chain
+        exists per process. Calling this method when the components already
+        exist is a no-op.
+        """
+        if self.ready:
+            return
+
+        start = time.perf_counter()
+        detector = self.detector or _detector()
+        reviewer = self.reviewer or _reviewer(detector)
+        self._warm(detector, reviewer)
+        self.detector, self.reviewer = detector, reviewer
+        logger.info("Shared components ready in %.3fs", time.perf_counter() - start)
+
+    def shutdown(self) -> None:
+        """
+        Release the shared components.
+        """
+        caches = [
+            getattr(component, name, None)
+            for component in (self.detector, self.reviewer)
+            for name in ("cache", "fused_cache")
+        ]
+        for cache in caches:
+            if isinstance(cache, ResultCache):
+                cache.close()
+        self.detector = None
+        self.reviewer = None
+
+    async def ashutdown(self) -> None:
+        """
+        Release the shared components, and close the connections of the models.
+
+        The connections belong to the event loop of the application, so the
+        models are created anew, with new connections, by the next startup.
+        """
+        self.shutdown()
+        await close_models()
+
+    @staticmethod
+    def _warm(detector: LanguageDetector, reviewer: Reviewer) -> None:
+        """
+        Warm the components so the first request does not pay for it.
+
+        Rendering the prompts once parses the templates and exercises the
+        formatting path without making any call to the model.
+        """
+        detector.prompt_template.format_messages(
+            **dict.fromkeys(detector.prompt_template.input_variables, "")
+        )
+        reviewer.prompt_template.format_messages(
+            code="", language="unknown", confidence=0.0, summary=""
+        )
+
+    def get_detector(self) -> LanguageDetector:
+        """
+        Get the shared language detector, building it if required.
+
+        Returns:
+            The shared language detector.
+        """
+        if self.detector is None:
+            self.startup()
+        return typing.cast(LanguageDetector, self.detector)
+
+    def get_admission(self) -> AdmissionController | None:
+        """
+        Get the admission controller, building it if required.
+
+        Unlike the other components, the controller is cheap to build, and
+        does not require the application to have started.
+
+        Returns:
+            The admission controller, or `None` if admission control is
+            disabled.
+        """
+        if not self._admission_built:
+            self.admission = self.admission or _admission()
+            self._admission_built = True
+        return self.admission
+
+    def get_reviewer(self) -> Reviewer:
+        """
+        Get the shared code reviewer, building it if required.
+
+        Returns:
+            The shared code reviewer.
+        """
+        if self.reviewer is None:
+            self.startup()
+        return typing.cast(Reviewer, self.reviewer)
+
+
+STATE = AppState()
+"""
+The process-wide application state.
+"""
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:  # noqa: ARG001
+    """
+    Application lifespan.
+
+    Builds the shared components before the application starts serving
+    requests, and releases them (closing the connections to the models) on
+    shutdown.
+
+    Args:
+        app:
+            The FastAPI application.
+    """
+    STATE.startup()
+    try:
+        yield
+    finally:
+        await STATE.ashutdown()
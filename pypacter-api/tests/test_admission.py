@@ -0,0 +1,184 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter_api.admission import AdmissionController, AdmissionRejected, Lane
+from pypacter_api.base import get_detector, router
+from pypacter_api.state import STATE, AppState
+
+
+async def _hold(
+    controller: AdmissionController,
+    lane: Lane,
+    order: list[str],
+    name: str,
+    release: asyncio.Event,
+) -> None:
+    async with controller.slot(lane, name):
+        order.append(name)
+        await release.wait()
+
+
+def test_interactive_requests_jump_the_queue() -> None:
+    controller = AdmissionController(max_concurrent=1)
+    order: list[str] = []
+
+    async def run() -> None:
+        release = asyncio.Event()
+        requests: list[tuple[Lane, str]] = [
+            ("bulk", "first"),
+            ("bulk", "bulk"),
+            ("interactive", "interactive"),
+        ]
+        tasks = [
+            asyncio.create_task(_hold(controller, lane, order, name, release))
+            for lane, name in requests
+        ]
+        await asyncio.sleep(0.01)
+        stats = controller.stats
+        assert stats.lanes["bulk"].running == 1
+        assert (stats.lanes["bulk"].queued, stats.lanes["interactive"].queued) == (1, 1)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert order == ["first", "interactive", "bulk"]
+    stats = controller.stats
+    assert stats.lanes["interactive"].admitted == 1
+    assert stats.lanes["interactive"].max_wait_seconds > 0
+    assert stats.lanes["bulk"].running == 0
+
+
+def test_bulk_requests_leave_room_for_interactive() -> None:
+    controller = AdmissionController(max_concurrent=2, max_bulk_concurrent=1)
+    order: list[str] = []
+
+    async def run() -> None:
+        release = asyncio.Event()
+        requests: list[tuple[Lane, str]] = [
+            ("bulk", "a"),
+            ("bulk", "b"),
+            ("interactive", "c"),
+        ]
+        tasks = [
+            asyncio.create_task(_hold(controller, lane, order, name, release))
+            for lane, name in requests
+        ]
+        await asyncio.sleep(0.01)
+        assert order == ["a", "c"]
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_rejected() -> None:
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+
+    async def run() -> None:
+        await controller.acquire("interactive", "a")
+        with pytest.raises(AdmissionRejected) as rejection:
+            await controller.acquire("interactive", "b")
+        assert rejection.value.status_code == 503
+        assert rejection.value.headers["Retry-After"] == "1"
+
+    asyncio.run(run())
+    assert controller.stats.lanes["interactive"].rejected == 1
+
+
+def test_waiting_times_out() -> None:
+    controller = AdmissionController(max_concurrent=1, queue_timeout=0.01)
+
+    async def run() -> None:
+        await controller.acquire("bulk", "a")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("bulk", "b")
+        controller.release("bulk")
+        await controller.acquire("bulk", "c")
+
+    asyncio.run(run())
+    stats = controller.stats.lanes["bulk"]
+    assert (stats.timed_out, stats.queued, stats.running) == (1, 0, 1)
+
+
+def test_slot_handed_over_at_timeout_is_released(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """A slot handed over just as the wait times out is not leaked."""
+    controller = AdmissionController(max_concurrent=1, queue_timeout=1)
+
+    async def late_handover(future: asyncio.Future[None], *_: float) -> None:
+        controller.release("bulk")
+        assert future.done()
+        raise TimeoutError
+
+    async def run() -> None:
+        await controller.acquire("bulk", "a")
+        monkeypatch.setattr(asyncio, "wait_for", late_handover)
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("bulk", "b")
+
+    asyncio.run(run())
+    stats = controller.stats.lanes["bulk"]
+    assert (stats.timed_out, stats.queued, stats.running) == (1, 0, 0)
+
+
+def test_clients_are_rate_limited() -> None:
+    controller = AdmissionController(rate=0.5, burst=2)
+
+    async def run() -> None:
+        for _ in range(2):
+            await controller.acquire("interactive", "a")
+        with pytest.raises(AdmissionRejected) as rejection:
+            await controller.acquire("interactive", "a")
+        assert rejection.value.status_code == 429
+        assert rejection.value.headers["Retry-After"] == "2"
+        await controller.acquire("interactive", "b")
+
+    asyncio.run(run())
+    assert controller.stats.rate_limited == 1
+
+
+def test_api_rejects_with_retry_after(monkeypatch: pytest.MonkeyPatch) -> None:
+    app = FastAPI()
+    app.include_router(router)
+    detector = MagicMock(spec=LanguageDetector)
+    detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    app.dependency_overrides[get_detector] = lambda: detector
+    monkeypatch.setattr(STATE, "admission", AdmissionController(rate=1, burst=1))
+    monkeypatch.setattr(STATE, "_admission_built", True)
+    client = TestClient(app)
+
+    headers = {"X-Client-Id": "ide"}
+    response = client.post("/detect-language", json={"code": "x"}, headers=headers)
+    assert response.status_code == 200
+    response = client.post("/detect-language", json={"code": "x"}, headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    stats = client.get("/admission").json()
+    assert stats["rate_limited"] == 1
+    assert stats["lanes"]["interactive"]["admitted"] == 1
+    assert stats["lanes"]["interactive"]["running"] == 0
+
+
+def test_admission_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PYPACTER_MAX_CONCURRENT", "8")
+    monkeypatch.setenv("PYPACTER_RATE_LIMIT", "5")
+    controller = AppState().get_admission()
+    assert controller is not None
+    assert (controller.max_concurrent, controller.max_bulk_concurrent) == (8, 6)
+    assert controller.rate == 5
+
+    monkeypatch.setenv("PYPACTER_MAX_CONCURRENT", "0")
+    assert AppState().get_admission() is None
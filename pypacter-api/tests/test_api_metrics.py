@@ -0,0 +1,121 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from pypacter.breaker import CircuitBreaker
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.language_detector.batching import MicroBatcher
+from pypacter.metrics import Metrics
+from pypacter.reviewer import Recommendations, Reviewer
+from pypacter_api.base import get_detector, get_reviewer, router
+
+
+def test_metrics_endpoint() -> None:
+    detection = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    review = Recommendations(recommendations=[], review_result="Success")
+    model = GenericFakeChatModel(
+        messages=iter([
+            AIMessage(content=detection.model_dump_json()),
+            AIMessage(content=review.model_dump_json()),
+        ])
+    )
+    metrics = Metrics()
+    detector = LanguageDetector(model, breaker=CircuitBreaker(), metrics=metrics)
+    reviewer = Reviewer(
+        model=model,
+        language_detector=detector,
+        breaker=CircuitBreaker(),
+        metrics=metrics,
+    )
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_detector] = lambda: detector
+    app.dependency_overrides[get_reviewer] = lambda: reviewer
+    client = TestClient(app)
+
+    response = client.post("/code-review", json={"code": "x = 1"})
+    assert response.json()["review_result"] == "Success"
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    for stage in ["detect", "review", "llm", "parse"]:
+        assert (
+            f'pypacter_stage_duration_seconds_count{{component="reviewer",'
+            f'stage="{stage}"}} 1'
+        ) in lines
+    assert 'pypacter_detector_tiers{tier="llm"} 1' in lines
+    for component in ["detector", "reviewer"]:
+        assert (
+            f'pypacter_breaker_state{{component="{component}",state="closed"}} 1'
+        ) in lines
+    assert any(line.startswith("pypacter_pool_requests ") for line in lines)
+
+
+def test_metrics_export_micro_batching() -> None:
+    detector = LanguageDetector(GenericFakeChatModel(messages=iter([])))
+    detector.batcher = MicroBatcher(detector.llm)
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_detector] = lambda: detector
+    app.dependency_overrides[get_reviewer] = lambda: Reviewer(
+        model=detector.model, language_detector=detector
+    )
+
+    lines = TestClient(app).get("/metrics").text.splitlines()
+
+    assert "pypacter_batcher_batches 0" in lines
+    assert "pypacter_batcher_tokens_per_snippet 0.0" in lines
+    assert "pypacter_batcher_mean_queue_seconds 0.0" in lines
+
+
+def test_metrics_export_waiters_of_calls_in_flight() -> None:
+    detection = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    release = threading.Event()
+    detector = LanguageDetector(GenericFakeChatModel(messages=iter([])))
+    detector.chain = MagicMock()
+    detector.chain.invoke.side_effect = lambda *_, **__: release.wait() and detection
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_detector] = lambda: detector
+    app.dependency_overrides[get_reviewer] = lambda: Reviewer(
+        model=detector.model, language_detector=detector
+    )
+    callers = [
+        threading.Thread(target=detector.invoke, args=({"code": "x := 1"},))
+        for _ in range(3)
+    ]
+    for caller in callers:
+        caller.start()
+    deadline = time.monotonic() + 5
+    while sum(detector.in_flight.waiters().values()) < 2:
+        assert time.monotonic() < deadline, "the callers did not join"
+        time.sleep(0.01)
+
+    lines = TestClient(app).get("/metrics").text.splitlines()
+    release.set()
+    for caller in callers:
+        caller.join()
+
+    assert any(
+        line.startswith('pypacter_single_flight_calls_waiters{component="detector",')
+        and line.endswith(" 2")
+        for line in lines
+    )
+    assert 'pypacter_single_flight_leaders{component="detector"} 1' in lines
@@ -1,16 +1,28 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
 from unittest.mock import MagicMock
 
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
+from langchain_core.runnables import RunnableLambda
 
 from pypacter.language_detector import (
+    LanguageDetectionInput,
     LanguageDetectionOutput,
     LanguageDetector,
 )
-from pypacter.reviewer import Recommendations, Reviewer
+from pypacter.reviewer import (
+    FusedRecommendations,
+    Recommendation,
+    Recommendations,
+    Reviewer,
+    ReviewInput,
+)
 from pypacter_api import __version__
-from pypacter_api.base import router
+from pypacter_api.base import get_detector, get_reviewer, router
+from pypacter_api.state import STATE
 
 app = FastAPI()
 app.include_router(router)
@@ -19,19 +31,19 @@ app.include_router(router)
 # Mock the external services
 @pytest.fixture
 def mock_detector() -> MagicMock:
-    return MagicMock()
+    return MagicMock(spec=LanguageDetector)
 
 @pytest.fixture
 def mock_reviewer() -> MagicMock:
-    return MagicMock()
+    return MagicMock(spec=Reviewer)
 
 
 @pytest.fixture
 def client(mock_detector: MagicMock, mock_reviewer: MagicMock) -> TestClient:
     """Fixture to instantiate the FastAPI test client."""
     # Replace the real detector and reviewer with mocks in the app.
-    app.dependency_overrides[LanguageDetector] = mock_detector
-    app.dependency_overrides[Reviewer] = mock_reviewer
+    app.dependency_overrides[get_detector] = lambda: mock_detector
+    app.dependency_overrides[get_reviewer] = lambda: mock_reviewer
     return TestClient(app)
 
 
@@ -52,11 +64,33 @@ def test_version(client: TestClient) -> None:
     assert response.json() == {"version": expected_version}
 
 
+# Test the /ready endpoint
+def test_ready_before_startup(client: TestClient) -> None:
+    """The API reports it is not ready until the shared components exist."""
+    STATE.shutdown()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+
+def test_ready_after_startup(
+    client: TestClient, mock_detector: MagicMock, mock_reviewer: MagicMock
+) -> None:
+    """The API reports it is ready once the shared components exist."""
+    STATE.detector, STATE.reviewer = mock_detector, mock_reviewer
+    try:
+        response = client.get("/ready")
+    finally:
+        STATE.shutdown()
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+
+
 # Test the /detect-language endpoint - Success
 def test_detect_language(client: TestClient, mock_detector: MagicMock) -> None:
     """Test successful language detection."""
-    # Arrange: Mock the LanguageDetector's invoke method to return a successful output
-    mock_detector.invoke.return_value = LanguageDetectionOutput(
+    # Arrange: Mock the LanguageDetector's ainvoke method to return a successful output
+    mock_detector.ainvoke.return_value = LanguageDetectionOutput(
         language="python",
         confidence=0.95,
         message="Language successfully detected.",
@@ -72,13 +106,15 @@ def test_detect_language(client: TestClient, mock_detector: MagicMock) -> None:
     assert response.json()["language"] == "python"
     assert response.json()["confidence"] == 0.95
     assert response.json()["result"] == "detection successful"
+    mock_detector.ainvoke.assert_awaited_once()
+    mock_detector.invoke.assert_not_called()
 
 
 # Test the /code-review endpoint - Success
 def test_code_review(client: TestClient, mock_reviewer: MagicMock) -> None:
     """Test successful code review generation."""
-    # Arrange: Mock the Reviewer invoke method to return a successful output
-    mock_reviewer.invoke.return_value = Recommendations(
+    # Arrange: Mock the Reviewer ainvoke method to return a successful output
+    mock_reviewer.ainvoke.return_value = Recommendations(
         recommendation=[],
         review_result="Success",
     )
@@ -90,3 +126,193 @@ def test_code_review(client: TestClient, mock_reviewer: MagicMock) -> None:
     # Assert
     assert response.status_code == 200
     assert isinstance(response.json()["recommendations"], list)
+    mock_reviewer.ainvoke.assert_awaited_once()
+    mock_reviewer.invoke.assert_not_called()
+
+
+def test_code_review_language_hint(
+    client: TestClient, mock_reviewer: MagicMock
+) -> None:
+    """The language hints are passed on to the reviewer, and the source reported."""
+    mock_reviewer.ainvoke.return_value = Recommendations(
+        review_result="Success", language_source="filename"
+    )
+
+    response = client.post("/code-review", json={"code": "", "filename": "foo.ts"})
+
+    assert response.status_code == 200
+    assert response.json()["language_source"] == "filename"
+    snippet = mock_reviewer.ainvoke.call_args.args[0]
+    assert isinstance(snippet, ReviewInput)
+    assert snippet.filename == "foo.ts"
+
+
+def test_code_review_fused(client: TestClient, mock_reviewer: MagicMock) -> None:
+    """The language identified by a fused review is part of the response."""
+    review = FusedRecommendations(
+        review_result="Success",
+        language_source="fused",
+        language="python",
+        confidence=0.9,
+    )
+    mock_reviewer.ainvoke.return_value = review
+    mock_reviewer.abatch.return_value = [review]
+
+    response = client.post("/code-review", json={"code": "x = 1"})
+    batch = client.post("/code-review/batch", json=[{"code": "x = 1"}])
+
+    assert response.status_code == 200
+    assert response.json()["language"] == "python"
+    assert response.json()["confidence"] == 0.9
+    assert batch.json()[0]["language"] == "python"
+
+
+def test_openapi_publishes_language_source(client: TestClient) -> None:
+    """The flags set by pypacter are part of the published response schema."""
+    schemas = client.get("/openapi.json").json()["components"]["schemas"]
+
+    reviews = [schemas[name] for name in schemas if name.startswith("Recommendations")]
+    assert reviews
+    assert all("language_source" in review["properties"] for review in reviews)
+    detection = schemas["LanguageDetectionOutput"]["properties"]
+    assert {"degraded", "tokens_saved"} <= detection.keys()
+
+
+# Test the batch endpoints
+def test_detect_language_batch(
+    client: TestClient, mock_detector: MagicMock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Batches are fanned out with the configured concurrency."""
+    monkeypatch.setenv("PYPACTER_BATCH_CONCURRENCY", "3")
+    output = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+    mock_detector.abatch.return_value = [output, output]
+
+    response = client.post(
+        "/detect-language/batch", json=[{"code": "x = 1"}, {"code": "y = 2"}]
+    )
+
+    assert response.status_code == 200
+    assert [item["language"] for item in response.json()] == ["python", "python"]
+    inputs, config = mock_detector.abatch.call_args.args
+    assert [snippet.code for snippet in inputs] == ["x = 1", "y = 2"]
+    assert config["max_concurrency"] == 3
+
+
+def test_code_review_batch_concurrency(
+    client: TestClient, mock_reviewer: MagicMock
+) -> None:
+    """The concurrency may be set per request."""
+    mock_reviewer.abatch.return_value = [
+        Recommendations(recommendations=[], review_result="Success")
+    ]
+
+    response = client.post(
+        "/code-review/batch?max_concurrency=2", json=[{"code": "x = 1"}]
+    )
+
+    assert response.status_code == 200
+    assert response.json()[0]["review_result"] == "Success"
+    assert mock_reviewer.abatch.call_args.args[1]["max_concurrency"] == 2
+    response = client.post("/code-review/batch?max_concurrency=0", json=[])
+    assert response.status_code == 422
+
+
+def test_batch_too_large(
+    client: TestClient, mock_detector: MagicMock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("PYPACTER_BATCH_MAX_SIZE", "1")
+
+    response = client.post(
+        "/detect-language/batch", json=[{"code": "x = 1"}, {"code": "y = 2"}]
+    )
+
+    assert response.status_code == 413
+    mock_detector.abatch.assert_not_called()
+
+
+def test_batch_stream_in_completion_order(client: TestClient) -> None:
+    """Streamed results are written as they complete, with their index."""
+
+    async def detect(snippet: LanguageDetectionInput) -> LanguageDetectionOutput:
+        if snippet.code == "slow":
+            await asyncio.sleep(0.1)
+        return LanguageDetectionOutput(
+            language=snippet.code,
+            confidence=1.0,
+            message="",
+            result="detection successful",
+        )
+
+    app.dependency_overrides[get_detector] = lambda: RunnableLambda(detect)
+
+    response = client.post(
+        "/detect-language/batch?stream=true",
+        json=[{"code": "slow"}, {"code": "fast"}],
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    items = [json.loads(line) for line in response.text.splitlines()]
+    assert [(item["index"], item["result"]["language"]) for item in items] == [
+        (1, "fast"),
+        (0, "slow"),
+    ]
+
+
+# Test the /code-review/stream endpoint
+def test_code_review_stream(client: TestClient, mock_reviewer: MagicMock) -> None:
+    """Recommendations are sent as events, followed by a summary."""
+    recommendation = Recommendation(line=3, severity="warning", message="Unused.")
+
+    async def stream(
+        *_: object, **__: object
+    ) -> AsyncIterator[Recommendation | Recommendations]:
+        yield recommendation
+        yield Recommendations(
+            recommendations=[recommendation], review_result="Success"
+        )
+
+    mock_reviewer.astream_recommendations.side_effect = stream
+
+    response = client.post("/code-review/stream", json={"code": "x = 1"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0], json.loads(block.split("\n")[1].removeprefix("data: ")))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert events[0] == ("event: recommendation", recommendation.model_dump())
+    name, summary = events[1]
+    assert name == "event: summary"
+    assert summary["review_result"] == "Success"
+    assert summary["recommendations"] == 1
+    assert 0 <= summary["time_to_first_recommendation"] <= summary["duration"]
+
+
+# Test the /code-review/diff endpoint
+def test_code_review_diff(client: TestClient, mock_reviewer: MagicMock) -> None:
+    mock_reviewer.areview_diff.return_value = Recommendations(
+        recommendations=[], review_result="Success"
+    )
+
+    response = client.post(
+        "/code-review/diff?context=3", json={"base": "x = 1", "code": "x = 2"}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["review_result"] == "Success"
+    change = mock_reviewer.areview_diff.call_args.args[0]
+    assert (change.base, change.code) == ("x = 1", "x = 2")
+    assert mock_reviewer.areview_diff.call_args.kwargs == {"context": 3}
+
+
+def test_code_review_diff_requires_change(client: TestClient) -> None:
+    response = client.post("/code-review/diff", json={"base": "x = 1"})
+
+    assert response.status_code == 422
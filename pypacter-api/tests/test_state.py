@@ -0,0 +1,209 @@
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from pypacter.connections import shared_pool
+from pypacter.language_detector import LanguageDetector
+from pypacter.language_detector.heuristics import HeuristicDetector
+from pypacter.reviewer import Reviewer
+from pypacter_api.base import get_detector, get_reviewer, router
+from pypacter_api.state import STATE, AppState, lifespan
+
+
+def test_startup_shares_detector() -> None:
+    """The reviewer reuses the detector rather than building its own."""
+    state = AppState()
+    assert not state.ready
+
+    state.startup()
+
+    assert state.ready
+    assert isinstance(state.detector, LanguageDetector)
+    assert isinstance(state.reviewer, Reviewer)
+    assert state.reviewer.language_detector is state.detector
+
+
+def test_startup_is_idempotent() -> None:
+    state = AppState()
+    state.startup()
+    detector, reviewer = state.detector, state.reviewer
+
+    state.startup()
+
+    assert state.detector is detector
+    assert state.reviewer is reviewer
+
+
+def test_startup_keeps_substituted_components() -> None:
+    """Components assigned before startup are used as-is."""
+    state = AppState()
+    state.detector = MagicMock()
+
+    state.startup()
+
+    assert isinstance(state.reviewer, Reviewer)
+    assert state.reviewer.language_detector is state.detector
+
+
+def test_lifespan_reuses_instances_across_requests() -> None:
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(router)
+    seen: list[tuple[LanguageDetector, Reviewer]] = []
+
+    @app.get("/probe")
+    def probe() -> None:
+        seen.append((get_detector(), get_reviewer()))
+
+    with TestClient(app) as client:
+        assert client.get("/ready").status_code == 200
+        client.get("/probe")
+        client.get("/probe")
+
+    assert seen[0][0] is seen[1][0]
+    assert seen[0][1] is seen[1][1]
+    assert not STATE.ready
+
+
+def test_lifespan_closes_the_connections() -> None:
+    """The connections of one run of the application are not reused by the next."""
+    app = FastAPI(lifespan=lifespan)
+
+    with TestClient(app):
+        pool = shared_pool()
+        client = pool.async_client()
+    assert client.is_closed
+
+    with TestClient(app):
+        assert shared_pool() is not pool
+        model = STATE.get_detector().model
+        assert model.http_async_client is not client  # type: ignore[union-attr]
+
+
+def test_micro_batching_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PYPACTER_MICRO_BATCH_SIZE", "4")
+    monkeypatch.setenv("PYPACTER_MICRO_BATCH_WAIT_MS", "20")
+    state = AppState()
+
+    state.startup()
+
+    batcher = state.get_detector().batcher
+    assert batcher is not None
+    assert (batcher.max_batch_size, batcher.max_wait) == (4, 0.02)
+    assert batcher.model is state.get_detector().llm
+    assert AppState().get_detector().batcher is not None
+    monkeypatch.setenv("PYPACTER_FAST_MODEL", "GPT_4O_MINI")
+    assert AppState().get_detector().batcher is None
+    monkeypatch.delenv("PYPACTER_FAST_MODEL")
+    monkeypatch.delenv("PYPACTER_MICRO_BATCH_SIZE")
+    assert AppState().get_detector().batcher is None
+
+
+def test_pygments_languages_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    pytest.importorskip("pygments")
+    monkeypatch.setenv("PYPACTER_PYGMENTS", "prefilter")
+    monkeypatch.setenv("PYPACTER_PYGMENTS_LANGUAGES", "python, go,")
+    prefilter = AppState().get_detector().prefilter
+    assert prefilter is not None
+    assert sorted(prefilter.index.languages) == ["go", "python"]  # type: ignore[attr-defined]
+
+    monkeypatch.setenv("PYPACTER_PYGMENTS_LANGUAGES", "python,cobol")
+    with pytest.raises(ValueError, match="cobol"):
+        AppState().get_detector()
+
+
+def test_detection_token_budget_from_environment(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("PYPACTER_DETECTION_TOKEN_BUDGET", "1024")
+    sampler = AppState().get_detector().sampler
+    assert sampler is not None
+    assert sampler.budget == 1024
+
+    monkeypatch.setenv("PYPACTER_DETECTION_TOKEN_BUDGET", "0")
+    assert AppState().get_detector().sampler is None
+
+
+def test_optional_stages_are_off_by_default() -> None:
+    state = AppState()
+    detector, reviewer = state.get_detector(), state.get_reviewer()
+    assert detector.fast_path == []
+    assert detector.cache is None
+    assert detector.sampler is None
+    assert detector.breaker is None
+    assert reviewer.cache is None
+    assert state.get_admission() is None
+
+
+def test_heuristics_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PYPACTER_HEURISTICS", "true")
+    monkeypatch.setenv("PYPACTER_CACHE_SIZE", "16")
+    detector = AppState().get_detector()
+    assert [type(tier) for tier in detector.fast_path] == [HeuristicDetector]
+    assert detector.cache is not None
+
+
+def test_model_routing_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    state = AppState()
+    assert state.get_detector().router is None
+    assert state.get_reviewer().router is None
+
+    monkeypatch.setenv("PYPACTER_FAST_MODEL", "GPT_4O_MINI")
+    monkeypatch.setenv("PYPACTER_ESCALATION_THRESHOLD", "0.7")
+    state = AppState()
+    assert state.get_detector().escalation_threshold == 0.7
+    assert state.get_detector().router is not None
+    assert state.get_reviewer().router is not None
+
+    monkeypatch.setenv("PYPACTER_FAST_REVIEW_TOKENS", "0")
+    assert AppState().get_reviewer().router is None
+
+
+def test_hedging_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert AppState().get_detector().hedged is None
+
+    monkeypatch.setenv("PYPACTER_HEDGE_PERCENTILE", "0.9")
+    monkeypatch.setenv("PYPACTER_HEDGE_MAX_RATIO", "0.05")
+    state = AppState()
+    hedged = state.get_detector().hedged
+    assert hedged is not None
+    assert (hedged.policy.percentile, hedged.policy.max_ratio) == (0.9, 0.05)
+    assert state.get_reviewer().hedged is not None
+
+
+def test_limiter_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert AppState().get_detector().limiter is None
+
+    monkeypatch.setenv("PYPACTER_LLM_CONCURRENCY", "4")
+    monkeypatch.setenv("PYPACTER_LLM_MAX_WAIT", "10")
+    state = AppState()
+    limiter = state.get_detector().limiter
+    assert limiter is not None
+    assert (limiter.stats.limit, limiter.max_wait) == (4, 10)
+    assert state.get_reviewer().limiter is limiter
+
+
+def test_breaker_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PYPACTER_BREAKER_FAILURES", "5")
+    monkeypatch.setenv("PYPACTER_BREAKER_LATENCY", "20")
+    state = AppState()
+    breaker = state.get_detector().breaker
+    assert breaker is not None
+    assert (breaker.failure_threshold, breaker.latency_threshold) == (5, 20)
+    reviewer_breaker = state.get_reviewer().breaker
+    assert reviewer_breaker is not None
+    assert reviewer_breaker is not breaker
+    assert reviewer_breaker.failure_threshold == 5
+
+    monkeypatch.setenv("PYPACTER_BREAKER_FAILURES", "0")
+    assert AppState().get_detector().breaker is None
+
+
+def test_metrics_are_shared(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("PYPACTER_TRACING", "false")
+    state = AppState()
+    metrics = state.get_detector().metrics
+    assert metrics is not None
+    assert metrics.tracer is None
+    assert state.get_reviewer().metrics is metrics
@@ -0,0 +1,333 @@
+"""
+Circuit breaking.
+
+When the provider is down or very slow, every call to the model waits for the
+full timeout before failing, so requests slow down exactly when fast answers
+matter most. A [`CircuitBreaker`][CircuitBreaker] tracks the outcome of the
+calls, and after too many consecutive failures (or calls slower than a
+threshold) it *opens*: calls then fail immediately with
+[`CircuitOpen`][CircuitOpen], letting the caller serve a degraded answer.
+
+After a while, the breaker is *half-open*: a few trial calls are let through.
+Should they succeed, the breaker closes again; otherwise it re-opens.
+
+Runnables are wrapped with [`Guarded`][Guarded] to go through a breaker. Calls
+rejected by a [`Limited`][pypacter.limiter.Limited] runnable inside it never
+reached the model, so they are not counted as failures.
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator
+from typing import Any, Generic, Literal, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+from pypacter.limiter import LimitExceeded
+
+__all__ = [
+    "BreakerState",
+    "BreakerStats",
+    "CircuitBreaker",
+    "CircuitOpen",
+    "Guarded",
+]
+
+InputT = TypeVar("InputT")
+OutputT = TypeVar("OutputT")
+
+BreakerState = Literal["closed", "open", "half-open"]
+
+
+class CircuitOpen(Exception):  # noqa: N818
+    """
+    A call was not made, as the circuit breaker is open.
+    """
+
+
+class BreakerStats(BaseModel):
+    """
+    The state and counters of a circuit breaker.
+    """
+
+    state: BreakerState = "closed"
+    consecutive_failures: int = 0
+    failures: int = 0
+    latency_breaches: int = 0
+    """
+    Successful calls which were slower than the latency threshold, and so
+    counted as failures.
+    """
+    opened: int = 0
+    """
+    The number of times the breaker opened.
+    """
+    short_circuited: int = 0
+    """
+    Calls which failed immediately as the breaker was open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing model for a while.
+
+    The breaker is thread-safe, and may be shared by several models of the same
+    provider.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        latency_threshold: float | None = None,
+        reset_timeout: float = 30.0,
+        trial_calls: int = 1,
+    ) -> None:
+        """
+        Create a new, closed breaker.
+
+        Args:
+            failure_threshold:
+                The number of consecutive failures after which the breaker
+                opens.
+            latency_threshold:
+                The time, in seconds, above which a successful call counts as
+                a failure. Only failed calls count if not set.
+            reset_timeout:
+                How long, in seconds, the breaker stays open before letting
+                trial calls through.
+            trial_calls:
+                The number of trial calls let through at once while half-open.
+        """
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_calls = trial_calls
+        self._stats = BreakerStats()
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> BreakerStats:
+        """
+        A snapshot of the state and counters.
+        """
+        with self._lock:
+            self._refresh()
+            return self._stats.model_copy()
+
+    @property
+    def state(self) -> BreakerState:
+        """
+        The current state of the breaker.
+        """
+        return self.stats.state
+
+    def _refresh(self) -> None:
+        """
+        Let trial calls through once the breaker has been open long enough.
+
+        The lock must be held.
+        """
+        if (
+            self._stats.state == "open"
+            and time.monotonic() - self._opened_at >= self.reset_timeout
+        ):
+            self._stats.state = "half-open"
+            self._trials = 0
+
+    def _open(self) -> None:
+        """
+        Open the breaker. The lock must be held.
+        """
+        self._stats.state = "open"
+        self._stats.opened += 1
+        self._opened_at = time.monotonic()
+
+    def before_call(self) -> None:
+        """
+        Check that a call may be made.
+
+        Raises:
+            CircuitOpen: If the breaker is open, or enough trial calls are
+                already in flight.
+        """
+        with self._lock:
+            self._refresh()
+            if self._stats.state == "closed":
+                return
+            if self._stats.state == "half-open" and self._trials < self.trial_calls:
+                self._trials += 1
+                return
+            self._stats.short_circuited += 1
+        msg = "The model is unavailable, calls are suspended."
+        raise CircuitOpen(msg)
+
+    def abandon(self) -> None:
+        """
+        Record that a call was cancelled before completing, or never made.
+
+        The call tells nothing of the health of the model, but frees its place
+        if it was a trial call.
+        """
+        with self._lock:
+            if self._stats.state == "half-open" and self._trials > 0:
+                self._trials -= 1
+
+    def record(self, seconds: float, *, failed: bool = False) -> None:
+        """
+        Record the outcome of a call.
+
+        Args:
+            seconds:
+                How long the call took.
+            failed:
+                Whether the call failed.
+        """
+        with self._lock:
+            stats = self._stats
+            breached = (
+                not failed
+                and self.latency_threshold is not None
+                and seconds > self.latency_threshold
+            )
+            stats.latency_breaches += breached
+            if not (failed or breached):
+                stats.consecutive_failures = 0
+                if stats.state == "half-open":
+                    stats.state = "closed"
+                return
+
+            stats.failures += failed
+            stats.consecutive_failures += 1
+            if stats.state == "half-open" or (
+                stats.state == "closed"
+                and stats.consecutive_failures >= self.failure_threshold
+            ):
+                self._open()
+
+
+class Guarded(Runnable[InputT, OutputT], Generic[InputT, OutputT]):
+    """
+    Calls a runnable through a circuit breaker.
+    """
+
+    def __init__(
+        self, runnable: Runnable[InputT, OutputT], breaker: CircuitBreaker
+    ) -> None:
+        """
+        Wrap a runnable.
+
+        Args:
+            runnable:
+                The runnable to guard, typically a model.
+            breaker:
+                The circuit breaker, usually shared by every model of a
+                provider.
+        """
+        self.runnable = runnable
+        self.breaker = breaker
+
+    def invoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the runnable, unless the breaker is open.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the runnable.
+        """
+        self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            output = self.runnable.invoke(input, config)
+        except LimitExceeded:
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record(time.monotonic() - start, failed=True)
+            raise
+        self.breaker.record(time.monotonic() - start)
+        return output
+
+    async def ainvoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the runnable, unless the breaker is open.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the runnable.
+        """
+        self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            output = await self.runnable.ainvoke(input, config)
+        except (asyncio.CancelledError, LimitExceeded):
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record(time.monotonic() - start, failed=True)
+            raise
+        self.breaker.record(time.monotonic() - start)
+        return output
+
+    async def astream(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> AsyncIterator[OutputT]:
+        """
+        Stream the output of the runnable, unless the breaker is open.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments passed to the runnable.
+
+        Yields:
+            The chunks of the output of the runnable.
+        """
+        self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            async for chunk in self.runnable.astream(input, config, **kwargs):
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit, LimitExceeded):
+            self.breaker.abandon()
+            raise
+        except Exception:
+            self.breaker.record(time.monotonic() - start, failed=True)
+            raise
+        self.breaker.record(time.monotonic() - start)
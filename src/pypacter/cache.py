@@ -0,0 +1,347 @@
+"""
+Result cache.
+
+Content-addressed cache for the outputs of the language detector and code
+reviewer. Entries are keyed on a hash of everything that influences the output
+(the code, the model and the prompt), so a change to any of them results in a
+different key rather than a stale hit.
+
+The cache has two tiers:
+
+-   A bounded, in-memory LRU tier, private to the process.
+-   An optional on-disk tier backed by SQLite, which is shared by every process
+    on the host using the same file (e.g. the workers of a single deployment).
+
+Both tiers honour the same time-to-live and are bounded in size. The in-memory
+tier evicts the least recently used entry, while the on-disk tier evicts the
+least recently stored entry (so that reads never need to write to the shared
+file). The asynchronous [`aget`][ResultCache.aget] and
+[`aset`][ResultCache.aset] access the on-disk tier in a worker thread, so that
+the event loop is not blocked on the file.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+__all__ = [
+    "CacheStats",
+    "ResultCache",
+    "make_key",
+]
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def make_key(*parts: str) -> str:
+    """
+    Create a cache key from its constituent parts.
+
+    Args:
+        parts:
+            The values which, together, determine the cached output.
+
+    Returns:
+        The hex-encoded SHA-256 digest of the parts.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CacheStats(BaseModel):
+    """
+    Counters describing the effectiveness of a cache.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        The fraction of lookups which were served from the cache.
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResultCache(Generic[ModelT]):
+    """
+    Two-tier cache of Pydantic model outputs.
+
+    The cache is safe to share between threads. Values are returned as copies,
+    so callers may modify them freely.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        model_type: type[ModelT],
+        *,
+        maxsize: int = 1024,
+        ttl: float | None = 24 * 60 * 60,
+        path: str | Path | None = None,
+        max_disk_entries: int | None = None,
+        namespace: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        Create a new cache.
+
+        Args:
+            model_type:
+                The type of the cached values.
+            maxsize:
+                The maximum number of entries held in memory. The least
+                recently used entry is evicted once this is exceeded.
+            ttl:
+                The number of seconds an entry remains valid, or `None` for
+                entries to never expire.
+            path:
+                The SQLite database file for the on-disk tier. If not
+                provided, only the in-memory tier is used.
+            max_disk_entries:
+                The maximum number of entries of this namespace held on disk,
+                or `None` for no limit. Expired entries are pruned first,
+                followed by the least recently stored entries.
+            namespace:
+                Separates the entries of different caches sharing the same
+                database file. Defaults to the name of the model type.
+            clock:
+                The source of the current time, in seconds since the epoch.
+        """
+        self.model_type = model_type
+        self.maxsize = maxsize
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.namespace = namespace or model_type.__name__
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[float | None, ModelT]] = OrderedDict()
+        self._stats = CacheStats()
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            self._db = self._connect(Path(path))
+
+    @staticmethod
+    def _connect(path: Path) -> sqlite3.Connection:
+        """
+        Open (and if need be, create) the on-disk tier.
+
+        Write-ahead logging allows readers in other processes to proceed while
+        an entry is being written.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " PRIMARY KEY (namespace, key)"
+            ")"
+        )
+        db.commit()
+        return db
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        A snapshot of the cache counters.
+        """
+        with self._lock:
+            return self._stats.model_copy()
+
+    def __len__(self) -> int:
+        """
+        The number of entries held in memory.
+        """
+        return len(self._memory)
+
+    def _expired(self, expires_at: float | None) -> bool:
+        return expires_at is not None and expires_at <= self._clock()
+
+    def get(self, key: str) -> ModelT | None:
+        """
+        Look up a value.
+
+        Args:
+            key:
+                The cache key, typically created with [`make_key`][make_key].
+
+        Returns:
+            A copy of the cached value, or `None` if there is no valid entry.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if not self._expired(expires_at):
+                    self._memory.move_to_end(key)
+                    self._stats.hits += 1
+                    self._stats.memory_hits += 1
+                    return value.model_copy(deep=True)
+                del self._memory[key]
+                self._stats.expirations += 1
+
+            stored = self._get_disk(key)
+            if stored is not None:
+                self._stats.hits += 1
+                self._stats.disk_hits += 1
+                return stored.model_copy(deep=True)
+
+            self._stats.misses += 1
+            return None
+
+    async def aget(self, key: str) -> ModelT | None:
+        """
+        Look up a value, without blocking the event loop.
+
+        Args:
+            key:
+                The cache key, typically created with [`make_key`][make_key].
+
+        Returns:
+            A copy of the cached value, or `None` if there is no valid entry.
+        """
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    def _get_disk(self, key: str) -> ModelT | None:
+        """
+        Look up a value in the on-disk tier, promoting it to memory on a hit.
+
+        Must be called with the lock held.
+        """
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT value, expires_at FROM results WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        raw, expires_at = row
+        if self._expired(expires_at):
+            self._stats.expirations += 1
+            return None
+        value = self.model_type.model_validate_json(raw)
+        self._set_memory(key, expires_at, value)
+        return value
+
+    def set(self, key: str, value: ModelT) -> None:
+        """
+        Store a value.
+
+        Args:
+            key:
+                The cache key, typically created with [`make_key`][make_key].
+            value:
+                The value to store. A copy is stored, so the caller may
+                continue to modify the original.
+        """
+        expires_at = None if self.ttl is None else self._clock() + self.ttl
+        value = value.model_copy(deep=True)
+        with self._lock:
+            self._set_memory(key, expires_at, value)
+            self._stats.stores += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, value.model_dump_json(), expires_at),
+                )
+                if self.max_disk_entries is not None:
+                    self._prune_disk(self.max_disk_entries)
+                self._db.commit()
+
+    async def aset(self, key: str, value: ModelT) -> None:
+        """
+        Store a value, without blocking the event loop.
+
+        Args:
+            key:
+                The cache key, typically created with [`make_key`][make_key].
+            value:
+                The value to store. A copy is stored, so the caller may
+                continue to modify the original.
+        """
+        if self._db is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def _prune_disk(self, limit: int) -> None:
+        """
+        Bound the number of entries of this namespace held on disk.
+
+        `INSERT OR REPLACE` assigns a new row ID to every write, so ordering by
+        row ID orders the entries by when they were last stored.
+
+        Must be called with the lock held.
+        """
+        if self._db is None:
+            return
+        expired = self._db.execute(
+            "DELETE FROM results WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, self._clock()),
+        ).rowcount
+        evicted = self._db.execute(
+            "DELETE FROM results WHERE rowid IN ("
+            " SELECT rowid FROM results WHERE namespace = ?"
+            " ORDER BY rowid DESC LIMIT -1 OFFSET ?"
+            ")",
+            (self.namespace, limit),
+        ).rowcount
+        self._stats.expirations += expired
+        self._stats.evictions += evicted
+
+    def _set_memory(self, key: str, expires_at: float | None, value: ModelT) -> None:
+        """
+        Store a value in memory, evicting the least recently used entries.
+
+        Must be called with the lock held.
+        """
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+            self._stats.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove every entry of this cache, from both tiers.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(
+                    "DELETE FROM results WHERE namespace = ?", (self.namespace,)
+                )
+                self._db.commit()
+
+    def close(self) -> None:
+        """
+        Close the on-disk tier, if any.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
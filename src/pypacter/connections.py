@@ -0,0 +1,382 @@
+"""
+Shared HTTP connections to the model providers.
+
+By default, every model client opens its own connections, so a burst of
+requests pays for new TCP and TLS handshakes. A
+[`ConnectionPool`][ConnectionPool] owns one synchronous and one asynchronous
+[`httpx`](https://www.python-httpx.org) client, and every model created through
+[`pypacter.models`][pypacter.models] shares those of the process-wide
+[`shared_pool`][shared_pool]. Connections are kept alive between calls, and
+HTTP/2 is used when the `h2` package is installed (the `http2` extra).
+
+The pool is configured through the following environment variables:
+
+-   `PYPACTER_HTTP_MAX_CONNECTIONS`: the maximum number of open connections.
+    Defaults to 100.
+-   `PYPACTER_HTTP_MAX_KEEPALIVE`: the maximum number of idle connections kept
+    alive. Defaults to 20.
+-   `PYPACTER_HTTP_KEEPALIVE_EXPIRY`: how long an idle connection is kept
+    alive, in seconds. Defaults to 30.
+-   `PYPACTER_HTTP_CONNECT_TIMEOUT`: the connection timeout, in seconds.
+    Defaults to 5.
+-   `PYPACTER_HTTP_READ_TIMEOUT`: the read timeout, in seconds. Defaults to 60.
+-   `PYPACTER_HTTP2`: `auto` (the default) to use HTTP/2 if available, `true`
+    to require it, or `false`.
+
+The pool counts the requests in flight, so that its saturation can be
+monitored: once [`max_connections`][PoolSettings.max_connections] requests are
+in flight, further requests wait for a connection to be released.
+"""
+
+import functools
+import importlib.util
+import os
+import threading
+import typing
+from collections.abc import AsyncIterator, Iterator
+
+import httpx
+from pydantic import BaseModel
+
+__all__ = [
+    "ConnectionPool",
+    "PoolSettings",
+    "PoolStats",
+    "shared_pool",
+]
+
+
+class PoolSettings(BaseModel):
+    """
+    The configuration of a connection pool.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    """
+    How long an idle connection is kept alive, in seconds.
+    """
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0
+    http2: bool | None = None
+    """
+    Whether to use HTTP/2. If `None`, HTTP/2 is used if the `h2` package is
+    installed.
+    """
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """
+        Read the settings from the environment.
+
+        Returns:
+            The settings, with defaults for the unset variables.
+
+        Raises:
+            ValueError: If `PYPACTER_HTTP2` is not recognised.
+        """
+        http2 = os.getenv("PYPACTER_HTTP2", "auto").lower()
+        if http2 not in {"auto", "true", "false"}:
+            msg = f"Unknown PYPACTER_HTTP2 value: {http2!r}"
+            raise ValueError(msg)
+        return cls(
+            max_connections=int(os.getenv("PYPACTER_HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(
+                os.getenv("PYPACTER_HTTP_MAX_KEEPALIVE", "20")
+            ),
+            keepalive_expiry=float(os.getenv("PYPACTER_HTTP_KEEPALIVE_EXPIRY", "30")),
+            connect_timeout=float(os.getenv("PYPACTER_HTTP_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("PYPACTER_HTTP_READ_TIMEOUT", "60")),
+            http2=None if http2 == "auto" else http2 == "true",
+        )
+
+    def use_http2(self) -> bool:
+        """
+        Whether HTTP/2 is used.
+
+        Returns:
+            The `http2` setting, or whether the `h2` package is installed if
+            not set.
+        """
+        if self.http2 is None:
+            return importlib.util.find_spec("h2") is not None
+        return self.http2
+
+
+class PoolStats(BaseModel):
+    """
+    Counters describing the use of a connection pool.
+    """
+
+    max_connections: int
+    requests: int = 0
+    errors: int = 0
+    """
+    Requests which failed before a response was received.
+    """
+    in_flight: int = 0
+    """
+    Requests holding a connection, until their response is closed.
+    """
+    max_in_flight: int = 0
+    saturated: int = 0
+    """
+    Requests which found every connection in use, and so had to wait for one.
+    """
+
+    @property
+    def utilization(self) -> float:
+        """
+        The share of the connections currently in use.
+        """
+        return self.in_flight / self.max_connections
+
+
+class _Counter:
+    """
+    Counts the requests in flight through the transports of a pool.
+    """
+
+    def __init__(self, max_connections: int) -> None:
+        self.stats = PoolStats(max_connections=max_connections)
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self.lock:
+            self.stats.requests += 1
+            self.stats.saturated += self.stats.in_flight >= self.stats.max_connections
+            self.stats.in_flight += 1
+            self.stats.max_in_flight = max(
+                self.stats.max_in_flight, self.stats.in_flight
+            )
+
+    def release(self, *, error: bool = False) -> None:
+        with self.lock:
+            self.stats.in_flight -= 1
+            self.stats.errors += error
+
+
+class _Stream(httpx.SyncByteStream):
+    """
+    A response body, releasing its request once closed.
+    """
+
+    def __init__(self, stream: httpx.SyncByteStream, counter: _Counter) -> None:
+        self.stream = stream
+        self.counter = counter
+        self.released = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self.stream
+
+    def close(self) -> None:
+        try:
+            self.stream.close()
+        finally:
+            if not self.released:
+                self.released = True
+                self.counter.release()
+
+
+class _AsyncStream(httpx.AsyncByteStream):
+    """
+    An asynchronous response body, releasing its request once closed.
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, counter: _Counter) -> None:
+        self.stream = stream
+        self.counter = counter
+        self.released = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.released:
+                self.released = True
+                self.counter.release()
+
+
+class _Transport(httpx.BaseTransport):
+    """
+    A transport counting the requests in flight.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, counter: _Counter) -> None:
+        self.transport = transport
+        self.counter = counter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.counter.acquire()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            self.counter.release(error=True)
+            raise
+        response.stream = _Stream(
+            typing.cast(httpx.SyncByteStream, response.stream), self.counter
+        )
+        return response
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class _AsyncTransport(httpx.AsyncBaseTransport):
+    """
+    An asynchronous transport counting the requests in flight.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, counter: _Counter) -> None:
+        self.transport = transport
+        self.counter = counter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.counter.acquire()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            self.counter.release(error=True)
+            raise
+        response.stream = _AsyncStream(
+            typing.cast(httpx.AsyncByteStream, response.stream), self.counter
+        )
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ConnectionPool:
+    """
+    A synchronous and an asynchronous HTTP client, sharing their settings.
+
+    The clients are created on first use. Note that the connections of the
+    asynchronous client belong to the event loop which opened them, so it
+    should only be used from a single event loop.
+    """
+
+    def __init__(self, settings: PoolSettings | None = None) -> None:
+        """
+        Create a new pool.
+
+        Args:
+            settings:
+                The configuration of the pool. Defaults to the default
+                settings.
+        """
+        self.settings = settings or PoolSettings()
+        self._counter = _Counter(self.settings.max_connections)
+        self._client: httpx.Client | None = None
+        self._async_client: httpx.AsyncClient | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> PoolStats:
+        """
+        A snapshot of the pool counters, shared by both clients.
+        """
+        with self._counter.lock:
+            return self._counter.stats.model_copy()
+
+    def _options(self) -> dict:
+        """
+        The options shared by the transports and clients.
+        """
+        settings = self.settings
+        return {
+            "limits": httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            ),
+            "http2": settings.use_http2(),
+        }
+
+    def timeout(self) -> httpx.Timeout:
+        """
+        The timeouts of the clients.
+
+        Clients such as the OpenAI one set a timeout on every request, which
+        overrides that of the HTTP client, so they should be given these
+        timeouts as well.
+
+        Returns:
+            The connect timeout, and the read, write and pool timeouts.
+        """
+        return httpx.Timeout(
+            self.settings.read_timeout, connect=self.settings.connect_timeout
+        )
+
+    def client(self) -> httpx.Client:
+        """
+        The synchronous client, created on first use.
+
+        Returns:
+            The client.
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    transport=_Transport(
+                        httpx.HTTPTransport(**self._options()), self._counter
+                    ),
+                    timeout=self.timeout(),
+                    follow_redirects=True,
+                )
+            return self._client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        The asynchronous client, created on first use.
+
+        Returns:
+            The client.
+        """
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(
+                    transport=_AsyncTransport(
+                        httpx.AsyncHTTPTransport(**self._options()), self._counter
+                    ),
+                    timeout=self.timeout(),
+                    follow_redirects=True,
+                )
+            return self._async_client
+
+    def close(self) -> None:
+        """
+        Close the synchronous client, if created.
+        """
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """
+        Close both clients, if created.
+        """
+        self.close()
+        with self._lock:
+            client, self._async_client = self._async_client, None
+        if client is not None:
+            await client.aclose()
+
+
+@functools.cache
+def shared_pool() -> ConnectionPool:
+    """
+    The connection pool shared by the pre-configured models.
+
+    The pool is configured from the environment when first used.
+
+    Returns:
+        The pool.
+    """
+    return ConnectionPool(PoolSettings.from_env())
@@ -0,0 +1,271 @@
+"""
+Hedged requests.
+
+Most calls to a model return in a predictable time, but a few are much slower,
+and these dominate the tail latency. A [`Hedged`][Hedged] runnable sends a
+second, identical request when the first has not returned after a high
+percentile of the recent latencies, and returns whichever completes first,
+cancelling the other.
+
+As each hedge is an extra call to the model, the share of requests which are
+hedged is capped by the [`HedgePolicy`][HedgePolicy]. Only asynchronous calls
+are hedged, as a synchronous call cannot be cancelled.
+"""
+
+import asyncio
+import threading
+import time
+import typing
+from collections import deque
+from collections.abc import AsyncIterator
+from typing import Any, Generic, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel, Field
+
+__all__ = [
+    "HedgePolicy",
+    "HedgeStats",
+    "Hedged",
+]
+
+InputT = TypeVar("InputT")
+OutputT = TypeVar("OutputT")
+
+
+class HedgePolicy(BaseModel):
+    """
+    When to hedge a request.
+    """
+
+    percentile: float = Field(default=0.95, gt=0, lt=1)
+    """
+    The percentile of the recent latencies after which a request is hedged.
+    """
+    window: int = Field(default=200, gt=0)
+    """
+    The number of recent latencies the percentile is computed over.
+    """
+    min_samples: int = Field(default=20, gt=0)
+    """
+    The number of latencies required before the percentile is used.
+    """
+    initial_delay: float = Field(default=2.0, gt=0)
+    """
+    The delay, in seconds, before hedging while too few latencies are known.
+    """
+    max_ratio: float = Field(default=0.1, ge=0, le=1)
+    """
+    The largest share of the requests which may be hedged.
+    """
+
+
+class HedgeStats(BaseModel):
+    """
+    Counters describing the hedged requests.
+    """
+
+    requests: int = 0
+    hedged: int = 0
+    """
+    The requests for which a second request was sent.
+    """
+    won: int = 0
+    """
+    The hedged requests answered by the second request.
+    """
+    capped: int = 0
+    """
+    The slow requests which were not hedged, as too many already had been.
+    """
+    delay: float = 0.0
+    """
+    The current delay, in seconds, before a request is hedged.
+    """
+
+    @property
+    def hedge_rate(self) -> float:
+        """
+        The share of requests which were hedged.
+        """
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        """
+        The share of hedged requests answered by the second request.
+        """
+        return self.won / self.hedged if self.hedged else 0.0
+
+
+class Hedged(Runnable[InputT, OutputT], Generic[InputT, OutputT]):
+    """
+    Hedges the slow asynchronous calls of a runnable.
+    """
+
+    def __init__(
+        self,
+        runnable: Runnable[InputT, OutputT],
+        policy: HedgePolicy | None = None,
+    ) -> None:
+        """
+        Wrap a runnable.
+
+        Args:
+            runnable:
+                The runnable to hedge, typically a model.
+            policy:
+                When to hedge a request. Defaults to the default policy.
+        """
+        self.runnable = runnable
+        self.policy = policy or HedgePolicy()
+        self._latencies: deque[float] = deque(maxlen=self.policy.window)
+        self._stats = HedgeStats(delay=self.policy.initial_delay)
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> HedgeStats:
+        """
+        A snapshot of the hedging counters.
+        """
+        with self._lock:
+            return self._stats.model_copy()
+
+    def _record(self, seconds: float) -> None:
+        """
+        Record the latency of a call, and update the hedging delay.
+        """
+        with self._lock:
+            self._latencies.append(seconds)
+            if len(self._latencies) >= self.policy.min_samples:
+                latencies = sorted(self._latencies)
+                index = int(self.policy.percentile * len(latencies))
+                self._stats.delay = latencies[min(index, len(latencies) - 1)]
+
+    def _may_hedge(self) -> bool:
+        """
+        Whether a slow request may be hedged without exceeding the cap.
+        """
+        with self._lock:
+            if self._stats.hedged + 1 > self.policy.max_ratio * self._stats.requests:
+                self._stats.capped += 1
+                return False
+            self._stats.hedged += 1
+            return True
+
+    async def _timed(self, input: InputT, config: RunnableConfig | None) -> OutputT:
+        """
+        Call the runnable, recording its latency if it succeeds.
+        """
+        start = time.perf_counter()
+        output = await self.runnable.ainvoke(input, config)
+        self._record(time.perf_counter() - start)
+        return output
+
+    def invoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the runnable, without hedging.
+
+        The latency is still recorded, to inform the hedging of asynchronous
+        calls.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the runnable.
+        """
+        with self._lock:
+            self._stats.requests += 1
+        start = time.perf_counter()
+        output = self.runnable.invoke(input, config)
+        self._record(time.perf_counter() - start)
+        return output
+
+    async def ainvoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the runnable, hedging the call if it is slow.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of whichever call completed first.
+
+        Raises:
+            Exception: The error of the first call, if every call failed.
+        """
+        with self._lock:
+            self._stats.requests += 1
+            delay = self._stats.delay
+        tasks = [asyncio.create_task(self._timed(input, config))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._may_hedge():
+                return await tasks[0]
+
+            tasks.append(asyncio.create_task(self._timed(input, config)))
+            pending = set(tasks)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is tasks[1]:
+                            with self._lock:
+                                self._stats.won += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise typing.cast(BaseException, error)
+        finally:
+            # Cancel the losing call, or both calls if this one was cancelled.
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def astream(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> AsyncIterator[OutputT]:
+        """
+        Stream the output of the runnable, without hedging.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments passed to the runnable.
+
+        Yields:
+            The chunks of the output of the runnable.
+        """
+        async for chunk in self.runnable.astream(input, config, **kwargs):
+            yield chunk
@@ -5,29 +5,108 @@ Takes in code snippet as an input and return the detected language.
 
 """
 
+import contextlib
+import logging
+import sqlite3
+import threading
 import typing
+from collections import Counter
+from collections.abc import AsyncIterator, Sequence
 from pathlib import Path
 from typing import Any
 
-from langchain.output_parsers import PydanticOutputParser
-from langchain_core.prompts import (
-    HumanMessagePromptTemplate,
-    SystemMessagePromptTemplate,
-)
 from langchain_core.runnables import Runnable, RunnableConfig, RunnableSerializable
+from langchain_core.runnables.config import get_config_list
+from langchain_core.runnables.utils import gather_with_concurrency
 from pydantic import BaseModel, Field
 
-from pypacter.models import DEFAULT_MODEL
+from pypacter.breaker import CircuitBreaker, Guarded
+from pypacter.cache import ResultCache, make_key
+from pypacter.hedging import Hedged, HedgePolicy, HedgeStats
+from pypacter.language_detector.heuristics import HeuristicDetector
+from pypacter.language_detector.local import CandidateFilter, LocalDetector
+from pypacter.limiter import AdaptiveLimiter, Limited
+from pypacter.metrics import Metrics
+from pypacter.models import default_model, model_id
+from pypacter.parsers import NOT_LLM_OUTPUT, OutputParser
+from pypacter.routing import Cascade, RoutingStats
+from pypacter.singleflight import SingleFlight
+from pypacter.templates import fingerprint, human_template, system_template
+from pypacter.tokens import estimate_tokens
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from langchain_core.prompts import (
+        HumanMessagePromptTemplate,
+        SystemMessagePromptTemplate,
+    )
+
+    from pypacter.language_detector.batching import MicroBatcher
+    from pypacter.language_detector.sampling import CodeSampler
+
+logger = logging.getLogger(__name__)
 
 _DIR = Path(__file__).parent
-INSTRUCTIONS_DETECTOR = SystemMessagePromptTemplate.from_template_file(
-    template_file=(_DIR / "instructions.md"),
-    input_variables=["format_instructions"],
-)
-CODE_TEMPLATE_DETECTOR = HumanMessagePromptTemplate.from_template_file(
-    template_file=(_DIR / "code_template.md"),
-    input_variables=["code"],
-)
+
+
+def instructions_template() -> "SystemMessagePromptTemplate":
+    """
+    The system prompt of the detector.
+    """
+    return system_template(_DIR / "instructions.md", "format_instructions")
+
+
+def code_template() -> "HumanMessagePromptTemplate":
+    """
+    The prompt presenting the code snippet.
+    """
+    return human_template(_DIR / "code_template.md", "code")
+
+
+def candidates_template() -> "HumanMessagePromptTemplate":
+    """
+    The prompt presenting the pre-filtered candidate languages.
+    """
+    return human_template(_DIR / "candidates_template.md", "candidates")
+
+
+def prompt_version() -> str:
+    """
+    Fingerprint of the prompt templates.
+
+    It is used to invalidate cached results when the prompts change.
+    """
+    return fingerprint(_DIR / "instructions.md", _DIR / "code_template.md")
+
+
+def candidates_prompt_version() -> str:
+    """
+    Fingerprint of the pre-filter prompt template.
+    """
+    return fingerprint(_DIR / "candidates_template.md")
+
+
+_LAZY: "dict[str, Callable[[], object]]" = {
+    "INSTRUCTIONS_DETECTOR": instructions_template,
+    "CODE_TEMPLATE_DETECTOR": code_template,
+    "CANDIDATES_TEMPLATE_DETECTOR": candidates_template,
+    "PROMPT_VERSION": prompt_version,
+    "CANDIDATES_PROMPT_VERSION": candidates_prompt_version,
+}
+
+
+def __getattr__(name: str) -> object:
+    """
+    Load the prompt templates on first access.
+
+    The templates used to be module constants, read when the module was
+    imported; they remain available under their former names.
+    """
+    if name in _LAZY:
+        return _LAZY[name]()
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
 
 
 # Pydantic Models for Input and Output
@@ -59,6 +138,17 @@ class LanguageDetectionOutput(BaseModel):
     ] = Field(
         description="Result of detection",
     )
+    tokens_saved: int = Field(
+        default=0,
+        description="The number of tokens of code left out of the prompt by sampling.",
+        json_schema_extra=NOT_LLM_OUTPUT,
+    )
+    degraded: bool = Field(
+        default=False,
+        description="Whether the model was unavailable, and the language was "
+        "detected locally instead.",
+        json_schema_extra=NOT_LLM_OUTPUT,
+    )
 
 
 class LanguageDetector(Runnable[LanguageDetectionInput, LanguageDetectionOutput]):
@@ -66,29 +156,174 @@ class LanguageDetector(Runnable[LanguageDetectionInput, LanguageDetectionOutput]
     A detector to identify programming language of a code snippet.
     """
 
-    def __init__(self, model: RunnableSerializable = DEFAULT_MODEL) -> None:
+    def __init__(  # noqa: PLR0913
+        self,
+        model: Runnable | None = None,
+        cache: ResultCache[LanguageDetectionOutput] | None = None,
+        fast_path: Sequence[LocalDetector] = (),
+        fast_path_threshold: float = 0.9,
+        prefilter: CandidateFilter | None = None,
+        batcher: "MicroBatcher | None" = None,
+        sampler: "CodeSampler | None" = None,
+        fast_model: Runnable | None = None,
+        escalation_threshold: float = 0.8,
+        hedge: HedgePolicy | None = None,
+        limiter: AdaptiveLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+        degraded: Sequence[LocalDetector] | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
         """
         Initializes the multi-language detector with optional LLM integration.
 
         Args:
-            model : The primary LLM Model to use for language detection
+            model : The primary LLM Model to use for language detection.
+                Defaults to the default model.
+            cache : An optional cache of detection results. Successful
+                detections are stored, keyed on the preprocessed code, the
+                model and the prompt version.
+            fast_path : Local detectors tried, in order, before the LLM. The
+                first guess with a confidence of at least
+                `fast_path_threshold` is returned without calling the LLM.
+            fast_path_threshold : The confidence required for a local guess
+                to be returned directly.
+            prefilter : An optional local filter whose most likely candidate
+                languages are included in the prompt, narrowing down the
+                languages the LLM needs to consider.
+            batcher : An optional micro-batcher through which asynchronous
+                detections are sent, packing concurrent requests into a
+                single prompt. To share the limiter, hedging and circuit
+                breaker of the detector, create it with the detector's `llm`
+                and assign it to `batcher` once the detector is created.
+                Batched prompts are sent to the primary model, so the batcher
+                is not used if a `fast_model` is set: detections are then
+                routed one by one, whether they arrive concurrently or not.
+            sampler : An optional sampler reducing long code to a sample
+                within a token budget before detection. The full code is used
+                if not provided.
+            fast_model : An optional cheaper, faster model tried before
+                `model`. The detection is only escalated to `model` if the
+                fast model fails, is not confident enough or finds several
+                possible languages (see [`Cascade`][pypacter.routing.Cascade]).
+            escalation_threshold : The confidence below which a detection by
+                the fast model is escalated.
+            hedge : An optional policy for hedging the slow asynchronous calls
+                to the primary model (see [`Hedged`][pypacter.hedging.Hedged]).
+                Calls are not hedged if not provided.
+            limiter : An optional limiter of the calls in flight to the
+                models, usually shared with the code reviewer (see
+                [`AdaptiveLimiter`][pypacter.limiter.AdaptiveLimiter]).
+            breaker : An optional circuit breaker around the calls to the
+                models, usually shared with the code reviewer (see
+                [`CircuitBreaker`][pypacter.breaker.CircuitBreaker]). If set,
+                detections the model fails (or which are not attempted as the
+                breaker is open) are answered by the `degraded` detectors,
+                and marked as degraded.
+            degraded : The local detectors answering when the model is
+                unavailable, most trusted first. Defaults to the fast-path
+                detectors, or the heuristics if there are none.
+            metrics : Optional metrics recording the time spent in each stage
+                of the detection, the tokens and the failures, usually shared
+                with the code reviewer (see
+                [`Metrics`][pypacter.metrics.Metrics]).
 
         """
-        self.model = model
+        self.model = model if model is not None else default_model()
+        self.cache = cache
+        self.fast_path = fast_path
+        self.fast_path_threshold = fast_path_threshold
+        self.prefilter = prefilter
+        self.batcher = batcher
+        self.sampler = sampler
+        self.fast_model = fast_model
+        self.escalation_threshold = escalation_threshold
+        self.breaker = breaker
+        self.metrics = metrics
+        self.degraded = (
+            degraded
+            if degraded is not None
+            else (list(fast_path) or [HeuristicDetector()])
+        )
+        self._tier_hits: Counter[str] = Counter()
+        self._tier_lock = threading.Lock()
+        self.in_flight: SingleFlight[LanguageDetectionOutput] = SingleFlight()
+        """
+        Coalesces concurrent detections of the same snippet into a single
+        call to the LLM.
+        """
 
-        parser: PydanticOutputParser[LanguageDetectionOutput] = PydanticOutputParser(
+        parser: OutputParser[LanguageDetectionOutput] = OutputParser(
             pydantic_object=LanguageDetectionOutput
         )
 
         self.prompt_template = (
-            INSTRUCTIONS_DETECTOR.format(
+            instructions_template().format(
                 format_instructions=parser.get_format_instructions()
             )
-            + CODE_TEMPLATE_DETECTOR
+            + code_template()
         )
+        if prefilter is not None:
+            self.prompt_template += candidates_template()
+        self.hedged: Hedged | None = None
+        """
+        Hedges the calls to the primary model, if a hedging policy is set.
+        """
+        llm: Runnable = self.model
+        fast: Runnable | None = fast_model
+        self.limiter = limiter
+        if limiter is not None:
+            llm = Limited(llm, limiter)
+            fast = None if fast is None else Limited(fast, limiter)
+        if hedge is not None:
+            self.hedged = llm = Hedged(llm, hedge)
+        if breaker is not None:
+            llm = Guarded(llm, breaker)
+            fast = None if fast is None else Guarded(fast, breaker)
+        self.llm = llm
+        """
+        The primary model, behind the limiter, the hedging and the circuit
+        breaker if set. Batchers should send their prompts to it, so batched
+        calls are limited and guarded as any other.
+        """
+        chain = self.prompt_template | llm | parser
+        self.router: Cascade[dict[str, str], LanguageDetectionOutput] | None = None
+        """
+        Routes detections between the fast and the primary model, if a fast
+        model is configured.
+        """
+        self.model_key = model_id(self.model)
+        """
+        Identifies the model (or models) producing the detections.
+        """
+        if fast_model is not None and fast is not None:
+            self.router = Cascade(
+                [
+                    (model_id(fast_model), self.prompt_template | fast | parser),
+                    (self.model_key, chain),
+                ],
+                escalate=self._escalate,
+            )
+            self.model_key = (
+                f"{model_id(fast_model)}@{escalation_threshold}>{self.model_key}"
+            )
         self.chain = typing.cast(
             RunnableSerializable[dict[str, str], LanguageDetectionOutput],
-            self.prompt_template | self.model | parser,
+            chain if self.router is None else self.router,
+        )
+        self._batch_config = (
+            None
+            if metrics is None
+            else RunnableConfig(callbacks=[metrics.handler("detector")])
+        )
+        if self._batch_config is not None:
+            self.chain = typing.cast(
+                RunnableSerializable[dict[str, str], LanguageDetectionOutput],
+                self.chain.with_config(self._batch_config),
+            )
+        self.prompt_version = make_key(
+            prompt_version(),
+            parser.get_format_instructions(),
+            "" if prefilter is None else candidates_prompt_version(),
         )
 
     @property
@@ -105,27 +340,367 @@ class LanguageDetector(Runnable[LanguageDetectionInput, LanguageDetectionOutput]
         """
         return LanguageDetectionOutput
 
+    @property
+    def tier_stats(self) -> dict[str, int]:
+        """
+        The number of detections answered by each tier.
+
+        The tiers are the names of the fast-path detectors, `cache`, `llm`,
+        `coalesced` (when an identical call to the LLM was already in flight),
+        `fallback` (when the LLM could not be invoked successfully) and
+        `degraded` (when it could not, and a breaker is set).
+        """
+        with self._tier_lock:
+            return dict(self._tier_hits)
+
+    @property
+    def routing_stats(self) -> RoutingStats | None:
+        """
+        How detections were routed between the fast and the primary model.
+
+        `None` unless a fast model is configured.
+        """
+        return None if self.router is None else self.router.stats
+
+    @property
+    def hedge_stats(self) -> HedgeStats | None:
+        """
+        How often calls to the primary model were hedged, and the hedge won.
+
+        `None` unless a hedging policy is set.
+        """
+        return None if self.hedged is None else self.hedged.stats
+
+    def _escalate(self, output: LanguageDetectionOutput) -> bool:
+        """
+        Whether a detection by the fast model should be escalated.
+        """
+        return (
+            output.confidence < self.escalation_threshold
+            or output.result == "possibility of multiple languages need more context"
+        )
+
+    def _record(self, tier: str) -> None:
+        """
+        Count a detection answered by the given tier.
+        """
+        with self._tier_lock:
+            self._tier_hits[tier] += 1
+
     def _preprocess_code(self, code: str) -> str:
         """
         Preprocess the code snippet for better language detection results.
 
+        Surrounding whitespace is removed and, if a sampler is configured, long
+        code is reduced to a sample within its token budget.
+
         Args:
             code: The raw code snippet.
 
         Returns:
             Preprocessed code snippet.
         """
-        return code.strip()
+        code = code.strip()
+        return code if self.sampler is None else self.sampler(code)
+
+    @staticmethod
+    def _with_savings(
+        output: LanguageDetectionOutput, code: str, preprocessed_code: str
+    ) -> LanguageDetectionOutput:
+        """
+        Report the tokens saved by preprocessing the code.
+
+        Args:
+            output: The detection output.
+            code: The raw code snippet.
+            preprocessed_code: The code used for detection.
+
+        Returns:
+            The output, copied with the tokens saved if any were.
+        """
+        saved = estimate_tokens(code.strip()) - estimate_tokens(preprocessed_code)
+        if saved <= 0:
+            return output
+        return output.model_copy(update={"tokens_saved": saved})
+
+    def _cache_key(self, code: str) -> str:
+        """
+        Key under which the detection result of a code snippet is cached.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            A key unique to the code, model and prompt version.
+        """
+        return make_key(code, self.model_key, self.prompt_version)
+
+    def _guess_locally(self, code: str) -> LanguageDetectionOutput | None:
+        """
+        Attempt to detect the language with the fast-path detectors.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            The output of the first confident detector, if any.
+        """
+        for detector in self.fast_path:
+            guess = detector.guess(code)
+            if guess is not None and guess.confidence >= self.fast_path_threshold:
+                self._record(detector.name)
+                return LanguageDetectionOutput(
+                    language=guess.language,
+                    confidence=guess.confidence,
+                    message=f"Detected locally from {guess.reason}.",
+                    result="detection successful",
+                )
+        return None
+
+    def _answer_locally(self, code: str) -> LanguageDetectionOutput | None:
+        """
+        Attempt to detect the language without calling the LLM.
+
+        The fast-path detectors are tried first, followed by the cache. A
+        cache which cannot be read is treated as a miss.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            The detection output, or `None` if the LLM must be called.
+        """
+        output = self._guess_locally(code)
+        if output is not None or self.cache is None:
+            return output
+        try:
+            cached = self.cache.get(self._cache_key(code))
+        except sqlite3.Error:
+            logger.warning("Could not read the detection cache", exc_info=True)
+            return None
+        if cached is not None:
+            self._record("cache")
+        return cached
+
+    async def _aanswer_locally(self, code: str) -> LanguageDetectionOutput | None:
+        """
+        Attempt to detect the language without calling the LLM, asynchronously.
+
+        As [`_answer_locally`][LanguageDetector._answer_locally], but the cache
+        is read without blocking the event loop.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            The detection output, or `None` if the LLM must be called.
+        """
+        output = self._guess_locally(code)
+        if output is not None or self.cache is None:
+            return output
+        try:
+            cached = await self.cache.aget(self._cache_key(code))
+        except sqlite3.Error:
+            logger.warning("Could not read the detection cache", exc_info=True)
+            return None
+        if cached is not None:
+            self._record("cache")
+        return cached
+
+    @staticmethod
+    def _cacheable(output: LanguageDetectionOutput) -> bool:
+        """
+        Whether an output produced by the LLM may be cached.
+
+        Outputs reporting a failed detection are not cached, so the snippet
+        is detected anew next time.
+
+        Args:
+            output: The output of the chain.
+
+        Returns:
+            Whether the output should be stored in the cache.
+        """
+        return output.result != "unsuccesfull detection. model exception occured"
+
+    def _store(self, code: str, output: LanguageDetectionOutput) -> None:
+        """
+        Record an output produced by the LLM, caching it if possible.
+
+        The cache is best effort: should it fail to store the output, the
+        error is logged and the detection is still returned.
+
+        Args:
+            code: The preprocessed code snippet.
+            output: The output of the chain.
+        """
+        self._record("llm")
+        if self.cache is None or not self._cacheable(output):
+            return
+        try:
+            self.cache.set(self._cache_key(code), output)
+        except sqlite3.Error:
+            logger.warning("Could not store the detection in the cache", exc_info=True)
+
+    async def _astore(self, code: str, output: LanguageDetectionOutput) -> None:
+        """
+        Record an output produced by the LLM, caching it if possible.
+
+        As [`_store`][LanguageDetector._store], but the cache is written
+        without blocking the event loop.
+
+        Args:
+            code: The preprocessed code snippet.
+            output: The output of the chain.
+        """
+        self._record("llm")
+        if self.cache is None or not self._cacheable(output):
+            return
+        try:
+            await self.cache.aset(self._cache_key(code), output)
+        except sqlite3.Error:
+            logger.warning("Could not store the detection in the cache", exc_info=True)
+
+    def _chain_input(self, code: str) -> dict[str, str]:
+        """
+        The input for the detection chain.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            The prompt variables, including the pre-filtered candidate
+            languages if a pre-filter is configured.
+        """
+        if self.prefilter is None:
+            return {"code": code}
+        candidates = self.prefilter.candidates(code)
+        return {"code": code, "candidates": ", ".join(candidates) or "none"}
+
+    def _fallback_output(self) -> LanguageDetectionOutput:
+        """
+        Output returned when the model could not be invoked successfully.
+
+        Returns:
+            A detection output marking the detection as unsuccessful.
+        """
+        return LanguageDetectionOutput(
+            language="unknown",
+            confidence=0.0,
+            message="unsuccesfull detection. model exception occured",
+            result="unsuccesfull detection. model exception occured",
+        )
+
+    def _stage(self, stage: str) -> contextlib.AbstractContextManager[None]:
+        """
+        Measure a stage of the detection, if metrics are recorded.
+        """
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.stage("detector", stage)
+
+    def _degraded_output(self, code: str) -> LanguageDetectionOutput:
+        """
+        Output returned when the model is unavailable and a breaker is set.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            The most confident guess of the degraded detectors, or the
+            fallback output if none can guess. Either is marked as degraded.
+        """
+        guesses = [
+            guess
+            for detector in self.degraded
+            if (guess := detector.guess(code)) is not None
+        ]
+        if not guesses:
+            return self._fallback_output().model_copy(update={"degraded": True})
+        guess = max(guesses, key=lambda guess: guess.confidence)
+        return LanguageDetectionOutput(
+            language=guess.language,
+            confidence=guess.confidence,
+            message=f"Detected locally from {guess.reason}, as the model is "
+            "unavailable.",
+            result="detection successful",
+            degraded=True,
+        )
+
+    def _failed_output(self, code: str) -> LanguageDetectionOutput:
+        """
+        Output returned when the detection failed.
+
+        Args:
+            code: The preprocessed code snippet.
+
+        Returns:
+            The degraded output if a breaker is set, otherwise the fallback
+            output.
+        """
+        if self.breaker is None:
+            self._record("fallback")
+            return self._fallback_output()
+        self._record("degraded")
+        return self._degraded_output(code)
+
+    def _shared(
+        self, result: tuple[LanguageDetectionOutput, bool]
+    ) -> LanguageDetectionOutput:
+        """
+        Unpack the outcome of a coalesced call to the LLM.
+
+        Args:
+            result: The output, and whether it was shared with another caller.
+
+        Returns:
+            The output, copied if it was shared.
+        """
+        output, shared = result
+        if shared:
+            self._record("coalesced")
+            return output.model_copy(deep=True)
+        return output
+
+    def _call_llm(
+        self, code: str, config: RunnableConfig | None
+    ) -> LanguageDetectionOutput:
+        """
+        Detect the language of a snippet with the LLM, and store the output.
+        """
+        output = self.chain.invoke(self._chain_input(code), config=config)
+        self._store(code, output)
+        return output
+
+    async def _acall_llm(
+        self, code: str, config: RunnableConfig | None
+    ) -> LanguageDetectionOutput:
+        """
+        Detect the language of a snippet with the LLM, and store the output.
+        """
+        payload = self._chain_input(code)
+        if self.batcher is None or self.router is not None:
+            output = await self.chain.ainvoke(payload, config=config)
+        else:
+            output = await self.batcher.submit(
+                payload, self.chain, config, batch_config=self._batch_config
+            )
+        await self._astore(code, output)
+        return output
 
     def invoke(
         self,
         input: LanguageDetectionInput | dict[str, str],
         config: RunnableConfig | None = None,
-        **kwargs: Any,
+        **kwargs: object,
     ) -> LanguageDetectionOutput:
         """
         Detect programming language in the given code snippet.
 
+        Concurrent detections of the same snippet share a single call to the
+        LLM. Should it fail, every one of them returns the fallback output, or
+        the degraded output if a breaker is set.
+
         Args:
             input:
                 The code snippet to analyze.
@@ -138,20 +713,225 @@ class LanguageDetector(Runnable[LanguageDetectionInput, LanguageDetectionOutput]
         Returns:
             Detected language and confidence scores.
         """
+        del kwargs
         if isinstance(input, dict):
             input = LanguageDetectionInput(**input)
 
+        preprocessed_code = input.code
         try:
-            # Preprocess the input code snippet
-            preprocessed_code = self._preprocess_code(input.code)
-            input.code = preprocessed_code
-            output = self.chain.invoke(input.model_dump(), config=config)
+            with self._stage("detect"):
+                # Preprocess the input code snippet
+                with self._stage("preprocess"):
+                    preprocessed_code = self._preprocess_code(input.code)
+                output = self._answer_locally(preprocessed_code)
+                if output is None:
+                    output = self._shared(
+                        self.in_flight.do(
+                            self._cache_key(preprocessed_code),
+                            lambda: self._call_llm(preprocessed_code, config),
+                        )
+                    )
+
+        except Exception:
+            logger.exception("Language detection failed")
+            output = self._failed_output(preprocessed_code)
+        return self._with_savings(output, input.code, preprocessed_code)
+
+    async def ainvoke(
+        self,
+        input: LanguageDetectionInput | dict[str, str],
+        config: RunnableConfig | None = None,
+        **kwargs: object,
+    ) -> LanguageDetectionOutput:
+        """
+        Detect programming language in the given code snippet asynchronously.
 
+        This awaits the chain directly instead of running the synchronous
+        [`invoke`][LanguageDetector.invoke] in a thread, so the event loop is
+        free to serve other requests while the model is generating. If a
+        batcher is configured, the snippet is detected together with other
+        concurrent requests.
+
+        Concurrent detections of the same snippet share a single call to the
+        LLM. Should it fail, every one of them returns the fallback output, or
+        the degraded output if a breaker is set.
+
+        Args:
+            input:
+                The code snippet to analyze.
+            config:
+                An optional configuration for the LLM.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            Detected language and confidence scores.
+        """
+        del kwargs
+        if isinstance(input, dict):
+            input = LanguageDetectionInput(**input)
+
+        preprocessed_code = input.code
+        try:
+            with self._stage("detect"):
+                with self._stage("preprocess"):
+                    preprocessed_code = self._preprocess_code(input.code)
+                output = await self._aanswer_locally(preprocessed_code)
+                if output is None:
+                    output = self._shared(
+                        await self.in_flight.ado(
+                            self._cache_key(preprocessed_code),
+                            lambda: self._acall_llm(preprocessed_code, config),
+                        )
+                    )
         except Exception:
-            output = LanguageDetectionOutput(
+            logger.exception("Language detection failed")
+            output = self._failed_output(preprocessed_code)
+        return self._with_savings(output, input.code, preprocessed_code)
+
+    async def abatch(
+        self,
+        inputs: Sequence[LanguageDetectionInput | dict[str, str]],
+        config: RunnableConfig | list[RunnableConfig] | None = None,
+        *,
+        return_exceptions: bool = False,  # noqa: ARG002
+        **kwargs: object,
+    ) -> list[LanguageDetectionOutput]:
+        """
+        Detect the programming language of several code snippets concurrently.
+
+        Each snippet is detected with [`ainvoke`][LanguageDetector.ainvoke],
+        with at most `max_concurrency` (from the config) in flight at once.
+
+        Args:
+            inputs:
+                The code snippets to analyze.
+            config:
+                An optional configuration for the LLM, either shared by all
+                inputs or one per input.
+            return_exceptions:
+                Required by the parent class. Failed detections are reported
+                through the fallback output, so no exceptions are returned.
+            kwargs:
+                Additional arguments passed to `ainvoke`.
+
+        Returns:
+            The detection outputs, in the same order as the inputs.
+        """
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+        return await gather_with_concurrency(
+            configs[0].get("max_concurrency"),
+            *(
+                self.ainvoke(item, item_config, **kwargs)
+                for item, item_config in zip(inputs, configs, strict=True)
+            ),
+        )
+
+    async def astream(
+        self,
+        input: LanguageDetectionInput | dict[str, str],
+        config: RunnableConfig | None = None,
+        **kwargs: object,
+    ) -> AsyncIterator[LanguageDetectionOutput]:
+        """
+        Stream the detected language of the given code snippet.
+
+        The detection output is small and only meaningful once complete, so
+        a single, final output is yielded.
+
+        Args:
+            input:
+                The code snippet to analyze.
+            config:
+                An optional configuration for the LLM.
+            kwargs:
+                Additional arguments passed to `ainvoke`.
+
+        Yields:
+            The detected language and confidence scores.
+        """
+        yield await self.ainvoke(input, config, **kwargs)
+
+
+class LocalLanguageDetector(Runnable[LanguageDetectionInput, LanguageDetectionOutput]):
+    """
+    A detector which only uses a local (non-LLM) detection engine.
+
+    This exposes any [`LocalDetector`][pypacter.language_detector.local.LocalDetector]
+    with the same interface as the [`LanguageDetector`][LanguageDetector], so
+    it can be used standalone where no model is available.
+    """
+
+    def __init__(self, engine: LocalDetector, threshold: float = 0.5) -> None:
+        """
+        Instantiates a local language detector.
+
+        Args:
+            engine : The local detection engine.
+            threshold : The confidence below which a guess is reported as
+                needing more context.
+
+        """
+        self.engine = engine
+        self.threshold = threshold
+
+    @property
+    def InputType(self) -> type[LanguageDetectionInput]:  # noqa: N802
+        """
+        The input type for the local detector.
+        """
+        return LanguageDetectionInput
+
+    @property
+    def OutputType(self) -> type[LanguageDetectionOutput]:  # noqa: N802
+        """
+        The output type for the local detector.
+        """
+        return LanguageDetectionOutput
+
+    def invoke(
+        self,
+        input: LanguageDetectionInput | dict[str, str],
+        config: RunnableConfig | None = None,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> LanguageDetectionOutput:
+        """
+        Detect programming language in the given code snippet.
+
+        Args:
+            input:
+                The code snippet to analyze.
+            config:
+                Required by the parent class, but not used as no LLM is
+                involved.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            Detected language and confidence scores.
+        """
+        if isinstance(input, dict):
+            input = LanguageDetectionInput(**input)
+
+        guess = self.engine.guess(input.code.strip())
+        if guess is None:
+            return LanguageDetectionOutput(
                 language="unknown",
                 confidence=0.0,
-                message="unsuccesfull detection. model exception occured",
-                result="unsuccesfull detection. model exception occured",
+                message=f"No language detected by {self.engine.name}.",
+                result="unknown language or no language detected",
             )
-        return output
+        return LanguageDetectionOutput(
+            language=guess.language,
+            confidence=guess.confidence,
+            message=f"Detected locally from {guess.reason}.",
+            result=(
+                "detection successful"
+                if guess.confidence >= self.threshold
+                else "possibility of multiple languages need more context"
+            ),
+        )
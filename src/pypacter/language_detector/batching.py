@@ -0,0 +1,320 @@
+"""
+Micro-batching of language detection requests.
+
+The output of a language detection is tiny compared to its prompt: every call
+pays for the full system prompt (the instructions and format instructions) and
+a round trip to the model. The [`MicroBatcher`][MicroBatcher] amortises both
+over concurrent requests.
+
+Requests arriving within a short window are collected and sent to the model as
+a single prompt listing every snippet, whose answer is a list of results tagged
+with the index of their snippet. The results are then handed back to the
+individual callers. Should the batched answer be unusable (the model failed,
+or returned something that does not parse), the affected snippets fall back to
+individual calls; unless the circuit breaker of the model is open, in which
+case every snippet of the batch fails (and the detector answers locally).
+
+Batching only applies to asynchronous detection, where concurrent requests
+share an event loop. Batches are sent to the primary model, so detectors
+routing between a fast and a primary model do not batch, keeping the routing
+of a detection independent of the traffic around it.
+"""
+
+import asyncio
+import threading
+import time
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import HumanMessagePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableSerializable
+from pydantic import BaseModel, Field
+
+from pypacter.breaker import CircuitOpen
+from pypacter.language_detector import LanguageDetectionOutput, instructions_template
+from pypacter.models import model_errors
+from pypacter.parsers import OutputParser
+from pypacter.templates import human_template
+from pypacter.tokens import message_tokens
+
+__all__ = [
+    "BatchStats",
+    "BatchedLanguageDetection",
+    "MicroBatcher",
+    "SnippetLanguageDetection",
+]
+
+
+def batch_template() -> HumanMessagePromptTemplate:
+    """
+    The prompt presenting several numbered code snippets.
+    """
+    return human_template(
+        Path(__file__).parent / "batch_template.md", "count", "snippets"
+    )
+
+
+class SnippetLanguageDetection(LanguageDetectionOutput):
+    """
+    The detected language of one snippet in a batch.
+    """
+
+    index: int = Field(..., description="The index of the snippet.")
+
+
+class BatchedLanguageDetection(BaseModel):
+    """
+    Output model for the language detection of several snippets at once.
+    """
+
+    results: list[SnippetLanguageDetection] = Field(
+        ..., description="The detection result of each snippet."
+    )
+
+
+class BatchStats(BaseModel):
+    """
+    Counters describing the effectiveness of micro-batching.
+    """
+
+    batches: int = 0
+    snippets: int = 0
+    single_calls: int = 0
+    """
+    Snippets detected on their own, either because no other request arrived in
+    time or because their batch failed.
+    """
+    tokens: int = 0
+    queue_seconds: float = 0.0
+    max_queue_seconds: float = 0.0
+
+    @property
+    def tokens_per_snippet(self) -> float:
+        """
+        The mean number of tokens used per snippet detected in a batch.
+        """
+        batched = self.snippets - self.single_calls
+        return self.tokens / batched if batched else 0.0
+
+    @property
+    def mean_queue_seconds(self) -> float:
+        """
+        The mean time a snippet waited for its batch to be sent.
+        """
+        return self.queue_seconds / self.snippets if self.snippets else 0.0
+
+
+@dataclass
+class _Request:
+    payload: dict[str, str]
+    fallback: RunnableSerializable[dict[str, str], LanguageDetectionOutput]
+    config: RunnableConfig | None
+    batch_config: RunnableConfig | None
+    future: asyncio.Future[LanguageDetectionOutput]
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """
+    Packs concurrent language detection requests into multi-snippet prompts.
+    """
+
+    def __init__(
+        self,
+        model: Runnable,
+        *,
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+    ) -> None:
+        """
+        Create a new batcher.
+
+        Args:
+            model:
+                The model the batched prompts are sent to, usually the `llm` of
+                the detector using the batcher.
+            max_batch_size:
+                The maximum number of snippets in a prompt. A batch is sent as
+                soon as it is full.
+            max_wait:
+                The maximum number of seconds a request waits for others to
+                join its batch.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.parser: OutputParser[BatchedLanguageDetection] = OutputParser(
+            pydantic_object=BatchedLanguageDetection
+        )
+        self.prompt_template = (
+            instructions_template().format(
+                format_instructions=self.parser.get_format_instructions()
+            )
+            + batch_template()
+        )
+        self._pending: list[_Request] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._stats = BatchStats()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stats(self) -> BatchStats:
+        """
+        A snapshot of the batching counters.
+        """
+        with self._stats_lock:
+            return self._stats.model_copy()
+
+    async def submit(
+        self,
+        payload: dict[str, str],
+        fallback: RunnableSerializable[dict[str, str], LanguageDetectionOutput],
+        config: RunnableConfig | None = None,
+        *,
+        batch_config: RunnableConfig | None = None,
+    ) -> LanguageDetectionOutput:
+        """
+        Detect the language of a snippet as part of a batch.
+
+        Args:
+            payload:
+                The prompt variables of the snippet: its `code`, and optionally
+                its pre-filtered `candidates`.
+            fallback:
+                The single-snippet chain used if the batch fails.
+            config:
+                The configuration for the fallback call. Batched calls are
+                shared by several requests, so they are made without it.
+            batch_config:
+                The configuration for the batched call, such as the callbacks
+                recording metrics. It should be the same for every request, as
+                a batch is made with that of its first request.
+
+        Returns:
+            The detected language.
+        """
+        loop = asyncio.get_running_loop()
+        request = _Request(
+            payload, fallback, config, batch_config, loop.create_future()
+        )
+        self._pending.append(request)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await request.future
+
+    def _flush(self) -> None:
+        """
+        Send the pending requests as a batch.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        now = time.perf_counter()
+        waits = [now - request.queued_at for request in batch]
+        with self._stats_lock:
+            self._stats.snippets += len(batch)
+            self._stats.queue_seconds += sum(waits)
+            self._stats.max_queue_seconds = max(self._stats.max_queue_seconds, *waits)
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _render(self, batch: list[_Request]) -> dict[str, str]:
+        """
+        The prompt variables for a batch.
+        """
+        sections = []
+        for index, request in enumerate(batch):
+            section = f"### Snippet {index}\n\n```\n{request.payload['code']}\n```"
+            if "candidates" in request.payload:
+                section += (
+                    "\n\nA local pre-filter ranked these languages as the most "
+                    f"likely, most likely first: {request.payload['candidates']}"
+                )
+            sections.append(section)
+        return {"count": str(len(batch)), "snippets": "\n\n".join(sections)}
+
+    async def _detect(
+        self, batch: list[_Request]
+    ) -> dict[int, LanguageDetectionOutput]:
+        """
+        Detect the languages of a batch with a single prompt.
+
+        Returns:
+            The outputs by index. Snippets missing from the answer, or every
+            snippet if the model failed to answer (see
+            [`model_errors`][pypacter.models.model_errors]), are left out.
+
+        Raises:
+            CircuitOpen: If the circuit breaker of the model is open, so the
+                individual calls would not be made either.
+        """
+        config = batch[0].batch_config
+        try:
+            prompt = await self.prompt_template.ainvoke(self._render(batch), config)
+            messages = prompt.to_messages()
+            response = typing.cast(
+                BaseMessage, await self.model.ainvoke(messages, config)
+            )
+            parsed = self.parser.invoke(response, config)
+        except CircuitOpen:
+            raise
+        except model_errors():
+            return {}
+        with self._stats_lock:
+            self._stats.batches += 1
+            self._stats.tokens += message_tokens(messages, response)
+        return {
+            result.index: LanguageDetectionOutput.model_validate(
+                result.model_dump(exclude={"index"})
+            )
+            for result in parsed.results
+            if 0 <= result.index < len(batch)
+        }
+
+    async def _run(self, batch: list[_Request]) -> None:
+        """
+        Resolve the requests of a batch.
+        """
+        outputs: dict[int, LanguageDetectionOutput | BaseException] = {}
+        if len(batch) > 1:
+            try:
+                outputs.update(await self._detect(batch))
+            except CircuitOpen as error:
+                outputs.update(dict.fromkeys(range(len(batch)), error))
+            except Exception as error:
+                # Not a failure of the model: fail the requests rather than
+                # leave them waiting.
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(error)
+                raise
+        fallbacks = [i for i in range(len(batch)) if i not in outputs]
+        if fallbacks:
+            with self._stats_lock:
+                self._stats.single_calls += len(fallbacks)
+            results = await asyncio.gather(
+                *(
+                    batch[i].fallback.ainvoke(batch[i].payload, config=batch[i].config)
+                    for i in fallbacks
+                ),
+                return_exceptions=True,
+            )
+            outputs.update(zip(fallbacks, results, strict=True))
+
+        for index, request in enumerate(batch):
+            if request.future.done():
+                continue
+            output = outputs[index]
+            if isinstance(output, BaseException):
+                request.future.set_exception(output)
+            else:
+                request.future.set_result(output)
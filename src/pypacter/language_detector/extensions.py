@@ -0,0 +1,105 @@
+"""
+Language of a file from its name.
+
+Most files are named after their language, in which case there is no need to
+detect it. Only unambiguous names are mapped: `.h`, for instance, is shared by
+C and C++ (and Objective-C), so the language of a header must still be
+detected. Likewise `.pl` (Perl or Prolog) and `.fs` (F# or GLSL) are left out.
+"""
+
+from pathlib import PurePath
+
+__all__ = [
+    "EXTENSIONS",
+    "FILENAMES",
+    "language_from_filename",
+]
+
+EXTENSIONS: dict[str, str] = {
+    ".py": "python",
+    ".pyi": "python",
+    ".pyw": "python",
+    ".js": "javascript",
+    ".mjs": "javascript",
+    ".cjs": "javascript",
+    ".jsx": "javascript",
+    ".ts": "typescript",
+    ".mts": "typescript",
+    ".cts": "typescript",
+    ".tsx": "typescript",
+    ".java": "java",
+    ".cs": "csharp",
+    ".go": "go",
+    ".rs": "rust",
+    ".c": "c",
+    ".cc": "cpp",
+    ".cpp": "cpp",
+    ".cxx": "cpp",
+    ".hpp": "cpp",
+    ".hh": "cpp",
+    ".hxx": "cpp",
+    ".rb": "ruby",
+    ".php": "php",
+    ".sh": "bash",
+    ".bash": "bash",
+    ".zsh": "shell",
+    ".sql": "sql",
+    ".html": "html",
+    ".htm": "html",
+    ".css": "css",
+    ".kt": "kotlin",
+    ".kts": "kotlin",
+    ".scala": "scala",
+    ".swift": "swift",
+    ".lua": "lua",
+    ".ps1": "powershell",
+    ".groovy": "groovy",
+    ".ex": "elixir",
+    ".exs": "elixir",
+    ".jl": "julia",
+    ".r": "r",
+    ".dart": "dart",
+    ".hs": "haskell",
+    ".erl": "erlang",
+    ".clj": "clojure",
+    ".vue": "vue",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".json": "json",
+    ".toml": "toml",
+    ".tf": "terraform",
+}
+"""
+The language of files with a given extension, in lower case.
+"""
+
+FILENAMES: dict[str, str] = {
+    "dockerfile": "dockerfile",
+    "makefile": "makefile",
+    "gnumakefile": "makefile",
+    "rakefile": "ruby",
+    "gemfile": "ruby",
+    "cmakelists.txt": "cmake",
+}
+"""
+The language of files with a given name (without directory), in lower case.
+"""
+
+
+def language_from_filename(filename: str) -> str | None:
+    """
+    The language of a file, inferred from its name.
+
+    Args:
+        filename:
+            The name or path of the file.
+
+    Returns:
+        The language, or `None` if the name does not identify a single
+        language.
+    """
+    path = PurePath(filename.strip())
+    name = path.name.lower()
+    if name in FILENAMES:
+        return FILENAMES[name]
+    return EXTENSIONS.get(path.suffix.lower())
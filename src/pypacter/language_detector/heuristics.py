@@ -0,0 +1,331 @@
+"""
+Heuristic language detection.
+
+Pure-Python detector for snippets whose language can be identified from a few
+tell-tale signs, such as a shebang line, a `<?php` tag or a `package main`
+declaration. When no such sign is present, the snippet is scored against
+per-language keyword and punctuation patterns.
+
+The detector is deliberately conservative: it only reports a high confidence
+when the evidence is unambiguous, leaving everything else to the LLM.
+"""
+
+import math
+import re
+from collections.abc import Sequence
+
+from pypacter.language_detector.local import Guess
+
+__all__ = [
+    "HeuristicDetector",
+]
+
+_SHEBANG = re.compile(r"\A#!\s*(?:\S*/)?(?:env\s+(?:-\S+\s+)*)?(?P<program>[\w.+-]+)")
+_SHEBANG_PROGRAMS: dict[str, str] = {
+    "python": "python",
+    "node": "javascript",
+    "deno": "typescript",
+    "ts-node": "typescript",
+    "bash": "bash",
+    "sh": "shell",
+    "zsh": "shell",
+    "dash": "shell",
+    "ksh": "shell",
+    "ruby": "ruby",
+    "perl": "perl",
+    "php": "php",
+    "rscript": "r",
+    "lua": "lua",
+    "pwsh": "powershell",
+    "groovy": "groovy",
+    "swift": "swift",
+    "kotlin": "kotlin",
+    "scala": "scala",
+    "elixir": "elixir",
+    "julia": "julia",
+}
+
+_MAGIC: Sequence[tuple[re.Pattern[str], str, float, str]] = [
+    (re.compile(r"\A\s*<\?php\b"), "php", 0.99, "<?php tag"),
+    (re.compile(r"^package\s+main\s*$", re.MULTILINE), "go", 0.98, "package main"),
+    (
+        re.compile(r"\A\s*<!DOCTYPE\s+html", re.IGNORECASE),
+        "html",
+        0.97,
+        "HTML doctype",
+    ),
+    (
+        re.compile(r"^using\s+System(?:\.[\w.]+)?;\s*$", re.MULTILINE),
+        "csharp",
+        0.95,
+        "using System",
+    ),
+    (
+        re.compile(r"^package\s+[a-z_][\w.]*;\s*$", re.MULTILINE),
+        "java",
+        0.92,
+        "Java package declaration",
+    ),
+    (
+        re.compile(r"^\s*fn\s+main\s*\(\s*\)", re.MULTILINE),
+        "rust",
+        0.95,
+        "fn main()",
+    ),
+    (
+        re.compile(r"^\s*def\s+\w+\s*\([^)]*\)\s*(?:->\s*[^:]+)?:\s*$", re.MULTILINE),
+        "python",
+        0.93,
+        "def ...: function definition",
+    ),
+]
+
+_INCLUDE = re.compile(r"^\s*#\s*include\s*[<\"]", re.MULTILINE)
+_CPP_MARKERS = re.compile(
+    r"\bstd::|#\s*include\s*<(?:iostream|string|vector|map|memory|algorithm)>"
+    r"|\bnamespace\s+\w+|\btemplate\s*<|\bclass\s+\w+\s*[:{]|\bcout\s*<<"
+)
+
+_SIGNALS: dict[str, Sequence[tuple[str, float]]] = {
+    "python": [
+        (r"^\s*(?:from\s+[\w.]+\s+)?import\s+[\w.]+(?:\s+as\s+\w+)?\s*$", 2.0),
+        (r"^\s*(?:el)?if\s+.+:\s*$", 1.5),
+        (
+            r"^\s*(?:for\s+\w+(?:,\s*\w+)*\s+in\s+.+|while\s+.+|else|try|finally):\s*$",
+            1.5,
+        ),
+        (r"^\s*class\s+\w+(?:\(.*\))?:\s*$", 2.5),
+        (r"\bself\.\w+", 1.5),
+        (r"\b(?:None|True|False|elif|lambda|nonlocal)\b", 1.0),
+        (r"^\s*@\w+(?:\.\w+)*(?:\(.*\))?\s*$", 1.0),
+        (r"\bprint\(", 0.5),
+    ],
+    "javascript": [
+        (r"\b(?:const|let|var)\s+\w+\s*=", 1.5),
+        (r"\bfunction\s*\w*\s*\(", 1.5),
+        (r"=>\s*[{(]?", 1.0),
+        (r"\bconsole\.\w+\(", 2.0),
+        (r"\brequire\(['\"]", 2.0),
+        (r"\bmodule\.exports\b|\bexport\s+default\b", 2.0),
+        (r"===|!==", 1.0),
+        (r"\bdocument\.\w+|\bwindow\.\w+", 1.5),
+    ],
+    "typescript": [
+        (r"\binterface\s+\w+\s*\{", 2.0),
+        (r"\b(?:const|let|var)\s+\w+\s*:\s*[\w<>\[\]|]+\s*=", 2.5),
+        (r"\(\s*\w+\s*:\s*(?:string|number|boolean|any|unknown)\b", 2.5),
+        (r"\btype\s+\w+\s*=", 1.5),
+        (r"\bimport\s+.+\s+from\s+['\"]", 1.0),
+        (r"\bconsole\.\w+\(", 1.0),
+    ],
+    "java": [
+        (r"\bpublic\s+(?:static\s+)?(?:final\s+)?(?:class|void|interface)\b", 2.0),
+        (r"\bSystem\.out\.print", 3.0),
+        (r"\bprivate\s+(?:static\s+)?(?:final\s+)?\w+(?:<.*>)?\s+\w+\s*[;=]", 1.5),
+        (r"^\s*import\s+(?:static\s+)?[\w.]+\*?;\s*$", 2.0),
+        (r"@Override\b", 2.0),
+        (r"\bnew\s+\w+(?:<.*>)?\(", 0.5),
+    ],
+    "csharp": [
+        (r"^\s*using\s+[\w.]+;\s*$", 2.0),
+        (r"\bnamespace\s+[\w.]+", 1.5),
+        (r"\bConsole\.Write(?:Line)?\(", 3.0),
+        (r"\bpublic\s+(?:static\s+)?(?:async\s+)?\w+\s+\w+\s*\(", 1.0),
+        (r"\{\s*get;\s*(?:set;)?\s*\}", 3.0),
+        (r"\bvar\s+\w+\s*=\s*new\b", 1.0),
+    ],
+    "go": [
+        (r"^\s*package\s+\w+\s*$", 2.0),
+        (r"\bfunc\s+(?:\(\s*\w+\s+\*?\w+\s*\)\s*)?\w+\s*\(", 2.5),
+        (r":=", 1.5),
+        (r"\bfmt\.\w+\(", 2.5),
+        (r"^\s*import\s+\(\s*$", 1.5),
+        (r"\bchan\b|\bgo\s+func\b|\bdefer\b", 1.5),
+    ],
+    "rust": [
+        (r"\bfn\s+\w+\s*(?:<.*>)?\(", 2.0),
+        (r"\blet\s+mut\s+\w+", 2.5),
+        (r"\b(?:println|format|vec|panic)!\(", 3.0),
+        (r"\bimpl\b(?:\s*<.*>)?\s+\w+", 2.0),
+        (r"^\s*use\s+[\w:]+(?:::\{.*\})?;\s*$", 1.5),
+        (r"&(?:mut\s+)?self\b|->\s*Result<|Option<", 1.5),
+    ],
+    "c": [
+        (r"^\s*#\s*include\s*<\w+\.h>", 2.0),
+        (r"\bprintf\s*\(", 1.5),
+        (r"\b(?:malloc|free|sizeof)\s*\(", 1.5),
+        (r"\bint\s+main\s*\(", 1.5),
+        (r"\bstruct\s+\w+\s*\{", 1.0),
+        (r"->\w+", 0.5),
+    ],
+    "cpp": [
+        (r"\bstd::\w+", 3.0),
+        (r"^\s*#\s*include\s*<\w+>", 2.0),
+        (r"\bcout\s*<<|\bcin\s*>>", 3.0),
+        (r"\btemplate\s*<", 2.0),
+        (r"\bnamespace\s+\w+|\busing\s+namespace\b", 2.0),
+        (r"\bint\s+main\s*\(", 1.0),
+    ],
+    "ruby": [
+        (r"^\s*def\s+\w+[?!]?(?:\(.*\))?\s*$", 2.0),
+        (r"^\s*end\s*$", 1.5),
+        (r"\bputs\s", 2.0),
+        (r"\brequire\s+['\"]", 1.5),
+        (r"\b\w+\.each\s+do\s*\|", 2.5),
+        (r"@\w+\s*=", 1.0),
+    ],
+    "php": [
+        (r"\$\w+\s*=", 2.0),
+        (r"\becho\s", 1.5),
+        (r"->\w+\(", 0.5),
+        (r"\bfunction\s+\w+\s*\(\s*\$", 2.5),
+    ],
+    "bash": [
+        (r"^\s*(?:if|while)\s+\[\[?\s", 2.5),
+        (r"^\s*(?:fi|done|esac)\s*$", 2.5),
+        (r"\$\{?\w+\}?", 0.5),
+        (r"^\s*echo\s", 1.0),
+        (r"^\s*export\s+\w+=", 1.5),
+        (r"^\s*\w+\(\)\s*\{", 1.5),
+    ],
+    "sql": [
+        (r"\bSELECT\b.+\bFROM\b", 3.0),
+        (r"\b(?:INSERT\s+INTO|UPDATE\s+\w+\s+SET|DELETE\s+FROM)\b", 3.0),
+        (r"\bCREATE\s+(?:TABLE|INDEX|VIEW)\b", 3.0),
+        (r"\b(?:WHERE|JOIN|GROUP\s+BY|ORDER\s+BY)\b", 1.0),
+    ],
+    "html": [
+        (r"<(?:html|head|body|div|span|p|a|ul|li|script|table)\b[^>]*>", 2.0),
+        (r"</\w+>", 1.0),
+    ],
+    "css": [
+        (r"^\s*[.#]?[\w-]+(?:(?:\s*[,>+~]\s*|\s+)[.#]?[\w-]+)*\s*\{\s*$", 1.0),
+        (r"^\s*[\w-]+\s*:\s*[^;{}]+;\s*$", 1.5),
+        (r"@media\b|@import\b", 2.0),
+    ],
+}
+"""
+Weighted patterns which are characteristic of each language.
+
+Each pattern contributes its weight once per matching line, up to three lines,
+so that a single repeated construct cannot dominate the score.
+"""
+
+_COMPILED_SIGNALS: dict[str, list[tuple[re.Pattern[str], float]]] = {
+    language: [
+        (re.compile(pattern, re.MULTILINE), weight) for pattern, weight in signals
+    ]
+    for language, signals in _SIGNALS.items()
+}
+_MAX_MATCHES = 3
+_EVIDENCE_SCALE = 6.0
+"""
+Score at which the evidence is considered substantial. Confidence grows with
+the winning score, approaching the margin over the runner-up as the score
+grows well beyond this value.
+"""
+
+
+class HeuristicDetector:
+    """
+    Detects languages from shebangs, magic tokens and weighted keyword scores.
+    """
+
+    name = "heuristic"
+
+    def guess(self, code: str) -> Guess | None:
+        """
+        Guess the programming language of a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            The most likely language, or `None` if there is no evidence for
+            any language.
+        """
+        if not code:
+            return None
+        return self._shebang(code) or self._magic(code) or self._score(code)
+
+    @staticmethod
+    def _shebang(code: str) -> Guess | None:
+        match = _SHEBANG.match(code)
+        if match is None:
+            return None
+        program = match["program"].lower().rstrip("0123456789.")
+        language = _SHEBANG_PROGRAMS.get(program)
+        if language is None:
+            return None
+        return Guess(language=language, confidence=0.99, reason=f"shebang {program}")
+
+    @staticmethod
+    def _magic(code: str) -> Guess | None:
+        for pattern, language, confidence, reason in _MAGIC:
+            if pattern.search(code):
+                return Guess(language=language, confidence=confidence, reason=reason)
+        if _INCLUDE.search(code):
+            if _CPP_MARKERS.search(code):
+                return Guess(
+                    language="cpp", confidence=0.92, reason="#include with C++"
+                )
+            return Guess(language="c", confidence=0.85, reason="#include")
+        return None
+
+    @staticmethod
+    def _score(code: str) -> Guess | None:
+        scores = {
+            language: _score_language(code, signals)
+            for language, signals in _COMPILED_SIGNALS.items()
+        }
+        _punctuation(code, scores)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (language, best), (_, runner_up) = ranked[0], ranked[1]
+        if best <= 0:
+            return None
+        margin = (best - runner_up) / best
+        evidence = 1.0 - math.exp(-best / _EVIDENCE_SCALE)
+        return Guess(
+            language=language,
+            confidence=round(margin * evidence, 3),
+            reason=f"keyword score {best:.1f} vs {runner_up:.1f}",
+        )
+
+
+def _score_language(
+    code: str, signals: Sequence[tuple[re.Pattern[str], float]]
+) -> float:
+    """
+    Sum the weights of the signals found in the code.
+    """
+    score = 0.0
+    for pattern, weight in signals:
+        matches = 0
+        for _ in pattern.finditer(code):
+            matches += 1
+            if matches == _MAX_MATCHES:
+                break
+        score += weight * matches
+    return score
+
+
+def _punctuation(code: str, scores: dict[str, float]) -> None:
+    """
+    Adjust the scores based on the punctuation ending each line.
+
+    Lines ending in `;` or braces favour the C family, while lines ending in a
+    colon without braces favour Python.
+    """
+    lines = [line.rstrip() for line in code.splitlines() if line.strip()]
+    if not lines:
+        return
+    semicolons = sum(line.endswith(";") for line in lines) / len(lines)
+    braces = sum(line.endswith(("{", "}")) for line in lines) / len(lines)
+    colons = sum(line.endswith(":") for line in lines) / len(lines)
+    for language in ("javascript", "typescript", "java", "csharp", "c", "cpp", "php"):
+        scores[language] += 2.0 * (semicolons + braces)
+    for language in ("go", "rust"):
+        scores[language] += 2.0 * braces
+    if braces == 0:
+        scores["python"] += 3.0 * colons
@@ -0,0 +1,288 @@
+"""
+Pygments-based language detection.
+
+Scores a code snippet against the [Pygments](https://pygments.org/) lexers of
+a restricted set of candidate languages. Each lexer contributes:
+
+-   its `analyse_text` score, which recognises a handful of tell-tale signs;
+-   the keywords it recognises in the snippet, each weighted by how few of the
+    other lexers also recognise it (so `return`, a keyword almost everywhere,
+    counts for little, while `fn` or `elif` count for a lot);
+-   a penalty for the proportion of the snippet it fails to lex.
+
+Lexers are comparatively expensive to create, so they are collected once into
+a [`LexerIndex`][LexerIndex] which is shared by every detector using the same
+set of languages. The index should be built at startup (see
+[`get_lexer_index`][get_lexer_index]) so that the cost is not paid by the
+first request.
+
+Pygments is an optional dependency, installed with the `pygments` extra.
+"""
+
+import functools
+import logging
+import math
+import re
+import time
+from collections import Counter
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Error, Keyword, Name
+
+from pypacter.language_detector.local import Guess
+
+if TYPE_CHECKING:
+    from pygments.lexer import Lexer
+
+__all__ = [
+    "DEFAULT_LANGUAGES",
+    "LexerIndex",
+    "PygmentsDetector",
+    "get_lexer_index",
+]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGES: dict[str, str] = {
+    "python": "python",
+    "javascript": "javascript",
+    "typescript": "typescript",
+    "java": "java",
+    "kotlin": "kotlin",
+    "scala": "scala",
+    "csharp": "csharp",
+    "go": "go",
+    "rust": "rust",
+    "c": "c",
+    "cpp": "cpp",
+    "swift": "swift",
+    "php": "php",
+    "ruby": "ruby",
+    "perl": "perl",
+    "lua": "lua",
+    "r": "r",
+    "bash": "bash",
+    "sql": "sql",
+    "html": "html",
+    "css": "css",
+    "json": "json",
+    "yaml": "yaml",
+}
+"""
+The default allow-list of candidate languages, mapped to their Pygments lexer
+alias.
+"""
+
+_IDENTIFIER = re.compile(r"[A-Za-z_]\w*")
+_MAX_ERROR_RATIO = 0.2
+"""
+Lexers which fail to lex more than this proportion of the tokens are not
+considered at all.
+"""
+_ANALYSE_WEIGHT = 0.5
+_SOFTMAX_TEMPERATURE = 0.5
+
+
+class LexerIndex:
+    """
+    The lexers of a fixed set of candidate languages.
+    """
+
+    def __init__(self, languages: dict[str, str]) -> None:
+        """
+        Build the index.
+
+        Args:
+            languages:
+                The candidate languages, mapped to their Pygments lexer alias.
+        """
+        start = time.perf_counter()
+        self.lexers: dict[str, Lexer] = {
+            language: get_lexer_by_name(alias, stripnl=False)
+            for language, alias in languages.items()
+        }
+        self.build_seconds = time.perf_counter() - start
+        """
+        The time it took to build the index, in seconds.
+        """
+        logger.info(
+            "Built Pygments index of %d lexers in %.3fs",
+            len(self.lexers),
+            self.build_seconds,
+        )
+
+    @property
+    def languages(self) -> list[str]:
+        """
+        The candidate languages.
+        """
+        return list(self.lexers)
+
+
+@functools.cache
+def _cached_index(languages: tuple[tuple[str, str], ...]) -> LexerIndex:
+    return LexerIndex(dict(languages))
+
+
+def get_lexer_index(languages: dict[str, str] | None = None) -> LexerIndex:
+    """
+    Get the shared index for a set of candidate languages.
+
+    The index is built on first use and reused afterwards.
+
+    Args:
+        languages:
+            The candidate languages, mapped to their Pygments lexer alias.
+            Defaults to [`DEFAULT_LANGUAGES`][DEFAULT_LANGUAGES].
+
+    Returns:
+        The lexer index.
+    """
+    return _cached_index(tuple(sorted((languages or DEFAULT_LANGUAGES).items())))
+
+
+class PygmentsDetector:
+    """
+    Detects languages by scoring a snippet with Pygments lexers.
+
+    The detector can be used as a fast-path tier of the
+    [`LanguageDetector`][pypacter.language_detector.LanguageDetector], or as a
+    pre-filter narrowing down the candidate languages given to the LLM.
+    """
+
+    name = "pygments"
+
+    def __init__(
+        self,
+        languages: Iterable[str] | None = None,
+        sample_chars: int = 2000,
+        candidates_count: int = 5,
+    ) -> None:
+        """
+        Create a new detector.
+
+        Args:
+            languages:
+                The allow-list of candidate languages, from
+                [`DEFAULT_LANGUAGES`][DEFAULT_LANGUAGES]. Fewer languages
+                make scoring faster. Defaults to all of them.
+            sample_chars:
+                Only the first `sample_chars` characters of a snippet are
+                lexed, bounding the cost of scoring large files.
+            candidates_count:
+                The number of candidates returned by
+                [`candidates`][PygmentsDetector.candidates].
+
+        Raises:
+            ValueError: If a language of the allow-list is not supported.
+        """
+        allowed = DEFAULT_LANGUAGES
+        if languages is not None:
+            languages = list(languages)
+            unknown = [name for name in languages if name not in DEFAULT_LANGUAGES]
+            if unknown:
+                msg = (
+                    f"Unsupported languages: {', '.join(map(repr, unknown))}. "
+                    f"Supported languages are: {', '.join(DEFAULT_LANGUAGES)}."
+                )
+                raise ValueError(msg)
+            allowed = {language: DEFAULT_LANGUAGES[language] for language in languages}
+        self.index = get_lexer_index(allowed)
+        self.sample_chars = sample_chars
+        self.candidates_count = candidates_count
+
+    def rank(self, code: str) -> list[tuple[str, float]]:
+        """
+        Rank the candidate languages for a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            The candidate languages which could lex the snippet, with their
+            probability, most likely first.
+        """
+        sample = code[: self.sample_chars]
+        if not sample.strip():
+            return []
+
+        keywords: dict[str, set[str]] = {}
+        errors: dict[str, float] = {}
+        for language, lexer in self.index.lexers.items():
+            tokens = [
+                (kind, value)
+                for kind, value in lexer.get_tokens(sample)
+                if value.strip()
+            ]
+            if not tokens:
+                continue
+            errors[language] = sum(kind in Error for kind, _ in tokens) / len(tokens)
+            keywords[language] = {
+                value
+                for kind, value in tokens
+                if (kind in Keyword or kind in Name.Builtin)
+                and _IDENTIFIER.fullmatch(value)
+            }
+
+        frequency = Counter(word for words in keywords.values() for word in words)
+        scores = {
+            language: (
+                _ANALYSE_WEIGHT * self.index.lexers[language].analyse_text(sample)
+                + sum(1 / frequency[word] for word in words)
+            )
+            * (1 - errors[language]) ** 4
+            for language, words in keywords.items()
+            if errors[language] <= _MAX_ERROR_RATIO
+        }
+        if not scores:
+            return []
+
+        top = max(scores.values())
+        weights = {
+            language: math.exp((score - top) / _SOFTMAX_TEMPERATURE)
+            for language, score in scores.items()
+        }
+        total = sum(weights.values())
+        return sorted(
+            ((language, weight / total) for language, weight in weights.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+    def guess(self, code: str) -> Guess | None:
+        """
+        Guess the programming language of a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            The most likely language, or `None` if no lexer could make sense
+            of the snippet.
+        """
+        ranking = self.rank(code)
+        if not ranking:
+            return None
+        language, probability = ranking[0]
+        return Guess(
+            language=language,
+            confidence=round(probability, 3),
+            reason="Pygments lexer scores",
+        )
+
+    def candidates(self, code: str) -> list[str]:
+        """
+        The most likely languages of a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            Up to `candidates_count` languages, most likely first.
+        """
+        return [language for language, _ in self.rank(code)[: self.candidates_count]]
@@ -0,0 +1,72 @@
+"""
+Local language detection.
+
+Interface shared by the language detection tiers which run locally, without
+calling a model. These are cheap enough to run before the LLM, and can answer
+directly when they are confident.
+"""
+
+from typing import Protocol
+
+from pydantic import BaseModel, Field
+
+__all__ = [
+    "CandidateFilter",
+    "Guess",
+    "LocalDetector",
+]
+
+
+class Guess(BaseModel):
+    """
+    A language guessed by a local detector.
+    """
+
+    language: str = Field(..., description="The guessed programming language.")
+    confidence: float = Field(
+        ..., ge=0.0, le=1.0, description="The confidence of the guess."
+    )
+    reason: str = Field(..., description="What the guess was based on.")
+
+
+class LocalDetector(Protocol):
+    """
+    A language detector which runs locally.
+    """
+
+    name: str
+    """
+    Name of the detector, used to report which tier answered.
+    """
+
+    def guess(self, code: str) -> Guess | None:
+        """
+        Guess the programming language of a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            The most likely language, or `None` if no guess can be made.
+        """
+        ...
+
+
+class CandidateFilter(Protocol):
+    """
+    Narrows down the languages the LLM should consider for a snippet.
+    """
+
+    def candidates(self, code: str) -> list[str]:
+        """
+        The most likely languages of a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            The candidate languages, most likely first.
+        """
+        ...
@@ -0,0 +1,439 @@
+"""
+N-gram language classifier.
+
+An offline language detection engine: a multinomial naive Bayes model over
+hashed byte n-grams. It needs no network access, and classifies a snippet in a
+fraction of a millisecond, as both feature extraction and scoring are
+vectorized with NumPy:
+
+-   The n-grams of a snippet are hashed with a polynomial rolling hash, one
+    array operation per n-gram length, into a fixed-size feature space.
+-   The model stores one row of log-probabilities per hashed feature, so
+    scoring a snippet gathers only the rows of the features it contains.
+
+Naive Bayes is notoriously over-confident, so the log-likelihoods are divided
+by the number of n-grams and scaled by a factor fitted on held-out samples
+during training, yielding calibrated probabilities.
+
+A model is a directory holding the weight matrix (`weights.npy`), which is
+memory-mapped when loaded, and its metadata (`model.json`). Models are built
+from a labelled corpus with the training command:
+
+```console
+python -m pypacter.language_detector.ngram CORPUS_DIR MODEL_DIR
+```
+
+where each sub-directory of `CORPUS_DIR` is named after a language and
+contains sample files of that language.
+
+NumPy is an optional dependency, installed with the `ngram` extra.
+"""
+
+import argparse
+import json
+import logging
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from pypacter.language_detector.local import Guess
+
+__all__ = [
+    "NgramClassifier",
+    "main",
+]
+
+logger = logging.getLogger(__name__)
+
+_PRIME = np.uint64(0x100000001B3)
+_SEED = np.uint64(0xCBF29CE484222325)
+_MIX = np.uint64(29)
+_SCALES = np.geomspace(0.1, 100.0, 61)
+"""
+Candidate scale factors tried when calibrating.
+"""
+FORMAT_VERSION = 1
+
+
+def hash_ngrams(
+    code: str,
+    n_features: int,
+    ngram_range: tuple[int, int] = (1, 4),
+    max_chars: int = 4096,
+) -> npt.NDArray[np.int64]:
+    """
+    Hash the byte n-grams of a code snippet.
+
+    Args:
+        code:
+            The code snippet.
+        n_features:
+            The size of the hashed feature space.
+        ngram_range:
+            The smallest and largest n-gram length, inclusive.
+        max_chars:
+            Only the first `max_chars` characters are considered.
+
+    Returns:
+        The feature index of every n-gram, with repetitions.
+    """
+    data = np.frombuffer(
+        code[:max_chars].encode("utf-8", errors="replace"), dtype=np.uint8
+    ).astype(np.uint64)
+    low, high = ngram_range
+    hashes = []
+    for n in range(low, min(high, len(data)) + 1):
+        count = len(data) - n + 1
+        rolling = np.full(count, _SEED ^ np.uint64(n), dtype=np.uint64)
+        for offset in range(n):
+            rolling = rolling * _PRIME + data[offset : offset + count]
+        hashes.append(rolling ^ (rolling >> _MIX))
+    if not hashes:
+        return np.empty(0, dtype=np.int64)
+    return (np.concatenate(hashes) % np.uint64(n_features)).astype(np.int64)
+
+
+class NgramClassifier:
+    """
+    Naive Bayes language classifier over hashed byte n-grams.
+    """
+
+    name = "ngram"
+
+    def __init__(  # noqa: PLR0913
+        self,
+        labels: Sequence[str],
+        weights: npt.NDArray[np.float32],
+        log_prior: npt.NDArray[np.float32],
+        *,
+        scale: float = 1.0,
+        ngram_range: tuple[int, int] = (1, 4),
+        max_chars: int = 4096,
+    ) -> None:
+        """
+        Create a classifier from trained parameters.
+
+        Most callers should use [`train`][NgramClassifier.train] or
+        [`load`][NgramClassifier.load] instead.
+
+        Args:
+            labels:
+                The languages, in the order of the weight columns.
+            weights:
+                The log-probability of each hashed feature given each
+                language, with shape `(n_features, n_labels)`.
+            log_prior:
+                The log-probability of each language.
+            scale:
+                The calibration factor applied to the length-normalized
+                log-likelihoods.
+            ngram_range:
+                The smallest and largest n-gram length, inclusive.
+            max_chars:
+                Only the first `max_chars` characters of a snippet are used.
+        """
+        self.labels = list(labels)
+        self.weights = weights
+        self.log_prior = log_prior
+        self.scale = scale
+        self.ngram_range = ngram_range
+        self.max_chars = max_chars
+
+    @property
+    def n_features(self) -> int:
+        """
+        The size of the hashed feature space.
+        """
+        return int(self.weights.shape[0])
+
+    def _features(self, code: str) -> npt.NDArray[np.int64]:
+        return hash_ngrams(code, self.n_features, self.ngram_range, self.max_chars)
+
+    def _logits(self, features: npt.NDArray[np.int64]) -> npt.NDArray[np.float64]:
+        """
+        Calibrated, unnormalized log-probabilities of each language.
+        """
+        index, counts = np.unique(features, return_counts=True)
+        log_likelihood = counts.astype(np.float64) @ self.weights[index]
+        return self.scale * log_likelihood / len(features) + self.log_prior
+
+    def predict_proba(self, code: str) -> dict[str, float]:
+        """
+        The probability of each language for a code snippet.
+
+        Args:
+            code:
+                The code snippet.
+
+        Returns:
+            The probability of each language, or an empty dictionary if the
+            snippet is empty.
+        """
+        features = self._features(code)
+        if not len(features):
+            return {}
+        logits = self._logits(features)
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        return dict(zip(self.labels, probabilities.tolist(), strict=True))
+
+    def guess(self, code: str) -> Guess | None:
+        """
+        Guess the programming language of a code snippet.
+
+        Args:
+            code:
+                The preprocessed code snippet.
+
+        Returns:
+            The most likely language, or `None` if the snippet is empty.
+        """
+        probabilities = self.predict_proba(code)
+        if not probabilities:
+            return None
+        language = max(probabilities, key=probabilities.__getitem__)
+        return Guess(
+            language=language,
+            confidence=round(probabilities[language], 3),
+            reason="n-gram classifier",
+        )
+
+    @classmethod
+    def train(  # noqa: PLR0913
+        cls,
+        samples: Sequence[str],
+        labels: Sequence[str],
+        *,
+        n_features: int = 2**16,
+        ngram_range: tuple[int, int] = (1, 4),
+        max_chars: int = 4096,
+        alpha: float = 0.1,
+        holdout: float = 0.2,
+        seed: int = 0,
+    ) -> "NgramClassifier":
+        """
+        Train a classifier on labelled samples.
+
+        Args:
+            samples:
+                The code snippets.
+            labels:
+                The language of each snippet.
+            n_features:
+                The size of the hashed feature space.
+            ngram_range:
+                The smallest and largest n-gram length, inclusive.
+            max_chars:
+                Only the first `max_chars` characters of a snippet are used.
+            alpha:
+                The additive (Laplace) smoothing applied to feature counts.
+            holdout:
+                The fraction of samples held out to calibrate the confidence.
+                The final model is trained on all samples.
+            seed:
+                Seed for the random hold-out split.
+
+        Returns:
+            The trained classifier.
+
+        Raises:
+            ValueError: If there are no samples, or the number of samples and
+                labels differ.
+        """
+        if not samples or len(samples) != len(labels):
+            msg = "Expected the same, non-zero, number of samples and labels."
+            raise ValueError(msg)
+
+        names = sorted(set(labels))
+        targets = np.array([names.index(label) for label in labels])
+        features = [
+            hash_ngrams(sample, n_features, ngram_range, max_chars)
+            for sample in samples
+        ]
+
+        def fit(rows: npt.NDArray[np.int64]) -> "NgramClassifier":
+            counts = np.zeros((n_features, len(names)), dtype=np.float64)
+            for column in range(len(names)):
+                selected = [features[row] for row in rows if targets[row] == column]
+                if selected:
+                    counts[:, column] = np.bincount(
+                        np.concatenate(selected), minlength=n_features
+                    )
+            weights = np.log(counts + alpha) - np.log(
+                counts.sum(axis=0) + alpha * n_features
+            )
+            prior = np.bincount(targets[rows], minlength=len(names)) + 1.0
+            return cls(
+                names,
+                weights.astype(np.float32),
+                np.log(prior / prior.sum()).astype(np.float32),
+                ngram_range=ngram_range,
+                max_chars=max_chars,
+            )
+
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(samples))
+        n_holdout = int(len(samples) * holdout)
+        scale = 1.0
+        if n_holdout:
+            calibration = fit(order[n_holdout:])
+            scale = calibration._calibrate(  # noqa: SLF001
+                [features[row] for row in order[:n_holdout]],
+                targets[order[:n_holdout]],
+            )
+        model = fit(order)
+        model.scale = scale
+        return model
+
+    def _calibrate(
+        self,
+        features: Sequence[npt.NDArray[np.int64]],
+        targets: npt.NDArray[np.int64],
+    ) -> float:
+        """
+        Find the scale minimizing the log-loss on held-out samples.
+        """
+        kept = [i for i, sample in enumerate(features) if len(sample)]
+        if not kept:
+            return 1.0
+        self.scale = 1.0
+        base = np.stack([self._logits(features[i]) - self.log_prior for i in kept])
+        truth = targets[kept]
+        losses = []
+        for scale in _SCALES:
+            logits = scale * base + self.log_prior
+            logits -= logits.max(axis=1, keepdims=True)
+            log_norm = np.log(np.exp(logits).sum(axis=1))
+            losses.append(
+                float(np.mean(log_norm - logits[np.arange(len(kept)), truth]))
+            )
+        return float(_SCALES[int(np.argmin(losses))])
+
+    def save(self, path: str | Path) -> None:
+        """
+        Save the classifier to a directory.
+
+        Args:
+            path:
+                The directory, created if need be.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "weights.npy", np.ascontiguousarray(self.weights))
+        metadata: dict[str, Any] = {
+            "format_version": FORMAT_VERSION,
+            "labels": self.labels,
+            "log_prior": self.log_prior.tolist(),
+            "scale": self.scale,
+            "ngram_range": list(self.ngram_range),
+            "max_chars": self.max_chars,
+        }
+        (path / "model.json").write_text(json.dumps(metadata, indent=2))
+
+    @classmethod
+    def load(cls, path: str | Path) -> "NgramClassifier":
+        """
+        Load a classifier from a directory.
+
+        The weight matrix is memory-mapped rather than read into memory, so
+        loading is near-instant and the pages are shared between processes.
+
+        Args:
+            path:
+                The directory the classifier was saved to.
+
+        Returns:
+            The classifier.
+
+        Raises:
+            ValueError: If the model was saved in an unsupported format.
+        """
+        path = Path(path)
+        metadata = json.loads((path / "model.json").read_text())
+        if metadata.get("format_version") != FORMAT_VERSION:
+            msg = f"Unsupported n-gram model format in {path}"
+            raise ValueError(msg)
+        low, high = metadata["ngram_range"]
+        return cls(
+            metadata["labels"],
+            np.load(path / "weights.npy", mmap_mode="r"),
+            np.asarray(metadata["log_prior"], dtype=np.float32),
+            scale=metadata["scale"],
+            ngram_range=(low, high),
+            max_chars=metadata["max_chars"],
+        )
+
+
+def read_corpus(path: Path) -> tuple[list[str], list[str]]:
+    """
+    Read a labelled corpus.
+
+    Args:
+        path:
+            A directory with one sub-directory per language, each containing
+            sample files (at any depth) of that language.
+
+    Returns:
+        The samples and their labels.
+    """
+    samples: list[str] = []
+    labels: list[str] = []
+    for language in sorted(p for p in path.iterdir() if p.is_dir()):
+        for file in sorted(p for p in language.rglob("*") if p.is_file()):
+            samples.append(file.read_text(errors="replace"))
+            labels.append(language.name)
+    return samples, labels
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """
+    Train an n-gram classifier from the command line.
+
+    Args:
+        argv:
+            The command line arguments. Defaults to `sys.argv`.
+    """
+    parser = argparse.ArgumentParser(
+        description="Train the n-gram language classifier from a corpus."
+    )
+    parser.add_argument("corpus", type=Path, help="directory of language folders")
+    parser.add_argument("output", type=Path, help="directory to save the model to")
+    parser.add_argument("--features", type=int, default=2**16)
+    parser.add_argument("--ngram-min", type=int, default=1)
+    parser.add_argument("--ngram-max", type=int, default=4)
+    parser.add_argument("--max-chars", type=int, default=4096)
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    samples, labels = read_corpus(args.corpus)
+    start = time.perf_counter()
+    model = NgramClassifier.train(
+        samples,
+        labels,
+        n_features=args.features,
+        ngram_range=(args.ngram_min, args.ngram_max),
+        max_chars=args.max_chars,
+        alpha=args.alpha,
+        holdout=args.holdout,
+        seed=args.seed,
+    )
+    model.save(args.output)
+    logger.info(
+        "Trained on %d samples of %d languages in %.2fs (scale %.3g); saved to %s",
+        len(samples),
+        len(model.labels),
+        time.perf_counter() - start,
+        model.scale,
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Token-budgeted sampling of code for language detection.
+
+Detecting the language of a file does not require the whole file: a few dozen
+lines are as telling as a few thousand, at a fraction of the tokens. The
+[`CodeSampler`][CodeSampler] reduces code to a representative sample within a
+token budget:
+
+-   A license header (a leading comment block mentioning a license or
+    copyright) is removed, as it reads the same in every language.
+-   Long string literals are shortened, and runs of data lines (such as the
+    rows of an embedded table) are collapsed to their first row.
+-   If the code still exceeds the budget, the sample is made of its first and
+    last lines, and of the lines in between with the most distinctive syntax
+    (imports, definitions, ...), in their original order. Omitted lines are
+    marked with `...`.
+
+Token counts are estimated locally, see [`tokens`][pypacter.tokens].
+"""
+
+import re
+from collections.abc import Iterable, Sequence
+
+from pypacter.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+__all__ = [
+    "CodeSampler",
+    "clean_lines",
+]
+
+_GAP = "..."
+_COMMENT = re.compile(r"^\s*(?:#(?!include|define|if|pragma|!)|//|/\*|\*|--|;|<!--)")
+_LICENSE = re.compile(r"licen[cs]e|copyright|\(c\)|spdx", re.IGNORECASE)
+_STRING = re.compile(r"""(["'`])(?:\\.|(?!\1).)*\1""")
+_DATA = re.compile(r"""^[\s\d.,:;+\-_()\[\]{}"'`]*,[\s\d.,:;+\-_()\[\]{}"'`]*$""")
+_SIGNAL = re.compile(
+    r"^\s*(?:#include|#!|<\?php|<!doctype|<html|@\w|"
+    r"(?:import|from|package|using|require|use|module|namespace|def|class|"
+    r"struct|enum|interface|trait|impl|fn|func|function|public|private|"
+    r"protected|static|const|let|var|val|template|select|create)\b)",
+    re.IGNORECASE,
+)
+
+
+def _strip_license(lines: Sequence[str]) -> Sequence[str]:
+    """
+    Remove the license header, if any, keeping a leading shebang.
+    """
+    start = 1 if lines and lines[0].startswith("#!") else 0
+    end = start
+    while end < len(lines) and (not lines[end].strip() or _COMMENT.match(lines[end])):
+        end += 1
+    if end > start and _LICENSE.search("\n".join(lines[start:end])):
+        return [*lines[:start], *lines[end:]]
+    return lines
+
+
+def clean_lines(
+    lines: Sequence[str], max_line_chars: int = 200, max_string_chars: int = 40
+) -> list[str]:
+    """
+    Remove the parts of code which do not help telling its language.
+
+    Args:
+        lines:
+            The lines of code.
+        max_line_chars:
+            The length at which lines are truncated.
+        max_string_chars:
+            The length at which string literals are shortened.
+
+    Returns:
+        The lines without license header, with long string literals shortened
+        and runs of data lines collapsed.
+    """
+
+    def shorten(match: re.Match[str]) -> str:
+        literal = match[0]
+        if len(literal) <= max_string_chars:
+            return literal
+        quote = match[1]
+        return f"{literal[: max_string_chars // 2]}{_GAP}{quote}"
+
+    cleaned: list[str] = []
+    in_data = False
+    for line in _strip_license(lines):
+        data = bool(_DATA.match(_STRING.sub('""', line)))
+        if data and in_data:
+            if cleaned[-1] != _GAP:
+                cleaned.append(_GAP)
+            continue
+        in_data = data
+        cleaned.append(_STRING.sub(shorten, line)[:max_line_chars])
+    return cleaned
+
+
+def _take(indices: Iterable[int], cost: Sequence[int], allowance: int) -> list[int]:
+    """
+    Take lines in order for as long as they fit within an allowance.
+    """
+    taken = []
+    for index in indices:
+        if cost[index] > allowance:
+            break
+        allowance -= cost[index]
+        taken.append(index)
+    return taken
+
+
+class CodeSampler:
+    """
+    Reduces code to a representative sample within a token budget.
+
+    Code which fits within the budget is returned whole, only stripped of
+    surrounding whitespace.
+    """
+
+    def __init__(
+        self,
+        budget: int = 1024,
+        head: float = 0.4,
+        tail: float = 0.2,
+        max_line_chars: int = 200,
+    ) -> None:
+        """
+        Create a new sampler.
+
+        Args:
+            budget:
+                The maximum number of tokens of a sample.
+            head:
+                The share of the budget given to the first lines of the code.
+            tail:
+                The share of the budget given to the last lines of the code.
+                The rest goes to the most distinctive lines in between.
+            max_line_chars:
+                The length at which the lines of a sample are truncated.
+        """
+        self.budget = budget
+        self.head = head
+        self.tail = tail
+        self.max_line_chars = max_line_chars
+
+    def __call__(self, code: str) -> str:
+        """
+        Sample code.
+
+        Args:
+            code:
+                The code to sample.
+
+        Returns:
+            The sample.
+        """
+        code = code.strip()
+        if estimate_tokens(code) <= self.budget:
+            return code
+        lines = clean_lines(code.splitlines(), self.max_line_chars)
+        cleaned = "\n".join(lines)
+        if estimate_tokens(cleaned) <= self.budget:
+            return cleaned
+        return "\n".join(self._select(lines))
+
+    def _select(self, lines: Sequence[str]) -> list[str]:
+        """
+        Select the lines of the sample.
+
+        Every line costs its length and a line break, and is assumed to be
+        preceded by a gap marker unless it belongs to the head or the tail.
+        """
+        limit = int(self.budget * CHARS_PER_TOKEN) - len(_GAP) - 1
+        cost = [len(line) + 1 for line in lines]
+        head = _take(range(len(lines)), cost, int(limit * self.head))
+        tail = _take(
+            reversed(range(len(head), len(lines))), cost, int(limit * self.tail)
+        )
+        allowance = limit - sum(cost[i] for i in (*head, *tail))
+
+        middle = []
+        for index in range(len(head), len(lines) - len(tail)):
+            if not _SIGNAL.match(lines[index]):
+                continue
+            line_cost = cost[index] + len(_GAP) + 1
+            if line_cost <= allowance:
+                allowance -= line_cost
+                middle.append(index)
+
+        sample: list[str] = []
+        previous = -1
+        for index in sorted({*head, *middle, *tail}):
+            if index != previous + 1 and sample[-1:] != [_GAP]:
+                sample.append(_GAP)
+            sample.append(lines[index])
+            previous = index
+        return sample
@@ -0,0 +1,462 @@
+"""
+Adaptive concurrency limiting.
+
+A fixed number of concurrent calls to the model is wrong both ways: too low,
+and throughput is wasted when the provider has capacity to spare; too high, and
+the provider answers with rate-limit errors which the retries only make worse.
+An [`AdaptiveLimiter`][AdaptiveLimiter] instead adjusts the number of calls in
+flight by additive increase, multiplicative decrease (AIMD):
+
+-   each call completing in a stable time (not much slower than the recent
+    average) raises the limit a little, by one per limit's worth of calls;
+-   a call rejected for overload (a `429` or `503` response) or timing out
+    cuts the limit by a factor, and a `Retry-After` header pauses all calls
+    for the time requested.
+
+The limiter is shared by synchronous and asynchronous callers. Runnables are
+wrapped with [`Limited`][Limited] to take a permit for each call.
+"""
+
+import asyncio
+import contextlib
+import math
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any, Generic, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+__all__ = [
+    "AdaptiveLimiter",
+    "LimitExceeded",
+    "Limited",
+    "LimiterStats",
+    "is_overload",
+    "retry_after",
+]
+
+InputT = TypeVar("InputT")
+OutputT = TypeVar("OutputT")
+
+_OVERLOAD_STATUSES = {429, 503}
+
+
+class LimitExceeded(Exception):  # noqa: N818
+    """
+    A call waited too long for a permit.
+    """
+
+
+def _errors(error: BaseException) -> Iterator[BaseException]:
+    """
+    An error and the errors it was raised from.
+    """
+    seen: set[int] = set()
+    current: BaseException | None = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def is_overload(error: BaseException) -> bool:
+    """
+    Whether an error shows the provider to be overloaded.
+
+    Args:
+        error:
+            The error raised by a call to the model.
+
+    Returns:
+        Whether the error, or an error it was raised from, is a timeout or a
+        response with a `429` or `503` status.
+    """
+    for cause in _errors(error):
+        if isinstance(cause, TimeoutError) or "Timeout" in type(cause).__name__:
+            return True
+        if getattr(cause, "status_code", None) in _OVERLOAD_STATUSES:
+            return True
+    return False
+
+
+def retry_after(error: BaseException) -> float | None:
+    """
+    The time the provider asked to wait before retrying.
+
+    Args:
+        error:
+            The error raised by a call to the model.
+
+    Returns:
+        The number of seconds from the `Retry-After` (or `Retry-After-Ms`)
+        header of the response, if the error carries one.
+    """
+    for cause in _errors(error):
+        headers = getattr(getattr(cause, "response", None), "headers", None)
+        if headers is None:
+            continue
+        with contextlib.suppress(ValueError, TypeError):
+            if milliseconds := headers.get("retry-after-ms"):
+                return float(milliseconds) / 1000
+            if seconds := headers.get("retry-after"):
+                return float(seconds)
+    return None
+
+
+class LimiterStats(BaseModel):
+    """
+    The state and counters of an adaptive limiter.
+    """
+
+    limit: float
+    """
+    The current number of calls allowed in flight.
+    """
+    in_flight: int = 0
+    max_in_flight: int = 0
+    calls: int = 0
+    waited: int = 0
+    """
+    Calls which had to wait for a permit.
+    """
+    rejected: int = 0
+    """
+    Calls which waited too long for a permit, and were not made.
+    """
+    overloads: int = 0
+    """
+    Calls which failed as the provider was overloaded.
+    """
+    decreases: int = 0
+    """
+    The number of times the limit was cut.
+    """
+    paused_seconds: float = 0.0
+    """
+    The total time calls were paused at the request of the provider.
+    """
+
+
+class AdaptiveLimiter:
+    """
+    Limits the calls in flight, adapting the limit to the provider's capacity.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        max_wait: float | None = None,
+    ) -> None:
+        """
+        Create a new limiter.
+
+        Args:
+            initial_limit:
+                The number of calls allowed in flight to start with.
+            min_limit:
+                The lowest the limit is cut to.
+            max_limit:
+                The highest the limit is raised to.
+            backoff:
+                The factor the limit is multiplied by when the provider is
+                overloaded.
+            latency_tolerance:
+                How many times slower than the recent average a call may be
+                and still count as stable.
+            max_wait:
+                The maximum time, in seconds, a call waits for a permit before
+                [`LimitExceeded`][LimitExceeded] is raised. Calls wait for as
+                long as needed if not set.
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_wait = max_wait
+        self._stats = LimiterStats(limit=initial_limit)
+        self._latency: float | None = None
+        self._paused_until = 0.0
+        self._decreased_at = -math.inf
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._async_waiters: list[
+            tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]
+        ] = []
+
+    @property
+    def stats(self) -> LimiterStats:
+        """
+        A snapshot of the state and counters.
+        """
+        with self._lock:
+            return self._stats.model_copy()
+
+    def _try_acquire(self, now: float) -> float | None:
+        """
+        Take a permit if one is available.
+
+        Returns:
+            `None` if a permit was taken, otherwise how long to wait before
+            trying again (infinite until a permit is released).
+        """
+        stats = self._stats
+        if now < self._paused_until:
+            return self._paused_until - now
+        if stats.in_flight < max(1, int(stats.limit)):
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+            stats.calls += 1
+            return None
+        return math.inf
+
+    def _timeout(self, wait: float, deadline: float | None, now: float) -> float | None:
+        """
+        How long to wait before trying again, without exceeding the deadline.
+
+        Raises:
+            LimitExceeded: If the deadline has passed.
+        """
+        if deadline is not None:
+            if now >= deadline:
+                self._stats.rejected += 1
+                msg = "Timed out waiting for a permit to call the model."
+                raise LimitExceeded(msg)
+            wait = min(wait, deadline - now)
+        return None if math.isinf(wait) else wait
+
+    def acquire(self) -> None:
+        """
+        Wait for a permit.
+
+        Raises:
+            LimitExceeded: If no permit was available in time.
+        """
+        start = time.monotonic()
+        deadline = None if self.max_wait is None else start + self.max_wait
+        with self._changed:
+            waited = False
+            while (wait := self._try_acquire(now := time.monotonic())) is not None:
+                if not waited:
+                    waited = True
+                    self._stats.waited += 1
+                self._changed.wait(self._timeout(wait, deadline, now))
+
+    async def aacquire(self) -> None:
+        """
+        Wait for a permit, without blocking the event loop.
+
+        Raises:
+            LimitExceeded: If no permit was available in time.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        deadline = None if self.max_wait is None else start + self.max_wait
+        waited = False
+        while True:
+            with self._lock:
+                wait = self._try_acquire(now := time.monotonic())
+                if wait is None:
+                    return
+                if not waited:
+                    waited = True
+                    self._stats.waited += 1
+                timeout = self._timeout(wait, deadline, now)
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], timeout)
+            except TimeoutError:
+                pass
+            finally:
+                with self._lock, contextlib.suppress(ValueError):
+                    self._async_waiters.remove(waiter)
+
+    def _notify(self) -> None:
+        """
+        Wake the waiting callers to try again. The lock must be held.
+        """
+        self._changed.notify_all()
+        for loop, future in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._async_waiters.clear()
+
+    def release(self, seconds: float, exception: BaseException | None = None) -> None:
+        """
+        Return a permit, and adapt the limit to the outcome of the call.
+
+        Args:
+            seconds:
+                How long the call took.
+            exception:
+                The error raised by the call, if any.
+        """
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats
+            stats.in_flight -= 1
+            if exception is None:
+                stable = (
+                    self._latency is None
+                    or seconds <= self.latency_tolerance * self._latency
+                )
+                self._latency = (
+                    seconds
+                    if self._latency is None
+                    else self._latency + 0.2 * (seconds - self._latency)
+                )
+                if stable:
+                    stats.limit = min(self.max_limit, stats.limit + 1 / stats.limit)
+            elif is_overload(exception):
+                stats.overloads += 1
+                # Calls in flight when the provider started refusing them fail
+                # together: cut the limit once for the lot.
+                if now - self._decreased_at > (self._latency or 1.0):
+                    self._decreased_at = now
+                    stats.limit = max(self.min_limit, stats.limit * self.backoff)
+                    stats.decreases += 1
+                pause = retry_after(exception)
+                if pause and now + pause > self._paused_until:
+                    stats.paused_seconds += now + pause - max(now, self._paused_until)
+                    self._paused_until = now + pause
+            self._notify()
+
+    @contextlib.contextmanager
+    def permit(self) -> Iterator[None]:
+        """
+        Hold a permit for the duration of a call.
+
+        Yields:
+            Once a permit is available.
+        """
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as error:
+            self.release(time.monotonic() - start, error)
+            raise
+        self.release(time.monotonic() - start)
+
+    @contextlib.asynccontextmanager
+    async def apermit(self) -> AsyncIterator[None]:
+        """
+        Hold a permit for the duration of an asynchronous call.
+
+        Yields:
+            Once a permit is available.
+        """
+        await self.aacquire()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as error:
+            self.release(time.monotonic() - start, error)
+            raise
+        self.release(time.monotonic() - start)
+
+
+def _wake(future: asyncio.Future[None]) -> None:
+    """
+    Wake a waiting asynchronous caller, unless it has stopped waiting.
+    """
+    if not future.done():
+        future.set_result(None)
+
+
+class Limited(Runnable[InputT, OutputT], Generic[InputT, OutputT]):
+    """
+    Takes a permit from a limiter for each call to a runnable.
+    """
+
+    def __init__(
+        self, runnable: Runnable[InputT, OutputT], limiter: AdaptiveLimiter
+    ) -> None:
+        """
+        Wrap a runnable.
+
+        Args:
+            runnable:
+                The runnable to limit, typically a model.
+            limiter:
+                The limiter, usually shared by every model of a provider.
+        """
+        self.runnable = runnable
+        self.limiter = limiter
+
+    def invoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the runnable once a permit is available.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the runnable.
+        """
+        with self.limiter.permit():
+            return self.runnable.invoke(input, config)
+
+    async def ainvoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the runnable once a permit is available.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the runnable.
+        """
+        async with self.limiter.apermit():
+            return await self.runnable.ainvoke(input, config)
+
+    async def astream(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> AsyncIterator[OutputT]:
+        """
+        Stream the output of the runnable, holding a permit until it ends.
+
+        Args:
+            input:
+                The input of the runnable.
+            config:
+                An optional configuration for the runnable.
+            kwargs:
+                Additional arguments passed to the runnable.
+
+        Yields:
+            The chunks of the output of the runnable.
+        """
+        async with self.limiter.apermit():
+            async for chunk in self.runnable.astream(input, config, **kwargs):
+                yield chunk
@@ -0,0 +1,716 @@
+"""
+Metrics and tracing of the pipeline.
+
+The detector and the reviewer swallow their errors into fallback outputs, so
+neither tells where the time of a slow review went, nor why a review failed.
+[`Metrics`][Metrics] records, for each component:
+
+-   a histogram of the time spent in each stage: `preprocess`, `detect` and
+    `review`, and within the chains, `format` (the prompt), `llm` and `parse`
+    (the output parser);
+-   the tokens sent to and generated by each model;
+-   the failures of each stage, by exception type, including those swallowed
+    into fallback outputs.
+
+The stages within the chains are measured by a LangChain callback handler
+([`MetricsHandler`][MetricsHandler]) bound to the chains, so they are seen
+however the chains are called. If a tracer is set (see
+[`default_tracer`][default_tracer]), each stage is also recorded as an
+OpenTelemetry span, nested under the span of the stage or request it is part
+of.
+
+The metrics are exported in the Prometheus text format by
+[`render`][Metrics.render], together with snapshots of the stats of the other
+components (cache, routing, limiter, etc.).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import importlib.util
+import math
+import threading
+import time
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from pydantic import BaseModel, Field
+
+if TYPE_CHECKING:
+    from uuid import UUID
+
+    from langchain_core.outputs import LLMResult
+    from opentelemetry.trace import Span, Tracer
+
+__all__ = [
+    "DEFAULT_BUCKETS",
+    "Metrics",
+    "MetricsHandler",
+    "MetricsStats",
+    "StageStats",
+    "Stats",
+    "TokenStats",
+    "default_tracer",
+]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+"""
+The upper bounds, in seconds, of the buckets of the stage histograms.
+"""
+
+Stats = BaseModel | Mapping[str, Any] | None
+"""
+A snapshot of the stats of a component, rendered alongside the metrics.
+"""
+
+
+def default_tracer() -> Tracer | None:
+    """
+    The OpenTelemetry tracer of the package.
+
+    Returns:
+        The `pypacter` tracer if OpenTelemetry is installed (the `otel`
+        extra), otherwise `None`. Spans are only exported once the
+        application has configured the OpenTelemetry SDK.
+    """
+    if importlib.util.find_spec("opentelemetry") is None:
+        return None
+    from opentelemetry import trace
+
+    return trace.get_tracer("pypacter")
+
+
+class StageStats(BaseModel):
+    """
+    A histogram of the time spent in a stage.
+    """
+
+    count: int = 0
+    seconds: float = 0.0
+    buckets: list[int] = Field(default_factory=list)
+    """
+    The number of observations in each bucket, the last bucket counting those
+    above the largest bound.
+    """
+
+    @property
+    def mean_seconds(self) -> float:
+        """
+        The mean time spent in the stage.
+        """
+        return self.seconds / self.count if self.count else 0.0
+
+
+class TokenStats(BaseModel):
+    """
+    Counters of the calls to a model.
+    """
+
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class MetricsStats(BaseModel):
+    """
+    A snapshot of the recorded metrics.
+    """
+
+    stages: dict[str, dict[str, StageStats]] = Field(default_factory=dict)
+    """
+    The time spent in each stage, by component and stage.
+    """
+    tokens: dict[str, TokenStats] = Field(default_factory=dict)
+    """
+    The calls and tokens, by model.
+    """
+    failures: dict[str, dict[str, dict[str, int]]] = Field(default_factory=dict)
+    """
+    The failures, by component, stage and exception type.
+    """
+
+
+def _escape(value: str) -> str:
+    """
+    Escape a label value of the Prometheus text format.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Mapping[str, str]) -> str:
+    """
+    Format the labels of a sample.
+    """
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    """
+    Format the value of a sample.
+    """
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _flatten(
+    name: str, stats: Mapping[str, Any], labels: Mapping[str, str]
+) -> Iterator[tuple[str, dict[str, str], float]]:
+    """
+    The samples of a snapshot of stats.
+
+    Numbers become samples named after their field. Strings become labels of a
+    sample of value 1. Mappings are flattened with their keys as a label named
+    after the field (e.g. `models` to `model`).
+    """
+    for field, value in stats.items():
+        metric = f"{name}_{field}"
+        if isinstance(value, bool | int | float):
+            yield metric, dict(labels), value
+        elif isinstance(value, str):
+            yield metric, {**labels, field: value}, 1
+        elif isinstance(value, Mapping):
+            label = field.removesuffix("s")
+            for key, item in value.items():
+                nested = {**labels, label: str(key)}
+                if isinstance(item, Mapping):
+                    yield from _flatten(metric, item, nested)
+                elif isinstance(item, bool | int | float):
+                    yield metric, nested, item
+
+
+class _Exposition:
+    """
+    Samples in the Prometheus text format, grouped by metric.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, tuple[str, str, list[str]]] = {}
+
+    def declare(self, name: str, kind: str, description: str = "") -> None:
+        """
+        Declare the type and description of a metric.
+        """
+        self._metrics.setdefault(name, (kind, description, []))
+
+    def add(
+        self, name: str, labels: Mapping[str, str], value: float, suffix: str = ""
+    ) -> None:
+        """
+        Add a sample to a metric, declared as untyped if it was not declared.
+        """
+        self.declare(name, "untyped")
+        self._metrics[name][2].append(
+            f"{name}{suffix}{_labels(labels)} {_number(value)}"
+        )
+
+    def render(self) -> str:
+        """
+        Render the samples, each metric preceded by its type and description.
+        """
+        lines: list[str] = []
+        for name, (kind, description, samples) in self._metrics.items():
+            if description:
+                lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class Metrics:
+    """
+    Records the time, tokens and failures of each stage of the pipeline.
+
+    The metrics are thread-safe, and are usually shared by the detector and
+    the reviewer.
+    """
+
+    def __init__(
+        self,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        tracer: Tracer | None = None,
+    ) -> None:
+        """
+        Create new, empty metrics.
+
+        Args:
+            buckets:
+                The upper bounds, in seconds, of the buckets of the stage
+                histograms, in increasing order.
+            tracer:
+                The OpenTelemetry tracer recording each stage as a span. Spans
+                are not recorded if not set.
+        """
+        self.buckets = tuple(buckets)
+        self.tracer = tracer
+        self._stats = MetricsStats()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> MetricsStats:
+        """
+        A snapshot of the recorded metrics.
+        """
+        with self._lock:
+            return self._stats.model_copy(deep=True)
+
+    def observe(self, component: str, stage: str, seconds: float) -> None:
+        """
+        Record the time spent in a stage.
+
+        Args:
+            component:
+                The component, such as `detector` or `reviewer`.
+            stage:
+                The stage of the component.
+            seconds:
+                The time spent.
+        """
+        bucket = next(
+            (i for i, bound in enumerate(self.buckets) if seconds <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            stages = self._stats.stages.setdefault(component, {})
+            stats = stages.get(stage)
+            if stats is None:
+                stats = stages[stage] = StageStats(
+                    buckets=[0] * (len(self.buckets) + 1)
+                )
+            stats.count += 1
+            stats.seconds += seconds
+            stats.buckets[bucket] += 1
+
+    def count_tokens(self, model: str, input_tokens: int, output_tokens: int) -> None:
+        """
+        Record a call to a model.
+
+        Args:
+            model:
+                The name of the model.
+            input_tokens:
+                The number of tokens of the prompt.
+            output_tokens:
+                The number of tokens generated.
+        """
+        with self._lock:
+            stats = self._stats.tokens.setdefault(model, TokenStats())
+            stats.calls += 1
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+
+    def count_failure(
+        self, component: str, stage: str, exception: BaseException
+    ) -> None:
+        """
+        Record the failure of a stage.
+
+        Args:
+            component:
+                The component, such as `detector` or `reviewer`.
+            stage:
+                The stage which failed.
+            exception:
+                The exception raised by the stage.
+        """
+        name = type(exception).__name__
+        with self._lock:
+            failures = self._stats.failures.setdefault(component, {})
+            counts = failures.setdefault(stage, {})
+            counts[name] = counts.get(name, 0) + 1
+
+    @contextlib.contextmanager
+    def stage(self, component: str, stage: str) -> Iterator[None]:
+        """
+        Measure a stage, recording it as a span if a tracer is set.
+
+        Exceptions raised by the stage are counted as failures, and propagated.
+
+        Args:
+            component:
+                The component, such as `detector` or `reviewer`.
+            stage:
+                The stage of the component.
+
+        Yields:
+            While the stage runs.
+        """
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            if self.tracer is not None:
+                stack.enter_context(
+                    self.tracer.start_as_current_span(f"pypacter.{component}.{stage}")
+                )
+            try:
+                yield
+            except Exception as exception:
+                self.count_failure(component, stage, exception)
+                raise
+            finally:
+                self.observe(component, stage, time.perf_counter() - start)
+
+    def handler(self, component: str) -> MetricsHandler:
+        """
+        Create a callback handler measuring the stages within the chains.
+
+        Args:
+            component:
+                The component whose chains are measured.
+
+        Returns:
+            The handler, to bind to the chains of the component.
+        """
+        return MetricsHandler(self, component)
+
+    def render(self, stats: Iterable[tuple[str, Stats, Mapping[str, str]]] = ()) -> str:
+        """
+        Render the metrics in the Prometheus text format.
+
+        Args:
+            stats:
+                Snapshots of the stats of other components, each with the name
+                of its metrics (prefixed with `pypacter_`) and the labels of
+                its samples. Snapshots which are `None` are skipped.
+
+        Returns:
+            The exposition of the metrics.
+        """
+        snapshot = self.stats
+        exposition = _Exposition()
+        self._render_stages(exposition, snapshot)
+        self._render_tokens(exposition, snapshot)
+        self._render_failures(exposition, snapshot)
+        for name, values, labels in stats:
+            if values is None:
+                continue
+            fields = values.model_dump() if isinstance(values, BaseModel) else values
+            for metric, sample_labels, value in _flatten(
+                f"pypacter_{name}", fields, labels
+            ):
+                exposition.add(metric, sample_labels, value)
+        return exposition.render()
+
+    def _render_stages(self, exposition: _Exposition, snapshot: MetricsStats) -> None:
+        """
+        Add the stage histograms to an exposition.
+        """
+        name = "pypacter_stage_duration_seconds"
+        exposition.declare(
+            name, "histogram", "The time spent in each stage of the pipeline."
+        )
+        bounds = [*(str(bound) for bound in self.buckets), "+Inf"]
+        for component, stages in snapshot.stages.items():
+            for stage, histogram in stages.items():
+                labels = {"component": component, "stage": stage}
+                cumulative = 0
+                for bound, count in zip(bounds, histogram.buckets, strict=True):
+                    cumulative += count
+                    exposition.add(name, {**labels, "le": bound}, cumulative, "_bucket")
+                exposition.add(name, labels, histogram.seconds, "_sum")
+                exposition.add(name, labels, histogram.count, "_count")
+
+    @staticmethod
+    def _render_tokens(exposition: _Exposition, snapshot: MetricsStats) -> None:
+        """
+        Add the calls and tokens of the models to an exposition.
+        """
+        calls = "pypacter_llm_calls_total"
+        tokens = "pypacter_llm_tokens_total"
+        exposition.declare(calls, "counter", "The calls to each model.")
+        exposition.declare(
+            tokens,
+            "counter",
+            "The tokens sent to (input) and generated by (output) each model.",
+        )
+        for model, usage in snapshot.tokens.items():
+            exposition.add(calls, {"model": model}, usage.calls)
+            exposition.add(
+                tokens, {"model": model, "direction": "input"}, usage.input_tokens
+            )
+            exposition.add(
+                tokens, {"model": model, "direction": "output"}, usage.output_tokens
+            )
+
+    @staticmethod
+    def _render_failures(exposition: _Exposition, snapshot: MetricsStats) -> None:
+        """
+        Add the failures of the stages to an exposition.
+        """
+        name = "pypacter_failures_total"
+        exposition.declare(
+            name,
+            "counter",
+            "The failures of each stage of the pipeline, by exception type.",
+        )
+        for component, stages in snapshot.failures.items():
+            for stage, counts in stages.items():
+                for exception, count in counts.items():
+                    labels = {
+                        "component": component,
+                        "stage": stage,
+                        "exception": exception,
+                    }
+                    exposition.add(name, labels, count)
+
+
+def _stage_of(name: str) -> str | None:
+    """
+    The stage of a chain run, from the name of its runnable.
+    """
+    if name.endswith("OutputParser"):
+        return "parse"
+    if name.endswith("PromptTemplate"):
+        return "format"
+    return None
+
+
+def _usage(response: LLMResult) -> tuple[int, int]:
+    """
+    The input and output tokens of a call to a model.
+
+    The usage of the messages is preferred, falling back to the usage reported
+    by the provider (e.g. OpenAI's `token_usage`).
+    """
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+    if input_tokens or output_tokens:
+        return input_tokens, output_tokens
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+@dataclass
+class _Run:
+    stage: str
+    start: float
+    model: str | None = None
+    span: Span | None = None
+
+
+class MetricsHandler(BaseCallbackHandler):
+    """
+    Measures the stages within the chains of a component.
+
+    The prompt templates, models and output parsers of the chains are
+    measured as the `format`, `llm` and `parse` stages; other runs are
+    ignored. The handler is bound to the chains with
+    `chain.with_config(callbacks=[handler])`.
+    """
+
+    run_inline = True
+    """
+    Handle the events in the calling task, so spans nest under the current
+    span.
+    """
+
+    def __init__(self, metrics: Metrics, component: str) -> None:
+        """
+        Create a new handler.
+
+        Args:
+            metrics:
+                The metrics recording the stages.
+            component:
+                The component whose chains are measured.
+        """
+        self.metrics = metrics
+        self.component = component
+        self._runs: dict[UUID, _Run] = {}
+        self._lock = threading.Lock()
+
+    def _start(
+        self,
+        run_id: UUID,
+        parent_run_id: UUID | None,
+        stage: str,
+        model: str | None = None,
+    ) -> None:
+        """
+        Record the start of a stage, opening its span.
+        """
+        span: Span | None = None
+        if (tracer := self.metrics.tracer) is not None:
+            from opentelemetry import trace
+
+            with self._lock:
+                parent = self._runs.get(parent_run_id) if parent_run_id else None
+            context = (
+                trace.set_span_in_context(parent.span)
+                if parent is not None and parent.span is not None
+                else None
+            )
+            attributes = {"pypacter.component": self.component}
+            if model is not None:
+                attributes["gen_ai.request.model"] = model
+            span = tracer.start_span(
+                f"pypacter.{self.component}.{stage}",
+                context=context,
+                attributes=attributes,
+            )
+        run = _Run(stage=stage, start=time.perf_counter(), model=model, span=span)
+        with self._lock:
+            self._runs[run_id] = run
+
+    def _end(
+        self,
+        run_id: UUID,
+        exception: BaseException | None = None,
+        usage: Mapping[str, int] | None = None,
+    ) -> _Run | None:
+        """
+        Record the end of a stage, closing its span.
+
+        Args:
+            run_id:
+                The run of the stage.
+            exception:
+                The exception raised by the stage, if it failed.
+            usage:
+                The token usage of a call to a model, added to its span.
+
+        Returns:
+            The run of the stage, or `None` if the run was not measured.
+        """
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        self.metrics.observe(self.component, run.stage, time.perf_counter() - run.start)
+        if exception is not None:
+            self.metrics.count_failure(self.component, run.stage, exception)
+        if run.span is not None:
+            run.span.set_attributes(usage or {})
+            if exception is not None:
+                from opentelemetry.trace import Status, StatusCode
+
+                run.span.record_exception(exception)
+                run.span.set_status(Status(StatusCode.ERROR, str(exception)))
+            run.span.end()
+        return run
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any] | None,
+        inputs: Any,  # noqa: ANN401, ARG002
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Start measuring a prompt template or an output parser.
+        """
+        name = kwargs.get("name") or (serialized or {}).get("name") or ""
+        if (stage := _stage_of(name)) is not None:
+            self._start(run_id, parent_run_id, stage)
+
+    def on_chain_end(
+        self,
+        outputs: Any,  # noqa: ANN401, ARG002
+        *,
+        run_id: UUID,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> None:
+        """
+        Stop measuring a prompt template or an output parser.
+        """
+        self._end(run_id)
+
+    def on_chain_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> None:
+        """
+        Record the failure of a prompt template or an output parser.
+        """
+        self._end(run_id, error)
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any] | None,
+        messages: Any,  # noqa: ANN401, ARG002
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Start measuring a call to a chat model.
+        """
+        model = (
+            (metadata or {}).get("ls_model_name")
+            or kwargs.get("name")
+            or (serialized or {}).get("name")
+            or "unknown"
+        )
+        self._start(run_id, parent_run_id, "llm", str(model))
+
+    def on_llm_start(
+        self,
+        serialized: dict[str, Any] | None,
+        prompts: list[str],
+        *,
+        run_id: UUID,
+        parent_run_id: UUID | None = None,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> None:
+        """
+        Start measuring a call to a completion model.
+        """
+        self.on_chat_model_start(
+            serialized,
+            prompts,
+            run_id=run_id,
+            parent_run_id=parent_run_id,
+            metadata=metadata,
+            **kwargs,
+        )
+
+    def on_llm_end(
+        self,
+        response: LLMResult,
+        *,
+        run_id: UUID,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> None:
+        """
+        Record a call to a model, with its tokens.
+        """
+        input_tokens, output_tokens = _usage(response)
+        run = self._end(
+            run_id,
+            usage={
+                "gen_ai.usage.input_tokens": input_tokens,
+                "gen_ai.usage.output_tokens": output_tokens,
+            },
+        )
+        if run is not None and run.model is not None:
+            self.metrics.count_tokens(run.model, input_tokens, output_tokens)
+
+    def on_llm_error(
+        self,
+        error: BaseException,
+        *,
+        run_id: UUID,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> None:
+        """
+        Record the failure of a call to a model.
+        """
+        self._end(run_id, error)
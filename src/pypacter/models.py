@@ -2,37 +2,225 @@
 AI Models.
 
 Collection of LLMs (large language models) that have been pre-configured.
+
+The models are created on first use, so that importing the package does not
+pay for importing the model clients nor for loading the `.env` file. They remain
+available as module attributes (e.g. `pypacter.models.DEFAULT_MODEL`), and each
+is only ever created once.
 """
 
+from __future__ import annotations
+
+import functools
 import os
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+if TYPE_CHECKING:
+    from collections.abc import Callable
 
-# Load environment variables from .env file
-load_dotenv()
+    from langchain_core.language_models import BaseChatModel
 
 __all__ = [
-    "DEFAULT_MODEL",
-    "GPT_4",
+    # The models and temperature are created on access, see `__getattr__`.
+    "DEFAULT_MODEL",  # noqa: F822
+    "GPT_4",  # noqa: F822
+    "GPT_4O_MINI",  # noqa: F822
+    "MODELS",
+    "TEMPERATURE",  # noqa: F822
+    "close_models",
+    "default_model",
+    "get_model",
+    "model_errors",
+    "model_id",
 ]
 
-TEMPERATURE = float(os.getenv("MODEL_TEMPERATURE", "0"))
-"""
-A lower temperature will cause the model to make more likely, but also more
-boring and conservative predictions. A high temperature on the other hand will
-generate more creative but also more unpredictable outputs.
-"""
-GPT_4 = ChatOpenAI(temperature=TEMPERATURE, model="gpt-4o")
-"""
-OpenAI's GPT-4 model.
 
-This model is the most powerful model available in the OpenAI API. It is capable
-of ingesting a large amount of text and generating coherent responses. This
-model is also the most expensive to use and therefore should be used sparingly.
+@functools.cache
+def load_env() -> None:
+    """
+    Load environment variables from the `.env` file, if not done already.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+
+
+def temperature() -> float:
+    """
+    The sampling temperature of the models, from `MODEL_TEMPERATURE`.
+
+    A lower temperature will cause the model to make more likely, but also more
+    boring and conservative predictions. A high temperature on the other hand
+    will generate more creative but also more unpredictable outputs.
+    """
+    load_env()
+    return float(os.getenv("MODEL_TEMPERATURE", "0"))
+
+
+def _chat_openai(model: str) -> BaseChatModel:
+    """
+    An OpenAI chat model, sharing the connections of the other models.
+
+    See [`connections`][pypacter.connections] for the configuration of the
+    connection pool. The timeouts of the pool are given to the model too, as
+    it would otherwise override them with its own on every request.
+    """
+    from langchain_openai import ChatOpenAI
+
+    from pypacter.connections import shared_pool
+
+    pool = shared_pool()
+    return ChatOpenAI(
+        temperature=temperature(),
+        model=model,
+        timeout=pool.timeout(),
+        http_client=pool.client(),
+        http_async_client=pool.async_client(),
+    )
+
+
+def _gpt_4() -> BaseChatModel:
+    """
+    OpenAI's GPT-4 model.
+
+    This model is the most powerful model available in the OpenAI API. It is
+    capable of ingesting a large amount of text and generating coherent
+    responses. This model is also the most expensive to use and therefore should
+    be used sparingly.
+    """
+    return _chat_openai("gpt-4o")
+
+
+def _gpt_4o_mini() -> BaseChatModel:
+    """
+    OpenAI's GPT-4o mini model.
+
+    A smaller model, much faster and cheaper than GPT-4o though less capable.
+    It is well suited to simple tasks, or as the first model of a cascade which
+    escalates to a stronger model when needed (see
+    [`routing`][pypacter.routing]).
+    """
+    return _chat_openai("gpt-4o-mini")
+
+
+MODELS: dict[str, Callable[[], BaseChatModel]] = {
+    "GPT_4": _gpt_4,
+    "GPT_4O_MINI": _gpt_4o_mini,
+}
+"""
+The factories of the pre-configured models, by name.
 """
 
-DEFAULT_MODEL = GPT_4
+DEFAULT = "GPT_4"
 """
-The default model to use for generations.
+The name of the default model to use for generations.
 """
+
+
+@functools.cache
+def get_model(name: str) -> BaseChatModel:
+    """
+    Get a pre-configured model, creating it on first use.
+
+    Args:
+        name:
+            The name of the model, one of [`MODELS`][MODELS].
+
+    Returns:
+        The model.
+
+    Raises:
+        KeyError: If the model is unknown.
+    """
+    load_env()
+    return MODELS[name]()
+
+
+def default_model() -> BaseChatModel:
+    """
+    Get the default model to use for generations.
+
+    Returns:
+        The model.
+    """
+    return get_model(DEFAULT)
+
+
+async def close_models() -> None:
+    """
+    Close the connections of the pre-configured models, and forget the models.
+
+    The asynchronous connections belong to the event loop which opened them,
+    so an application closes them on shutdown. The models, and their shared
+    connection pool, are created anew on next use.
+    """
+    from pypacter.connections import shared_pool
+
+    get_model.cache_clear()
+    if shared_pool.cache_info().currsize:
+        pool = shared_pool()
+        shared_pool.cache_clear()
+        await pool.aclose()
+
+
+def __getattr__(name: str) -> object:
+    """
+    Create the models (and read the temperature) on first access.
+    """
+    if name == "DEFAULT_MODEL":
+        return default_model()
+    if name == "TEMPERATURE":
+        return temperature()
+    if name in MODELS:
+        return get_model(name)
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+def model_id(model: object) -> str:
+    """
+    Identify a model.
+
+    The identifier is used wherever outputs produced by different models must
+    be kept apart, such as in cache keys.
+
+    Args:
+        model:
+            The model to identify.
+
+    Returns:
+        The name of the model if it has one, otherwise the name of its type.
+    """
+    for attribute in ("model_name", "model"):
+        name = getattr(model, attribute, None)
+        if isinstance(name, str):
+            return name
+    return type(model).__name__
+
+
+@functools.cache
+def model_errors() -> tuple[type[Exception], ...]:
+    """
+    The errors a call to a model is expected to fail with.
+
+    These are the errors of the API and of the connection to it, the invalid
+    outputs, and the calls refused by a limiter or a circuit breaker. Any other
+    error is a bug, and is not handled as a failure of the model.
+
+    Returns:
+        The types of the errors, for use in an `except` clause.
+    """
+    from langchain_core.exceptions import LangChainException
+    from openai import APIError
+
+    from pypacter.breaker import CircuitOpen
+    from pypacter.limiter import LimitExceeded
+
+    return (
+        APIError,
+        OSError,
+        ValueError,
+        LangChainException,
+        CircuitOpen,
+        LimitExceeded,
+    )
@@ -0,0 +1,106 @@
+"""
+Output parsers.
+
+The output models hold both the fields the model is asked to fill in, and
+fields set by pypacter itself, such as how the language of a review was
+determined. The latter belong in the schema published by the API, but not in
+the format instructions given to the model, which would then try to fill them
+in. They are marked with [`NOT_LLM_OUTPUT`][NOT_LLM_OUTPUT], and left out of
+the format instructions of the [`OutputParser`][OutputParser].
+"""
+
+import json
+from typing import TypeVar
+
+from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import BaseModel, JsonValue
+from pydantic.json_schema import JsonDict
+
+__all__ = [
+    "NOT_LLM_OUTPUT",
+    "OutputParser",
+]
+
+TBaseModel = TypeVar("TBaseModel", bound=BaseModel)
+
+NOT_LLM_OUTPUT: JsonDict = {"x-llm-output": False}
+"""
+The `json_schema_extra` of the fields which are not filled in by the model.
+"""
+
+
+_FORMAT_INSTRUCTIONS = (
+    "The output should be formatted as a JSON instance that conforms to the JSON "
+    "schema below.\n\n"
+    'As an example, for the schema {{"properties": {{"foo": {{"title": "Foo", '
+    '"description": "a list of strings", "type": "array", "items": {{"type": '
+    '"string"}}}}}}, "required": ["foo"]}}\n'
+    'the object {{"foo": ["bar", "baz"]}} is a well-formatted instance of the '
+    'schema. The object {{"properties": {{"foo": ["bar", "baz"]}}}} is not '
+    "well-formatted.\n\n"
+    "Here is the output schema:\n```\n{schema}\n```"
+)
+"""
+The format instructions of `PydanticOutputParser`, whose template is private to
+LangChain.
+"""
+
+
+def _pruned(value: JsonValue) -> JsonValue:
+    """
+    A copy of a part of a JSON schema, without the fields of `NOT_LLM_OUTPUT`.
+    """
+    if isinstance(value, list):
+        return [_pruned(item) for item in value]
+    if isinstance(value, dict):
+        return _llm_schema(value)
+    return value
+
+
+def _llm_schema(schema: JsonDict) -> JsonDict:
+    """
+    A copy of a JSON schema, without the fields of `NOT_LLM_OUTPUT`.
+
+    The fields are left out at any depth, including the definitions of the
+    nested models.
+    """
+    pruned = {key: _pruned(value) for key, value in schema.items()}
+    properties = pruned.get("properties")
+    if not isinstance(properties, dict):
+        return pruned
+    hidden = {
+        name
+        for name, field in properties.items()
+        if isinstance(field, dict) and NOT_LLM_OUTPUT.items() <= field.items()
+    }
+    pruned["properties"] = {
+        name: field for name, field in properties.items() if name not in hidden
+    }
+    required = pruned.get("required")
+    if isinstance(required, list):
+        pruned["required"] = [name for name in required if name not in hidden]
+    return pruned
+
+
+class OutputParser(PydanticOutputParser[TBaseModel]):
+    """
+    Parses the output of the model into a Pydantic model.
+
+    Unlike its parent, the format instructions leave out the fields marked with
+    [`NOT_LLM_OUTPUT`][NOT_LLM_OUTPUT].
+    """
+
+    def get_format_instructions(self) -> str:
+        """
+        The format instructions for the output of the model.
+
+        Returns:
+            The instructions, with the JSON schema of the fields filled in by
+            the model.
+        """
+        schema = _llm_schema(self.pydantic_object.model_json_schema())
+        schema.pop("title", None)
+        schema.pop("type", None)
+        return _FORMAT_INSTRUCTIONS.format(
+            schema=json.dumps(schema, ensure_ascii=False)
+        )
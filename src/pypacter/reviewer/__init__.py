@@ -5,30 +5,181 @@ This module contains a code verifier. It takes a code snippet, and identifies
 any issues with the code.
 """
 
+import contextlib
+import logging
+import sqlite3
 import typing
+from collections.abc import AsyncIterator, Sequence
 from pathlib import Path
-from typing import Any
+from typing import Any, TypeVar
 
-from langchain.output_parsers import PydanticOutputParser
-from langchain_core.prompts import (
-    HumanMessagePromptTemplate,
-    SystemMessagePromptTemplate,
-)
 from langchain_core.runnables import Runnable, RunnableConfig, RunnableSerializable
+from langchain_core.runnables.config import get_config_list, patch_config
+from langchain_core.runnables.utils import gather_with_concurrency
 from pydantic import BaseModel, Field
 
-from pypacter.language_detector import LanguageDetectionInput, LanguageDetector
-from pypacter.models import DEFAULT_MODEL
+from pypacter.breaker import CircuitBreaker, Guarded
+from pypacter.cache import ResultCache, make_key
+from pypacter.hedging import Hedged, HedgePolicy, HedgeStats
+from pypacter.language_detector import (
+    LanguageDetectionInput,
+    LanguageDetectionOutput,
+    LanguageDetector,
+)
+from pypacter.language_detector.extensions import language_from_filename
+from pypacter.limiter import AdaptiveLimiter, Limited
+from pypacter.metrics import Metrics
+from pypacter.models import default_model, model_id
+from pypacter.parsers import NOT_LLM_OUTPUT, OutputParser
+from pypacter.reviewer.streaming import ItemStreamParser
+from pypacter.routing import RoutingStats, SizeRouter
+from pypacter.singleflight import SingleFlight
+from pypacter.templates import fingerprint, human_template, system_template
+from pypacter.tokens import estimate_tokens
+
+if typing.TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from langchain_core.prompts import (
+        HumanMessagePromptTemplate,
+        SystemMessagePromptTemplate,
+    )
+
+    from pypacter.reviewer.chunking import Chunk
+    from pypacter.reviewer.diffing import DiffReviewInput
+
+logger = logging.getLogger(__name__)
 
 _DIR = Path(__file__).parent
-INSTRUCTIONS = SystemMessagePromptTemplate.from_template_file(
-    template_file=(_DIR / "instructions.md"),
-    input_variables=["format_instructions"],
-)
-CODE_TEMPLATE = HumanMessagePromptTemplate.from_template_file(
-    template_file=(_DIR / "code_template.md"),
-    input_variables=["code"],
-)
+
+
+def instructions_template() -> "SystemMessagePromptTemplate":
+    """
+    The system prompt of the reviewer.
+    """
+    return system_template(_DIR / "instructions.md", "format_instructions")
+
+
+def code_template() -> "HumanMessagePromptTemplate":
+    """
+    The prompt presenting the code snippet and its detected language.
+    """
+    return human_template(_DIR / "code_template.md", "code")
+
+
+def prompt_version() -> str:
+    """
+    Fingerprint of the prompt templates.
+
+    It is used to invalidate cached reviews when the prompts change.
+    """
+    return fingerprint(_DIR / "instructions.md", _DIR / "code_template.md")
+
+
+def fused_instructions_template() -> "SystemMessagePromptTemplate":
+    """
+    The system prompt of the reviewer in fused detect-and-review mode.
+    """
+    return system_template(_DIR / "fused_instructions.md", "format_instructions")
+
+
+def fused_code_template() -> "HumanMessagePromptTemplate":
+    """
+    The prompt presenting the code snippet in fused mode.
+    """
+    return human_template(_DIR / "fused_code_template.md", "code")
+
+
+def fused_prompt_version() -> str:
+    """
+    Fingerprint of the prompt templates of the fused mode.
+    """
+    return fingerprint(_DIR / "fused_instructions.md", _DIR / "fused_code_template.md")
+
+
+_LAZY: "dict[str, Callable[[], object]]" = {
+    "INSTRUCTIONS": instructions_template,
+    "CODE_TEMPLATE": code_template,
+    "PROMPT_VERSION": prompt_version,
+    "FUSED_INSTRUCTIONS": fused_instructions_template,
+    "FUSED_CODE_TEMPLATE": fused_code_template,
+    "FUSED_PROMPT_VERSION": fused_prompt_version,
+}
+
+
+def __getattr__(name: str) -> object:
+    """
+    Load the prompt templates on first access.
+
+    The templates used to be module constants, read when the module was
+    imported; they remain available under their former names.
+    """
+    if name in _LAZY:
+        return _LAZY[name]()
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+LanguageSource = typing.Literal["hint", "filename", "detector", "fused"]
+"""
+How the language of reviewed code was determined: given by the caller, inferred
+from the file name, detected by the language detector, or identified by the
+reviewer itself in fused mode.
+"""
+
+
+def normalize_code(code: str) -> str:
+    """
+    Normalize a code snippet for comparison.
+
+    Line endings are unified and trailing whitespace is removed, neither of
+    which changes the review. Leading lines are kept as-is so that the line
+    numbers of the recommendations remain valid.
+
+    Args:
+        code:
+            The code snippet.
+
+    Returns:
+        The normalized code snippet.
+    """
+    return "\n".join(line.rstrip() for line in code.splitlines()).rstrip("\n")
+
+
+class ReviewInput(LanguageDetectionInput):
+    """
+    Input model for code review.
+
+    The language of the code is detected, unless it is given or the file name
+    identifies it unambiguously.
+    """
+
+    language: str | None = Field(
+        default=None, description="The programming language of the code, if known."
+    )
+    filename: str | None = Field(
+        default=None,
+        description="The name of the file the code comes from, if known.",
+    )
+    fused: bool | None = Field(
+        default=None,
+        description="Whether to identify the language and review the code in a "
+        "single call to the model. Defaults to the configuration of the reviewer.",
+    )
+
+    def language_hint(self) -> tuple[str, LanguageSource] | None:
+        """
+        The language of the code, if known without detecting it.
+
+        Returns:
+            The language and how it was determined, or `None` if the language
+            must be detected.
+        """
+        if self.language and self.language.strip():
+            return self.language.strip().lower(), "hint"
+        if self.filename and (language := language_from_filename(self.filename)):
+            return language, "filename"
+        return None
 
 
 class ReviewerLLMInput(BaseModel):
@@ -78,6 +229,91 @@ class Recommendations(BaseModel):
     review_result: typing.Literal["Success", "Failed"] = Field(
         description="Describes if the code snippet was reviewed or not"
     )
+    language_source: LanguageSource = Field(
+        default="detector",
+        description="How the language of the code snippet was determined.",
+        json_schema_extra=NOT_LLM_OUTPUT,
+    )
+
+
+class FusedRecommendations(Recommendations):
+    """
+    Output for the LLM in fused mode.
+
+    The language of the code is identified as part of the review, instead of by
+    a separate language detection.
+    """
+
+    language: str = Field(
+        default="unknown", description="The programming language of the code."
+    )
+    confidence: float = Field(
+        default=0.0, description="The confidence in the programming language."
+    )
+
+
+TRecommendations = TypeVar("TRecommendations", bound=Recommendations)
+
+
+def _read_cache(
+    cache: ResultCache[TRecommendations] | None, key: str
+) -> TRecommendations | None:
+    """
+    Look up a previous review, treating a cache which cannot be read as a miss.
+    """
+    if cache is None:
+        return None
+    try:
+        return cache.get(key)
+    except sqlite3.Error:
+        logger.warning("Could not read the review cache", exc_info=True)
+        return None
+
+
+async def _aread_cache(
+    cache: ResultCache[TRecommendations] | None, key: str
+) -> TRecommendations | None:
+    """
+    Look up a previous review, without blocking the event loop.
+    """
+    if cache is None:
+        return None
+    try:
+        return await cache.aget(key)
+    except sqlite3.Error:
+        logger.warning("Could not read the review cache", exc_info=True)
+        return None
+
+
+def _write_cache(
+    cache: ResultCache[TRecommendations] | None, key: str, output: TRecommendations
+) -> None:
+    """
+    Store a review, if it was successful.
+
+    The cache is best effort: should it fail to store the review, the error is
+    logged and the review is still returned.
+    """
+    if cache is None or output.review_result != "Success":
+        return
+    try:
+        cache.set(key, output)
+    except sqlite3.Error:
+        logger.warning("Could not store the review in the cache", exc_info=True)
+
+
+async def _awrite_cache(
+    cache: ResultCache[TRecommendations] | None, key: str, output: TRecommendations
+) -> None:
+    """
+    Store a review if it was successful, without blocking the event loop.
+    """
+    if cache is None or output.review_result != "Success":
+        return
+    try:
+        await cache.aset(key, output)
+    except sqlite3.Error:
+        logger.warning("Could not store the review in the cache", exc_info=True)
 
 
 class Reviewer(Runnable[LanguageDetectionInput, Recommendations]):
@@ -85,31 +321,197 @@ class Reviewer(Runnable[LanguageDetectionInput, Recommendations]):
     Code reviewer class.
     """
 
-    def __init__(self, model: RunnableSerializable = DEFAULT_MODEL) -> None:
+    def __init__(  # noqa: PLR0913, PLR0915
+        self,
+        model: Runnable | None = None,
+        language_detector: LanguageDetector | None = None,
+        cache: ResultCache[Recommendations] | None = None,
+        max_chunk_lines: int | None = None,
+        chunk_overlap: int = 5,
+        max_chunk_concurrency: int = 4,
+        *,
+        fused: bool = False,
+        fused_cache: ResultCache[FusedRecommendations] | None = None,
+        fast_model: Runnable | None = None,
+        fast_max_tokens: int = 1500,
+        hedge: HedgePolicy | None = None,
+        limiter: AdaptiveLimiter | None = None,
+        breaker: CircuitBreaker | None = None,
+        metrics: Metrics | None = None,
+    ) -> None:
         """
         Instantiates a new code reviewer.
+
+        Args:
+            model:
+                The LLM Model to use for the code review. Defaults to the
+                default model.
+            language_detector:
+                An existing language detector to reuse. If not provided, a new
+                detector is created. Sharing a detector avoids rebuilding its
+                parser and prompt chain for every reviewer.
+            cache:
+                An optional cache of reviews. Only successful reviews are
+                stored, keyed on the normalized code, the detected language,
+                the model and the prompt version.
+            max_chunk_lines:
+                If set, code longer than this many lines is split into chunks
+                at the boundaries of its top-level definitions, which are
+                reviewed concurrently and merged (see
+                [`chunking`][pypacter.reviewer.chunking]).
+            chunk_overlap:
+                The number of lines of context shared by neighbouring chunks.
+            max_chunk_concurrency:
+                The maximum number of chunks of a file reviewed at once.
+            fused:
+                Whether, by default, the language is identified as part of the
+                review rather than detected beforehand, saving a round-trip to
+                the model. Only applies to [`invoke`][Reviewer.invoke] and
+                [`ainvoke`][Reviewer.ainvoke], when the language is not hinted
+                and the code is not reviewed in chunks.
+            fused_cache:
+                An optional cache of reviews in fused mode, keyed on the
+                normalized code, the model and the prompt version.
+            fast_model:
+                An optional cheaper, faster model reviewing small snippets,
+                while larger ones are still reviewed by `model` (see
+                [`SizeRouter`][pypacter.routing.SizeRouter]).
+            fast_max_tokens:
+                The largest prompt, in estimated tokens, reviewed by the fast
+                model.
+            hedge:
+                An optional policy for hedging the slow asynchronous calls to
+                the primary model (see [`Hedged`][pypacter.hedging.Hedged]).
+                Streamed reviews are not hedged.
+            limiter:
+                An optional limiter of the calls in flight to the models,
+                usually shared with the language detector (see
+                [`AdaptiveLimiter`][pypacter.limiter.AdaptiveLimiter]).
+            breaker:
+                An optional circuit breaker around the calls to the models
+                (see [`CircuitBreaker`][pypacter.breaker.CircuitBreaker]).
+                Give the reviewer its own breaker rather than the language
+                detector's, so failing reviews do not degrade detection. While
+                it is open, reviews fail immediately instead of waiting on an
+                unavailable model.
+            metrics:
+                Optional metrics recording the time spent in each stage of the
+                review, the tokens and the failures, usually shared with the
+                language detector (see [`Metrics`][pypacter.metrics.Metrics]).
+        """
+        self.language_detector = language_detector or LanguageDetector()
+        self.model = model if model is not None else default_model()
+        self.cache = cache
+        self.max_chunk_lines = max_chunk_lines
+        self.chunk_overlap = chunk_overlap
+        self.max_chunk_concurrency = max_chunk_concurrency
+        self.fused = fused
+        self.fused_cache = fused_cache
+        self.fast_model = fast_model
+        self.fast_max_tokens = fast_max_tokens
+        self.metrics = metrics
+        self.in_flight: SingleFlight[Recommendations] = SingleFlight()
+        """
+        Coalesces concurrent reviews of the same snippet into a single call to
+        the LLM.
         """
-        self.language_detector = LanguageDetector()
-        self.model = model
 
-        parser: PydanticOutputParser[Recommendations] = PydanticOutputParser(
+        self.parser: OutputParser[Recommendations] = OutputParser(
             pydantic_object=Recommendations
         )
         self.prompt_template = (
-            INSTRUCTIONS.format(format_instructions=parser.get_format_instructions())
-            + CODE_TEMPLATE
+            instructions_template().format(
+                format_instructions=self.parser.get_format_instructions()
+            )
+            + code_template()
         )
+        self.router: SizeRouter | None = None
+        """
+        Routes reviews between the fast and the primary model by the size of
+        their prompt, if a fast model is configured.
+        """
+        self.model_key = model_id(self.model)
+        """
+        Identifies the model (or models) producing the reviews.
+        """
+        self.hedged: Hedged | None = None
+        """
+        Hedges the calls to the primary model, if a hedging policy is set.
+        """
+        llm: Runnable = self.model
+        self.limiter = limiter
+        fast: Runnable | None = fast_model
+        if limiter is not None:
+            llm = Limited(llm, limiter)
+            fast = None if fast is None else Limited(fast, limiter)
+        if hedge is not None:
+            self.hedged = llm = Hedged(llm, hedge)
+        self.breaker = breaker
+        if breaker is not None:
+            llm = Guarded(llm, breaker)
+            fast = None if fast is None else Guarded(fast, breaker)
+        if fast_model is not None and fast is not None:
+            self.router = SizeRouter(
+                small=(model_id(fast_model), fast),
+                large=(self.model_key, llm),
+                size=lambda prompt: estimate_tokens(prompt.to_string()),
+                max_small_size=fast_max_tokens,
+            )
+            self.model_key = (
+                f"{model_id(fast_model)}<={fast_max_tokens}<{self.model_key}"
+            )
+            llm = self.router
         self.chain = typing.cast(
             RunnableSerializable[dict[str, str], Recommendations],
-            self.prompt_template | self.model | parser,
+            self.prompt_template | llm | self.parser,
+        )
+        self.raw_chain = self.prompt_template | llm
+        """
+        The review chain without the output parser, producing the raw
+        generated text.
+        """
+        fused_parser: OutputParser[FusedRecommendations] = OutputParser(
+            pydantic_object=FusedRecommendations
+        )
+        self.fused_prompt_template = (
+            fused_instructions_template().format(
+                format_instructions=fused_parser.get_format_instructions()
+            )
+            + fused_code_template()
+        )
+        self.fused_chain = typing.cast(
+            RunnableSerializable[dict[str, str], FusedRecommendations],
+            self.fused_prompt_template | llm | fused_parser,
+        )
+        if metrics is not None:
+            callbacks = [metrics.handler("reviewer")]
+            self.chain = typing.cast(
+                RunnableSerializable[dict[str, str], Recommendations],
+                self.chain.with_config(callbacks=callbacks),
+            )
+            self.raw_chain = typing.cast(
+                RunnableSerializable[dict[str, Any], Any],
+                self.raw_chain.with_config(callbacks=callbacks),
+            )
+            self.fused_chain = typing.cast(
+                RunnableSerializable[dict[str, str], FusedRecommendations],
+                self.fused_chain.with_config(callbacks=callbacks),
+            )
+        self.fused_prompt_version = make_key(
+            fused_prompt_version(), fused_parser.get_format_instructions()
+        )
+        self.prompt_version = make_key(
+            prompt_version(),
+            self.parser.get_format_instructions(),
+            "" if max_chunk_lines is None else f"{max_chunk_lines}:{chunk_overlap}",
         )
 
     @property
-    def InputType(self) -> type[LanguageDetectionInput]:  # noqa: N802
+    def InputType(self) -> type[ReviewInput]:  # noqa: N802
         """
         The input type for the code reviewer.
         """
-        return LanguageDetectionInput
+        return ReviewInput
 
     @property
     def OutputType(self) -> type[Recommendations]:  # noqa: N802
@@ -118,6 +520,313 @@ class Reviewer(Runnable[LanguageDetectionInput, Recommendations]):
         """
         return Recommendations
 
+    @property
+    def routing_stats(self) -> RoutingStats | None:
+        """
+        How reviews were routed between the fast and the primary model.
+
+        `None` unless a fast model is configured.
+        """
+        return None if self.router is None else self.router.stats
+
+    @property
+    def hedge_stats(self) -> HedgeStats | None:
+        """
+        How often calls to the primary model were hedged, and the hedge won.
+
+        `None` unless a hedging policy is set.
+        """
+        return None if self.hedged is None else self.hedged.stats
+
+    @staticmethod
+    def _llm_input(
+        input: LanguageDetectionInput, detection: LanguageDetectionOutput
+    ) -> ReviewerLLMInput:
+        """
+        Combine the code snippet with its language detection result.
+
+        Args:
+            input:
+                The code snippet to review.
+            detection:
+                The language detected for the code snippet.
+
+        Returns:
+            The input for the review chain.
+        """
+        return ReviewerLLMInput(
+            language=detection.language,
+            confidence=detection.confidence,
+            summary=detection.result + detection.message,
+            code=input.code,
+        )
+
+    @staticmethod
+    def _review_input(input: LanguageDetectionInput | dict[str, str]) -> ReviewInput:
+        """
+        Convert any accepted input to a review input.
+        """
+        if isinstance(input, ReviewInput):
+            return input
+        if isinstance(input, LanguageDetectionInput):
+            return ReviewInput(**input.model_dump())
+        return ReviewInput(**input)
+
+    @staticmethod
+    def _hinted(
+        input: ReviewInput,
+    ) -> tuple[LanguageDetectionOutput, LanguageSource] | None:
+        """
+        The language of a snippet, if known without calling the detector.
+
+        Args:
+            input:
+                The code snippet to review.
+
+        Returns:
+            A detection output standing for the language hint and how the
+            language was determined, or `None` if it must be detected.
+        """
+        hint = input.language_hint()
+        if hint is None:
+            return None
+        language, source = hint
+        return (
+            LanguageDetectionOutput(
+                language=language,
+                confidence=1.0,
+                message=(
+                    " Language given by the caller."
+                    if source == "hint"
+                    else f" Language inferred from the file name {input.filename}."
+                ),
+                result="detection successful",
+            ),
+            source,
+        )
+
+    def _stage(self, stage: str) -> contextlib.AbstractContextManager[None]:
+        """
+        Measure a stage of the review, if metrics are recorded.
+        """
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.stage("reviewer", stage)
+
+    def _detect(
+        self, input: ReviewInput, config: RunnableConfig | None = None
+    ) -> tuple[LanguageDetectionOutput, LanguageSource]:
+        """
+        Determine the language of a snippet, detecting it only if needed.
+        """
+        if (hinted := self._hinted(input)) is not None:
+            return hinted
+        with self._stage("detect"):
+            return self.language_detector.invoke(input, config), "detector"
+
+    async def _adetect(
+        self, input: ReviewInput, config: RunnableConfig | None = None
+    ) -> tuple[LanguageDetectionOutput, LanguageSource]:
+        """
+        Determine the language of a snippet, detecting it only if needed.
+        """
+        if (hinted := self._hinted(input)) is not None:
+            return hinted
+        with self._stage("detect"):
+            return await self.language_detector.ainvoke(input, config), "detector"
+
+    @staticmethod
+    def _with_source(
+        output: Recommendations, source: LanguageSource
+    ) -> Recommendations:
+        """
+        Report how the language of the reviewed snippet was determined.
+
+        Returns:
+            The output, copied if its language source differs.
+        """
+        if output.language_source == source:
+            return output
+        return output.model_copy(update={"language_source": source})
+
+    def _use_fused(self, input: ReviewInput) -> bool:
+        """
+        Whether a snippet is reviewed in fused mode.
+
+        A hinted language needs no detection, and chunked reviews need the
+        language up front to split the code, so neither is fused.
+        """
+        fused = self.fused if input.fused is None else input.fused
+        if not fused or input.language_hint() is not None:
+            return False
+        return (
+            self.max_chunk_lines is None
+            or len(input.code.splitlines()) <= self.max_chunk_lines
+        )
+
+    def _fused_key(self, code: str) -> str:
+        """
+        Key under which the fused review of a code snippet is cached.
+        """
+        return make_key(normalize_code(code), self.model_key, self.fused_prompt_version)
+
+    def _fused(self, code: str, config: RunnableConfig | None) -> Recommendations:
+        """
+        Identify the language of a snippet and review it in a single call.
+        """
+        key = self._fused_key(code)
+        if (cached := _read_cache(self.fused_cache, key)) is not None:
+            return cached
+
+        def review() -> FusedRecommendations:
+            with self._stage("review"):
+                output = self.fused_chain.invoke({"code": code}, config=config)
+            _write_cache(self.fused_cache, key, output)
+            return output
+
+        output, shared = self.in_flight.do(key, review)
+        return output.model_copy(deep=True) if shared else output
+
+    async def _afused(
+        self, code: str, config: RunnableConfig | None
+    ) -> Recommendations:
+        """
+        Identify the language of a snippet and review it in a single call.
+        """
+        key = self._fused_key(code)
+        if (cached := await _aread_cache(self.fused_cache, key)) is not None:
+            return cached
+
+        async def review() -> FusedRecommendations:
+            with self._stage("review"):
+                output = await self.fused_chain.ainvoke({"code": code}, config=config)
+            await _awrite_cache(self.fused_cache, key, output)
+            return output
+
+        output, shared = await self.in_flight.ado(key, review)
+        return output.model_copy(deep=True) if shared else output
+
+    def _cache_key(self, llm_input: ReviewerLLMInput) -> str:
+        """
+        Key under which the review of a code snippet is cached.
+
+        Args:
+            llm_input:
+                The input for the review chain.
+
+        Returns:
+            A key unique to the code, language, model and prompt version.
+        """
+        return make_key(
+            normalize_code(llm_input.code),
+            llm_input.language,
+            self.model_key,
+            self.prompt_version,
+        )
+
+    def _cache_get(self, key: str) -> Recommendations | None:
+        """
+        Look up a previous review.
+        """
+        return _read_cache(self.cache, key)
+
+    async def _acache_get(self, key: str) -> Recommendations | None:
+        """
+        Look up a previous review, without blocking the event loop.
+        """
+        return await _aread_cache(self.cache, key)
+
+    def _cache_set(self, key: str, output: Recommendations) -> None:
+        """
+        Store a review, if it was successful.
+        """
+        _write_cache(self.cache, key, output)
+
+    async def _acache_set(self, key: str, output: Recommendations) -> None:
+        """
+        Store a review if it was successful, without blocking the event loop.
+        """
+        await _awrite_cache(self.cache, key, output)
+
+    def _split(self, llm_input: ReviewerLLMInput) -> "list[Chunk] | None":
+        """
+        Split a snippet into chunks, if chunking is enabled.
+
+        Args:
+            llm_input:
+                The input for the review chain.
+
+        Returns:
+            The chunks, or `None` if the snippet should be reviewed whole.
+        """
+        if self.max_chunk_lines is None:
+            return None
+        # Imported here, as the chunking module builds on the models above.
+        from pypacter.reviewer.chunking import split_code
+
+        chunks = split_code(
+            llm_input.code,
+            llm_input.language,
+            max_lines=self.max_chunk_lines,
+            overlap=self.chunk_overlap,
+        )
+        return chunks if len(chunks) > 1 else None
+
+    def _chunk_inputs(
+        self, llm_input: ReviewerLLMInput, chunks: "list[Chunk]"
+    ) -> list[dict[str, Any]]:
+        """
+        The inputs of the review chain for each chunk of a snippet.
+        """
+        return [
+            llm_input.model_copy(update={"code": chunk.code}).model_dump()
+            for chunk in chunks
+        ]
+
+    def _review(
+        self, key: str, llm_input: ReviewerLLMInput, config: RunnableConfig | None
+    ) -> Recommendations:
+        """
+        Review a snippet with the LLM, and cache the review.
+        """
+        from pypacter.reviewer.chunking import merge_reviews
+
+        with self._stage("review"):
+            chunks = self._split(llm_input)
+            if chunks is None:
+                output = self.chain.invoke(llm_input.model_dump(), config=config)
+            else:
+                reviews = self.chain.batch(
+                    self._chunk_inputs(llm_input, chunks),
+                    patch_config(config, max_concurrency=self.max_chunk_concurrency),
+                    return_exceptions=True,
+                )
+                output = merge_reviews(chunks, reviews)
+        self._cache_set(key, output)
+        return output
+
+    async def _areview(
+        self, key: str, llm_input: ReviewerLLMInput, config: RunnableConfig | None
+    ) -> Recommendations:
+        """
+        Review a snippet with the LLM, and cache the review.
+        """
+        from pypacter.reviewer.chunking import merge_reviews
+
+        with self._stage("review"):
+            chunks = self._split(llm_input)
+            if chunks is None:
+                output = await self.chain.ainvoke(llm_input.model_dump(), config=config)
+            else:
+                reviews = await self.chain.abatch(
+                    self._chunk_inputs(llm_input, chunks),
+                    patch_config(config, max_concurrency=self.max_chunk_concurrency),
+                    return_exceptions=True,
+                )
+                output = merge_reviews(chunks, reviews)
+        await self._acache_set(key, output)
+        return output
+
     def invoke(
         self,
         input: LanguageDetectionInput | dict[str, str],
@@ -127,6 +836,12 @@ class Reviewer(Runnable[LanguageDetectionInput, Recommendations]):
         """
         Perform the code review.
 
+        Concurrent reviews of the same snippet share a single call to the LLM.
+        Should it fail, every one of them reports the review as failed.
+
+        In fused mode, the language is identified by the review itself and the
+        output is a [`FusedRecommendations`][FusedRecommendations].
+
         Args:
             input:
                 The HTTP request-response pair.
@@ -139,18 +854,390 @@ class Reviewer(Runnable[LanguageDetectionInput, Recommendations]):
         Returns:
             The generated code snippet.
         """
+        input = self._review_input(input)
+
+        source: LanguageSource = "detector"
+        try:
+            if self._use_fused(input):
+                source = "fused"
+                return self._with_source(self._fused(input.code, config), source)
+            result, source = self._detect(input, config)
+            final_input = self._llm_input(input, result)
+            key = self._cache_key(final_input)
+            output = self._cache_get(key)
+            if output is None:
+                output, shared = self.in_flight.do(
+                    key, lambda: self._review(key, final_input, config)
+                )
+                if shared:
+                    output = output.model_copy(deep=True)
+        except Exception:
+            logger.exception("Code review failed")
+            output = Recommendations(recommendations=[], review_result="Failed")
+        return self._with_source(output, source)
+
+    async def ainvoke(
+        self,
+        input: LanguageDetectionInput | dict[str, str],
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> Recommendations:
+        """
+        Perform the code review asynchronously.
+
+        Both the language detection and the review are awaited natively, so
+        the event loop is not blocked while waiting on the model. Concurrent
+        reviews of the same snippet share a single call to the LLM.
+        Fused mode is supported as in [`invoke`][Reviewer.invoke].
+
+        Args:
+            input:
+                The code snippet to review.
+            config:
+                An optional configuration for the LLM.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The code review recommendations.
+        """
+        input = self._review_input(input)
+
+        source: LanguageSource = "detector"
+        try:
+            if self._use_fused(input):
+                source = "fused"
+                fused = await self._afused(input.code, config)
+                return self._with_source(fused, source)
+            result, source = await self._adetect(input, config)
+            final_input = self._llm_input(input, result)
+            key = self._cache_key(final_input)
+            output = await self._acache_get(key)
+            if output is None:
+                output, shared = await self.in_flight.ado(
+                    key, lambda: self._areview(key, final_input, config)
+                )
+                if shared:
+                    output = output.model_copy(deep=True)
+        except Exception:
+            logger.exception("Code review failed")
+            output = Recommendations(recommendations=[], review_result="Failed")
+        return self._with_source(output, source)
+
+    async def abatch(
+        self,
+        inputs: Sequence[LanguageDetectionInput | dict[str, str]],
+        config: RunnableConfig | list[RunnableConfig] | None = None,
+        *,
+        return_exceptions: bool = False,  # noqa: ARG002
+        **kwargs: Any,  # noqa: ANN401
+    ) -> list[Recommendations]:
+        """
+        Review several code snippets concurrently.
+
+        Each snippet is reviewed with [`ainvoke`][Reviewer.ainvoke], with at
+        most `max_concurrency` (from the config) in flight at once.
+
+        Args:
+            inputs:
+                The code snippets to review.
+            config:
+                An optional configuration for the LLM, either shared by all
+                inputs or one per input.
+            return_exceptions:
+                Required by the parent class. Failed reviews are reported
+                through `review_result`, so no exceptions are returned.
+            kwargs:
+                Additional arguments passed to `ainvoke`.
+
+        Returns:
+            The code review recommendations, in the same order as the inputs.
+        """
+        if not inputs:
+            return []
+        configs = get_config_list(config, len(inputs))
+        return await gather_with_concurrency(
+            configs[0].get("max_concurrency"),
+            *(
+                self.ainvoke(item, item_config, **kwargs)
+                for item, item_config in zip(inputs, configs, strict=True)
+            ),
+        )
+
+    async def astream(
+        self,
+        input: LanguageDetectionInput | dict[str, str],
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> AsyncIterator[Recommendations]:
+        """
+        Stream the code review.
+
+        The language is detected first, after which the outputs of the review
+        chain are yielded as they are produced. If anything fails, a final
+        output with `review_result="Failed"` is yielded.
+
+        Args:
+            input:
+                The code snippet to review.
+            config:
+                An optional configuration for the LLM.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Yields:
+            The code review recommendations.
+        """
+        input = self._review_input(input)
+
+        source: LanguageSource = "detector"
+        try:
+            result, source = await self._adetect(input, config)
+            final_input = self._llm_input(input, result)
+            key = self._cache_key(final_input)
+            if (cached := await self._acache_get(key)) is not None:
+                yield self._with_source(cached, source)
+                return
+            chunk = None
+            async for chunk in self.chain.astream(
+                final_input.model_dump(), config=config
+            ):
+                yield self._with_source(chunk, source)
+            if chunk is not None:
+                await self._acache_set(key, chunk)
+        except Exception:
+            logger.exception("Code review failed")
+            yield self._with_source(
+                Recommendations(recommendations=[], review_result="Failed"), source
+            )
+
+    async def astream_recommendations(
+        self,
+        input: LanguageDetectionInput | dict[str, str],
+        config: RunnableConfig | None = None,
+    ) -> AsyncIterator[Recommendation | Recommendations]:
+        """
+        Stream the individual recommendations of the code review.
+
+        Unlike [`astream`][Reviewer.astream], which yields the review as a
+        whole, the generated JSON is parsed incrementally and each
+        recommendation is yielded as soon as the model has finished writing
+        it. The complete review is yielded last.
+
+        Args:
+            input:
+                The code snippet to review.
+            config:
+                An optional configuration for the LLM.
+
+        Yields:
+            Each recommendation, followed by the complete review. If anything
+            fails, the complete review contains the recommendations yielded so
+            far and has `review_result="Failed"`.
+        """
+        input = self._review_input(input)
+
+        streamed: list[Recommendation] = []
+        source: LanguageSource = "detector"
+        try:
+            result, source = await self._adetect(input, config)
+            final_input = self._llm_input(input, result)
+            key = self._cache_key(final_input)
+            if (cached := await self._acache_get(key)) is not None:
+                for recommendation in cached.recommendations:
+                    yield recommendation
+                yield self._with_source(cached, source)
+                return
+            items = ItemStreamParser(Recommendation)
+            async for chunk in self.raw_chain.astream(
+                final_input.model_dump(), config=config
+            ):
+                for recommendation in items.feed(str(chunk.content)):
+                    streamed.append(recommendation)
+                    yield recommendation
+            with self._stage("parse"):
+                output = self.parser.parse(items.text)
+            await self._acache_set(key, output)
+        except Exception:
+            logger.exception("Code review failed")
+            output = Recommendations(recommendations=streamed, review_result="Failed")
+        yield self._with_source(output, source)
+
+    def _plan_diff(
+        self, base: str, llm_input: ReviewerLLMInput, context: int
+    ) -> "tuple[list[Chunk], list[Recommendation]] | None":
+        """
+        Plan the incremental review of a change.
+
+        Args:
+            base:
+                The code before the change.
+            llm_input:
+                The input for the review chain of the code after the change.
+            context:
+                The number of unchanged lines reviewed around each change.
+
+        Returns:
+            The windows to review and the recommendations carried over, or
+            `None` if the base code has not been reviewed before.
+        """
+        from pypacter.reviewer.diffing import plan_review
+
+        base_review = self._cache_get(
+            self._cache_key(llm_input.model_copy(update={"code": base}))
+        )
+        if base_review is None:
+            return None
+        return plan_review(base, llm_input.code, base_review, context)
+
+    async def _aplan_diff(
+        self, base: str, llm_input: ReviewerLLMInput, context: int
+    ) -> "tuple[list[Chunk], list[Recommendation]] | None":
+        """
+        Plan the incremental review of a change, without blocking the loop.
+
+        See [`_plan_diff`][Reviewer._plan_diff].
+        """
+        from pypacter.reviewer.diffing import plan_review
+
+        base_review = await self._acache_get(
+            self._cache_key(llm_input.model_copy(update={"code": base}))
+        )
+        if base_review is None:
+            return None
+        return plan_review(base, llm_input.code, base_review, context)
+
+    @staticmethod
+    def _merge_diff(
+        windows: "list[Chunk]",
+        reviews: Sequence[Recommendations | BaseException],
+        reused: list[Recommendation],
+    ) -> Recommendations:
+        """
+        Merge the reviews of the changed windows and the carried over ones.
+        """
+        from pypacter.reviewer.chunking import merge_reviews
+
+        output = merge_reviews(windows, reviews)
+        output.recommendations = sorted(
+            [*output.recommendations, *reused], key=lambda r: r.line
+        )
+        return output
+
+    def review_diff(
+        self,
+        input: "DiffReviewInput | dict[str, str]",
+        config: RunnableConfig | None = None,
+        context: int = 10,
+    ) -> Recommendations:
+        """
+        Review a change to a code snippet.
+
+        If the base code has been reviewed before (and the review is still
+        cached), only the changed lines and up to `context` lines around them
+        are reviewed, and the recommendations on the other lines are carried
+        over from the review of the base. Otherwise, the new code is reviewed
+        in full.
+
+        Args:
+            input:
+                The base code, and either the new code or a unified diff.
+            config:
+                An optional configuration for the LLM.
+            context:
+                The number of unchanged lines reviewed around each change.
+
+        Returns:
+            The code review recommendations of the new code in full.
+        """
+        from pypacter.reviewer.diffing import DiffReviewInput
+
         if isinstance(input, dict):
-            input = LanguageDetectionInput(**input)
+            input = DiffReviewInput(**input)
 
+        source: LanguageSource = "detector"
         try:
-            result = self.language_detector.invoke(input)
-            final_input = ReviewerLLMInput(
-                language=result.language,
-                confidence=result.confidence,
-                summary=result.result + result.message,
-                code=input.code,
+            snippet = ReviewInput(
+                code=input.new_code(), language=input.language, filename=input.filename
             )
-            output = self.chain.invoke(final_input.model_dump(), config=config)
+            result, source = self._detect(snippet, config)
+            final_input = self._llm_input(snippet, result)
+            key = self._cache_key(final_input)
+            output = self._cache_get(key)
+            if output is None:
+                plan = self._plan_diff(input.base, final_input, context)
+                if plan is None:
+                    output = self._review(key, final_input, config)
+                else:
+                    windows, reused = plan
+                    reviews = self.chain.batch(
+                        self._chunk_inputs(final_input, windows),
+                        patch_config(
+                            config, max_concurrency=self.max_chunk_concurrency
+                        ),
+                        return_exceptions=True,
+                    )
+                    output = self._merge_diff(windows, reviews, reused)
+                    self._cache_set(key, output)
         except Exception:
+            logger.exception("Diff review failed")
             output = Recommendations(recommendations=[], review_result="Failed")
-        return output
+        return self._with_source(output, source)
+
+    async def areview_diff(
+        self,
+        input: "DiffReviewInput | dict[str, str]",
+        config: RunnableConfig | None = None,
+        context: int = 10,
+    ) -> Recommendations:
+        """
+        Review a change to a code snippet asynchronously.
+
+        See [`review_diff`][Reviewer.review_diff].
+
+        Args:
+            input:
+                The base code, and either the new code or a unified diff.
+            config:
+                An optional configuration for the LLM.
+            context:
+                The number of unchanged lines reviewed around each change.
+
+        Returns:
+            The code review recommendations of the new code in full.
+        """
+        from pypacter.reviewer.diffing import DiffReviewInput
+
+        if isinstance(input, dict):
+            input = DiffReviewInput(**input)
+
+        source: LanguageSource = "detector"
+        try:
+            snippet = ReviewInput(
+                code=input.new_code(), language=input.language, filename=input.filename
+            )
+            result, source = await self._adetect(snippet, config)
+            final_input = self._llm_input(snippet, result)
+            key = self._cache_key(final_input)
+            output = await self._acache_get(key)
+            if output is None:
+                plan = await self._aplan_diff(input.base, final_input, context)
+                if plan is None:
+                    output = await self._areview(key, final_input, config)
+                else:
+                    windows, reused = plan
+                    reviews = await self.chain.abatch(
+                        self._chunk_inputs(final_input, windows),
+                        patch_config(
+                            config, max_concurrency=self.max_chunk_concurrency
+                        ),
+                        return_exceptions=True,
+                    )
+                    output = self._merge_diff(windows, reviews, reused)
+                    await self._acache_set(key, output)
+        except Exception:
+            logger.exception("Diff review failed")
+            output = Recommendations(recommendations=[], review_result="Failed")
+        return self._with_source(output, source)
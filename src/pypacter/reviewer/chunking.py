@@ -0,0 +1,227 @@
+"""
+Chunked review of large files.
+
+A large file does not fit in a single review prompt, and even when it does the
+review takes long and is more likely to fail. This module splits the code into
+chunks which are reviewed independently (and concurrently), and merges the
+reviews back into one.
+
+The code is split at the boundaries of its top-level definitions, so that a
+function or class is only split if it alone exceeds the size of a chunk. For
+Python, the boundaries are taken from the syntax tree; for other languages (or
+Python which does not parse) they are inferred from the indentation and the
+nesting of braces.
+
+Each chunk includes a few lines of overlap with its neighbours for context.
+Every line is owned by exactly one chunk, and when a recommendation is reported
+by several chunks (because it falls within an overlap) only one is kept,
+preferably the one from the chunk owning the line.
+"""
+
+import ast
+import difflib
+import re
+from collections.abc import Sequence
+
+from pydantic import BaseModel, Field
+
+from pypacter.reviewer import Recommendation, Recommendations
+
+__all__ = [
+    "Chunk",
+    "merge_reviews",
+    "split_code",
+]
+
+_SIMILAR_MESSAGE = 0.6
+"""
+How similar two messages on the same line must be to be considered duplicates.
+"""
+_STRING = re.compile(r"""(["'`])(?:\\.|(?!\1).)*\1""")
+
+
+class Chunk(BaseModel):
+    """
+    A contiguous part of a file, reviewed on its own.
+
+    Line numbers are 1-based and inclusive, in the coordinates of the file.
+    """
+
+    code: str = Field(..., description="The code of the chunk, with its overlap.")
+    first_line: int = Field(..., description="The line the chunk code starts at.")
+    start: int = Field(..., description="The first line owned by the chunk.")
+    end: int = Field(..., description="The last line owned by the chunk.")
+
+    def to_file_line(self, line: int) -> int:
+        """
+        Convert a line number within the chunk to one within the file.
+
+        Args:
+            line:
+                The 1-based line number within the chunk code.
+
+        Returns:
+            The line number within the file.
+        """
+        return self.first_line + line - 1
+
+    def owns(self, line: int) -> bool:
+        """
+        Whether the chunk owns a line of the file.
+        """
+        return self.start <= line <= self.end
+
+
+def _python_boundaries(code: str) -> list[int] | None:
+    """
+    The 0-based lines at which the top-level statements of Python code start.
+
+    Returns:
+        The boundaries, or `None` if the code does not parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return None
+    boundaries = []
+    for node in tree.body:
+        decorators = getattr(node, "decorator_list", [])
+        boundaries.append(min([node.lineno, *(d.lineno for d in decorators)]) - 1)
+    return boundaries
+
+
+def _heuristic_boundaries(lines: Sequence[str]) -> list[int]:
+    """
+    The 0-based lines which appear to start a top-level definition.
+
+    These are the unindented, non-blank lines outside of any braces.
+    """
+    boundaries = []
+    depth = 0
+    for number, line in enumerate(lines):
+        if depth <= 0 and line.strip() and not line[0].isspace():
+            if line.lstrip()[0] not in "})]":
+                boundaries.append(number)
+            depth = 0
+        stripped = _STRING.sub("", line)
+        depth += stripped.count("{") - stripped.count("}")
+    return boundaries
+
+
+def split_code(
+    code: str,
+    language: str = "unknown",
+    max_lines: int = 200,
+    overlap: int = 5,
+) -> list[Chunk]:
+    """
+    Split code into chunks at the boundaries of its top-level definitions.
+
+    Args:
+        code:
+            The code to split.
+        language:
+            The programming language of the code. Python is split according to
+            its syntax tree, other languages heuristically.
+        max_lines:
+            The maximum number of lines owned by a chunk.
+        overlap:
+            The number of lines included before and after the lines owned by a
+            chunk, for context.
+
+    Returns:
+        The chunks, in order. Code with at most `max_lines` lines results in a
+        single chunk.
+    """
+    lines = code.splitlines()
+    if len(lines) <= max_lines:
+        return [Chunk(code=code, first_line=1, start=1, end=max(len(lines), 1))]
+
+    boundaries = None
+    if language.lower() == "python":
+        boundaries = _python_boundaries(code)
+    if boundaries is None:
+        boundaries = _heuristic_boundaries(lines)
+    edges = sorted({0, *boundaries, len(lines)})
+
+    # Greedily pack consecutive segments into spans, splitting any segment
+    # which alone exceeds the maximum.
+    spans: list[tuple[int, int]] = []
+    start = previous = 0
+    for edge in edges[1:]:
+        if edge - start > max_lines:
+            if previous > start:
+                spans.append((start, previous))
+                start = previous
+            while edge - start > max_lines:
+                spans.append((start, start + max_lines))
+                start += max_lines
+        previous = edge
+    spans.append((start, len(lines)))
+
+    chunks = []
+    for start, end in spans:
+        first = max(start - overlap, 0)
+        last = min(end + overlap, len(lines))
+        chunks.append(
+            Chunk(
+                code="\n".join(lines[first:last]),
+                first_line=first + 1,
+                start=start + 1,
+                end=end,
+            )
+        )
+    return chunks
+
+
+def _duplicate(a: Recommendation, b: Recommendation) -> bool:
+    """
+    Whether two recommendations report the same issue.
+    """
+    if a.line != b.line or a.severity != b.severity:
+        return False
+    x, y = a.message.strip().lower(), b.message.strip().lower()
+    return x == y or difflib.SequenceMatcher(None, x, y).ratio() >= _SIMILAR_MESSAGE
+
+
+def merge_reviews(
+    chunks: Sequence[Chunk], reviews: Sequence[Recommendations | BaseException]
+) -> Recommendations:
+    """
+    Merge the reviews of the chunks of a file.
+
+    Args:
+        chunks:
+            The chunks of the file.
+        reviews:
+            The review of each chunk, or the exception raised while reviewing
+            it.
+
+    Returns:
+        The review of the file, with line numbers in file coordinates and
+        duplicate recommendations removed. The review has failed if the review
+        of any chunk failed, in which case it contains the recommendations of
+        the chunks which were reviewed successfully.
+    """
+    candidates: list[tuple[bool, Recommendation]] = []
+    failed = False
+    for chunk, review in zip(chunks, reviews, strict=True):
+        if isinstance(review, BaseException) or review.review_result != "Success":
+            failed = True
+            continue
+        for recommendation in review.recommendations:
+            line = chunk.to_file_line(recommendation.line)
+            candidates.append((
+                chunk.owns(line),
+                recommendation.model_copy(update={"line": line}),
+            ))
+
+    # Recommendations from the chunk owning their line take precedence.
+    kept: list[Recommendation] = []
+    for _, recommendation in sorted(candidates, key=lambda c: not c[0]):
+        if not any(_duplicate(recommendation, other) for other in kept):
+            kept.append(recommendation)
+    return Recommendations(
+        recommendations=sorted(kept, key=lambda r: r.line),
+        review_result="Failed" if failed else "Success",
+    )
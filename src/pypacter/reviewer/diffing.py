@@ -0,0 +1,189 @@
+"""
+Incremental review of changes.
+
+Most commits only touch a handful of lines of a file, yet reviewing the new
+version of the file from scratch costs as much as the first review. Given the
+review of the base version (from the cache), only the changed regions need to
+be reviewed again:
+
+-   The changed lines, with a bounded amount of surrounding context, are
+    reviewed as separate windows (see [`chunking`][pypacter.reviewer.chunking]).
+-   The recommendations of the base review on lines which did not change, and
+    which fall outside of every window, are carried over with their line number
+    shifted to the new version.
+
+The new version is either given as is, or as a unified diff against the base.
+"""
+
+import difflib
+import re
+from typing import Self
+
+from pydantic import BaseModel, Field, model_validator
+
+from pypacter.reviewer import Recommendation, Recommendations
+from pypacter.reviewer.chunking import Chunk
+
+__all__ = [
+    "DiffReviewInput",
+    "apply_unified_diff",
+    "plan_review",
+]
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class DiffReviewInput(BaseModel):
+    """
+    Input model for the review of a change.
+    """
+
+    base: str = Field(..., description="The code before the change.")
+    code: str | None = Field(default=None, description="The code after the change.")
+    diff: str | None = Field(
+        default=None,
+        description="The change, as a unified diff against the base code.",
+    )
+    language: str | None = Field(
+        default=None, description="The programming language of the code, if known."
+    )
+    filename: str | None = Field(
+        default=None,
+        description="The name of the file the code comes from, if known.",
+    )
+
+    @model_validator(mode="after")
+    def _check_change(self) -> Self:
+        if (self.code is None) == (self.diff is None):
+            msg = "Exactly one of `code` and `diff` must be given."
+            raise ValueError(msg)
+        return self
+
+    def new_code(self) -> str:
+        """
+        The code after the change.
+
+        Returns:
+            The code, applying the diff to the base if need be.
+
+        Raises:
+            ValueError: If the diff does not apply to the base.
+        """
+        if self.code is not None:
+            return self.code
+        return apply_unified_diff(self.base, self.diff or "")
+
+
+def apply_unified_diff(base: str, diff: str) -> str:
+    """
+    Apply a unified diff.
+
+    File headers (`---`/`+++`) are ignored, so the diff should only concern a
+    single file.
+
+    Args:
+        base:
+            The original code.
+        diff:
+            The unified diff.
+
+    Returns:
+        The patched code.
+
+    Raises:
+        ValueError: If the diff is malformed, or its context does not match the
+            base code.
+    """
+    old = base.splitlines()
+    new: list[str] = []
+    position = 0
+    lines = iter(diff.splitlines())
+    for line in lines:
+        header = _HUNK.match(line)
+        if header is None:
+            continue
+        start = int(header[1]) - (0 if header[2] == "0" else 1)
+        if start < position:
+            msg = f"Overlapping or unordered hunk: {line}"
+            raise ValueError(msg)
+        new.extend(old[position:start])
+        position = start
+        removed = int(header[2] or 1)
+        added = int(header[4] or 1)
+        while removed or added:
+            body = next(lines, None)
+            if body is None:
+                msg = f"Truncated hunk: {line}"
+                raise ValueError(msg)
+            marker, text = body[:1] or " ", body[1:]
+            if marker == "\\":
+                continue
+            if marker in {" ", "-"}:
+                if position >= len(old) or old[position] != text:
+                    msg = f"Diff does not apply at line {position + 1}"
+                    raise ValueError(msg)
+                position += 1
+                removed -= 1
+            if marker in {" ", "+"}:
+                new.append(text)
+                added -= 1
+    new.extend(old[position:])
+    return "\n".join(new)
+
+
+def plan_review(
+    base: str,
+    code: str,
+    base_review: Recommendations,
+    context: int = 10,
+) -> tuple[list[Chunk], list[Recommendation]]:
+    """
+    Plan the review of a change.
+
+    Args:
+        base:
+            The code before the change.
+        code:
+            The code after the change.
+        base_review:
+            The review of the base code.
+        context:
+            The number of unchanged lines reviewed around each change.
+
+    Returns:
+        The windows of the new code to review, and the recommendations of the
+        base review carried over to the new code.
+    """
+    old_lines, new_lines = base.splitlines(), code.splitlines()
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    moved: dict[int, int] = {}
+    spans: list[tuple[int, int]] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            moved.update((i1 + k + 1, j1 + k + 1) for k in range(i2 - i1))
+            continue
+        first = max(j1 + 1 - context, 1)
+        last = min(max(j2, j1 + 1) + context, len(new_lines))
+        if first > last:
+            continue
+        if spans and first <= spans[-1][1] + 1:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], last))
+        else:
+            spans.append((first, last))
+
+    windows = [
+        Chunk(
+            code="\n".join(new_lines[first - 1 : last]),
+            first_line=first,
+            start=first,
+            end=last,
+        )
+        for first, last in spans
+    ]
+    reused = []
+    for recommendation in base_review.recommendations:
+        line = moved.get(recommendation.line)
+        if line is not None and not any(window.owns(line) for window in windows):
+            reused.append(recommendation.model_copy(update={"line": line}))
+    return windows, reused
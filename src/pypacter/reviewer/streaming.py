@@ -0,0 +1,129 @@
+"""
+Incremental parsing of streamed reviews.
+
+The model generates the [`Recommendations`][pypacter.reviewer.Recommendations]
+JSON token by token, and a review of a large file takes many seconds to
+complete. The [`ItemStreamParser`][ItemStreamParser] follows the JSON as it
+is generated and hands out each
+[`Recommendation`][pypacter.reviewer.Recommendation] as soon as its object is
+closed, so that it can be shown to the user long before the review completes.
+"""
+
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+__all__ = ["ItemStreamParser"]
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+class ItemStreamParser(Generic[ModelT]):
+    """
+    Extracts the items of a list from a partial JSON document.
+
+    The document must be an object with a single list of objects, such as
+    `Recommendations`, whose items are validated as `item_type`.
+
+    The parser only tracks the nesting of the document, so each chunk is
+    scanned once regardless of how long the document grows. Text surrounding
+    the document (such as a Markdown code fence) is ignored.
+    """
+
+    def __init__(self, item_type: type[ModelT]) -> None:
+        """
+        Create a new parser.
+
+        Args:
+            item_type:
+                The type of the items of the list.
+        """
+        self.item_type = item_type
+        self._chunks: list[str] = []
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._start: tuple[int, int] | None = None
+
+    @property
+    def text(self) -> str:
+        """
+        The text received so far.
+        """
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> list[ModelT]:
+        """
+        Parse the next chunk of the document.
+
+        Args:
+            chunk:
+                The text generated since the previous chunk.
+
+        Returns:
+            The items completed by this chunk, in order. Items which are not
+            valid are skipped.
+        """
+        self._chunks.append(chunk)
+        completed = []
+        for position, char in enumerate(chunk):
+            if self._in_string:
+                self._scan_string(char)
+            elif (item := self._scan(char, position)) is not None:
+                completed.append(item)
+        return completed
+
+    def _scan_string(self, char: str) -> None:
+        """
+        Follow a character within a string, looking for its end.
+        """
+        if self._escaped:
+            self._escaped = False
+        elif char == "\\":
+            self._escaped = True
+        elif char == '"':
+            self._in_string = False
+
+    def _scan(self, char: str, position: int) -> ModelT | None:
+        """
+        Follow a character outside of a string, tracking the nesting.
+
+        Args:
+            char:
+                The character.
+            position:
+                The position of the character within the last chunk.
+
+        Returns:
+            The item closed by the character, if any.
+        """
+        if char == '"' and self._stack:
+            self._in_string = True
+        elif char == "{" or (char == "[" and self._stack):
+            # Items are the objects of the array of the top-level object.
+            if char == "{" and self._stack == ["{", "["]:
+                self._start = (len(self._chunks) - 1, position)
+            self._stack.append(char)
+        elif char in "}]" and self._stack:
+            self._stack.pop()
+            if char == "}" and self._stack == ["{", "["]:
+                return self._parse(position)
+        return None
+
+    def _parse(self, end: int) -> ModelT | None:
+        """
+        Parse the item ending at the given position of the last chunk.
+
+        Only the chunks spanned by the item are joined, so each item is copied
+        once however long the document grows.
+        """
+        start, self._start = self._start, None
+        if start is None:
+            return None
+        first, offset = start
+        text = "".join(self._chunks[first:])
+        end += len(text) - len(self._chunks[-1])
+        try:
+            return self.item_type.model_validate_json(text[offset : end + 1])
+        except ValidationError:
+            return None
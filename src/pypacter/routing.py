@@ -0,0 +1,382 @@
+"""
+Model routing.
+
+Not every call needs the strongest (and slowest, and most expensive) model.
+This module routes calls between models:
+
+-   A [`Cascade`][Cascade] tries a cheap model first, and escalates to the next
+    model whenever the output is not good enough, or the call fails.
+-   A [`SizeRouter`][SizeRouter] sends small inputs to a cheap model and larger
+    ones to a strong model.
+
+Both record which model answered each call, how often calls were escalated and
+the latency of each model, see [`RoutingStats`][RoutingStats].
+"""
+
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Any, Generic, TypeVar
+
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel, Field
+
+from pypacter.models import model_errors
+
+__all__ = [
+    "Cascade",
+    "ModelStats",
+    "RoutingStats",
+    "SizeRouter",
+]
+
+logger = logging.getLogger(__name__)
+
+InputT = TypeVar("InputT")
+OutputT = TypeVar("OutputT")
+
+
+class ModelStats(BaseModel):
+    """
+    Counters describing the calls made to one model.
+    """
+
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        """
+        The mean latency of the calls.
+        """
+        return self.seconds / self.calls if self.calls else 0.0
+
+
+class RoutingStats(BaseModel):
+    """
+    Counters describing the routing decisions.
+    """
+
+    requests: int = 0
+    escalated: int = 0
+    """
+    The number of requests passed on from the first model of a cascade.
+    """
+    escalations: int = 0
+    """
+    The number of times a request was passed on to the next model of a cascade.
+    """
+    decisions: dict[str, int] = Field(default_factory=dict)
+    """
+    The number of requests answered by each model.
+    """
+    models: dict[str, ModelStats] = Field(default_factory=dict)
+
+    @property
+    def escalation_rate(self) -> float:
+        """
+        The share of requests which were escalated at least once.
+        """
+        return self.escalated / self.requests if self.requests else 0.0
+
+
+class _Routed(Runnable[InputT, OutputT], Generic[InputT, OutputT]):
+    """
+    Base class of the routers, recording the routing statistics.
+    """
+
+    def __init__(self, routes: Sequence[tuple[str, Runnable[InputT, OutputT]]]) -> None:
+        if not routes:
+            msg = "At least one route is required."
+            raise ValueError(msg)
+        self.routes = list(routes)
+        self._stats = RoutingStats()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> RoutingStats:
+        """
+        A snapshot of the routing counters.
+        """
+        with self._lock:
+            return self._stats.model_copy(deep=True)
+
+    def _record_call(self, name: str, start: float, *, error: bool = False) -> None:
+        """
+        Record the latency of a call to a model.
+        """
+        seconds = time.perf_counter() - start
+        with self._lock:
+            stats = self._stats.models.setdefault(name, ModelStats())
+            stats.calls += 1
+            stats.errors += error
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def _record_decision(self, name: str, escalations: int = 0) -> None:
+        """
+        Record the model which answered a request.
+        """
+        logger.debug("Routed to %s after %d escalation(s)", name, escalations)
+        with self._lock:
+            self._stats.requests += 1
+            self._stats.escalated += escalations > 0
+            self._stats.escalations += escalations
+            self._stats.decisions[name] = self._stats.decisions.get(name, 0) + 1
+
+    def _call(
+        self,
+        name: str,
+        runnable: Runnable[InputT, OutputT],
+        input: InputT,
+        config: RunnableConfig | None,
+    ) -> OutputT:
+        """
+        Call a model, recording its latency.
+        """
+        start = time.perf_counter()
+        try:
+            output = runnable.invoke(input, config)
+        except Exception:
+            self._record_call(name, start, error=True)
+            raise
+        self._record_call(name, start)
+        return output
+
+    async def _acall(
+        self,
+        name: str,
+        runnable: Runnable[InputT, OutputT],
+        input: InputT,
+        config: RunnableConfig | None,
+    ) -> OutputT:
+        """
+        Call a model, recording its latency.
+        """
+        start = time.perf_counter()
+        try:
+            output = await runnable.ainvoke(input, config)
+        except Exception:
+            self._record_call(name, start, error=True)
+            raise
+        self._record_call(name, start)
+        return output
+
+
+class Cascade(_Routed[InputT, OutputT]):
+    """
+    Tries models in turn, until one gives a satisfactory output.
+
+    The models are usually ordered from the cheapest to the strongest. The
+    output of the last model is always accepted, and its failures are raised.
+    A call is only escalated on the failures expected of a model (see
+    [`model_errors`][pypacter.models.model_errors]), other errors are raised.
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[tuple[str, Runnable[InputT, OutputT]]],
+        escalate: Callable[[OutputT], bool],
+    ) -> None:
+        """
+        Create a new cascade.
+
+        Args:
+            stages:
+                The name of each model (as reported in the statistics) and the
+                runnable calling it, in the order they are tried.
+            escalate:
+                Whether an output should be passed on to the next model.
+        """
+        super().__init__(stages)
+        self.escalate = escalate
+
+    def invoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the models in turn, until one gives a satisfactory output.
+
+        Args:
+            input:
+                The input of the models.
+            config:
+                An optional configuration for the models.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The first satisfactory output, or the output of the last model.
+        """
+        *stages, (last_name, last) = self.routes
+        for escalations, (name, runnable) in enumerate(stages):
+            try:
+                output = self._call(name, runnable, input, config)
+            except model_errors():
+                logger.warning("Escalating after %s failed", name, exc_info=True)
+                continue
+            if not self.escalate(output):
+                self._record_decision(name, escalations)
+                return output
+        output = self._call(last_name, last, input, config)
+        self._record_decision(last_name, len(stages))
+        return output
+
+    async def ainvoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the models in turn, until one gives a satisfactory output.
+
+        Args:
+            input:
+                The input of the models.
+            config:
+                An optional configuration for the models.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The first satisfactory output, or the output of the last model.
+        """
+        *stages, (last_name, last) = self.routes
+        for escalations, (name, runnable) in enumerate(stages):
+            try:
+                output = await self._acall(name, runnable, input, config)
+            except model_errors():
+                logger.warning("Escalating after %s failed", name, exc_info=True)
+                continue
+            if not self.escalate(output):
+                self._record_decision(name, escalations)
+                return output
+        output = await self._acall(last_name, last, input, config)
+        self._record_decision(last_name, len(stages))
+        return output
+
+
+class SizeRouter(_Routed[InputT, OutputT]):
+    """
+    Sends small inputs to one model, and larger inputs to another.
+    """
+
+    def __init__(
+        self,
+        small: tuple[str, Runnable[InputT, OutputT]],
+        large: tuple[str, Runnable[InputT, OutputT]],
+        size: Callable[[InputT], int],
+        max_small_size: int,
+    ) -> None:
+        """
+        Create a new router.
+
+        Args:
+            small:
+                The name of the model for small inputs (as reported in the
+                statistics), and the runnable calling it.
+            large:
+                The name of the model for larger inputs, and the runnable
+                calling it.
+            size:
+                The size of an input, e.g. its number of tokens.
+            max_small_size:
+                The largest size of the inputs sent to the small model.
+        """
+        super().__init__([small, large])
+        self.size = size
+        self.max_small_size = max_small_size
+
+    def _route(self, input: InputT) -> tuple[str, Runnable[InputT, OutputT]]:
+        """
+        Choose the model for an input, and record the decision.
+        """
+        small, large = self.routes
+        name, runnable = small if self.size(input) <= self.max_small_size else large
+        self._record_decision(name)
+        return name, runnable
+
+    def invoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the model suited to the size of the input.
+
+        Args:
+            input:
+                The input of the model.
+            config:
+                An optional configuration for the model.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the model.
+        """
+        return self._call(*self._route(input), input, config)
+
+    async def ainvoke(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401, ARG002
+    ) -> OutputT:
+        """
+        Call the model suited to the size of the input.
+
+        Args:
+            input:
+                The input of the model.
+            config:
+                An optional configuration for the model.
+            kwargs:
+                Additional arguments. These are required by the parent class,
+                but are not used in this method.
+
+        Returns:
+            The output of the model.
+        """
+        return await self._acall(*self._route(input), input, config)
+
+    async def astream(
+        self,
+        input: InputT,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> AsyncIterator[OutputT]:
+        """
+        Stream the output of the model suited to the size of the input.
+
+        Args:
+            input:
+                The input of the model.
+            config:
+                An optional configuration for the model.
+            kwargs:
+                Additional arguments passed to the model.
+
+        Yields:
+            The chunks of the output of the model.
+        """
+        name, runnable = self._route(input)
+        start = time.perf_counter()
+        try:
+            async for chunk in runnable.astream(input, config, **kwargs):
+                yield chunk
+        except Exception:
+            self._record_call(name, start, error=True)
+            raise
+        self._record_call(name, start)
@@ -0,0 +1,200 @@
+"""
+Request coalescing.
+
+When the same input is submitted many times at once (e.g. the same file sent by
+every job of a CI fan-out), each request would call the model before any of
+them could populate the cache. A [`SingleFlight`][SingleFlight] group ensures
+that only one call per key is in flight at any time: the first caller (the
+leader) does the work, and the callers arriving while it is running wait for
+and share its outcome. Should the call fail, the exception is raised to every
+waiting caller.
+
+Synchronous and asynchronous calls are coalesced separately, as a thread cannot
+await a future of an event loop (nor an event loop block on a thread).
+"""
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+from pydantic import BaseModel
+
+__all__ = [
+    "SingleFlight",
+    "SingleFlightStats",
+]
+
+T = TypeVar("T")
+
+
+class SingleFlightStats(BaseModel):
+    """
+    Counters describing the effectiveness of request coalescing.
+    """
+
+    leaders: int = 0
+    """
+    Calls which did the work.
+    """
+    followers: int = 0
+    """
+    Calls which shared the outcome of an identical call already in flight.
+    """
+    max_waiters: int = 0
+    """
+    The largest number of followers any single call had.
+    """
+
+
+class _Call(Generic[T]):
+    """
+    A synchronous call in flight.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls sharing the same key.
+
+    The group is safe to share between threads.
+    """
+
+    def __init__(self) -> None:
+        """
+        Create a new group.
+        """
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call[T]] = {}
+        self._tasks: dict[str, asyncio.Task[T]] = {}
+        self._task_waiters: dict[str, int] = {}
+        self._stats = SingleFlightStats()
+
+    @property
+    def stats(self) -> SingleFlightStats:
+        """
+        A snapshot of the coalescing counters.
+        """
+        with self._lock:
+            return self._stats.model_copy()
+
+    def waiters(self) -> dict[str, int]:
+        """
+        The number of followers of each call currently in flight.
+
+        Returns:
+            The keys in flight, mapped to the number of callers waiting on
+            them (in addition to the leader).
+        """
+        with self._lock:
+            counts = {key: call.waiters for key, call in self._calls.items()}
+            for key, count in self._task_waiters.items():
+                counts[key] = counts.get(key, 0) + count
+            return counts
+
+    def _follow(self, waiters: int) -> None:
+        """
+        Count a follower. Must be called with the lock held.
+        """
+        self._stats.followers += 1
+        self._stats.max_waiters = max(self._stats.max_waiters, waiters)
+
+    def do(self, key: str, fn: Callable[[], T]) -> tuple[T, bool]:
+        """
+        Call a function, unless an identical call is already in flight.
+
+        Args:
+            key:
+                Identifies the call. Calls with the same key must produce the
+                same result.
+            fn:
+                The function to call.
+
+        Returns:
+            The result, and whether it was shared from another caller's call.
+
+        Raises:
+            Exception: Whatever the function raised, whether it was called by
+                this caller or the one it shared the call with.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._follow(call.waiters)
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._stats.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True  # type: ignore[return-value]
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Await a function, unless an identical call is already in flight.
+
+        The call runs in its own task, so that cancelling the caller which
+        started it does not cancel it for the others.
+
+        Args:
+            key:
+                Identifies the call. Calls with the same key must produce the
+                same result.
+            fn:
+                The function to await.
+
+        Returns:
+            The result, and whether it was shared from another caller's call.
+
+        Raises:
+            Exception: Whatever the function raised, whether it was called by
+                this caller or the one it shared the call with.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is not None and task.get_loop() is loop:
+                self._task_waiters[key] += 1
+                self._follow(self._task_waiters[key])
+                shared = True
+            else:
+
+                async def run() -> T:
+                    return await fn()
+
+                task = self._tasks[key] = loop.create_task(run())
+                self._task_waiters[key] = 0
+                self._stats.leaders += 1
+                shared = False
+
+                def forget(done: asyncio.Task[T]) -> None:
+                    with self._lock:
+                        if self._tasks.get(key) is done:
+                            del self._tasks[key]
+                            del self._task_waiters[key]
+
+                task.add_done_callback(forget)
+
+        return await asyncio.shield(task), shared
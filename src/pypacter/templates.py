@@ -0,0 +1,79 @@
+"""
+Prompt templates.
+
+The prompts are kept in Markdown files alongside the modules using them. They
+are read and parsed on first use rather than when the modules are imported, and
+then shared by every language detector and code reviewer.
+"""
+
+import functools
+from pathlib import Path
+
+from langchain_core.prompts import (
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate,
+)
+
+from pypacter.cache import make_key
+
+__all__ = [
+    "fingerprint",
+    "human_template",
+    "system_template",
+]
+
+
+@functools.cache
+def system_template(path: Path, *input_variables: str) -> SystemMessagePromptTemplate:
+    """
+    Load a system message template.
+
+    Args:
+        path:
+            The template file.
+        input_variables:
+            The variables of the template.
+
+    Returns:
+        The template.
+    """
+    return SystemMessagePromptTemplate.from_template_file(
+        template_file=path, input_variables=list(input_variables)
+    )
+
+
+@functools.cache
+def human_template(path: Path, *input_variables: str) -> HumanMessagePromptTemplate:
+    """
+    Load a human message template.
+
+    Args:
+        path:
+            The template file.
+        input_variables:
+            The variables of the template.
+
+    Returns:
+        The template.
+    """
+    return HumanMessagePromptTemplate.from_template_file(
+        template_file=path, input_variables=list(input_variables)
+    )
+
+
+@functools.cache
+def fingerprint(*paths: Path) -> str:
+    """
+    Fingerprint template files.
+
+    The fingerprint is used to invalidate cached results when the prompts
+    change.
+
+    Args:
+        paths:
+            The template files.
+
+    Returns:
+        A key unique to the contents of the files.
+    """
+    return make_key(*(path.read_text() for path in paths))
@@ -0,0 +1,60 @@
+"""
+Token accounting.
+
+Helpers to measure how many tokens a prompt or completion uses. The actual
+usage reported by the model is preferred, and an estimate is used where the
+model does not report it (e.g. test doubles and some providers).
+"""
+
+import math
+
+from langchain_core.messages import BaseMessage
+
+__all__ = [
+    "CHARS_PER_TOKEN",
+    "estimate_tokens",
+    "message_tokens",
+]
+
+CHARS_PER_TOKEN = 4.0
+"""
+The average number of characters per token, a common rule of thumb for English
+text and source code with GPT tokenizers.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    This does not need a tokenizer (nor the network access some tokenizers need
+    to fetch their vocabulary), at the cost of being approximate.
+
+    Args:
+        text:
+            The text.
+
+    Returns:
+        The estimated number of tokens.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(prompt: list[BaseMessage], response: BaseMessage) -> int:
+    """
+    The total number of tokens used by a model call.
+
+    Args:
+        prompt:
+            The messages sent to the model.
+        response:
+            The message returned by the model.
+
+    Returns:
+        The input and output tokens reported by the model, or estimated from the
+        message contents if the model did not report them.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        return int(usage["total_tokens"])
+    return sum(estimate_tokens(str(m.content)) for m in [*prompt, response])
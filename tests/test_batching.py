@@ -0,0 +1,196 @@
+import asyncio
+import json
+import re
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import RunnableLambda, RunnableSerializable
+
+from pypacter.breaker import CircuitBreaker
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.language_detector.batching import MicroBatcher
+from pypacter.limiter import AdaptiveLimiter
+
+SNIPPET = re.compile(r"### Snippet (\d+)\n\n```\n(.*?)\n```", re.DOTALL)
+
+
+def answer(messages: list[BaseMessage], *_: object) -> AIMessage:
+    """A batched answer naming each snippet's language after its code."""
+    results = [
+        {
+            "index": int(index),
+            "language": code,
+            "confidence": 0.9,
+            "message": "",
+            "result": "detection successful",
+        }
+        for index, code in SNIPPET.findall(str(messages[-1].content))
+    ]
+    return AIMessage(content=json.dumps({"results": results}))
+
+
+def single(code: str) -> LanguageDetectionOutput:
+    return LanguageDetectionOutput(
+        language=f"single {code}",
+        confidence=0.5,
+        message="",
+        result="detection successful",
+    )
+
+
+@pytest.fixture
+def model() -> MagicMock:
+    model = MagicMock(spec=RunnableSerializable)
+    model.ainvoke.side_effect = answer
+    return model
+
+
+@pytest.fixture
+def chain() -> MagicMock:
+    chain = MagicMock(spec=RunnableSerializable)
+    chain.ainvoke.side_effect = lambda payload, **_: single(payload["code"])
+    return chain
+
+
+def detector(model: MagicMock, chain: MagicMock, **kwargs: float) -> LanguageDetector:
+    detector = LanguageDetector(
+        MagicMock(spec=RunnableSerializable),
+        batcher=MicroBatcher(model, **kwargs),  # type: ignore[arg-type]
+    )
+    detector.chain = chain
+    return detector
+
+
+async def detect_all(detector: LanguageDetector, codes: list[str]) -> list[str]:
+    outputs = await asyncio.gather(*(detector.ainvoke({"code": c}) for c in codes))
+    return [output.language for output in outputs]
+
+
+def test_concurrent_requests_share_a_prompt(model: MagicMock, chain: MagicMock) -> None:
+    language_detector = detector(model, chain)
+
+    languages = asyncio.run(detect_all(language_detector, ["a", "b", "c"]))
+
+    assert languages == ["a", "b", "c"]
+    model.ainvoke.assert_awaited_once()
+    chain.ainvoke.assert_not_called()
+    stats = language_detector.batcher.stats  # type: ignore[union-attr]
+    assert (stats.batches, stats.snippets, stats.single_calls) == (1, 3, 0)
+    assert stats.tokens_per_snippet > 0
+    assert stats.mean_queue_seconds >= 0
+    assert language_detector.tier_stats == {"llm": 3}
+
+
+def test_full_batch_is_sent_immediately(model: MagicMock, chain: MagicMock) -> None:
+    language_detector = detector(model, chain, max_batch_size=2, max_wait=60)
+
+    languages = asyncio.run(
+        asyncio.wait_for(detect_all(language_detector, ["a", "b"]), timeout=5)
+    )
+
+    assert languages == ["a", "b"]
+    assert language_detector.batcher.stats.max_queue_seconds < 5  # type: ignore[union-attr]
+
+
+def test_lone_request_uses_single_call(model: MagicMock, chain: MagicMock) -> None:
+    language_detector = detector(model, chain)
+
+    languages = asyncio.run(detect_all(language_detector, ["a"]))
+
+    assert languages == ["single a"]
+    model.ainvoke.assert_not_called()
+
+
+def test_unparseable_answer_falls_back(model: MagicMock, chain: MagicMock) -> None:
+    model.ainvoke.side_effect = None
+    model.ainvoke.return_value = AIMessage(content="I think these are Python.")
+    language_detector = detector(model, chain)
+
+    languages = asyncio.run(detect_all(language_detector, ["a", "b"]))
+
+    assert languages == ["single a", "single b"]
+    assert language_detector.batcher.stats.single_calls == 2  # type: ignore[union-attr]
+
+
+def test_missing_result_falls_back(model: MagicMock, chain: MagicMock) -> None:
+    """Only the snippets missing from the answer are detected on their own."""
+
+    def partial(messages: list[BaseMessage], *_: object) -> AIMessage:
+        content = json.loads(str(answer(messages).content))
+        content["results"] = content["results"][:1]
+        return AIMessage(content=json.dumps(content))
+
+    model.ainvoke.side_effect = partial
+    language_detector = detector(model, chain)
+
+    languages = asyncio.run(detect_all(language_detector, ["a", "b"]))
+
+    assert languages == ["a", "single b"]
+
+
+def test_routed_detections_are_not_batched(model: MagicMock, chain: MagicMock) -> None:
+    """Detections routed through a fast model are routed one by one."""
+    language_detector = LanguageDetector(
+        MagicMock(spec=RunnableSerializable),
+        fast_model=MagicMock(model_name="mini"),
+        batcher=MicroBatcher(model),  # type: ignore[arg-type]
+    )
+    language_detector.chain = chain
+
+    languages = asyncio.run(detect_all(language_detector, ["a", "b"]))
+
+    assert languages == ["single a", "single b"]
+    model.ainvoke.assert_not_called()
+
+
+def test_unexpected_error_fails_the_batch(model: MagicMock, chain: MagicMock) -> None:
+    """Errors other than failures of the model are not retried one by one."""
+    model.ainvoke.side_effect = TypeError("bug")
+    language_detector = detector(model, chain)
+
+    languages = asyncio.run(detect_all(language_detector, ["a", "b"]))
+
+    assert languages == ["unknown", "unknown"]
+    assert language_detector.batcher.stats.single_calls == 0  # type: ignore[union-attr]
+    chain.ainvoke.assert_not_called()
+
+
+def test_batches_share_the_limiter() -> None:
+    limiter = AdaptiveLimiter()
+    language_detector = LanguageDetector(RunnableLambda(answer), limiter=limiter)
+    language_detector.batcher = MicroBatcher(language_detector.llm)
+
+    languages = asyncio.run(detect_all(language_detector, ["a", "b"]))
+
+    assert languages == ["a", "b"]
+    assert limiter.stats.calls == 1
+
+
+def test_batches_are_guarded_by_the_breaker() -> None:
+    """Failed batches open the breaker, after which batches are not sent."""
+    calls = []
+
+    def fail(messages: list[BaseMessage]) -> AIMessage:
+        calls.append(messages)
+        msg = "provider down"
+        raise ConnectionError(msg)
+
+    breaker = CircuitBreaker(failure_threshold=1)
+    language_detector = LanguageDetector(RunnableLambda(fail), breaker=breaker)
+    language_detector.batcher = MicroBatcher(language_detector.llm)
+    codes = ["def f():\n    return 1", "def g():\n    return 2"]
+
+    async def detect() -> list[LanguageDetectionOutput]:
+        return await asyncio.gather(
+            *(language_detector.ainvoke({"code": code}) for code in codes)
+        )
+
+    for _ in range(2):
+        outputs = asyncio.run(asyncio.wait_for(detect(), timeout=5))
+        assert all(output.degraded for output in outputs)
+
+    assert len(calls) == 1
+    stats = breaker.stats
+    assert (stats.failures, stats.short_circuited) == (1, 3)
+    assert language_detector.batcher.stats.batches == 0
@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from pypacter.breaker import CircuitBreaker, CircuitOpen, Guarded
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.limiter import LimitExceeded
+from pypacter.parsers import OutputParser
+
+
+def _fail(_: str) -> str:
+    msg = "provider down"
+    raise ConnectionError(msg)
+
+
+def test_opens_after_consecutive_failures() -> None:
+    breaker = CircuitBreaker(failure_threshold=3)
+    guarded = Guarded(RunnableLambda(_fail), breaker)
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            guarded.invoke("x")
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpen):
+        guarded.invoke("x")
+    stats = breaker.stats
+    assert (stats.failures, stats.opened, stats.short_circuited) == (3, 1, 1)
+
+
+def test_successes_reset_the_failures() -> None:
+    breaker = CircuitBreaker(failure_threshold=2)
+
+    breaker.record(0.1, failed=True)
+    breaker.record(0.1)
+    breaker.record(0.1, failed=True)
+
+    assert breaker.state == "closed"
+    assert breaker.stats.consecutive_failures == 1
+
+
+def test_slow_calls_count_as_failures() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, latency_threshold=1.0)
+
+    breaker.record(0.5)
+    breaker.record(1.5)
+    breaker.record(2.0)
+
+    stats = breaker.stats
+    assert stats.state == "open"
+    assert (stats.failures, stats.latency_breaches) == (0, 2)
+
+
+def test_half_open_trial_closes_or_reopens() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record(0.1, failed=True)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    breaker.before_call()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+    breaker.record(0.1, failed=True)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record(0.1)
+    assert breaker.state == "closed"
+    assert breaker.stats.opened == 2
+
+
+def test_cancelled_trial_frees_its_place() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record(0.1, failed=True)
+
+    async def slow(x: str) -> str:
+        await asyncio.sleep(1)
+        return x
+
+    guarded: Guarded[str, str] = Guarded(RunnableLambda(slow), breaker)
+
+    async def run() -> None:
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(guarded.ainvoke("x"), 0.01)
+
+    asyncio.run(run())
+    breaker.before_call()
+    assert breaker.state == "half-open"
+
+
+def test_limiter_rejections_are_not_failures() -> None:
+    def reject(_: str) -> str:
+        msg = "no permit"
+        raise LimitExceeded(msg)
+
+    breaker = CircuitBreaker(failure_threshold=1)
+    guarded = Guarded(RunnableLambda(reject), breaker)
+    with pytest.raises(LimitExceeded):
+        guarded.invoke("x")
+    with pytest.raises(LimitExceeded):
+        asyncio.run(guarded.ainvoke("x"))
+    assert breaker.state == "closed"
+    assert breaker.stats.failures == 0
+
+    # A rejected trial call frees its place for the next one.
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record(0.1, failed=True)
+    with pytest.raises(LimitExceeded):
+        Guarded(RunnableLambda(reject), breaker).invoke("x")
+    breaker.before_call()
+    assert breaker.state == "half-open"
+
+
+def test_detector_degrades_to_local_detection() -> None:
+    breaker = CircuitBreaker(failure_threshold=1)
+    detector = LanguageDetector(RunnableLambda(_fail), breaker=breaker)
+    code = "#!/usr/bin/env python3\nimport os\nprint(os.getcwd())\n"
+
+    first = detector.invoke({"code": code})
+    second = asyncio.run(detector.ainvoke({"code": code}))
+
+    for output in (first, second):
+        assert output.degraded
+        assert output.language == "python"
+        assert output.result == "detection successful"
+    assert breaker.stats.short_circuited == 1
+    assert detector.tier_stats["degraded"] == 2
+
+
+def test_degraded_output_without_guess() -> None:
+    detector = LanguageDetector(
+        RunnableLambda(_fail), breaker=CircuitBreaker(), degraded=[]
+    )
+
+    output = detector.invoke({"code": "???"})
+
+    assert output.degraded
+    assert output.language == "unknown"
+
+
+def test_healthy_detection_is_not_degraded() -> None:
+    output = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    detector = LanguageDetector(
+        RunnableLambda(lambda _: output.model_dump_json()),
+        breaker=CircuitBreaker(),
+    )
+
+    assert not detector.invoke({"code": "x = 1"}).degraded
+    instructions = OutputParser(
+        pydantic_object=LanguageDetectionOutput
+    ).get_format_instructions()
+    assert "degraded" not in instructions
+    assert "degraded" in LanguageDetectionOutput.model_json_schema()["properties"]
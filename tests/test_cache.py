@@ -0,0 +1,178 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+
+from pypacter.cache import ResultCache, make_key
+from pypacter.language_detector import LanguageDetectionOutput
+
+
+class FakeClock:
+    """Manually advanced clock."""
+
+    def __init__(self) -> None:
+        """Start the clock at an arbitrary time."""
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        """Current time."""
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def output(language: str) -> LanguageDetectionOutput:
+    return LanguageDetectionOutput(
+        language=language,
+        confidence=0.9,
+        message="",
+        result="detection successful",
+    )
+
+
+def test_make_key_separates_parts() -> None:
+    assert make_key("ab", "c") != make_key("a", "bc")
+    assert make_key("a", "b") == make_key("a", "b")
+
+
+def test_hit_and_miss_counters() -> None:
+    cache = ResultCache(LanguageDetectionOutput)
+
+    assert cache.get("key") is None
+    cache.set("key", output("python"))
+    hit = cache.get("key")
+
+    assert hit is not None
+    assert hit.language == "python"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.memory_hits == 1
+    assert cache.stats.hit_rate == 0.5
+
+
+def test_returns_copies() -> None:
+    cache = ResultCache(LanguageDetectionOutput)
+    value = output("python")
+    cache.set("key", value)
+
+    value.language = "changed"
+    first = cache.get("key")
+    assert first is not None
+    first.language = "changed"
+
+    second = cache.get("key")
+    assert second is not None
+    assert second.language == "python"
+
+
+def test_lru_eviction() -> None:
+    cache = ResultCache(LanguageDetectionOutput, maxsize=2)
+    cache.set("a", output("a"))
+    cache.set("b", output("b"))
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", output("c"))
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats.evictions == 1
+
+
+def test_ttl_expiry(clock: FakeClock) -> None:
+    cache = ResultCache(LanguageDetectionOutput, ttl=10, clock=clock)
+    cache.set("key", output("python"))
+
+    clock.now += 9
+    assert cache.get("key") is not None
+    clock.now += 2
+    assert cache.get("key") is None
+    assert cache.stats.expirations == 1
+
+
+def test_disk_tier_is_shared(tmp_path: Path, clock: FakeClock) -> None:
+    path = tmp_path / "cache.sqlite"
+    writer = ResultCache(LanguageDetectionOutput, path=path, ttl=10, clock=clock)
+    reader = ResultCache(LanguageDetectionOutput, path=path, ttl=10, clock=clock)
+    other = ResultCache(LanguageDetectionOutput, path=path, namespace="other")
+
+    writer.set("key", output("rust"))
+    hit = reader.get("key")
+
+    assert hit is not None
+    assert hit.language == "rust"
+    assert reader.stats.disk_hits == 1
+    assert other.get("key") is None
+
+    # Promoted to memory after the first disk hit
+    reader.get("key")
+    assert reader.stats.memory_hits == 1
+
+    clock.now += 11
+    fresh = ResultCache(LanguageDetectionOutput, path=path, ttl=10, clock=clock)
+    assert fresh.get("key") is None
+
+    for cache in (writer, reader, other, fresh):
+        cache.close()
+
+
+def test_clear(tmp_path: Path) -> None:
+    cache = ResultCache(LanguageDetectionOutput, path=tmp_path / "cache.sqlite")
+    cache.set("key", output("python"))
+
+    cache.clear()
+
+    assert cache.get("key") is None
+    cache.close()
+
+
+def test_disk_tier_is_bounded(tmp_path: Path) -> None:
+    path = tmp_path / "cache.sqlite"
+    cache = ResultCache(
+        LanguageDetectionOutput, path=path, maxsize=1, max_disk_entries=2
+    )
+    for key in ("a", "b", "c"):
+        cache.set(key, output(key))
+    cache.close()
+
+    # A restarted process only finds the two most recently stored entries
+    restarted = ResultCache(LanguageDetectionOutput, path=path)
+    assert restarted.get("a") is None
+    assert restarted.get("b") is not None
+    assert restarted.get("c") is not None
+    restarted.close()
+
+
+def test_async_access_leaves_the_event_loop(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The on-disk tier is accessed in a worker thread."""
+    cache = ResultCache(LanguageDetectionOutput, path=tmp_path / "cache.sqlite")
+    threads = []
+    get, set_ = cache.get, cache.set
+
+    def recorded_get(key: str) -> LanguageDetectionOutput | None:
+        threads.append(threading.get_ident())
+        return get(key)
+
+    def recorded_set(key: str, value: LanguageDetectionOutput) -> None:
+        threads.append(threading.get_ident())
+        set_(key, value)
+
+    monkeypatch.setattr(cache, "get", recorded_get)
+    monkeypatch.setattr(cache, "set", recorded_set)
+
+    async def run() -> LanguageDetectionOutput | None:
+        await cache.aset("key", output("go"))
+        return await cache.aget("key")
+
+    hit = asyncio.run(run())
+
+    assert hit is not None
+    assert hit.language == "go"
+    assert len(threads) == 2
+    assert threading.get_ident() not in threads
+    cache.close()
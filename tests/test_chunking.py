@@ -0,0 +1,184 @@
+import asyncio
+import itertools
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.runnables import RunnableSerializable
+
+from pypacter.language_detector import LanguageDetectionOutput
+from pypacter.reviewer import Recommendation, Recommendations, Reviewer
+from pypacter.reviewer.chunking import Chunk, merge_reviews, split_code
+
+
+def python_module(functions: int, body: int = 8) -> str:
+    """A module of decorated functions, each `body + 2` lines long."""
+    blocks = [
+        "\n".join([
+            "@decorator",
+            f"def function_{i}(x):",
+            *(f"    x = x + {j}" for j in range(body - 1)),
+            "    return x",
+        ])
+        for i in range(functions)
+    ]
+    return '"""Module."""\n\n' + "\n\n".join(blocks)
+
+
+def assert_partition(chunks: list[Chunk], lines: int) -> None:
+    """Every line is owned by exactly one chunk."""
+    assert chunks[0].start == 1
+    assert chunks[-1].end == lines
+    for previous, chunk in itertools.pairwise(chunks):
+        assert chunk.start == previous.end + 1
+
+
+def test_short_code_is_one_chunk() -> None:
+    code = "x = 1\ny = 2"
+
+    assert split_code(code, "python", max_lines=10) == [
+        Chunk(code=code, first_line=1, start=1, end=2)
+    ]
+
+
+def test_python_split_at_definitions() -> None:
+    code = python_module(10)
+    lines = code.splitlines()
+
+    chunks = split_code(code, "python", max_lines=25, overlap=2)
+
+    assert len(chunks) > 1
+    assert_partition(chunks, len(lines))
+    for chunk in chunks:
+        assert chunk.end - chunk.start + 1 <= 25
+        # Chunks after the first start at a decorator, not within a function.
+        if chunk.start > 1:
+            assert lines[chunk.start - 1] == "@decorator"
+        assert chunk.first_line == max(chunk.start - 2, 1)
+        assert chunk.code.splitlines()[0] == lines[chunk.first_line - 1]
+
+
+def test_brace_languages_split_at_top_level() -> None:
+    functions = [
+        f"function f{i}(x) {{\n  if (x) {{\n    return '}}';\n  }}\n  return x;\n}}"
+        for i in range(10)
+    ]
+    code = "\n".join(functions)
+    lines = code.splitlines()
+
+    chunks = split_code(code, "javascript", max_lines=14, overlap=0)
+
+    assert_partition(chunks, len(lines))
+    for chunk in chunks:
+        assert lines[chunk.start - 1].startswith("function")
+
+
+def test_oversized_definition_is_split() -> None:
+    code = python_module(1, body=50)
+
+    chunks = split_code(code, "python", max_lines=20, overlap=0)
+
+    assert_partition(chunks, len(code.splitlines()))
+    assert all(chunk.end - chunk.start + 1 <= 20 for chunk in chunks)
+
+
+def test_merge_remaps_and_dedupes() -> None:
+    chunks = [
+        Chunk(code="", first_line=1, start=1, end=10),
+        Chunk(code="", first_line=9, start=11, end=20),
+    ]
+    reviews = [
+        Recommendations(
+            recommendations=[
+                Recommendation(line=3, severity="error", message="Bad name."),
+                Recommendation(line=11, severity="warning", message="Unused var x"),
+            ],
+            review_result="Success",
+        ),
+        Recommendations(
+            recommendations=[
+                # Line 11 of the file, reported by both chunks.
+                Recommendation(line=3, severity="warning", message="Unused variable x"),
+                Recommendation(line=5, severity="error", message="Bad name."),
+            ],
+            review_result="Success",
+        ),
+    ]
+
+    merged = merge_reviews(chunks, reviews)
+
+    assert merged.review_result == "Success"
+    assert [(r.line, r.message) for r in merged.recommendations] == [
+        (3, "Bad name."),
+        (11, "Unused variable x"),
+        (13, "Bad name."),
+    ]
+
+
+def test_merge_with_failed_chunk() -> None:
+    chunks = [
+        Chunk(code="", first_line=1, start=1, end=10),
+        Chunk(code="", first_line=11, start=11, end=20),
+    ]
+    review = Recommendations(
+        recommendations=[Recommendation(line=2, severity="error", message="x")],
+        review_result="Success",
+    )
+
+    merged = merge_reviews(chunks, [review, RuntimeError("context too long")])
+
+    assert merged.review_result == "Failed"
+    assert [r.line for r in merged.recommendations] == [2]
+
+
+@pytest.fixture
+def reviewer() -> Reviewer:
+    detector = MagicMock(spec=RunnableSerializable)
+    detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+    reviewer = Reviewer(
+        MagicMock(spec=RunnableSerializable),
+        language_detector=detector,  # type: ignore[arg-type]
+        max_chunk_lines=25,
+        chunk_overlap=2,
+    )
+    reviewer.chain = MagicMock(spec=RunnableSerializable)
+    return reviewer
+
+
+def test_reviewer_reviews_chunks_concurrently(reviewer: Reviewer) -> None:
+    reviewer.chain.abatch.side_effect = lambda inputs, *_, **__: [  # type: ignore[attr-defined]
+        Recommendations(
+            recommendations=[Recommendation(line=3, severity="error", message=str(i))],
+            review_result="Success",
+        )
+        for i in range(len(inputs))
+    ]
+    code = python_module(10)
+
+    output = asyncio.run(reviewer.ainvoke({"code": code}))
+
+    inputs, config = reviewer.chain.abatch.call_args.args  # type: ignore[attr-defined]
+    chunks = split_code(code, "python", max_lines=25, overlap=2)
+    assert [item["code"] for item in inputs] == [chunk.code for chunk in chunks]
+    assert config["max_concurrency"] == 4
+    assert reviewer.chain.abatch.call_args.kwargs["return_exceptions"] is True  # type: ignore[attr-defined]
+    assert output.review_result == "Success"
+    assert [r.line for r in output.recommendations] == [
+        chunk.first_line + 2 for chunk in chunks
+    ]
+    reviewer.chain.ainvoke.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_reviewer_reviews_short_code_whole(reviewer: Reviewer) -> None:
+    reviewer.chain.ainvoke.return_value = Recommendations(  # type: ignore[attr-defined]
+        recommendations=[], review_result="Success"
+    )
+
+    output = asyncio.run(reviewer.ainvoke({"code": "x = 1"}))
+
+    assert output.review_result == "Success"
+    reviewer.chain.abatch.assert_not_called()  # type: ignore[attr-defined]
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import openai
+import pytest
+from langchain_openai import ChatOpenAI
+
+from pypacter.connections import ConnectionPool, PoolSettings, shared_pool
+from pypacter.models import get_model
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "Hello"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """An OpenAI-compatible chat completions endpoint, recording clients."""
+
+    protocol_version = "HTTP/1.1"
+    clients: list[tuple[str, int]]
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Answer a chat completion request."""
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.clients.append(self.client_address)
+        body = json.dumps(COMPLETION).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_: object) -> None:
+        """Keep the test output quiet."""
+
+
+@pytest.fixture
+def stub() -> Iterator[tuple[str, list[tuple[str, int]]]]:
+    """Serve the stub endpoint, yielding its URL and the clients seen."""
+    clients: list[tuple[str, int]] = []
+    handler = type("Handler", (StubHandler,), {"clients": clients})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1", clients
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def silent_stub() -> Iterator[str]:
+    """Serve an endpoint which accepts requests but never answers them."""
+    release = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802
+            """Hold the request until the test is over, or for 10 seconds."""
+            release.wait(10)
+
+        def log_message(self, *_: object) -> None:
+            """Keep the test output quiet."""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    release.set()
+    server.shutdown()
+    server.server_close()
+
+
+def _model(pool: ConnectionPool, url: str) -> ChatOpenAI:
+    return ChatOpenAI(
+        model="stub",
+        api_key="sk-000",  # type: ignore[arg-type]
+        base_url=url,
+        max_retries=0,
+        http_client=pool.client(),
+        http_async_client=pool.async_client(),
+    )
+
+
+def test_models_share_connections(
+    stub: tuple[str, list[tuple[str, int]]],
+) -> None:
+    url, clients = stub
+    pool = ConnectionPool(PoolSettings(http2=False))
+
+    for model in (_model(pool, url), _model(pool, url)):
+        assert model.invoke("Hi").content == "Hello"
+
+    assert len(clients) == 2
+    assert clients[0] == clients[1], "the connection was not reused"
+    stats = pool.stats
+    assert (stats.requests, stats.in_flight, stats.max_in_flight) == (2, 0, 1)
+    assert stats.utilization == 0
+    pool.close()
+
+
+def test_async_saturation(stub: tuple[str, list[tuple[str, int]]]) -> None:
+    url, clients = stub
+    pool = ConnectionPool(PoolSettings(max_connections=1, http2=False))
+    model = _model(pool, url)
+
+    async def run() -> None:
+        await asyncio.gather(*(model.ainvoke("Hi") for _ in range(3)))
+        await pool.aclose()
+
+    asyncio.run(run())
+
+    assert len(clients) == 3
+    stats = pool.stats
+    assert (stats.requests, stats.in_flight) == (3, 0)
+    assert stats.saturated >= 1
+
+
+def test_failures_release_connections() -> None:
+    pool = ConnectionPool(PoolSettings(connect_timeout=0.5, http2=False))
+
+    with pytest.raises(httpx.ConnectError):
+        pool.client().get("http://127.0.0.1:1/")
+
+    stats = pool.stats
+    assert (stats.requests, stats.errors, stats.in_flight) == (1, 1, 0)
+
+
+def test_preconfigured_models_share_pool() -> None:
+    pool = shared_pool()
+
+    for name in ("GPT_4", "GPT_4O_MINI"):
+        model = get_model(name)
+        assert model.http_client is pool.client()  # type: ignore[attr-defined]
+        assert model.http_async_client is pool.async_client()  # type: ignore[attr-defined]
+
+
+def test_preconfigured_models_time_out(
+    silent_stub: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """The read timeout of the pool applies to the requests of the models."""
+    monkeypatch.setenv("OPENAI_API_BASE", silent_stub)
+    monkeypatch.setenv("PYPACTER_HTTP_READ_TIMEOUT", "0.2")
+    get_model.cache_clear()
+    shared_pool.cache_clear()
+    try:
+        model = get_model("GPT_4O_MINI")
+        start = time.perf_counter()
+        with pytest.raises(openai.APITimeoutError):
+            model.invoke("Hi")
+        # The model retries twice, each attempt timing out.
+        assert time.perf_counter() - start < 5
+    finally:
+        shared_pool().close()
+        get_model.cache_clear()
+        shared_pool.cache_clear()
+
+
+def test_settings_from_environment(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert PoolSettings.from_env() == PoolSettings()
+
+    monkeypatch.setenv("PYPACTER_HTTP_MAX_CONNECTIONS", "8")
+    monkeypatch.setenv("PYPACTER_HTTP_READ_TIMEOUT", "2.5")
+    monkeypatch.setenv("PYPACTER_HTTP2", "false")
+    settings = PoolSettings.from_env()
+    assert (settings.max_connections, settings.read_timeout) == (8, 2.5)
+    assert not settings.use_http2()
+
+    monkeypatch.setenv("PYPACTER_HTTP2", "maybe")
+    with pytest.raises(ValueError, match="PYPACTER_HTTP2"):
+        PoolSettings.from_env()
@@ -0,0 +1,182 @@
+import asyncio
+import difflib
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.runnables import RunnableSerializable
+from pydantic import ValidationError
+
+from pypacter.cache import ResultCache
+from pypacter.language_detector import LanguageDetectionOutput
+from pypacter.reviewer import Recommendation, Recommendations, Reviewer
+from pypacter.reviewer.diffing import (
+    DiffReviewInput,
+    apply_unified_diff,
+    plan_review,
+)
+
+BASE = "\n".join(f"line {i}" for i in range(1, 41))
+
+
+def change(code: str) -> str:
+    """Insert two lines after line 10, and change line 30."""
+    lines = code.splitlines()
+    lines[29] = "changed 30"
+    lines[10:10] = ["new a", "new b"]
+    return "\n".join(lines)
+
+
+def unified_diff(base: str, code: str, context: int = 3) -> str:
+    return "\n".join(
+        difflib.unified_diff(
+            base.splitlines(),
+            code.splitlines(),
+            "a/x.py",
+            "b/x.py",
+            n=context,
+            lineterm="",
+        )
+    )
+
+
+@pytest.mark.parametrize("context", [0, 1, 3])
+@pytest.mark.parametrize(
+    "new",
+    [
+        change(BASE),
+        "first\n" + BASE,
+        BASE + "\nlast",
+        "\n".join(BASE.splitlines()[5:]),
+        "",
+    ],
+)
+def test_apply_unified_diff(new: str, context: int) -> None:
+    assert apply_unified_diff(BASE, unified_diff(BASE, new, context)) == new
+
+
+def test_apply_unified_diff_mismatch() -> None:
+    diff = unified_diff(BASE, change(BASE))
+
+    with pytest.raises(ValueError, match="does not apply"):
+        apply_unified_diff(BASE.replace("line 9", "line nine"), diff)
+
+
+def test_input_requires_one_change() -> None:
+    with pytest.raises(ValidationError):
+        DiffReviewInput(base="x")
+    with pytest.raises(ValidationError):
+        DiffReviewInput(base="x", code="y", diff="z")
+    assert DiffReviewInput(base="x", code="y").new_code() == "y"
+
+
+def test_plan_review() -> None:
+    base_review = Recommendations(
+        recommendations=[
+            Recommendation(line=2, severity="warning", message="before"),
+            Recommendation(line=20, severity="warning", message="between"),
+            Recommendation(line=30, severity="error", message="changed"),
+            Recommendation(line=40, severity="warning", message="after"),
+        ],
+        review_result="Success",
+    )
+
+    windows, reused = plan_review(BASE, change(BASE), base_review, context=2)
+
+    assert [(w.start, w.end) for w in windows] == [(9, 14), (30, 34)]
+    assert windows[0].code.splitlines() == [
+        "line 9",
+        "line 10",
+        "new a",
+        "new b",
+        "line 11",
+        "line 12",
+    ]
+    # Recommendations outside the windows move with their line; the one on
+    # the changed line is dropped, to be reviewed again.
+    assert [(r.line, r.message) for r in reused] == [
+        (2, "before"),
+        (22, "between"),
+        (42, "after"),
+    ]
+
+
+@pytest.fixture
+def reviewer() -> Reviewer:
+    detector = MagicMock(spec=RunnableSerializable)
+    detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+    reviewer = Reviewer(
+        MagicMock(spec=RunnableSerializable),
+        language_detector=detector,  # type: ignore[arg-type]
+        cache=ResultCache(Recommendations),
+    )
+    reviewer.chain = MagicMock(spec=RunnableSerializable)
+    return reviewer
+
+
+def test_review_diff_reuses_base_review(reviewer: Reviewer) -> None:
+    chain: MagicMock = reviewer.chain  # type: ignore[assignment]
+    chain.ainvoke.return_value = Recommendations(
+        recommendations=[
+            Recommendation(line=2, severity="warning", message="base issue"),
+            Recommendation(line=30, severity="error", message="old issue"),
+        ],
+        review_result="Success",
+    )
+    chain.abatch.side_effect = lambda inputs, *_, **__: [
+        Recommendations(
+            recommendations=[
+                Recommendation(line=1, severity="error", message="window issue")
+            ],
+            review_result="Success",
+        )
+        for _ in inputs
+    ]
+    asyncio.run(reviewer.ainvoke({"code": BASE}))
+
+    output = asyncio.run(
+        reviewer.areview_diff(
+            {"base": BASE, "diff": unified_diff(BASE, change(BASE))}, context=2
+        )
+    )
+
+    assert output.review_result == "Success"
+    assert [(r.line, r.message) for r in output.recommendations] == [
+        (2, "base issue"),
+        (9, "window issue"),
+        (30, "window issue"),
+    ]
+    inputs = chain.abatch.call_args.args[0]
+    assert [len(item["code"].splitlines()) for item in inputs] == [6, 5]
+    chain.ainvoke.assert_awaited_once()
+
+    # The merged review is cached as the review of the new code.
+    again = asyncio.run(reviewer.areview_diff({"base": BASE, "code": change(BASE)}))
+    assert again == output
+    chain.abatch.assert_called_once()
+
+
+def test_review_diff_without_base_review(reviewer: Reviewer) -> None:
+    """The new code is reviewed in full if the base was never reviewed."""
+    chain: MagicMock = reviewer.chain  # type: ignore[assignment]
+    chain.ainvoke.return_value = Recommendations(
+        recommendations=[], review_result="Success"
+    )
+
+    output = asyncio.run(reviewer.areview_diff({"base": BASE, "code": change(BASE)}))
+
+    assert output.review_result == "Success"
+    assert chain.ainvoke.call_args.args[0]["code"] == change(BASE)
+    chain.abatch.assert_not_called()
+
+
+def test_review_diff_invalid_diff(reviewer: Reviewer) -> None:
+    diff = unified_diff(BASE, change(BASE))
+
+    output = reviewer.review_diff({"base": "something else", "diff": diff})
+
+    assert output.review_result == "Failed"
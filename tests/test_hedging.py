@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from pypacter.hedging import Hedged, HedgePolicy
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+
+
+def _slow_then_fast(delays: list[float]) -> RunnableLambda:
+    """A runnable whose calls take the given times, in turn."""
+    calls = iter(delays)
+
+    async def call(x: str) -> str:
+        delay = next(calls)
+        await asyncio.sleep(delay)
+        return f"{x}:{delay}"
+
+    return RunnableLambda(call)
+
+
+def test_fast_calls_are_not_hedged() -> None:
+    hedged = Hedged(_slow_then_fast([0.0] * 3), HedgePolicy(initial_delay=0.5))
+
+    async def run() -> list[str]:
+        return [await hedged.ainvoke("a") for _ in range(3)]
+
+    assert asyncio.run(run()) == ["a:0.0"] * 3
+    stats = hedged.stats
+    assert (stats.requests, stats.hedged, stats.capped) == (3, 0, 0)
+
+
+def test_slow_call_is_hedged() -> None:
+    hedged = Hedged(
+        _slow_then_fast([5.0, 0.0]),
+        HedgePolicy(initial_delay=0.05, max_ratio=1),
+    )
+
+    assert asyncio.run(hedged.ainvoke("a")) == "a:0.0"
+    stats = hedged.stats
+    assert (stats.requests, stats.hedged, stats.won) == (1, 1, 1)
+    assert stats.win_rate == 1
+
+
+def test_first_call_may_still_win() -> None:
+    hedged = Hedged(
+        _slow_then_fast([0.1, 5.0]),
+        HedgePolicy(initial_delay=0.05, max_ratio=1),
+    )
+
+    assert asyncio.run(hedged.ainvoke("a")) == "a:0.1"
+    assert (hedged.stats.hedged, hedged.stats.won) == (1, 0)
+
+
+def test_hedge_ratio_is_capped() -> None:
+    hedged = Hedged(
+        _slow_then_fast([0.1] * 4),
+        HedgePolicy(initial_delay=0.01, max_ratio=0.5),
+    )
+
+    async def run() -> None:
+        for _ in range(2):
+            await hedged.ainvoke("a")
+
+    asyncio.run(run())
+    stats = hedged.stats
+    assert (stats.requests, stats.hedged, stats.capped) == (2, 1, 1)
+    assert stats.hedge_rate == 0.5
+
+
+def test_delay_adapts_to_latencies(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Each call takes the number of seconds given as its input."""
+    now = 0.0
+
+    def call(seconds: float) -> float:
+        nonlocal now
+        now += seconds
+        return seconds
+
+    monkeypatch.setattr(
+        "pypacter.hedging.time", SimpleNamespace(perf_counter=lambda: now)
+    )
+    hedged = Hedged(
+        RunnableLambda(call),
+        HedgePolicy(percentile=0.5, min_samples=4, initial_delay=10),
+    )
+    for seconds in (1, 2, 3):
+        hedged.invoke(seconds)
+    assert hedged.stats.delay == 10
+
+    hedged.invoke(4)
+    assert hedged.stats.delay == 3
+
+
+def test_failure_of_both_calls_is_raised() -> None:
+    async def fail(_: str) -> str:
+        await asyncio.sleep(0.1)
+        msg = "model unavailable"
+        raise RuntimeError(msg)
+
+    hedged: Hedged[str, str] = Hedged(
+        RunnableLambda(fail), HedgePolicy(initial_delay=0.01, max_ratio=1)
+    )
+
+    with pytest.raises(RuntimeError, match="model unavailable"):
+        asyncio.run(hedged.ainvoke("a"))
+    assert hedged.stats.hedged == 1
+
+
+def test_detector_hedges_model() -> None:
+    output = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    detector = LanguageDetector(
+        RunnableLambda(lambda _: output.model_dump_json()), hedge=HedgePolicy()
+    )
+
+    detection = asyncio.run(detector.ainvoke({"code": "x = 1"}))
+
+    assert detection.language == "python"
+    stats = detector.hedge_stats
+    assert stats is not None
+    assert stats.requests == 1
+    assert LanguageDetector(RunnableLambda(lambda x: x)).hedge_stats is None
@@ -0,0 +1,70 @@
+import pytest
+
+from pypacter.language_detector.heuristics import HeuristicDetector
+
+
+@pytest.fixture
+def detector() -> HeuristicDetector:
+    return HeuristicDetector()
+
+
+@pytest.mark.parametrize(
+    ("code", "language"),
+    [
+        ("#!/usr/bin/env python3\nprint('hi')", "python"),
+        ("#!/bin/bash\necho hi", "bash"),
+        ("#!/usr/bin/env -S node --harmony\nconsole.log(1)", "javascript"),
+        ("<?php\necho 'hi';", "php"),
+        ('package main\n\nimport "fmt"\n', "go"),
+        ("#include <iostream>\nint main() { std::cout << 1; }", "cpp"),
+        ("def add(a, b):\n    return a + b", "python"),
+        ("using System;\nclass A {}", "csharp"),
+        ('fn main() {\n    println!("hi");\n}', "rust"),
+    ],
+)
+def test_unambiguous_snippets(
+    detector: HeuristicDetector, code: str, language: str
+) -> None:
+    guess = detector.guess(code)
+
+    assert guess is not None
+    assert guess.language == language
+    assert guess.confidence >= 0.9
+
+
+@pytest.mark.parametrize(
+    ("code", "language"),
+    [
+        (
+            "const fs = require('fs');\n"
+            "function read(path) {\n"
+            "  console.log(path === '');\n"
+            "}\n"
+            "module.exports = read;",
+            "javascript",
+        ),
+        (
+            "require 'json'\ndef hello\n  puts 'hi'\nend\n"
+            "[1, 2].each do |x|\n  puts x\nend",
+            "ruby",
+        ),
+        ("SELECT id, name FROM users WHERE id = 1 ORDER BY name;", "sql"),
+    ],
+)
+def test_keyword_scoring(detector: HeuristicDetector, code: str, language: str) -> None:
+    guess = detector.guess(code)
+
+    assert guess is not None
+    assert guess.language == language
+    assert 0 < guess.confidence < 0.9
+
+
+@pytest.mark.parametrize("code", ["", "this is a good day", "x=5"])
+def test_no_evidence(detector: HeuristicDetector, code: str) -> None:
+    assert detector.guess(code) is None
+
+
+def test_ambiguous_snippet_has_low_confidence(detector: HeuristicDetector) -> None:
+    guess = detector.guess("print('Hello, World!')")
+
+    assert guess is None or guess.confidence < 0.5
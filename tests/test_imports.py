@@ -0,0 +1,79 @@
+"""
+Importing the package must stay cheap.
+
+The imports run in a fresh interpreter, as the modules are already imported in
+the test session.
+"""
+
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET = float(os.getenv("PYPACTER_IMPORT_BUDGET", "0.3"))
+"""
+The maximum time, in seconds, importing the detector and the reviewer may add to
+importing the parts of LangChain they build upon.
+
+Importing the OpenAI client alone takes longer than this.
+"""
+
+MODULES = "pypacter.language_detector, pypacter.reviewer, pypacter.models"
+BASELINE = (
+    "langchain_core.runnables.base, langchain_core.output_parsers.pydantic, "
+    "langchain_core.prompts.chat, pydantic"
+)
+
+
+def run(*args: str) -> subprocess.CompletedProcess[str]:
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    return subprocess.run(  # noqa: S603
+        [sys.executable, *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+
+def import_time(modules: str) -> float:
+    """
+    The time to import modules in a fresh interpreter, from `-X importtime`.
+    """
+    result = run("-X", "importtime", "-c", f"import {modules}")
+    total = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            total += int(cumulative)
+    return total / 1e6
+
+
+def test_import_is_lazy() -> None:
+    """Importing does not create any model, nor need an API key."""
+    heavy = ("langchain_openai", "openai", "langchain.output_parsers", "dotenv")
+    result = run(
+        "-c",
+        f"import sys, {MODULES}; print(sorted(m for m in sys.modules "
+        f"if any(m == h or m.startswith(h + '.') for h in {heavy!r})))",
+    )
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_templates_loaded_on_use() -> None:
+    result = run(
+        "-c",
+        "from pypacter.templates import fingerprint; "
+        "from pypacter.reviewer import PROMPT_VERSION, prompt_version; "
+        "print(fingerprint.cache_info().currsize, PROMPT_VERSION == prompt_version())",
+    )
+
+    assert result.stdout.split() == ["1", "True"]
+
+
+def test_import_time_budget() -> None:
+    # The fastest of a few runs, as other processes may slow down any one.
+    overhead = min(import_time(MODULES) - import_time(BASELINE) for _ in range(2))
+
+    assert overhead < IMPORT_BUDGET
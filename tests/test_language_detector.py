@@ -1,14 +1,21 @@
+import asyncio
+import sqlite3
 from unittest.mock import MagicMock
 
 import pytest
-from langchain_core.runnables import RunnableSerializable
+from langchain_core.runnables import RunnableLambda, RunnableSerializable
 from pydantic import ValidationError
 
+from pypacter.cache import ResultCache
 from pypacter.language_detector import (
     LanguageDetectionInput,
     LanguageDetectionOutput,
     LanguageDetector,
+    LocalLanguageDetector,
 )
+from pypacter.language_detector.heuristics import HeuristicDetector
+from pypacter.language_detector.sampling import CodeSampler
+from pypacter.tokens import estimate_tokens
 
 
 @pytest.fixture
@@ -161,3 +168,420 @@ def test_empty_input(
     assert output.confidence == 0.0
     assert output.result == "unknown language or no language detected"
     mock_chain.invoke.assert_called_once()
+
+
+def test_async_language_detection_success(
+    language_detector: LanguageDetector, mock_chain: MagicMock
+) -> None:
+    """Test that ainvoke awaits the chain instead of calling it synchronously."""
+    # Arrange
+    mock_chain.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    input_data = LanguageDetectionInput(code="  print('Hello, World!')  ")
+
+    # Act
+    output = asyncio.run(language_detector.ainvoke(input_data))
+
+    # Assert
+    assert output.language == "python"
+    mock_chain.ainvoke.assert_awaited_once()
+    assert mock_chain.ainvoke.call_args.args[0] == {"code": "print('Hello, World!')"}
+    mock_chain.invoke.assert_not_called()
+
+
+def test_async_language_chain_error(
+    language_detector: LanguageDetector, mock_chain: MagicMock
+) -> None:
+    """Test that ainvoke falls back when the chain raises."""
+    # Arrange
+    mock_chain.ainvoke.side_effect = Exception("Model error")
+    input_data = LanguageDetectionInput(code="print('Hello, World!')")
+
+    # Act
+    output = asyncio.run(language_detector.ainvoke(input_data))
+
+    # Assert
+    assert output.language == "unknown"
+    assert output.result == "unsuccesfull detection. model exception occured"
+
+
+def test_async_batch_runs_concurrently(
+    language_detector: LanguageDetector, mock_chain: MagicMock
+) -> None:
+    """Test that abatch keeps several chain calls in flight, in input order."""
+    in_flight = 0
+    peak = 0
+
+    async def fake_ainvoke(
+        payload: dict[str, str], **_: object
+    ) -> LanguageDetectionOutput:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return LanguageDetectionOutput(
+            language=payload["code"],
+            confidence=1.0,
+            message="",
+            result="detection successful",
+        )
+
+    mock_chain.ainvoke.side_effect = fake_ainvoke
+    inputs = [LanguageDetectionInput(code=str(i)) for i in range(6)]
+
+    # Act
+    outputs = asyncio.run(
+        language_detector.abatch(inputs, config={"max_concurrency": 3})
+    )
+
+    # Assert
+    assert [output.language for output in outputs] == [str(i) for i in range(6)]
+    assert peak == 3
+
+
+def test_async_stream_yields_final_output(
+    language_detector: LanguageDetector, mock_chain: MagicMock
+) -> None:
+    mock_chain.ainvoke.return_value = LanguageDetectionOutput(
+        language="go",
+        confidence=0.9,
+        message="",
+        result="detection successful",
+    )
+
+    async def collect() -> list[LanguageDetectionOutput]:
+        return [
+            chunk
+            async for chunk in language_detector.astream(
+                LanguageDetectionInput(code="package main")
+            )
+        ]
+
+    outputs = asyncio.run(collect())
+
+    assert [output.language for output in outputs] == ["go"]
+
+
+def test_cached_detection(mock_model: MagicMock, mock_chain: MagicMock) -> None:
+    """Test that a repeated snippet is served from the cache."""
+    # Arrange
+    cache = ResultCache(LanguageDetectionOutput)
+    detector = LanguageDetector(mock_model, cache=cache)
+    detector.chain = mock_chain
+    mock_chain.invoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+
+    # Act: whitespace differences are removed by preprocessing
+    first = detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+    second = detector.invoke(LanguageDetectionInput(code="  print('Hello')\n"))
+    third = asyncio.run(detector.ainvoke(LanguageDetectionInput(code="print('Hello')")))
+
+    # Assert
+    assert first == second == third
+    mock_chain.invoke.assert_called_once()
+    mock_chain.ainvoke.assert_not_called()
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+
+
+def test_failed_detection_not_cached(
+    mock_model: MagicMock, mock_chain: MagicMock
+) -> None:
+    """Test that model exceptions are never cached."""
+    # Arrange
+    cache = ResultCache(LanguageDetectionOutput)
+    detector = LanguageDetector(mock_model, cache=cache)
+    detector.chain = mock_chain
+    mock_chain.invoke.side_effect = Exception("Model error")
+
+    # Act
+    detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+    detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+
+    # Assert
+    assert mock_chain.invoke.call_count == 2
+    assert len(cache) == 0
+    assert cache.stats.stores == 0
+
+
+def test_failed_result_not_cached(mock_model: MagicMock, mock_chain: MagicMock) -> None:
+    """Test that failures reported by the model itself are never cached."""
+    # Arrange
+    cache = ResultCache(LanguageDetectionOutput)
+    detector = LanguageDetector(mock_model, cache=cache)
+    detector.chain = mock_chain
+    mock_chain.invoke.return_value = LanguageDetectionOutput(
+        language="unknown",
+        message="The model could not process the snippet.",
+        result="unsuccesfull detection. model exception occured",
+    )
+
+    # Act
+    detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+    detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+
+    # Assert
+    assert mock_chain.invoke.call_count == 2
+    assert cache.stats.stores == 0
+
+
+def test_cache_errors_do_not_fail_detection(
+    mock_model: MagicMock, mock_chain: MagicMock
+) -> None:
+    """Test that a cache which cannot be used does not fail the detection."""
+    # Arrange
+    cache = MagicMock(spec=ResultCache)
+    cache.get.side_effect = cache.aget.side_effect = sqlite3.OperationalError(
+        "database is locked"
+    )
+    cache.set.side_effect = cache.aset.side_effect = sqlite3.OperationalError(
+        "database is locked"
+    )
+    detector = LanguageDetector(mock_model, cache=cache)
+    detector.chain = mock_chain
+    expected = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    mock_chain.invoke.return_value = expected
+    mock_chain.ainvoke.return_value = expected
+
+    # Act
+    output = detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+    async_output = asyncio.run(
+        detector.ainvoke(LanguageDetectionInput(code="print('Hello')"))
+    )
+
+    # Assert
+    assert output.language == async_output.language == "python"
+    cache.set.assert_called_once()
+    cache.aset.assert_awaited_once()
+
+
+def test_cache_key_depends_on_model(mock_chain: MagicMock) -> None:
+    """Test that different models do not share cached results."""
+    # Arrange
+    cache = ResultCache(LanguageDetectionOutput)
+    mock_chain.invoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    detectors = [
+        LanguageDetector(MagicMock(model_name=name), cache=cache)
+        for name in ("gpt-4o", "gpt-4o-mini")
+    ]
+    for detector in detectors:
+        detector.chain = mock_chain
+
+    # Act
+    for detector in detectors:
+        detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+
+    # Assert
+    assert mock_chain.invoke.call_count == 2
+    assert len(cache) == 2
+
+
+def test_fast_path_skips_llm(mock_model: MagicMock, mock_chain: MagicMock) -> None:
+    """Test that a confident local guess is returned without calling the LLM."""
+    # Arrange
+    detector = LanguageDetector(mock_model, fast_path=(HeuristicDetector(),))
+    detector.chain = mock_chain
+
+    # Act
+    output = detector.invoke(LanguageDetectionInput(code="<?php echo 'hi';"))
+    async_output = asyncio.run(
+        detector.ainvoke(LanguageDetectionInput(code="#!/bin/bash\necho hi"))
+    )
+
+    # Assert
+    assert output.language == "php"
+    assert output.result == "detection successful"
+    assert async_output.language == "bash"
+    mock_chain.invoke.assert_not_called()
+    mock_chain.ainvoke.assert_not_called()
+    assert detector.tier_stats == {"heuristic": 2}
+
+
+def test_fast_path_falls_back_to_llm(
+    mock_model: MagicMock, mock_chain: MagicMock
+) -> None:
+    """Test that ambiguous snippets, and failures, are counted per tier."""
+    # Arrange
+    detector = LanguageDetector(
+        mock_model,
+        cache=ResultCache(LanguageDetectionOutput),
+        fast_path=(HeuristicDetector(),),
+        fast_path_threshold=0.95,
+    )
+    detector.chain = mock_chain
+    mock_chain.invoke.side_effect = [
+        LanguageDetectionOutput(
+            language="python",
+            confidence=0.8,
+            message="",
+            result="detection successful",
+        ),
+        Exception("Model error"),
+    ]
+
+    # Act
+    detector.invoke(LanguageDetectionInput(code="print('Hello, World!')"))
+    detector.invoke(LanguageDetectionInput(code="print('Hello, World!')"))
+    detector.invoke(LanguageDetectionInput(code="x=5"))
+
+    # Assert
+    assert mock_chain.invoke.call_count == 2
+    assert detector.tier_stats == {"llm": 1, "cache": 1, "fallback": 1}
+
+
+def test_local_language_detector() -> None:
+    """Test the standalone, LLM-free detector."""
+    detector = LocalLanguageDetector(HeuristicDetector())
+
+    assert detector.invoke({"code": "<?php echo 1;"}).language == "php"
+    assert detector.invoke({"code": "x=5"}).result == (
+        "unknown language or no language detected"
+    )
+
+
+def test_identical_detections_are_coalesced(
+    language_detector: LanguageDetector, mock_chain: MagicMock
+) -> None:
+    """Concurrent detections of the same snippet make a single LLM call."""
+
+    async def fake_ainvoke(*_: object, **__: object) -> LanguageDetectionOutput:
+        await asyncio.sleep(0.01)
+        return LanguageDetectionOutput(
+            language="python",
+            confidence=0.9,
+            message="",
+            result="detection successful",
+        )
+
+    mock_chain.ainvoke.side_effect = fake_ainvoke
+    inputs = [LanguageDetectionInput(code="x = 1")] * 5
+
+    outputs = asyncio.run(language_detector.abatch(inputs))
+
+    assert [output.language for output in outputs] == ["python"] * 5
+    assert len({id(output) for output in outputs}) == 5
+    mock_chain.ainvoke.assert_awaited_once()
+    assert language_detector.tier_stats == {"llm": 1, "coalesced": 4}
+
+
+def test_coalesced_failure_falls_back(
+    language_detector: LanguageDetector, mock_chain: MagicMock
+) -> None:
+    """Every caller sharing a failed call gets the fallback output."""
+
+    async def fail(*_: object, **__: object) -> LanguageDetectionOutput:
+        await asyncio.sleep(0.01)
+        msg = "Model error"
+        raise RuntimeError(msg)
+
+    mock_chain.ainvoke.side_effect = fail
+    inputs = [LanguageDetectionInput(code="x = 1")] * 3
+
+    outputs = asyncio.run(language_detector.abatch(inputs))
+
+    assert {output.result for output in outputs} == {
+        "unsuccesfull detection. model exception occured"
+    }
+    mock_chain.ainvoke.assert_awaited_once()
+    assert language_detector.tier_stats == {"fallback": 3}
+
+
+def test_sampled_detection_reports_tokens_saved(
+    mock_model: MagicMock, mock_chain: MagicMock
+) -> None:
+    """Only a sample of long code is sent, and the savings are reported."""
+    detector = LanguageDetector(mock_model, sampler=CodeSampler(budget=50))
+    detector.chain = mock_chain
+    mock_chain.invoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+    code = "\n".join(f"value_{i} = compute({i})" for i in range(200))
+
+    output = detector.invoke({"code": code})
+
+    sent = mock_chain.invoke.call_args.args[0]["code"]
+    assert estimate_tokens(sent) <= 50
+    assert output.tokens_saved == estimate_tokens(code) - estimate_tokens(sent)
+    assert mock_chain.invoke.return_value.tokens_saved == 0
+    assert detector.invoke({"code": "x = 1"}).tokens_saved == 0
+
+
+def _answer(language: str, confidence: float) -> RunnableLambda:
+    output = LanguageDetectionOutput(
+        language=language,
+        confidence=confidence,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    return RunnableLambda(lambda _: output.model_dump_json())
+
+
+def test_fast_model_escalates_low_confidence() -> None:
+    """Test that unconfident detections by the fast model are escalated."""
+    detector = LanguageDetector(
+        _answer("python", 0.99), fast_model=_answer("ruby", 0.5)
+    )
+
+    output = detector.invoke(LanguageDetectionInput(code="puts x"))
+
+    assert output.language == "python"
+    stats = detector.routing_stats
+    assert stats is not None
+    assert (stats.requests, stats.escalated) == (1, 1)
+
+    detector.escalation_threshold = 0.4
+    assert detector.invoke(LanguageDetectionInput(code="puts y")).language == "ruby"
+    stats = detector.routing_stats
+    assert stats is not None
+    assert stats.escalation_rate == 0.5
+
+
+def test_fast_model_changes_cache_key(
+    mock_model: MagicMock, mock_chain: MagicMock
+) -> None:
+    """Test that routed and unrouted detections are cached apart."""
+    # Arrange
+    cache = ResultCache(LanguageDetectionOutput)
+    mock_chain.invoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    routed = LanguageDetector(
+        mock_model, cache=cache, fast_model=MagicMock(model_name="mini")
+    )
+    unrouted = LanguageDetector(mock_model, cache=cache)
+    for detector in (routed, unrouted):
+        detector.chain = mock_chain
+
+    # Act
+    for detector in (routed, unrouted):
+        detector.invoke(LanguageDetectionInput(code="print('Hello')"))
+
+    # Assert
+    assert unrouted.routing_stats is None
+    assert mock_chain.invoke.call_count == 2
+    assert len(cache) == 2
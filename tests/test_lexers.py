@@ -0,0 +1,113 @@
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.runnables import RunnableSerializable
+
+from pypacter.language_detector import (
+    LanguageDetectionInput,
+    LanguageDetectionOutput,
+    LanguageDetector,
+    LocalLanguageDetector,
+)
+
+pytest.importorskip("pygments")
+
+from pypacter.language_detector.lexers import (  # noqa: E402
+    PygmentsDetector,
+    get_lexer_index,
+)
+
+
+@pytest.fixture
+def detector() -> PygmentsDetector:
+    return PygmentsDetector()
+
+
+def test_index_is_built_once() -> None:
+    index = get_lexer_index()
+
+    assert get_lexer_index() is index
+    assert PygmentsDetector().index is index
+    assert index.build_seconds > 0
+
+
+def test_allow_list_restricts_candidates() -> None:
+    detector = PygmentsDetector(["python", "sql"])
+
+    assert sorted(detector.index.languages) == ["python", "sql"]
+    assert set(detector.candidates("SELECT id FROM users WHERE id = 1")) <= {
+        "python",
+        "sql",
+    }
+
+
+def test_unknown_language_is_reported() -> None:
+    with pytest.raises(ValueError, match="Unsupported languages: 'cobol'"):
+        PygmentsDetector(["python", "cobol"])
+
+
+@pytest.mark.parametrize(
+    ("code", "language"),
+    [
+        ("SELECT id, name FROM users WHERE id = 1 ORDER BY name;", "sql"),
+        ("body {\n  color: red;\n  margin: 0;\n}", "css"),
+        (
+            "use std::io;\n"
+            "fn add(a: i32) -> i32 {\n"
+            "    let mut x = a;\n"
+            '    println!("{}", x);\n'
+            "    x\n"
+            "}",
+            "rust",
+        ),
+    ],
+)
+def test_candidates_include_language(
+    detector: PygmentsDetector, code: str, language: str
+) -> None:
+    assert language in detector.candidates(code)
+
+
+def test_rank_is_a_distribution(detector: PygmentsDetector) -> None:
+    ranking = detector.rank("def add(a, b):\n    return a + b")
+
+    assert ranking
+    assert sum(probability for _, probability in ranking) == pytest.approx(1.0)
+    assert [p for _, p in ranking] == sorted((p for _, p in ranking), reverse=True)
+
+
+def test_empty_snippet(detector: PygmentsDetector) -> None:
+    assert detector.rank("   ") == []
+    assert detector.guess("") is None
+
+
+def test_standalone(detector: PygmentsDetector) -> None:
+    local = LocalLanguageDetector(detector, threshold=0.0)
+
+    output = local.invoke({"code": "SELECT id FROM users WHERE id = 1;"})
+
+    assert output.language == "sql"
+    assert output.result == "detection successful"
+
+
+def test_prefilter_adds_candidates_to_prompt(detector: PygmentsDetector) -> None:
+    mock_chain = MagicMock(spec=RunnableSerializable)
+    mock_chain.invoke.return_value = LanguageDetectionOutput(
+        language="sql",
+        confidence=0.9,
+        message="",
+        result="detection successful",
+    )
+    llm_detector = LanguageDetector(
+        MagicMock(spec=RunnableSerializable), prefilter=detector
+    )
+    llm_detector.chain = mock_chain
+    code = "SELECT id FROM users WHERE id = 1;"
+
+    llm_detector.invoke(LanguageDetectionInput(code=code))
+
+    payload = mock_chain.invoke.call_args.args[0]
+    assert payload["code"] == code
+    assert "sql" in payload["candidates"].split(", ")
+    messages = llm_detector.prompt_template.format_messages(**payload)
+    assert payload["candidates"] in str(messages[-1].content)
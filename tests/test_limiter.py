@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.limiter import (
+    AdaptiveLimiter,
+    Limited,
+    LimitExceeded,
+    is_overload,
+    retry_after,
+)
+
+
+class RateLimitError(Exception):
+    """An overload error, as raised by the OpenAI client."""
+
+    def __init__(self, retry: str | None = None) -> None:
+        """Create the error, with an optional `Retry-After` header."""
+        super().__init__("rate limited")
+        self.status_code = 429
+        headers = {"retry-after": retry} if retry else {}
+        self.response = httpx.Response(429, headers=headers)
+
+
+def test_limit_grows_while_latency_is_stable() -> None:
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=3)
+
+    for _ in range(10):
+        with limiter.permit():
+            pass
+
+    stats = limiter.stats
+    assert stats.limit == 3
+    assert (stats.calls, stats.in_flight) == (10, 0)
+
+
+def test_limit_is_cut_on_overload() -> None:
+    limiter = AdaptiveLimiter(initial_limit=8, min_limit=3)
+
+    for _ in range(3):
+        with pytest.raises(RateLimitError), limiter.permit():
+            raise RateLimitError
+
+    stats = limiter.stats
+    assert stats.limit == 4, "the burst of errors cuts the limit once"
+    assert (stats.overloads, stats.decreases) == (3, 1)
+
+
+def test_other_errors_keep_limit() -> None:
+    limiter = AdaptiveLimiter(initial_limit=4)
+
+    with pytest.raises(ValueError, match="bad"), limiter.permit():
+        int("bad")
+
+    assert limiter.stats.limit == 4
+    assert limiter.stats.overloads == 0
+
+
+def test_retry_after_pauses_calls() -> None:
+    limiter = AdaptiveLimiter()
+
+    with pytest.raises(RateLimitError), limiter.permit():
+        raise RateLimitError(retry="0.2")
+    start = time.monotonic()
+    with limiter.permit():
+        pass
+
+    assert time.monotonic() - start >= 0.15
+    assert limiter.stats.paused_seconds == pytest.approx(0.2, abs=0.05)
+    assert limiter.stats.waited == 1
+
+
+def test_sync_callers_are_limited() -> None:
+    limiter = AdaptiveLimiter(initial_limit=2, max_limit=2)
+    release = threading.Event()
+
+    def call() -> None:
+        with limiter.permit():
+            release.wait(timeout=5)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(call) for _ in range(4)]
+        while limiter.stats.waited < 2:
+            time.sleep(0.01)
+        assert limiter.stats.in_flight == 2
+        release.set()
+        for future in futures:
+            future.result()
+
+    assert limiter.stats.max_in_flight == 2
+
+
+def test_async_callers_are_limited() -> None:
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    in_flight: list[int] = []
+
+    async def call(x: int) -> int:
+        in_flight.append(limiter.stats.in_flight)
+        await asyncio.sleep(0.01)
+        return x
+
+    limited: Limited[int, int] = Limited(RunnableLambda(call), limiter)
+
+    async def run() -> list[int]:
+        return await asyncio.gather(*(limited.ainvoke(x) for x in range(3)))
+
+    assert asyncio.run(run()) == [0, 1, 2]
+    assert in_flight == [1, 1, 1]
+    assert limiter.stats.waited == 2
+
+
+def test_waiting_too_long_is_rejected() -> None:
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1, max_wait=0.05)
+
+    async def run() -> None:
+        await limiter.aacquire()
+        with pytest.raises(LimitExceeded):
+            await limiter.aacquire()
+
+    asyncio.run(run())
+    assert limiter.stats.rejected == 1
+
+
+def test_overload_detection() -> None:
+    assert is_overload(RateLimitError())
+    assert is_overload(httpx.ReadTimeout("slow"))
+    assert not is_overload(ValueError())
+    assert retry_after(RateLimitError(retry="3")) == 3
+    assert retry_after(RateLimitError()) is None
+
+
+def test_detector_shares_limiter() -> None:
+    limiter = AdaptiveLimiter()
+    output = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    detector = LanguageDetector(
+        RunnableLambda(lambda _: output.model_dump_json()), limiter=limiter
+    )
+
+    assert detector.invoke({"code": "x = 1"}).language == "python"
+    assert asyncio.run(detector.ainvoke({"code": "y = 2"})).language == "python"
+    assert limiter.stats.calls == 2
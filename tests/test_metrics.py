@@ -0,0 +1,189 @@
+import asyncio
+import contextlib
+import json
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from pypacter.language_detector import LanguageDetectionOutput, LanguageDetector
+from pypacter.language_detector.batching import MicroBatcher
+from pypacter.metrics import Metrics
+from pypacter.reviewer import Recommendations, Reviewer
+
+DETECTION = LanguageDetectionOutput(
+    language="python",
+    confidence=0.95,
+    message="Language successfully detected.",
+    result="detection successful",
+)
+
+
+def _model(*contents: str) -> GenericFakeChatModel:
+    """A fake chat model answering with the given contents, and their usage."""
+    return GenericFakeChatModel(
+        messages=iter(
+            AIMessage(
+                content=content,
+                usage_metadata={
+                    "input_tokens": 100,
+                    "output_tokens": 10,
+                    "total_tokens": 110,
+                },
+            )
+            for content in contents
+        )
+    )
+
+
+def test_stages_are_measured() -> None:
+    metrics = Metrics(buckets=[0.1, 1])
+
+    with metrics.stage("reviewer", "review"):
+        pass
+    with pytest.raises(ValueError, match="bad"), metrics.stage("reviewer", "review"):
+        int("bad")
+    metrics.observe("reviewer", "review", 5)
+
+    stats = metrics.stats
+    review = stats.stages["reviewer"]["review"]
+    assert (review.count, review.buckets) == (3, [2, 0, 1])
+    assert review.mean_seconds > 1
+    assert stats.failures == {"reviewer": {"review": {"ValueError": 1}}}
+
+
+def test_detector_stages_and_tokens() -> None:
+    metrics = Metrics()
+    detector = LanguageDetector(
+        _model(DETECTION.model_dump_json(), DETECTION.model_dump_json()),
+        metrics=metrics,
+    )
+
+    assert detector.invoke({"code": "x = 1"}).language == "python"
+    assert asyncio.run(detector.ainvoke({"code": "y = 2"})).language == "python"
+
+    stats = metrics.stats
+    stages = stats.stages["detector"]
+    assert set(stages) == {"detect", "preprocess", "format", "llm", "parse"}
+    assert all(stage.count == 2 for stage in stages.values())
+    tokens = stats.tokens["GenericFakeChatModel"]
+    assert (tokens.calls, tokens.input_tokens, tokens.output_tokens) == (2, 200, 20)
+
+
+def test_batched_detections_are_measured() -> None:
+    metrics = Metrics()
+    results = [{"index": i, **DETECTION.model_dump()} for i in range(2)]
+    detector = LanguageDetector(
+        _model(json.dumps({"results": results})), metrics=metrics
+    )
+    detector.batcher = MicroBatcher(detector.llm)
+
+    async def detect() -> list[LanguageDetectionOutput]:
+        return list(
+            await asyncio.gather(
+                detector.ainvoke({"code": "x = 1"}), detector.ainvoke({"code": "y = 2"})
+            )
+        )
+
+    assert [output.language for output in asyncio.run(detect())] == ["python"] * 2
+
+    stats = metrics.stats
+    stages = stats.stages["detector"]
+    assert {stage: stages[stage].count for stage in ("format", "llm", "parse")} == {
+        "format": 1,
+        "llm": 1,
+        "parse": 1,
+    }
+    assert stats.tokens["GenericFakeChatModel"].calls == 1
+
+
+def test_swallowed_failures_are_counted() -> None:
+    metrics = Metrics()
+    detector = LanguageDetector(_model(DETECTION.model_dump_json()), metrics=metrics)
+    reviewer = Reviewer(
+        model=_model("not json"), language_detector=detector, metrics=metrics
+    )
+
+    output = reviewer.invoke({"code": "x = 1"})
+
+    assert output.review_result == "Failed"
+    failures = metrics.stats.failures["reviewer"]
+    assert failures["parse"] == {"OutputParserException": 1}
+    assert failures["review"] == {"OutputParserException": 1}
+    assert metrics.stats.stages["reviewer"]["detect"].count == 1
+
+
+def test_render_prometheus_text() -> None:
+    metrics = Metrics(buckets=[0.5])
+    metrics.observe("detector", "llm", 0.2)
+    metrics.count_tokens("gpt", 7, 3)
+    review = Recommendations(recommendations=[], review_result="Success")
+
+    text = metrics.render([
+        ("routing", {"models": {"fast": {"calls": 2}}}, {"component": "x"}),
+        ("review", review, {}),
+        ("missing", None, {}),
+    ])
+
+    lines = text.splitlines()
+    assert "# TYPE pypacter_stage_duration_seconds histogram" in lines
+    assert (
+        'pypacter_stage_duration_seconds_bucket{component="detector",stage="llm",'
+        'le="+Inf"} 1'
+    ) in lines
+    assert 'pypacter_llm_tokens_total{model="gpt",direction="input"} 7' in lines
+    assert 'pypacter_routing_models_calls{component="x",model="fast"} 2' in lines
+    assert 'pypacter_review_review_result{review_result="Success"} 1' in lines
+    assert not any("missing" in line for line in lines)
+
+
+class _Span:
+    """A span recording its attributes, standing for an OpenTelemetry span."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.attributes: dict[str, Any] = {}
+        self.ended = False
+
+    def set_attributes(self, attributes: dict[str, Any]) -> None:
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        self.ended = True
+
+
+class _Tracer:
+    """A tracer keeping its spans, standing for an OpenTelemetry tracer."""
+
+    def __init__(self) -> None:
+        self.spans: list[_Span] = []
+
+    def start_span(self, name: str, **_: object) -> _Span:
+        self.spans.append(span := _Span(name))
+        return span
+
+    @contextlib.contextmanager
+    def start_as_current_span(self, name: str) -> Iterator[_Span]:
+        span = self.start_span(name)
+        yield span
+        span.end()
+
+
+def test_stages_are_traced() -> None:
+    pytest.importorskip("opentelemetry")
+    tracer = _Tracer()
+    detector = LanguageDetector(
+        _model(DETECTION.model_dump_json()),
+        metrics=Metrics(tracer=tracer),  # type: ignore[arg-type]
+    )
+
+    detector.invoke({"code": "x = 1"})
+
+    names = [span.name for span in tracer.spans]
+    assert names[:2] == ["pypacter.detector.detect", "pypacter.detector.preprocess"]
+    assert "pypacter.detector.llm" in names
+    assert all(span.ended for span in tracer.spans)
+    llm = next(span for span in tracer.spans if span.name.endswith(".llm"))
+    assert llm.attributes["gen_ai.usage.output_tokens"] == 10
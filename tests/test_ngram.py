@@ -0,0 +1,141 @@
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from langchain_core.runnables import RunnableSerializable
+
+from pypacter.language_detector import LanguageDetector, LocalLanguageDetector
+
+np = pytest.importorskip("numpy")
+
+from pypacter.language_detector.ngram import NgramClassifier, main  # noqa: E402
+
+CORPUS = {
+    "python": [
+        "def add(a, b):\n    return a + b\n",
+        "import os\n\nfor name in os.listdir('.'):\n    print(name)\n",
+        "class Point:\n    def __init__(self, x):\n        self.x = x\n",
+        "if value is None:\n    raise ValueError('missing')\nelif value:\n    pass\n",
+        "with open(path) as f:\n    data = [line.strip() for line in f]\n",
+        "async def fetch(self):\n    return await self.client.get(url)\n",
+    ],
+    "javascript": [
+        "function add(a, b) {\n  return a + b;\n}\n",
+        "const items = list.map((x) => x * 2);\nconsole.log(items);\n",
+        "let count = 0;\nbutton.addEventListener('click', () => count++);\n",
+        "export default class Point {\n  constructor(x) {\n    this.x = x;\n  }\n}\n",
+        "if (value === undefined) {\n  throw new Error('missing');\n}\n",
+        "const data = await fetch(url).then((res) => res.json());\n",
+    ],
+    "sql": [
+        "SELECT id, name FROM users WHERE id = 1;\n",
+        "INSERT INTO orders (id, total) VALUES (1, 9.99);\n",
+        "UPDATE users SET name = 'bob' WHERE id = 2;\n",
+        "CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL);\n",
+        "SELECT COUNT(*) FROM orders GROUP BY user_id HAVING COUNT(*) > 1;\n",
+        "DELETE FROM sessions WHERE expires_at < NOW();\n",
+    ],
+}
+
+
+@pytest.fixture(scope="module")
+def model() -> NgramClassifier:
+    samples = [sample for samples in CORPUS.values() for sample in samples]
+    labels = [label for label, samples in CORPUS.items() for _ in samples]
+    return NgramClassifier.train(samples, labels, n_features=2**14, holdout=0.34)
+
+
+@pytest.mark.parametrize(
+    ("code", "language"),
+    [
+        ("def main():\n    print('hello')\n", "python"),
+        ("const x = () => {\n  console.log('hi');\n};\n", "javascript"),
+        ("SELECT name FROM users WHERE id = 3;", "sql"),
+    ],
+)
+def test_guess(model: NgramClassifier, code: str, language: str) -> None:
+    guess = model.guess(code)
+
+    assert guess is not None
+    assert guess.language == language
+    assert 0.0 <= guess.confidence <= 1.0
+
+
+def test_predict_proba_is_a_distribution(model: NgramClassifier) -> None:
+    probabilities = model.predict_proba("x = 1")
+
+    assert set(probabilities) == set(CORPUS)
+    assert sum(probabilities.values()) == pytest.approx(1.0)
+    assert model.scale > 0
+
+
+def test_empty_snippet(model: NgramClassifier) -> None:
+    assert model.predict_proba("") == {}
+    assert model.guess("") is None
+
+
+def test_mismatched_training_data() -> None:
+    with pytest.raises(ValueError, match="samples and labels"):
+        NgramClassifier.train(["x = 1"], [])
+
+
+def test_save_and_load(model: NgramClassifier, tmp_path: Path) -> None:
+    model.save(tmp_path)
+
+    loaded = NgramClassifier.load(tmp_path)
+
+    assert isinstance(loaded.weights, np.memmap)
+    assert loaded.labels == model.labels
+    assert loaded.n_features == model.n_features
+    code = "SELECT 1 FROM dual;"
+    assert loaded.predict_proba(code) == pytest.approx(model.predict_proba(code))
+
+
+def test_training_cli(tmp_path: Path) -> None:
+    corpus = tmp_path / "corpus"
+    for language, samples in CORPUS.items():
+        (corpus / language).mkdir(parents=True)
+        for i, sample in enumerate(samples):
+            (corpus / language / f"{i}.txt").write_text(sample)
+
+    main([str(corpus), str(tmp_path / "model"), "--features", "4096"])
+
+    loaded = NgramClassifier.load(tmp_path / "model")
+    assert loaded.labels == sorted(CORPUS)
+    assert loaded.n_features == 4096
+
+
+def test_throughput(model: NgramClassifier) -> None:
+    """Classifying a snippet takes well under a millisecond."""
+    snippets = [sample for samples in CORPUS.values() for sample in samples] * 100
+
+    start = time.perf_counter()
+    for snippet in snippets:
+        model.guess(snippet)
+    elapsed = time.perf_counter() - start
+
+    assert len(snippets) / elapsed > 1000
+
+
+def test_fast_path(model: NgramClassifier) -> None:
+    """The classifier answers without calling the LLM when confident."""
+    detector = LanguageDetector(
+        MagicMock(spec=RunnableSerializable),
+        fast_path=[model],
+        fast_path_threshold=0.0,
+    )
+
+    output = detector.invoke({"code": "SELECT id FROM users;"})
+
+    assert output.language == "sql"
+    assert detector.tier_stats == {"ngram": 1}
+
+
+def test_standalone(model: NgramClassifier) -> None:
+    local = LocalLanguageDetector(model, threshold=0.0)
+
+    output = local.invoke({"code": "SELECT id FROM users;"})
+
+    assert output.language == "sql"
+    assert output.result == "detection successful"
@@ -0,0 +1,57 @@
+import json
+
+from langchain_core.output_parsers import PydanticOutputParser
+from pydantic import BaseModel, Field
+
+from pypacter.parsers import NOT_LLM_OUTPUT, OutputParser
+from pypacter.reviewer import Recommendation, Recommendations
+
+
+class Item(BaseModel):
+    """An item, with a field set after parsing."""
+
+    name: str
+    checked: bool = Field(default=False, json_schema_extra=NOT_LLM_OUTPUT)
+
+
+class Items(BaseModel):
+    """Several items, with a required field set after parsing."""
+
+    items: list[Item]
+    source: str = Field(json_schema_extra=NOT_LLM_OUTPUT)
+
+
+def test_hidden_fields_left_out_of_instructions() -> None:
+    instructions = OutputParser(pydantic_object=Items).get_format_instructions()
+
+    schema = json.loads(instructions.rsplit("```", 2)[-2])
+    assert list(schema["properties"]) == ["items"]
+    assert schema["required"] == ["items"]
+    assert list(schema["$defs"]["Item"]["properties"]) == ["name"]
+
+
+def test_instructions_match_langchain() -> None:
+    """Without hidden fields, the instructions are those of LangChain."""
+    ours: OutputParser[Recommendation] = OutputParser(pydantic_object=Recommendation)
+    theirs: PydanticOutputParser[Recommendation] = PydanticOutputParser(
+        pydantic_object=Recommendation
+    )
+
+    assert ours.get_format_instructions() == theirs.get_format_instructions()
+
+
+def test_hidden_fields_remain_in_schema() -> None:
+    assert "source" in Items.model_json_schema()["properties"]
+    assert "language_source" in Recommendations.model_json_schema()["properties"]
+    assert (
+        "language_source"
+        not in OutputParser(pydantic_object=Recommendations).get_format_instructions()
+    )
+
+
+def test_hidden_fields_are_parsed() -> None:
+    parser: OutputParser[Items] = OutputParser(pydantic_object=Items)
+
+    items = parser.parse('{"items": [{"name": "a"}], "source": "test"}')
+
+    assert items == Items(items=[Item(name="a")], source="test")
@@ -1,14 +1,27 @@
+import asyncio
+import sqlite3
+from collections.abc import AsyncIterator
+from typing import Any
 from unittest.mock import MagicMock
 
 import pytest
-from langchain_core.runnables import RunnableSerializable
+from langchain_core.messages import AIMessageChunk
+from langchain_core.runnables import RunnableLambda, RunnableSerializable
 from pydantic import ValidationError
 
+from pypacter.cache import ResultCache
 from pypacter.language_detector import (
     LanguageDetectionInput,
     LanguageDetectionOutput,
 )
-from pypacter.reviewer import Recommendation, Recommendations, Reviewer
+from pypacter.reviewer import (
+    FusedRecommendations,
+    Recommendation,
+    Recommendations,
+    Reviewer,
+    ReviewInput,
+    normalize_code,
+)
 
 
 @pytest.fixture
@@ -236,3 +249,421 @@ def test_code_review_no_input(
     assert len(output.recommendations) == 0
     assert output.review_result == "Success"
     mock_chain.invoke.assert_called_once()
+
+
+def test_async_code_review_success(
+    reviewer: Reviewer, mock_chain: MagicMock, language_detector: MagicMock
+) -> None:
+    """Test that ainvoke awaits both the detector and the review chain."""
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    mock_chain.ainvoke.return_value = Recommendations(
+        recommendations=[
+            Recommendation(line=1, severity="error", message="Syntax error.")
+        ],
+        review_result="Success",
+    )
+
+    output = asyncio.run(reviewer.ainvoke(LanguageDetectionInput(code="print 'x'")))
+
+    assert output.review_result == "Success"
+    assert len(output.recommendations) == 1
+    language_detector.ainvoke.assert_awaited_once()
+    mock_chain.ainvoke.assert_awaited_once()
+    language_detector.invoke.assert_not_called()
+    mock_chain.invoke.assert_not_called()
+
+
+def test_async_code_review_chain_error(
+    reviewer: Reviewer, mock_chain: MagicMock, language_detector: MagicMock
+) -> None:
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    mock_chain.ainvoke.side_effect = Exception()
+
+    output = asyncio.run(reviewer.ainvoke({"code": "print('Hello World')"}))
+
+    assert output.review_result == "Failed"
+    assert len(output.recommendations) == 0
+
+
+def test_async_code_review_stream(
+    reviewer: Reviewer, mock_chain: MagicMock, language_detector: MagicMock
+) -> None:
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+
+    async def fake_astream(*_: object, **__: object) -> AsyncIterator[Recommendations]:
+        yield Recommendations(recommendations=[], review_result="Success")
+        raise RuntimeError
+
+    mock_chain.astream = fake_astream
+
+    async def collect() -> list[Recommendations]:
+        return [
+            chunk
+            async for chunk in reviewer.astream(LanguageDetectionInput(code="x = 1"))
+        ]
+
+    outputs = asyncio.run(collect())
+
+    assert [output.review_result for output in outputs] == ["Success", "Failed"]
+
+
+@pytest.fixture
+def cached_reviewer(reviewer: Reviewer, language_detector: MagicMock) -> Reviewer:
+    """Reviewer with an in-memory review cache."""
+    reviewer.cache = ResultCache(Recommendations)
+    detection = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="Language successfully detected.",
+        result="detection successful",
+    )
+    language_detector.invoke.return_value = detection
+    language_detector.ainvoke.return_value = detection
+    return reviewer
+
+
+def test_code_review_cached(cached_reviewer: Reviewer, mock_chain: MagicMock) -> None:
+    """Test that the same file is only reviewed once, whatever its line endings."""
+    mock_chain.invoke.return_value = Recommendations(
+        recommendations=[
+            Recommendation(line=2, severity="warning", message="Unused variable.")
+        ],
+        review_result="Success",
+    )
+
+    first = cached_reviewer.invoke(LanguageDetectionInput(code="import os\nx = 1\n"))
+    second = cached_reviewer.invoke(
+        LanguageDetectionInput(code="import os  \r\nx = 1\r\n\r\n")
+    )
+    third = asyncio.run(
+        cached_reviewer.ainvoke(LanguageDetectionInput(code="import os\nx = 1"))
+    )
+
+    assert first == second == third
+    mock_chain.invoke.assert_called_once()
+    mock_chain.ainvoke.assert_not_called()
+
+
+def test_code_review_cache_errors_do_not_fail_review(
+    cached_reviewer: Reviewer, mock_chain: MagicMock
+) -> None:
+    """Test that a cache which cannot be used does not fail the review."""
+    cache = MagicMock(spec=ResultCache)
+    locked = sqlite3.OperationalError("database is locked")
+    cache.get.side_effect = cache.aget.side_effect = locked
+    cache.set.side_effect = cache.aset.side_effect = locked
+    cached_reviewer.cache = cache
+    review = Recommendations(recommendations=[], review_result="Success")
+    mock_chain.invoke.return_value = review
+    mock_chain.ainvoke.return_value = review
+
+    output = cached_reviewer.invoke(LanguageDetectionInput(code="x = 1"))
+    async_output = asyncio.run(
+        cached_reviewer.ainvoke(LanguageDetectionInput(code="x = 1"))
+    )
+
+    assert output.review_result == async_output.review_result == "Success"
+    cache.set.assert_called_once()
+    cache.aset.assert_awaited_once()
+
+
+def test_code_review_cache_keyed_on_language(
+    cached_reviewer: Reviewer, mock_chain: MagicMock, language_detector: MagicMock
+) -> None:
+    mock_chain.invoke.return_value = Recommendations(
+        recommendations=[], review_result="Success"
+    )
+
+    cached_reviewer.invoke(LanguageDetectionInput(code="x = 1"))
+    language_detector.invoke.return_value = LanguageDetectionOutput(
+        language="ruby",
+        confidence=0.6,
+        message="",
+        result="possibility of multiple languages need more context",
+    )
+    cached_reviewer.invoke(LanguageDetectionInput(code="x = 1"))
+
+    assert mock_chain.invoke.call_count == 2
+
+
+def test_code_review_failures_not_cached(
+    cached_reviewer: Reviewer, mock_chain: MagicMock
+) -> None:
+    mock_chain.invoke.side_effect = [
+        Exception(),
+        Recommendations(recommendations=[], review_result="Failed"),
+        Recommendations(recommendations=[], review_result="Success"),
+    ]
+
+    outputs = [
+        cached_reviewer.invoke(LanguageDetectionInput(code="x = 1")) for _ in range(4)
+    ]
+
+    assert [output.review_result for output in outputs] == [
+        "Failed",
+        "Failed",
+        "Success",
+        "Success",
+    ]
+    assert mock_chain.invoke.call_count == 3
+
+
+def test_normalize_code_keeps_line_numbers() -> None:
+    assert normalize_code("\n\nx = 1   \r\ny = 2\n\n") == "\n\nx = 1\ny = 2"
+
+
+def test_identical_reviews_are_coalesced(
+    reviewer: Reviewer, mock_chain: MagicMock, language_detector: MagicMock
+) -> None:
+    """Concurrent reviews of the same snippet make a single LLM call."""
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+
+    async def fake_ainvoke(*_: object, **__: object) -> Recommendations:
+        await asyncio.sleep(0.01)
+        return Recommendations(
+            recommendations=[Recommendation(line=1, severity="warning", message="x")],
+            review_result="Success",
+        )
+
+    mock_chain.ainvoke.side_effect = fake_ainvoke
+
+    outputs = asyncio.run(reviewer.abatch([{"code": "x = 1"}] * 4))
+
+    assert [output.review_result for output in outputs] == ["Success"] * 4
+    assert outputs[0].recommendations is not outputs[1].recommendations
+    mock_chain.ainvoke.assert_awaited_once()
+    assert reviewer.in_flight.stats.followers == 3
+
+
+async def chunks(items: list[AIMessageChunk]) -> AsyncIterator[AIMessageChunk]:
+    for item in items:
+        yield item
+
+
+def test_stream_recommendations(
+    reviewer: Reviewer, language_detector: MagicMock
+) -> None:
+    """Recommendations are yielded as they are generated, then the review."""
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+    review = Recommendations(
+        recommendations=[
+            Recommendation(line=1, severity="error", message="Syntax error."),
+            Recommendation(line=2, severity="warning", message="Unused import."),
+        ],
+        review_result="Success",
+    )
+    text = review.model_dump_json()
+    reviewer.raw_chain = MagicMock(spec=RunnableSerializable)
+    reviewer.raw_chain.astream.return_value = chunks([
+        AIMessageChunk(content=text[i : i + 7]) for i in range(0, len(text), 7)
+    ])
+    cache: ResultCache[Recommendations] = ResultCache(Recommendations)
+    reviewer.cache = cache
+
+    async def collect() -> list[Recommendation | Recommendations]:
+        return [item async for item in reviewer.astream_recommendations({"code": "x"})]
+
+    items = asyncio.run(collect())
+
+    assert items == [*review.recommendations, review]
+    # The second review is served from the cache, in the same shape.
+    assert asyncio.run(collect()) == items
+    reviewer.raw_chain.astream.assert_called_once()
+
+
+def test_stream_recommendations_failure(
+    reviewer: Reviewer, language_detector: MagicMock
+) -> None:
+    """A review cut short keeps the recommendations streamed so far."""
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.95,
+        message="",
+        result="detection successful",
+    )
+    text = '{"recommendations": [{"line": 1, "severity": "error", "message": "x"}, {"li'
+    reviewer.raw_chain = MagicMock(spec=RunnableSerializable)
+    reviewer.raw_chain.astream.return_value = chunks([AIMessageChunk(content=text)])
+
+    async def collect() -> list[Recommendation | Recommendations]:
+        return [item async for item in reviewer.astream_recommendations({"code": "x"})]
+
+    items = asyncio.run(collect())
+
+    recommendation = Recommendation(line=1, severity="error", message="x")
+    assert items == [
+        recommendation,
+        Recommendations(recommendations=[recommendation], review_result="Failed"),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("hints", "language", "source"),
+    [
+        ({"language": " TypeScript "}, "typescript", "hint"),
+        ({"filename": "src/app/foo.ts"}, "typescript", "filename"),
+        ({"filename": "Dockerfile"}, "dockerfile", "filename"),
+        ({"language": "go", "filename": "main.rs"}, "go", "hint"),
+    ],
+)
+def test_language_hint_skips_detection(
+    reviewer: Reviewer,
+    mock_chain: MagicMock,
+    hints: dict[str, str],
+    language: str,
+    source: str,
+) -> None:
+    mock_chain.invoke.return_value = Recommendations(
+        recommendations=[], review_result="Success"
+    )
+
+    output = reviewer.invoke(ReviewInput(code="const x = 1;", **hints))
+
+    reviewer.language_detector.invoke.assert_not_called()  # type: ignore[attr-defined]
+    assert mock_chain.invoke.call_args.args[0]["language"] == language
+    assert output.language_source == source
+    assert mock_chain.invoke.return_value.language_source == "detector"
+
+
+@pytest.mark.parametrize("filename", ["include/foo.h", "script.pl", "README"])
+def test_ambiguous_filename_is_detected(
+    reviewer: Reviewer,
+    mock_chain: MagicMock,
+    language_detector: MagicMock,
+    filename: str,
+) -> None:
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="c",
+        confidence=0.9,
+        message="",
+        result="detection successful",
+    )
+    mock_chain.ainvoke.return_value = Recommendations(
+        recommendations=[], review_result="Success"
+    )
+
+    output = asyncio.run(reviewer.ainvoke({"code": "int x = 1;", "filename": filename}))
+
+    language_detector.ainvoke.assert_awaited_once()
+    assert mock_chain.ainvoke.call_args.args[0]["language"] == "c"
+    assert output.language_source == "detector"
+
+
+@pytest.fixture
+def fused_reviewer(language_detector: MagicMock, mock_model: MagicMock) -> Reviewer:
+    """Instantiate a Reviewer in fused mode with a mocked fused chain."""
+    reviewer = Reviewer(
+        model=mock_model,
+        language_detector=language_detector,  # type: ignore[arg-type]
+        fused=True,
+        fused_cache=ResultCache(FusedRecommendations),
+    )
+    reviewer.chain = MagicMock(spec=RunnableSerializable)
+    reviewer.fused_chain = MagicMock(spec=RunnableSerializable)
+    reviewer.fused_chain.ainvoke.return_value = FusedRecommendations(
+        language="python",
+        confidence=0.9,
+        recommendations=[Recommendation(line=1, severity="warning", message="x")],
+        review_result="Success",
+    )
+    return reviewer
+
+
+def test_fused_review_single_call(
+    fused_reviewer: Reviewer, language_detector: MagicMock
+) -> None:
+    output = asyncio.run(fused_reviewer.ainvoke({"code": "print(x)"}))
+
+    assert isinstance(output, FusedRecommendations)
+    assert (output.language, output.language_source) == ("python", "fused")
+    language_detector.ainvoke.assert_not_called()
+    fused_reviewer.chain.ainvoke.assert_not_called()  # type: ignore[attr-defined]
+
+    # Fused reviews are cached on the code alone.
+    again = asyncio.run(fused_reviewer.ainvoke({"code": "print(x)\n"}))
+    assert again == output
+    fused_reviewer.fused_chain.ainvoke.assert_awaited_once()  # type: ignore[attr-defined]
+
+
+@pytest.mark.parametrize(
+    "hints", [{"fused": False}, {"language": "python"}, {"filename": "x.py"}]
+)
+def test_fused_review_per_request(
+    fused_reviewer: Reviewer, language_detector: MagicMock, hints: dict[str, Any]
+) -> None:
+    """Fused mode is overridden per request, and unneeded with a hint."""
+    language_detector.ainvoke.return_value = LanguageDetectionOutput(
+        language="python",
+        confidence=0.9,
+        message="",
+        result="detection successful",
+    )
+    chain: MagicMock = fused_reviewer.chain  # type: ignore[assignment]
+    chain.ainvoke.return_value = Recommendations(review_result="Success")
+
+    output = asyncio.run(fused_reviewer.ainvoke({"code": "print(x)", **hints}))
+
+    assert output.language_source != "fused"
+    chain.ainvoke.assert_awaited_once()
+    fused_reviewer.fused_chain.ainvoke.assert_not_called()  # type: ignore[attr-defined]
+
+
+def test_fused_review_failure(fused_reviewer: Reviewer) -> None:
+    fused_reviewer.fused_chain.invoke.side_effect = ValueError("bad output")  # type: ignore[attr-defined]
+
+    output = fused_reviewer.invoke({"code": "print(x)"})
+
+    assert output.review_result == "Failed"
+    assert output.language_source == "fused"
+
+
+def test_small_snippets_reviewed_by_fast_model(language_detector: MagicMock) -> None:
+    def model(message: str) -> RunnableLambda:
+        output = Recommendations(
+            recommendations=[
+                Recommendation(line=1, severity="warning", message=message)
+            ],
+            review_result="Success",
+        )
+        return RunnableLambda(lambda _: output.model_dump_json())
+
+    reviewer = Reviewer(
+        model=model("strong"),
+        language_detector=language_detector,  # type: ignore[arg-type]
+        fast_model=model("fast"),
+        fast_max_tokens=1500,
+    )
+    small = ReviewInput(code="x = 1", language="python")
+    large = ReviewInput(code="x = 1\n" * 2000, language="python")
+
+    assert reviewer.invoke(small).recommendations[0].message == "fast"
+    assert reviewer.invoke(large).recommendations[0].message == "strong"
+    stats = reviewer.routing_stats
+    assert stats is not None
+    assert sum(stats.decisions.values()) == 2
+    assert Reviewer(model=model("strong")).routing_stats is None
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from pypacter.routing import Cascade, SizeRouter
+
+
+def _fail(_: str) -> str:
+    msg = "model unavailable"
+    raise ConnectionError(msg)
+
+
+def test_cascade_accepts_first_satisfactory_output() -> None:
+    cascade = Cascade(
+        [
+            ("fast", RunnableLambda(lambda x: f"fast:{x}")),
+            ("strong", RunnableLambda(lambda x: f"strong:{x}")),
+        ],
+        escalate=lambda output: output.endswith("?"),
+    )
+
+    assert cascade.invoke("a") == "fast:a"
+    assert cascade.invoke("b?") == "strong:b?"
+
+    stats = cascade.stats
+    assert (stats.requests, stats.escalated, stats.escalations) == (2, 1, 1)
+    assert stats.decisions == {"fast": 1, "strong": 1}
+    assert stats.escalation_rate == 0.5
+    assert stats.models["fast"].calls == 2
+    assert stats.models["strong"].calls == 1
+
+
+def test_cascade_escalates_on_failure() -> None:
+    cascade = Cascade(
+        [("fast", RunnableLambda(_fail)), ("strong", RunnableLambda(str.upper))],
+        escalate=lambda _: False,
+    )
+
+    assert asyncio.run(cascade.ainvoke("a")) == "A"
+    stats = cascade.stats
+    assert stats.models["fast"].errors == 1
+    assert stats.decisions == {"strong": 1}
+
+
+def test_cascade_raises_failure_of_last_model() -> None:
+    cascade = Cascade(
+        [("fast", RunnableLambda(_fail)), ("strong", RunnableLambda(_fail))],
+        escalate=lambda _: False,
+    )
+
+    with pytest.raises(ConnectionError, match="model unavailable"):
+        cascade.invoke("a")
+    assert cascade.stats.requests == 0
+    assert cascade.stats.models["strong"].errors == 1
+
+
+def test_cascade_raises_unexpected_errors() -> None:
+    def bug(_: str) -> str:
+        msg = "not a model failure"
+        raise TypeError(msg)
+
+    cascade = Cascade(
+        [("fast", RunnableLambda(bug)), ("strong", RunnableLambda(str.upper))],
+        escalate=lambda _: False,
+    )
+
+    with pytest.raises(TypeError, match="not a model failure"):
+        cascade.invoke("a")
+
+
+def test_size_router_routes_by_size() -> None:
+    router = SizeRouter(
+        small=("small", RunnableLambda(lambda x: f"small:{x}")),
+        large=("large", RunnableLambda(lambda x: f"large:{x}")),
+        size=len,
+        max_small_size=3,
+    )
+
+    assert router.invoke("abc") == "small:abc"
+    assert router.invoke("abcd") == "large:abcd"
+    assert asyncio.run(router.ainvoke("ab")) == "small:ab"
+
+    stats = router.stats
+    assert stats.decisions == {"small": 2, "large": 1}
+    assert stats.escalation_rate == 0.0
+    assert stats.models["large"].mean_seconds >= 0
+
+
+def test_size_router_streams() -> None:
+    router = SizeRouter(
+        small=("small", RunnableLambda(str.lower)),
+        large=("large", RunnableLambda(str.upper)),
+        size=len,
+        max_small_size=1,
+    )
+
+    async def stream() -> list[str]:
+        return [chunk async for chunk in router.astream("Ab")]
+
+    assert asyncio.run(stream()) == ["AB"]
+    assert router.stats.models["large"].calls == 1
+
+
+def test_routes_are_required() -> None:
+    with pytest.raises(ValueError, match="At least one route"):
+        Cascade([], escalate=lambda _: False)
@@ -0,0 +1,70 @@
+from pypacter.language_detector.sampling import CodeSampler, clean_lines
+from pypacter.tokens import estimate_tokens
+
+LICENSE = """\
+# Copyright (c) 2024 Example Corp.
+#
+# Licensed under the Apache License, Version 2.0.
+"""
+
+
+def large_file(functions: int = 500) -> str:
+    body = "\n\n".join(
+        f"def function_{i}(x):\n    y = x * {i}\n    return y + 1"
+        for i in range(functions)
+    )
+    return f"{LICENSE}\nimport os\nimport sys\n\n{body}\n"
+
+
+def test_short_code_is_unchanged() -> None:
+    sampler = CodeSampler(budget=100)
+
+    assert sampler("  print('hello')\n\n") == "print('hello')"
+
+
+def test_sample_fits_budget() -> None:
+    code = large_file()
+    sampler = CodeSampler(budget=200)
+
+    sample = sampler(code)
+
+    assert estimate_tokens(code) > 10 * 200
+    assert estimate_tokens(sample) <= 200
+    lines = sample.splitlines()
+    assert lines[:2] == ["import os", "import sys"]
+    assert lines[-1] == "    return y + 1"
+    assert "..." in lines
+    # The lines in between favour definitions.
+    middle = lines[lines.index("...") : -3]
+    assert sum(line.startswith("def ") for line in middle) > len(middle) // 3
+
+
+def test_license_header_removed() -> None:
+    lines = clean_lines(["#!/usr/bin/env python", *LICENSE.splitlines(), "x = 1"])
+
+    assert lines == ["#!/usr/bin/env python", "x = 1"]
+
+
+def test_comments_without_license_kept() -> None:
+    lines = ["# Compute things.", "#include <stdio.h>", "x = 1"]
+
+    assert clean_lines(lines) == lines
+
+
+def test_literals_and_data_shortened() -> None:
+    lines = clean_lines([
+        f'MESSAGE = "{"a" * 100}"',
+        "TABLE = [",
+        "    1, 2, 3,",
+        "    4, 5, 6,",
+        "    7, 8, 9,",
+        "]",
+    ])
+
+    assert lines == [
+        'MESSAGE = "aaaaaaaaaaaaaaaaaaa..."',
+        "TABLE = [",
+        "    1, 2, 3,",
+        "...",
+        "]",
+    ]
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pypacter.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_call() -> None:
+    group: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work() -> int:
+        calls.append(1)
+        release.wait(timeout=5)
+        return 42
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        futures = [pool.submit(group.do, "key", work) for _ in range(5)]
+        while group.waiters().get("key", 0) < 4:
+            pass
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    assert sorted(results) == [(42, False)] + [(42, True)] * 4
+    stats = group.stats
+    assert (stats.leaders, stats.followers, stats.max_waiters) == (1, 4, 4)
+    assert group.waiters() == {}
+
+
+def test_sequential_calls_are_not_shared() -> None:
+    group: SingleFlight[int] = SingleFlight()
+
+    assert group.do("key", lambda: 1) == (1, False)
+    assert group.do("key", lambda: 2) == (2, False)
+    assert group.stats.leaders == 2
+
+
+def test_failure_is_raised_to_every_caller() -> None:
+    group: SingleFlight[int] = SingleFlight()
+    release = threading.Event()
+
+    def work() -> int:
+        release.wait(timeout=5)
+        msg = "model unavailable"
+        raise RuntimeError(msg)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(group.do, "key", work) for _ in range(3)]
+        while group.waiters().get("key", 0) < 2:
+            pass
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model unavailable"):
+                future.result()
+
+
+def test_async_calls_share_one_call() -> None:
+    group: SingleFlight[str] = SingleFlight()
+    calls = []
+
+    async def work() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main() -> list[tuple[str, bool]]:
+        return await asyncio.gather(*(group.ado("key", work) for _ in range(10)))
+
+    results = asyncio.run(main())
+
+    assert len(calls) == 1
+    assert results.count(("done", False)) == 1
+    assert results.count(("done", True)) == 9
+    assert group.waiters() == {}
+
+
+def test_cancelled_leader_does_not_cancel_followers() -> None:
+    group: SingleFlight[str] = SingleFlight()
+
+    async def work() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main() -> tuple[str, bool]:
+        leader = asyncio.create_task(group.ado("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(group.ado("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == ("done", True)
@@ -0,0 +1,62 @@
+import json
+
+from pypacter.reviewer import Recommendation, Recommendations
+from pypacter.reviewer.streaming import ItemStreamParser
+
+REVIEW = Recommendations(
+    recommendations=[
+        Recommendation(
+            line=1, severity="error", message='Use "{" and "}" \\ carefully.'
+        ),
+        Recommendation(line=4, severity="warning", message="Unused [variable]."),
+    ],
+    review_result="Success",
+)
+
+
+def test_items_are_parsed_as_they_close() -> None:
+    """Each item is returned by the chunk which closes it, and only then."""
+    text = "```json\n" + REVIEW.model_dump_json(indent=2) + "\n```"
+    parser = ItemStreamParser(Recommendation)
+
+    completed = [(i, item) for i, char in enumerate(text) for item in parser.feed(char)]
+
+    assert [item for _, item in completed] == REVIEW.recommendations
+    first_close = text.index("}", text.index("carefully"))
+    assert completed[0][0] == first_close
+    assert parser.text == text
+
+
+def test_large_chunks() -> None:
+    parser = ItemStreamParser(Recommendation)
+
+    items = parser.feed(REVIEW.model_dump_json())
+
+    assert items == REVIEW.recommendations
+
+
+def test_invalid_items_are_skipped() -> None:
+    document = {
+        "recommendations": [
+            {"line": "first", "severity": "error", "message": "x"},
+            {"line": 2, "severity": "error", "message": "y"},
+        ],
+        "review_result": "Success",
+    }
+    parser = ItemStreamParser(Recommendation)
+
+    items = parser.feed("Here is the review: " + json.dumps(document))
+
+    assert items == [Recommendation(line=2, severity="error", message="y")]
+
+
+def test_items_spanning_chunks() -> None:
+    text = REVIEW.model_dump_json()
+    parser = ItemStreamParser(Recommendation)
+
+    items = [
+        item for i in range(0, len(text), 7) for item in parser.feed(text[i : i + 7])
+    ]
+
+    assert items == REVIEW.recommendations
+    assert parser.text == text
@@ -0,0 +1,24 @@
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from pypacter.tokens import estimate_tokens, message_tokens
+
+
+def test_estimate_tokens() -> None:
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_message_tokens_prefers_reported_usage() -> None:
+    response = AIMessage(
+        content="python",
+        usage_metadata={"input_tokens": 90, "output_tokens": 10, "total_tokens": 100},
+    )
+
+    assert message_tokens([HumanMessage(content="x" * 400)], response) == 100
+
+
+def test_message_tokens_estimates_without_usage() -> None:
+    prompt: list[BaseMessage] = [HumanMessage(content="x" * 400)]
+
+    assert message_tokens(prompt, AIMessage(content="abcd")) == 101